@@ -1,8 +1,47 @@
+import os
+import sys
 import time
 from datetime import datetime
-import serial
 from google.cloud import firestore
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hydro.aggregate import IntervalAggregator
+from hydro.alerts import DEFAULT_RULES, AlertEngine, print_sink, rules_from_config
+from hydro.calibration import DEFAULT_CALIBRATION_PATH, CalibrationBook, Calibrator
+from hydro.filters import default_pipeline
+from hydro.hub import IngestHub
+from hydro.log import configure as configure_logging, get_logger
+from hydro.metrics import REGISTRY, MetricsServer
+from hydro.sampling import AdaptiveSampler, point_document
+from hydro.storage import SensorStore
+from hydro.uploader import BatchUploader
+
+# Unsent batches are kept here until Firestore is reachable again
+SPOOL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "firestore_spool.jsonl")
+FLUSH_INTERVAL = 60  # Seconds a sample may wait in the upload buffer
+POLL_INTERVAL = 1  # Seconds between draining the serial reader
+STALE_TIMEOUT = 30  # Reopen the port if no valid line arrives for this long
+# Ask boards for probe voltages and calibrate them here with the coefficients in CALIBRATION_PATH
+# (python -m hydro.calibration); the voltages are stored so history can be recalibrated
+RAW_MODE = False
+CALIBRATION_PATH = DEFAULT_CALIBRATION_PATH
+
+# "swinging_door" or "deadband": upload the samples needed to follow each sensor within
+# TOLERANCES (see hydro.sampling), and at least one per sampling interval.
+# "interval": upload one summary (mean/min/max/last) per tank per sampling interval.
+SAMPLING_MODE = "swinging_door"
+TOLERANCES = {}  # Field -> largest error allowed in the uploaded curve; e.g. {"ph": 0.05}
+
+LOG_LEVEL = "INFO"
+LOG_RATE_LIMIT = 5  # Identical messages per minute; None logs everything
+METRICS_PORT = 9109  # Prometheus text at /metrics; None disables it
+
+log = get_logger("write_hydro_data_to_firebase")
+
+# Tank ID -> Arduino port; leave empty to pick up every board that is plugged in
+ARDUINO_PORTS = {"tank1": "/dev/ttyACM0"}  # Adjust as needed
+
 # Firestore setup
 def initialize_firestore():
     """
@@ -11,80 +50,129 @@ def initialize_firestore():
     return firestore.Client.from_service_account_json("/home/tcar5787/APIkeys/hydrometer/serviceAccountKey.json")
 
 # Firestore function to write sensor data
-def write_to_firestore(db, sensor_data):
+def write_to_firestore(uploader, sensor_data):
     """
-    Write sensor data to Firestore.
+    Queue sensor data for a batched Firestore write.
     """
-    try:
-        # Reference Firestore collection
-        collection_ref = db.collection("sensor_readings")
-
-        # Add sensor data with a Python-generated timestamp (to second resolution)
-        sensor_data["timestamp"] = datetime.utcnow().replace(microsecond=0)  # Truncate to second resolution
-        collection_ref.add(sensor_data)
+    # Add sensor data with a Python-generated timestamp (to second resolution)
+    sensor_data["timestamp"] = datetime.utcnow().replace(microsecond=0)  # Truncate to second resolution
+    uploader.add(sensor_data)
 
-        print(f"Data written to Firestore: {sensor_data}")
-    except Exception as e:
-        print(f"Error writing to Firestore: {e}")
-
-# Function to read data from Arduino
-def read_from_arduino(port="/dev/ttyACM0", baud_rate=9600, timeout=1):
+# Function to open long-lived Arduino sessions
+def open_arduino_sessions(ports=None, baud_rate=9600, raw=RAW_MODE):
     """
-    Read sensor data from Arduino.
+    Start a background hub that keeps every tank's Arduino port open.
+
+    Opening a port resets the board, so each is opened once and reopened
+    only if it fails or stops sending valid data. With no ``ports``, serial
+    devices are discovered (and new ones adopted) automatically.
     """
-    try:
-        # Establish connection with Arduino
-        arduino = serial.Serial(port, baud_rate, timeout=timeout)
-        print("Connected to Arduino.")
-        time.sleep(2)  # Allow time for the connection to stabilize
-
-        # Read a line of data
-        line = arduino.readline().decode("utf-8").strip()
-        arduino.close()  # Close the connection after reading
-        print(f"Raw data from Arduino: {line}")
-
-        # Parse the line into sensor values
-        # Example format: "WATER_LEVEL:50,WATER_TEMP:24.5,EC:1.2,TDS:500,PH:6.8"
-        data = dict(item.split(":") for item in line.split(","))
-        return {
-            "water_level": float(data.get("WATER_LEVEL", 0)),
-            "water_temp": float(data.get("WATER_TEMP", 0)),
-            "ec": float(data.get("EC", 0)),
-            "tds": float(data.get("TDS", 0)),
-            "ph": float(data.get("PH", 0)),
-        }
-    except Exception as e:
-        print(f"Error reading data from Arduino: {e}")
-        return None
+    hub = IngestHub(ports, discover=not ports, baud_rate=baud_rate, stale_timeout=STALE_TIMEOUT, raw=raw)
+    samples = hub.subscribe()
+    hub.start()
+    return hub, samples
 
 # Main loop to sample and send data to Firestore
-def main(sampling_interval=900):
+def main(sampling_interval=900, mode=SAMPLING_MODE):
     """
     Main function to sample Arduino data and send to Firestore.
-    
+
+    In the adaptive modes every sample is smoothed and passed to a
+    per-tank AdaptiveSampler, and the samples it keeps are uploaded with
+    their own timestamps: a few documents while the tank is steady, the
+    outline of a pH crash as it happens. In "interval" mode every sample
+    received during an interval is aggregated (mean/min/max/last) and one
+    summary document per tank is uploaded per interval.
+
     Args:
-        sampling_interval (int): Sampling interval in seconds (default 900s or 15 minutes).
+        sampling_interval (int): Sampling interval in seconds (default 900s or 15 minutes);
+            the longest silence between documents in the adaptive modes.
+        mode (str): "swinging_door", "deadband" or "interval".
     """
-    # Initialize Firestore
+    log_limiter = configure_logging(LOG_LEVEL, rate=LOG_RATE_LIMIT)
+
+    # Initialize Firestore; slow interval sampling gains nothing from buffering
     db = initialize_firestore()
+    uploader = BatchUploader(
+        db,
+        max_age=FLUSH_INTERVAL if mode != "interval" or sampling_interval < FLUSH_INTERVAL else 0,
+        spool_path=SPOOL_PATH,
+    )
 
-    # Arduino port
-    ARDUINO_PORT = "/dev/ttyACM0"  # Adjust as needed
+    hub, samples = open_arduino_sessions(ARDUINO_PORTS)
+    aggregators = {}  # Tank ID -> IntervalAggregator
+    samplers = {}  # Tank ID -> (FilterPipeline, AdaptiveSampler)
+    seen = set()  # Tanks heard from this interval
+    store = SensorStore()  # Every raw sample is kept locally
+    calibrator = Calibrator(CalibrationBook(CALIBRATION_PATH))
+    alerts = AlertEngine(rules_from_config(DEFAULT_RULES), sinks=[print_sink])
+    next_upload = time.monotonic() + sampling_interval
+
+    # Per-tank serial counters and uploader totals are read at scrape time
+    REGISTRY.register_stats("hydro_device", lambda: hub.stats()["devices"], label="tank", counters=(
+        "reconnects", "lines_read", "parse_errors",
+        "frames", "crc_errors", "dropped_frames", "rejected_frames", "rejected_values",
+    ))
+    REGISTRY.register_stats("hydro_uploader", uploader.stats, counters=("commits", "documents_written", "failures"))
+    REGISTRY.register_stats(
+        "hydro_sampler", lambda: {tank: sampler.stats() for tank, (_, sampler) in samplers.items()}, label="tank",
+        counters=("samples", "points", "trigger_first", "trigger_change", "trigger_heartbeat", "trigger_flush"),
+    )
+    REGISTRY.gauge("hydro_queue_depth", "Samples waiting for the main loop", source=samples.depth)
+    if log_limiter is not None:
+        REGISTRY.gauge("hydro_log_suppressed", "Log lines dropped by the rate limit", source=lambda: log_limiter.suppressed)
+    drain_time = REGISTRY.histogram("hydro_ingest_seconds", "Time to fold one drained batch into aggregates, store and alerts")
+    metrics_server = MetricsServer(REGISTRY, port=METRICS_PORT).start() if METRICS_PORT else None
 
     try:
         while True:
-            # Read sensor data from Arduino
-            sensor_data = read_from_arduino(port=ARDUINO_PORT)
-            if sensor_data:
-                # Write data to Firestore
-                write_to_firestore(db, sensor_data)
+            # Fold every sample received since the last tick into the sampler or interval summary
+            with drain_time.time():
+                for timestamp, tank, reading, raw in calibrator.calibrate(samples.drain()):
+                    seen.add(tank)
+                    if mode == "interval":
+                        if tank not in aggregators:
+                            aggregators[tank] = IntervalAggregator()
+                        aggregators[tank].add(reading)
+                    else:
+                        if tank not in samplers:
+                            samplers[tank] = (
+                                default_pipeline(),
+                                AdaptiveSampler(TOLERANCES, max_silence=sampling_interval, mode=mode),
+                            )
+                        smoothing, sampler = samplers[tank]
+                        for point in sampler.add(timestamp, smoothing(reading)):
+                            uploader.add(dict(point_document(point), tank=tank))
+                    store.add(timestamp, reading, tank, raw)
+                    alerts.process(timestamp, reading, tank)
+            alerts.tick(time.time())
+
+            if time.monotonic() >= next_upload:
+                for tank, device in list(hub.devices.items()):  # The hub thread adopts new boards
+                    if tank not in seen:
+                        log.warning("No data from tank %s in the last %s seconds (stats: %s)",
+                                    tank, sampling_interval, device.stats())
+                    elif mode == "interval":
+                        write_to_firestore(uploader, dict(aggregators[tank].result(), tank=tank))
+                        aggregators[tank].reset()
+                seen.clear()
+                next_upload += sampling_interval
 
-            # Wait for the next sample
-            print(f"Waiting for the next sample in {sampling_interval} seconds...")
-            time.sleep(sampling_interval)
+            uploader.poll()
+            time.sleep(POLL_INTERVAL)
 
     except KeyboardInterrupt:
-        print("Script terminated by user.")
+        log.info("Script terminated by user.")
+    finally:
+        hub.stop()
+        store.close()
+        for tank, (_, sampler) in samplers.items():
+            for point in sampler.flush():  # The newest sample, so the cloud copy ends where the data did
+                uploader.add(dict(point_document(point), tank=tank))
+            log.info("Tank %s: %d samples uploaded as %d documents", tank, sampler.samples, sampler.points)
+        uploader.close()
+        if metrics_server is not None:
+            metrics_server.stop()
 
 if __name__ == "__main__":
     # Set the sampling interval as desired (default is 15 minutes)
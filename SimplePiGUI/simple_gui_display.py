@@ -1,73 +1,51 @@
+import math
+import os
+import sys
 import tkinter as tk
-import serial
 import time
-from datetime import datetime
 
-# Arduino Serial Connection Settings
-ARDUINO_PORT = "/dev/ttyACM0"  # Adjust to your port
-BAUD_RATE = 9600
-TIMEOUT = 1  # Seconds
-
-arduino_connected = False
-last_flash = None
-last_interaction = time.time()
-
-# Attempt to connect to Arduino
-try:
-    arduino = serial.Serial(ARDUINO_PORT, BAUD_RATE, timeout=TIMEOUT)
-    arduino_connected = True
-except serial.SerialException:
-    arduino_connected = False
-
-
-# Read Arduino Data
-def read_arduino_data():
-    """Read and parse data from Arduino."""
-    global arduino_connected
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-    if not arduino_connected:
-        try:
-            arduino.open()
-            arduino_connected = True
-        except Exception as e:
-            print(f"Error reconnecting to Arduino: {e}")
-            return  # Skip if unable to reconnect
+from hydro.client import CollectorClient
+from hydro.config import load_config
+from hydro.serial_reader import SerialReader
 
-    try:
-        line = arduino.readline().decode("utf-8").strip()
-        print(f"Raw Arduino data: {line}")  # Debugging output
+# Settings shared with the collector daemon (collector.toml; see hydro.config)
+config = load_config()
+TANK, ARDUINO_PORT = next(iter(config["serial"]["ports"].items()), (None, "/dev/ttyACM0"))
+BAUD_RATE = config["serial"]["baud_rate"]
+TIMEOUT = 1  # Seconds
 
-        # Parse the line into a dictionary
-        try:
-            data = dict(item.split(":") for item in line.split(","))
-        except ValueError as ve:
-            print(f"Error parsing line: {line}, Error: {ve}")
-            return {}
+# Label text per Reading field
+LABEL_FORMATS = {
+    "ph": "pH: {}",
+    "water_temp": "Temperature: {} °C",
+    "water_level": "Water Level: {} m",
+    "tds": "TDS: {} ppm",
+    "ec": "EC: {} mS/cm",
+}
 
-        return data
+last_flash = None
+last_interaction = time.time()
 
-    except Exception as e:
-        print(f"Error reading from Arduino: {e}")
-        arduino_connected = False
-        return {}
+# Attach to the collector if it is running, else own the serial port; either
+# way a background thread does the I/O so the UI never blocks on it
+if CollectorClient.available(config["socket"]["path"]):
+    reader = CollectorClient(config["socket"]["path"], tank=TANK)
+else:
+    reader = SerialReader(ARDUINO_PORT, BAUD_RATE, timeout=TIMEOUT)
+reader.start()
 
 
 # Update Displayed Values
 def update_display():
-    """Fetch new data and update the display."""
-    data = read_arduino_data()
-    if data:
-        # Update labels with Arduino keys
-        if "PH" in data:
-            labels["PH"].config(text=f"pH: {data['PH']}")
-        if "WATER_TEMP" in data:
-            labels["WATER_TEMP"].config(text=f"Temperature: {data['WATER_TEMP']} °C")
-        if "WATER_LEVEL" in data:
-            labels["WATER_LEVEL"].config(text=f"Water Level: {data['WATER_LEVEL']} m")
-        if "TDS" in data:
-            labels["TDS"].config(text=f"TDS: {data['TDS']} ppm")
-        if "EC" in data:
-            labels["EC"].config(text=f"EC: {data['EC']} mS/cm")
+    """Show the newest sample parsed by the reader thread."""
+    samples = reader.drain()
+    if samples:
+        _, data = samples[-1]
+        for name, value in data._asdict().items():
+            if not math.isnan(value):  # Keep the last good value on screen
+                labels[name].config(text=LABEL_FORMATS[name].format(value))
 
     root.after(1000, update_display)  # Refresh every second
 
@@ -78,7 +56,7 @@ def update_arduino_status():
     global last_flash
 
     try:
-        if arduino_connected:
+        if reader.connected:
             current_time = time.time()
             if last_flash is None or current_time - last_flash > 0.5:
                 light_color = "green" if status_light.cget("bg") == "black" else "black"
@@ -96,6 +74,7 @@ def update_arduino_status():
 
 # Close Program
 def close_program():
+    reader.stop()
     root.destroy()
 
 
@@ -119,11 +98,11 @@ data_frame.pack(expand=True, fill=tk.BOTH, pady=20)
 
 # Add labels for each sensor
 labels = {
-    "PH": tk.Label(data_frame, text="pH: --", font=("Arial", 14), fg="white", bg="black"),
-    "WATER_TEMP": tk.Label(data_frame, text="Temperature: -- °C", font=("Arial", 14), fg="white", bg="black"),
-    "WATER_LEVEL": tk.Label(data_frame, text="Water Level: -- m", font=("Arial", 14), fg="white", bg="black"),
-    "TDS": tk.Label(data_frame, text="TDS: -- ppm", font=("Arial", 14), fg="white", bg="black"),
-    "EC": tk.Label(data_frame, text="EC: -- mS/cm", font=("Arial", 14), fg="white", bg="black"),
+    "ph": tk.Label(data_frame, text="pH: --", font=("Arial", 14), fg="white", bg="black"),
+    "water_temp": tk.Label(data_frame, text="Temperature: -- °C", font=("Arial", 14), fg="white", bg="black"),
+    "water_level": tk.Label(data_frame, text="Water Level: -- m", font=("Arial", 14), fg="white", bg="black"),
+    "tds": tk.Label(data_frame, text="TDS: -- ppm", font=("Arial", 14), fg="white", bg="black"),
+    "ec": tk.Label(data_frame, text="EC: -- mS/cm", font=("Arial", 14), fg="white", bg="black"),
 }
 for label in labels.values():
     label.pack(anchor="w", padx=10, pady=5)
@@ -33,8 +33,21 @@ float currentWaterLevel = 0.0; // Measured water level in meters
 
 // Sampling Intervals
 const unsigned long samplingInterval = 1000; // 1 second
+const unsigned long rawSamplingInterval = 250; // Raw mode: no float maths or blocking conversions
 unsigned long lastSampleTime = 0;
 
+// Binary framed mode (see hydro/frames.py): the host sends "MODE BIN" or
+// "MODE ASCII"; frames are sync, sequence, 5 x float32, CRC16 (25 bytes)
+const uint8_t FRAME_SYNC = 0xA5;
+bool binaryMode = false;
+// Raw mode (see hydro/calibration.py): after "MODE RAW" the probe voltages are
+// sent instead of EC/TDS/pH, and the host applies the calibration. "MODE BIN"
+// keeps raw mode (frames carry the voltages); "MODE ASCII" leaves both
+bool rawMode = false;
+uint16_t frameSeq = 0;
+char commandBuffer[16];
+uint8_t commandLength = 0;
+
 void setup() {
   // Ultrasonic Sensor Pins
   pinMode(trigPin, OUTPUT);
@@ -52,10 +65,12 @@ void setup() {
 }
 
 void loop() {
+  checkSerialCommand();
+
   unsigned long currentTime = millis();
 
-  // Sample and stream data every second
-  if (currentTime - lastSampleTime >= samplingInterval) {
+  // Sample and stream data every second (four times a second in raw mode)
+  if (currentTime - lastSampleTime >= (rawMode ? rawSamplingInterval : samplingInterval)) {
     lastSampleTime = currentTime;
     sampleAndStreamData();
   }
@@ -65,6 +80,11 @@ void sampleAndStreamData() {
   // Measure water level using ultrasonic sensor
   currentWaterLevel = measureWaterLevel();
 
+  if (rawMode) {
+    sampleAndStreamRaw();
+    return;
+  }
+
   // Measure temperature using DS18B20
   temperature = measureTemperature();
 
@@ -77,6 +97,11 @@ void sampleAndStreamData() {
   // Measure pH using the calibrated pH sensor
   ph_act = measurePH();
 
+  if (binaryMode) {
+    sendFrame(currentWaterLevel, temperature, ecValue, tdsValue, ph_act);
+    return;
+  }
+
   // Stream the data to the Serial port
   Serial.print("WATER_LEVEL:");
   Serial.print(currentWaterLevel, 2);
@@ -90,6 +115,31 @@ void sampleAndStreamData() {
   Serial.println(ph_act, 2);
 }
 
+void sampleAndStreamRaw() {
+  // Temperature from the last finished conversion; the next one runs in the background
+  if (sensors.isConversionComplete()) {
+    temperature = sensors.getTempCByIndex(0);
+    sensors.requestTemperatures();
+  }
+  float ecVolts = analogRead(EC_PIN) * 5.0 / 1024.0;
+  float phVolts = measurePHVoltage(2);
+
+  if (binaryMode) {
+    // Same frame layout; there is no TDS probe
+    sendFrame(currentWaterLevel, temperature, ecVolts, NAN, phVolts);
+    return;
+  }
+
+  Serial.print("WATER_LEVEL:");
+  Serial.print(currentWaterLevel, 2);
+  Serial.print(",WATER_TEMP:");
+  Serial.print(temperature, 1);
+  Serial.print(",EC_V:");
+  Serial.print(ecVolts, 4);
+  Serial.print(",PH_V:");
+  Serial.println(phVolts, 4);
+}
+
 float measureWaterLevel() {
   // Send a 10-microsecond pulse to trigger pin
   digitalWrite(trigPin, LOW);
@@ -125,10 +175,15 @@ float measureEC() {
 }
 
 float measurePH() {
+  // Calculate the pH value using the calibration equation
+  return 7 + (slope * (measurePHVoltage(30) - calibration_voltage));
+}
+
+float measurePHVoltage(unsigned long sampleDelay) {
   // Collect and sort 10 samples from the pH sensor
   for (int i = 0; i < 10; i++) { 
     buffer_arr[i] = analogRead(PH_PIN);
-    delay(30);
+    delay(sampleDelay);
   }
   for (int i = 0; i < 9; i++) {
     for (int j = i + 1; j < 10; j++) {
@@ -147,13 +202,72 @@ float measurePH() {
   }
 
   // Convert the average to a voltage
-  float volt = (float)avgval * 5 / 1024.0 / 6;
-
-  // Calculate the pH value using the calibration equation
-  return 7 + (slope * (volt - calibration_voltage));
+  return (float)avgval * 5 / 1024.0 / 6;
 }
 
 float measureTemperature() {
   sensors.requestTemperatures(); // Request temperature from DS18B20
   return sensors.getTempCByIndex(0); // Return temperature in Celsius
 }
+
+void checkSerialCommand() {
+  while (Serial.available() > 0) {
+    char c = Serial.read();
+    if (c == '\n' || c == '\r') {
+      commandBuffer[commandLength] = '\0';
+      if (strcmp(commandBuffer, "MODE BIN") == 0) {
+        Serial.println("MODE:BIN");
+        binaryMode = true;
+      } else if (strcmp(commandBuffer, "MODE RAW") == 0) {
+        Serial.println("MODE:RAW");
+        setRawMode(true);
+      } else if (strcmp(commandBuffer, "MODE ASCII") == 0) {
+        binaryMode = false;
+        setRawMode(false);
+        Serial.println("MODE:ASCII");
+      }
+      commandLength = 0;
+    } else if (commandLength < sizeof(commandBuffer) - 1) {
+      commandBuffer[commandLength++] = c;
+    }
+  }
+}
+
+void setRawMode(bool raw) {
+  if (raw == rawMode) {
+    return;
+  }
+  rawMode = raw;
+  // Raw mode reads the finished conversion and starts the next one without
+  // blocking; the calibrated path blocks until its own request completes
+  sensors.setWaitForConversion(!raw);
+  if (raw) {
+    sensors.requestTemperatures();
+  }
+}
+
+uint16_t crc16(const uint8_t *data, size_t length) {
+  // CRC16-CCITT: polynomial 0x1021, initial value 0xFFFF
+  uint16_t crc = 0xFFFF;
+  for (size_t i = 0; i < length; i++) {
+    crc ^= (uint16_t)data[i] << 8;
+    for (uint8_t bit = 0; bit < 8; bit++) {
+      crc = (crc & 0x8000) ? (crc << 1) ^ 0x1021 : crc << 1;
+    }
+  }
+  return crc;
+}
+
+void sendFrame(float waterLevel, float waterTemp, float ecValue, float tds, float ph) {
+  uint8_t frame[25];
+  float values[5] = {waterLevel, waterTemp, ecValue, tds, ph};
+  frame[0] = FRAME_SYNC;
+  frame[1] = frameSeq & 0xFF;
+  frame[2] = frameSeq >> 8;
+  memcpy(frame + 3, values, sizeof(values)); // AVR floats are little-endian IEEE 754
+  uint16_t crc = crc16(frame, 23);
+  frame[23] = crc & 0xFF;
+  frame[24] = crc >> 8;
+  Serial.write(frame, sizeof(frame));
+  frameSeq++;
+}
@@ -33,6 +33,16 @@ const unsigned long samplingInterval = 1000; // 1 second
 unsigned long lastSampleTime = 0;
 unsigned long lastDisplayUpdateTime = 0;
 
+// Binary framed mode (see hydro/frames.py): the host sends "MODE BIN" or
+// "MODE ASCII"; frames are sync, sequence, 5 x float32, CRC16 (25 bytes).
+// Raw mode ("MODE RAW") needs real EC and pH probes, so it is refused with
+// "MODE:NORAW" and the host stops asking
+const uint8_t FRAME_SYNC = 0xA5;
+bool binaryMode = false;
+uint16_t frameSeq = 0;
+char commandBuffer[16];
+uint8_t commandLength = 0;
+
 // Display Variables
 const int displayInterval = 2000; // 2 seconds per measurement
 int currentMeasurement = 0;
@@ -56,6 +66,8 @@ void setup() {
 }
 
 void loop() {
+  checkSerialCommand();
+
   unsigned long currentTime = millis();
 
   // Sample and stream data every second
@@ -83,6 +95,11 @@ void sampleAndStreamData() {
   currentEC += randomFloat(-0.05, 0.05);
   currentPH += randomFloat(-0.1, 0.1);
 
+  if (binaryMode) {
+    sendFrame(currentWaterLevel, currentWaterTemp, currentEC, currentTDS, currentPH);
+    return;
+  }
+
   // Stream the data to the Serial port
   Serial.print("WATER_LEVEL:");
   Serial.print(currentWaterLevel, 2);
@@ -219,3 +236,50 @@ int getMedianNum(int bArray[], int iFilterLen) {
 float randomFloat(float min, float max) {
   return min + ((float)rand() / RAND_MAX) * (max - min);
 }
+
+void checkSerialCommand() {
+  while (Serial.available() > 0) {
+    char c = Serial.read();
+    if (c == '\n' || c == '\r') {
+      commandBuffer[commandLength] = '\0';
+      if (strcmp(commandBuffer, "MODE BIN") == 0) {
+        Serial.println("MODE:BIN");
+        binaryMode = true;
+      } else if (strcmp(commandBuffer, "MODE ASCII") == 0) {
+        binaryMode = false;
+        Serial.println("MODE:ASCII");
+      } else if (strcmp(commandBuffer, "MODE RAW") == 0 && !binaryMode) {
+        Serial.println("MODE:NORAW"); // Not inside the frame stream
+      }
+      commandLength = 0;
+    } else if (commandLength < sizeof(commandBuffer) - 1) {
+      commandBuffer[commandLength++] = c;
+    }
+  }
+}
+
+uint16_t crc16(const uint8_t *data, size_t length) {
+  // CRC16-CCITT: polynomial 0x1021, initial value 0xFFFF
+  uint16_t crc = 0xFFFF;
+  for (size_t i = 0; i < length; i++) {
+    crc ^= (uint16_t)data[i] << 8;
+    for (uint8_t bit = 0; bit < 8; bit++) {
+      crc = (crc & 0x8000) ? (crc << 1) ^ 0x1021 : crc << 1;
+    }
+  }
+  return crc;
+}
+
+void sendFrame(float waterLevel, float waterTemp, float ecValue, float tds, float ph) {
+  uint8_t frame[25];
+  float values[5] = {waterLevel, waterTemp, ecValue, tds, ph};
+  frame[0] = FRAME_SYNC;
+  frame[1] = frameSeq & 0xFF;
+  frame[2] = frameSeq >> 8;
+  memcpy(frame + 3, values, sizeof(values)); // AVR floats are little-endian IEEE 754
+  uint16_t crc = crc16(frame, 23);
+  frame[23] = crc & 0xFF;
+  frame[24] = crc >> 8;
+  Serial.write(frame, sizeof(frame));
+  frameSeq++;
+}
@@ -0,0 +1,64 @@
+"""
+Measure hydro.alerts.AlertEngine evaluation cost per sample with many rules.
+
+Usage: python benchmarks/bench_alerts.py [--rules 500] [--samples 100000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hydro.alerts import AlertEngine, RateOfChange, Stale, Threshold
+from hydro.protocol import Reading
+
+
+def make_rules(count, seed=0):
+    """A mix of thresholds (with hysteresis and min-duration), slopes and stale checks."""
+    rng = random.Random(seed)
+    rules = []
+    for i in range(count):
+        field = Reading._fields[i % len(Reading._fields)]
+        kind = i % 10
+        if kind < 6:
+            rules.append(Threshold(field, low=rng.uniform(-1, 0.5), high=rng.uniform(1, 1000),
+                                   hysteresis=0.05, min_duration=rng.choice([0, 30, 120]), name=f"t{i}"))
+        elif kind < 9:
+            rules.append(RateOfChange(field, max_rate=rng.uniform(0.5, 50), window=rng.choice([300, 600, 1800]),
+                                      name=f"r{i}"))
+        else:
+            rules.append(Stale(field, timeout=60, name=f"s{i}"))
+    return rules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rules", type=int, default=500, help="Rules loaded")
+    parser.add_argument("--samples", type=int, default=100000, help="Samples evaluated (1 Hz)")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    walk = np.cumsum(rng.standard_normal((args.samples, len(Reading._fields))) * 0.01, axis=0)
+    values = np.array([0.5, 25.0, 1.5, 750.0, 6.5]) + walk
+    readings = [Reading._make(row) for row in values.tolist()]
+    times = (time.time() + np.arange(args.samples)).tolist()
+
+    engine = AlertEngine(make_rules(args.rules))
+    alerts = 0
+    start = time.perf_counter()
+    for timestamp, reading in zip(times, readings):
+        alerts += len(engine.process(timestamp, reading))
+    elapsed = time.perf_counter() - start
+
+    per_sample = elapsed / args.samples
+    print(f"{args.rules} rules, {args.samples:,} samples, {alerts:,} alert transitions")
+    print(f"per sample:          {per_sample * 1e6:8.1f} us ({1 / per_sample:,.0f} samples/s)")
+    print(f"per rule evaluation: {elapsed / engine.evaluations * 1e9:8.0f} ns")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Benchmark hydro.archive against the SQLite store on month-scale history.
+
+Synthetic samples for one tank (slow pH drift with noise, realistic
+rounding) go into a SensorStore and are exported to an archive in each
+available format. Then the same month, one day, one column and a value
+filter that prunes most row groups are loaded from each source.
+
+Usage: python benchmarks/bench_archive.py [--days 30] [--rate 1] [--formats npz parquet]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hydro import archive as archive_module
+from hydro.archive import DAY, SensorArchive
+from hydro.storage import SensorStore
+
+
+def synthetic(days, rate, seed=0):
+    rng = np.random.default_rng(seed)
+    start = 1.7e9 - 1.7e9 % DAY
+    count = int(days * DAY * rate)
+    times = start + np.arange(count) / rate + rng.uniform(0, 0.01, count)
+    phase = np.arange(count) / (DAY * rate)
+    values = np.column_stack([
+        np.round(0.52 - 0.01 * phase + rng.normal(0, 0.002, count), 3),
+        np.round(25 + 2 * np.sin(2 * np.pi * phase) + rng.normal(0, 0.05, count), 2),
+        np.round(1.5 + rng.normal(0, 0.01, count), 2),
+        np.round(750 + rng.normal(0, 3, count), 1),
+        np.round(6.5 + 0.4 * np.sin(phase / 3) + rng.normal(0, 0.01, count), 2),
+    ])
+    return times, values
+
+
+def timed(fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--days", type=float, default=30)
+    parser.add_argument("--rate", type=float, default=1, help="Samples per second")
+    parser.add_argument("--formats", nargs="+", default=["npz", "parquet"])
+    args = parser.parse_args()
+
+    times, values = synthetic(args.days, args.rate)
+    start, end = times[0], times[-1]
+    middle = start + (args.days // 2) * DAY
+    print(f"{len(times)} samples over {args.days:g} days")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SensorStore(os.path.join(tmp, "sensor.db"))
+        t0 = time.perf_counter()
+        store.insert_many(times, values, "tank1")
+        print(f"sqlite: insert {time.perf_counter() - t0:.1f} s, {directory_size(tmp) / 1e6:.1f} MB")
+        month, _ = timed(lambda: store.query(start, end, tank="tank1"), repeat=1)
+        day, _ = timed(lambda: store.query(middle, middle + DAY, tank="tank1"))
+        print(f"sqlite: month {month * 1000:7.0f} ms, one day {day * 1000:6.1f} ms (all columns)")
+
+        for format in args.formats:
+            if format == "parquet" and archive_module.pq is None:
+                print("parquet: skipped, pyarrow is not installed")
+                continue
+            path = os.path.join(tmp, format)
+            archive = SensorArchive(path, format)
+            t0 = time.perf_counter()
+            rows = archive.export(store)
+            export = time.perf_counter() - t0
+            print(f"{format}: export {rows} rows in {export:.1f} s, {directory_size(path) / 1e6:.1f} MB")
+            month, _ = timed(lambda: archive.load(start, end))
+            column, _ = timed(lambda: archive.load(start, end, columns=["ph"]))
+            one_day, _ = timed(lambda: archive.load(middle, middle + DAY))
+            filtered, result = timed(lambda: archive.load(start, end, columns=["ph"], where={"ph": (6.85, None)}))
+            groups = sum(len(entry["groups"]) for entry in archive.manifest["files"].values())
+            read = sum(
+                archive_module._group_matches(group, start, end, {"ph": (6.85, None)})
+                for entry in archive.manifest["files"].values() for group in entry["groups"]
+            )
+            print(
+                f"{format}: month {month * 1000:7.0f} ms, pH only {column * 1000:6.0f} ms, one day {one_day * 1000:6.1f} ms, "
+                f"pH >= 6.85 {filtered * 1000:6.0f} ms ({read}/{groups} row groups, {len(result['ph'])} rows)"
+            )
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
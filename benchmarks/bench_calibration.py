@@ -0,0 +1,129 @@
+"""
+Throughput of host-side calibration (hydro.calibration) and of reprocessing history.
+
+Raw samples are made by running a synthetic tank's pH/EC/temperature back
+through the sketch's calibration, so converting them must give the values
+back. Three ways of converting them are timed per sample:
+
+    scalar       the sketch's float maths ported line by line, once per sample
+    calibrate    Calibrator.calibrate on drained batches of --batch samples,
+                 as the collector does
+    apply        CalibrationBook.apply on one array, as reprocessing does
+
+Then --rows raw samples are stored in a temporary SensorStore, the pH
+probe is recalibrated from a given time and ``reprocess`` rewrites the
+affected history; the time per row is reported.
+
+Usage: python benchmarks/bench_calibration.py [--rows 1000000] [--batch 1 10 100 4096]
+"""
+import argparse
+import math
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hydro.calibration import DEFAULT_PROBES, CalibrationBook, Calibrator, PHProbe
+from hydro.protocol import RawReading, Reading
+from hydro.storage import SensorStore
+
+
+def synthetic(count, seed=0):
+    """(times, raw, truth): raw (n, 5) in RawReading order and the (n, 5) Readings they calibrate to."""
+    rng = np.random.default_rng(seed)
+    times = 1.7e9 + np.arange(count, dtype=float)
+    hours = (times - times[0]) / 3600
+    truth = np.column_stack([
+        0.55 + rng.normal(0, 0.002, count),
+        24 + 1.5 * np.sin(2 * np.pi * hours / 24) + rng.normal(0, 0.03, count),
+        1.5 + 1.5 * (hours % 8) / 8 + rng.normal(0, 0.005, count),  # Crosses the EC range switch
+        np.zeros(count),
+        6.2 + 0.4 * (hours % 8) / 8 + rng.normal(0, 0.02, count),
+    ])
+    truth[:, 3] = 500 * truth[:, 2]
+    raw = truth.copy()
+    raw[:, 2] = DEFAULT_PROBES["ec"].voltage(truth[:, 2], truth[:, 1])
+    raw[:, 3] = np.nan
+    raw[:, 4] = DEFAULT_PROBES["ph"].voltage(truth[:, 4], truth[:, 1])
+    raw[rng.random((count, 5)) < 0.001] = np.nan
+    truth[np.isnan(raw[:, 2]), 2:4] = np.nan
+    truth[np.isnan(raw[:, 4]), 4] = np.nan
+    truth[np.isnan(raw[:, 1]), 2:4] = np.nan  # Compensated at 25 °C instead; not comparable
+    return times, raw, truth
+
+
+def scalar(raw, v7=1.916, slope=12.2, k_low=1.0, k_high=1.0):
+    """One sample at a time, as stream2pi.ino computes it."""
+    water_level, water_temp, ec_voltage, _, ph_voltage = raw
+    temperature = 25.0 if math.isnan(water_temp) else water_temp
+    ec_raw = 1000.0 * ec_voltage * 1000.0 / 820.0 / 200.0
+    k = k_high if ec_raw * k_low > 2.25 else k_low
+    ec = ec_raw * k / (1.0 + 0.0185 * (temperature - 25.0))
+    return Reading(water_level, water_temp, ec, ec * 500.0, 7.0 + slope * (ph_voltage - v7))
+
+
+def per_sample(seconds, count):
+    return f"{seconds / count * 1e6:7.2f} us/sample"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Stored raw samples to reprocess")
+    parser.add_argument("--samples", type=int, default=100_000, help="Samples for the conversion timings")
+    parser.add_argument("--batch", type=int, nargs="+", default=[1, 10, 100, 4096], help="Drained batch sizes")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        book = CalibrationBook(os.path.join(tmp, "calibration.json"))
+        times, raw, truth = synthetic(args.samples)
+        readings = [RawReading._make(row) for row in raw.tolist()]
+
+        t0 = time.perf_counter()
+        converted = [scalar(reading) for reading in readings]
+        print(f"scalar               {per_sample(time.perf_counter() - t0, len(readings))}")
+        reference = np.array(converted)
+
+        for size in args.batch:
+            calibrator = Calibrator(book)
+            batches = [
+                [(t, "tank1", reading) for t, reading in zip(times[i:i + size].tolist(), readings[i:i + size])]
+                for i in range(0, len(readings), size)
+            ]
+            t0 = time.perf_counter()
+            for batch in batches:
+                calibrator.calibrate(batch)
+            print(f"calibrate batch {size:<5}{per_sample(time.perf_counter() - t0, len(readings))}")
+
+        t0 = time.perf_counter()
+        values = book.apply("tank1", times, raw)
+        print(f"apply                {per_sample(time.perf_counter() - t0, len(readings))}")
+        error = np.nanmax(np.abs(values - truth), axis=0)
+        print("max error vs truth:  " + ", ".join(f"{name} {e:.2g}" for name, e in zip(Reading._fields, error)))
+        print(f"max diff vs scalar:  {np.nanmax(np.abs(values - reference)):.2g}")
+
+        times, raw, truth = synthetic(args.rows, seed=1)
+        store = SensorStore(os.path.join(tmp, "sensor.db"))
+        t0 = time.perf_counter()
+        store.insert_many(times, truth, "tank1", raw)
+        print(f"stored {args.rows:,} raw samples in {time.perf_counter() - t0:.1f} s")
+
+        # The pH probe drifted: recalibrate the second half of the history
+        since = times[len(times) // 2]
+        book.add("tank1", {"ph": PHProbe(v7=1.90, slope=12.5)}, valid_from=since, note="bench")
+        t0 = time.perf_counter()
+        rows = book.reprocess(store, "tank1", start=since)
+        elapsed = time.perf_counter() - t0
+        print(f"reprocess {rows:,} rows in {elapsed:.2f} s ({per_sample(elapsed, rows).strip()})")
+
+        _, stored = store.query(start=since, tank="tank1")
+        expected = PHProbe(v7=1.90, slope=12.5)(raw[len(times) // 2:, 4], raw[len(times) // 2:, 1])
+        print(f"max pH diff after reprocess: {np.nanmax(np.abs(stored['ph'] - expected)):.2g}")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Time the hydro.filters streams per sample against their batch NumPy
+equivalents over noisy traces (tests/test_filters.py checks they agree).
+
+Traces: a copy of the recorded hydroponics_data.db, a synthetic 10 Hz hour
+with spikes and dropouts, and optionally a raw serial capture (--lines).
+
+Usage: python benchmarks/bench_filters.py [--lines capture.txt]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hydro.filters import EMA, FilterPipeline, Hampel, RunningMedian, default_pipeline
+from hydro.protocol import LineParser, Reading
+from hydro.storage import DEFAULT_DB_PATH, SensorStore
+
+
+def recorded_trace():
+    """The repo's sample database, opened on a copy so it is left untouched."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "trace.db")
+        shutil.copy(DEFAULT_DB_PATH, path)
+        store = SensorStore(path)
+        _, values = store.query()
+        store.close()
+    return values.view(np.float64).reshape(len(values), -1)
+
+
+def synthetic_trace(seconds=3600, rate=10, seed=0):
+    rng = np.random.default_rng(seed)
+    count = seconds * rate
+    base = np.array([0.52, 25.0, 1.5, 750.0, 6.5])
+    noise = np.array([0.01, 0.05, 0.01, 5.0, 0.02])
+    values = base + np.cumsum(rng.standard_normal((count, 5)), axis=0) * noise * 0.1
+    values += rng.standard_normal((count, 5)) * noise
+    spikes = rng.random((count, 5)) < 0.005  # Ultrasonic echoes, EMI on the probes
+    values[spikes] += rng.choice([-1, 1], spikes.sum()) * noise[np.nonzero(spikes)[1]] * 50
+    values[rng.random((count, 5)) < 0.01] = np.nan  # Dropped or rejected values
+    return values
+
+
+def capture_trace(path):
+    with open(path, "rb") as f:
+        values = LineParser().parse_buffer(f.read())
+    return values.view(np.float64).reshape(len(values), -1)
+
+
+def pipelines():
+    yield "default (Hampel 9 + EMA span 4)", default_pipeline
+    yield "median 30 (firmware TDS filter)", lambda: FilterPipeline({f: [RunningMedian(30)] for f in Reading._fields})
+    yield "median 4 + EMA 0.1 + 25C compensation", lambda: FilterPipeline(
+        {f: [RunningMedian(4), EMA(alpha=0.1)] for f in Reading._fields}, compensate=True)
+    yield "Hampel 31, 2 sigma", lambda: FilterPipeline({f: [Hampel(31, n_sigmas=2.0)] for f in Reading._fields})
+
+
+def bench(name, trace):
+    print(f"{name}: {len(trace):,} samples")
+    for label, make in pipelines():
+        pipeline = make()
+        rows = trace.tolist()
+        start = time.perf_counter()
+        for row in rows:
+            pipeline(row)
+        stream_time = time.perf_counter() - start
+        start = time.perf_counter()
+        make().apply_batch(trace)
+        batch_time = time.perf_counter() - start
+        per_sample = stream_time / max(len(trace), 1) * 1e6
+        print(f"  {label:40s} stream {per_sample:5.1f} us/sample, batch {batch_time * 1000:7.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--lines", help="Raw serial capture (one stream2pi line per row)")
+    args = parser.parse_args()
+
+    traces = [("recorded hydroponics_data.db", recorded_trace()), ("synthetic 10 Hz hour", synthetic_trace())]
+    if args.lines:
+        traces.append((args.lines, capture_trace(args.lines)))
+    for name, trace in traces:
+        bench(name, trace)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Load-test hydro.hub.IngestHub with simulated boards on pseudo-terminals.
+
+Usage: python benchmarks/bench_hub.py [--devices 12] [--rate 10] [--seconds 10]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hydro.fake_arduino import FakeArduino
+from hydro.hub import IngestHub
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--devices", type=int, default=12, help="Number of simulated boards")
+    parser.add_argument("--rate", type=float, default=10, help="Lines per second per board")
+    parser.add_argument("--seconds", type=float, default=10, help="Measurement length")
+    args = parser.parse_args()
+
+    fakes = [FakeArduino(args.rate, seed=i) for i in range(args.devices)]
+    hub = IngestHub({f"tank{i + 1}": fake.port for i, fake in enumerate(fakes)})
+    feed = hub.subscribe()
+    hub.start()
+    for fake in fakes:
+        fake.start()
+    time.sleep(1)  # Let every port connect
+    feed.drain()
+
+    # The simulators run in this process too; measure only the hub thread's share
+    received = {}
+    cpu_start, wall_start = time.thread_time(), time.monotonic()
+    hub_cpu_start = _thread_cpu(hub._thread)
+    while time.monotonic() - wall_start < args.seconds:
+        time.sleep(0.1)
+        for sample in feed.drain():
+            received[sample.tank] = received.get(sample.tank, 0) + 1
+    wall = time.monotonic() - wall_start
+    hub_cpu = _thread_cpu(hub._thread) - hub_cpu_start
+    consumer_cpu = time.thread_time() - cpu_start
+
+    stats = hub.stats()
+    hub.stop()
+    for fake in fakes:
+        fake.stop()
+
+    total = sum(received.values())
+    expected = args.devices * args.rate * wall
+    print(f"{args.devices} devices at {args.rate} Hz for {wall:.1f} s")
+    print(f"samples received: {total:,} of ~{expected:,.0f} ({total / wall:,.0f}/s)")
+    print(f"per tank: min {min(received.values(), default=0)}, max {max(received.values(), default=0)}")
+    print(f"hub thread CPU:   {hub_cpu / wall * 100:5.1f}% of one core")
+    print(f"consumer CPU:     {consumer_cpu / wall * 100:5.1f}% of one core")
+    print(f"parse errors: {sum(d['parse_errors'] for d in stats['devices'].values())}, "
+          f"dropped: {sum(stats['subscriptions'][0]['dropped'].values())}")
+
+
+def _thread_cpu(thread):
+    """CPU seconds used by another thread (Linux)."""
+    with open(f"/proc/self/task/{thread.native_id}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Load-test hydro.live_server: N concurrent SSE clients on one publisher.
+
+Clients run in a separate process (asyncio, raw sockets) and report events
+received and publish-to-receive latency; the server thread's CPU is read
+from /proc. On a one-core box clients and server share the CPU, so the
+numbers are a lower bound for a Pi serving remote browsers.
+
+Usage: python benchmarks/bench_live_server.py [--clients 10 100 500] [--rate 10] [--seconds 10]
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hydro.live_server import LiveServer
+from hydro.protocol import Reading
+
+
+async def _client(port, stop_at, latencies, counts):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(b"GET /api/stream HTTP/1.1\r\nHost: bench\r\n\r\n")
+    await writer.drain()
+    await reader.readuntil(b"\r\n\r\n")
+    received = 0
+    try:
+        while time.time() < stop_at:
+            try:
+                event = await asyncio.wait_for(reader.readuntil(b"\n\n"), stop_at - time.time())
+            except (asyncio.TimeoutError, asyncio.IncompleteReadError):
+                break
+            if event.startswith(b"event: sample"):
+                payload = json.loads(event.split(b"data: ", 1)[1])
+                latencies.append(time.time() - payload["t"])
+                received += 1
+    finally:
+        counts.append(received)
+        writer.close()
+
+
+def _run_clients(port, clients, seconds, queue):
+    async def main():
+        latencies, counts = [], []
+        stop_at = time.time() + seconds
+        await asyncio.gather(*(_client(port, stop_at, latencies, counts) for _ in range(clients)),
+                             return_exceptions=True)
+        return latencies, counts
+
+    queue.put(asyncio.run(main()))
+
+
+def _thread_cpu(thread):
+    """CPU seconds used by another thread (Linux)."""
+    with open(f"/proc/self/task/{thread.native_id}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def run(clients, rate, seconds):
+    server = LiveServer(port=0, host="127.0.0.1").start()
+    queue = multiprocessing.Queue()
+    worker = multiprocessing.Process(target=_run_clients, args=(server.port, clients, seconds + 1, queue))
+    worker.start()
+    deadline = time.monotonic() + 10
+    while len(server.clients) < clients and time.monotonic() < deadline:
+        time.sleep(0.05)
+    connected = len(server.clients)
+
+    rng = np.random.default_rng(0)
+    cpu_start, wall_start = _thread_cpu(server._thread), time.monotonic()
+    published = 0
+    next_time = wall_start
+    while time.monotonic() - wall_start < seconds:
+        values = np.array([0.52, 25.0, 1.5, 750.0, 6.5]) + rng.standard_normal(5) * 0.01
+        server.publish(time.time(), Reading._make(values.round(2)), "tank1")
+        published += 1
+        next_time += 1.0 / rate
+        time.sleep(max(0.0, next_time - time.monotonic()))
+    cpu = _thread_cpu(server._thread) - cpu_start
+    wall = time.monotonic() - wall_start
+
+    latencies, counts = queue.get()
+    worker.join()
+    stats = server.stats()
+    server.stop()
+    latencies = np.array(latencies) * 1000
+    delivered = sum(counts) / max(published * clients, 1)
+    print(f"{clients:5d} clients ({connected} connected): delivered {delivered * 100:5.1f}%, "
+          f"latency p50 {np.percentile(latencies, 50) if len(latencies) else float('nan'):6.1f} ms "
+          f"p99 {np.percentile(latencies, 99) if len(latencies) else float('nan'):6.1f} ms, "
+          f"server CPU {cpu / wall * 100:5.1f}%, slow disconnects {stats['disconnected_slow']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clients", type=int, nargs="+", default=[10, 100, 500], help="Concurrent clients per run")
+    parser.add_argument("--rate", type=float, default=10, help="Samples published per second")
+    parser.add_argument("--seconds", type=float, default=10, help="Length of each run")
+    args = parser.parse_args()
+
+    print(f"publishing {args.rate} samples/s for {args.seconds} s per run")
+    for clients in args.clients:
+        run(clients, args.rate, args.seconds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Cost of hydro.metrics updates and hydro.log calls on the hot path, and of
+rendering a /metrics scrape, against the print() calls they replace.
+
+Usage: python benchmarks/bench_metrics.py [--calls 200000]
+"""
+import argparse
+import io
+import os
+import sys
+import time
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hydro.fake_arduino import FakeArduino
+from hydro.log import configure, get_logger
+from hydro.metrics import MetricsServer, Registry
+from hydro.serial_reader import SerialReader
+
+
+def per_call(fn, calls):
+    start = time.perf_counter()
+    fn(calls)
+    return (time.perf_counter() - start) / calls * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--calls", type=int, default=200000)
+    args = parser.parse_args()
+    calls = args.calls
+
+    registry = Registry()
+    counter = registry.counter("bench_total")
+    histogram = registry.histogram("bench_seconds")
+
+    def empty(n):
+        for _ in range(n):
+            pass
+
+    def inc(n):
+        for _ in range(n):
+            counter.inc()
+
+    def observe(n):
+        for i in range(n):
+            histogram.observe(i * 1e-7)
+
+    def timed(n):
+        for _ in range(n):
+            with histogram.time():
+                pass
+
+    baseline = per_call(empty, calls)
+    print("Metric updates (ns per call, loop overhead subtracted):")
+    for label, fn in (("Counter.inc", inc), ("Histogram.observe", observe), ("Histogram.time()", timed)):
+        print(f"  {label:<28}{per_call(fn, calls) - baseline:>8.0f}")
+
+    sink = io.StringIO()
+    log = get_logger("bench")
+
+    def printed(n):
+        for i in range(n):
+            print(f"Error reading tank {i}: timeout", file=sink)
+
+    def debug_disabled(n):
+        for i in range(n):
+            log.debug("Error reading tank %s: %s", i, "timeout")
+
+    def warning_limited(n):
+        for i in range(n):
+            log.warning("Error reading tank %s: %s", i, "timeout")
+
+    configure("INFO", rate=5, per=60, stream=sink)
+    print("Logging one message per call (ns per call):")
+    print(f"  {'print()':<28}{per_call(printed, calls // 10):>8.0f}")
+    print(f"  {'log.debug, level INFO':<28}{per_call(debug_disabled, calls):>8.0f}")
+    print(f"  {'log.warning, rate-limited':<28}{per_call(warning_limited, calls // 10):>8.0f}")
+    configure("INFO", rate=None, levelled=False, stream=sys.stdout)
+
+    # A scrape with a real reader attached, as gui_display registers it
+    with FakeArduino(rate=10) as fake:
+        reader = SerialReader(fake.port)
+        reader.start()
+        registry.register_stats("hydro_serial", reader.stats, counters=("lines_read", "parse_errors", "reconnects"))
+        for redraw in ("blit", "full"):
+            registry.histogram("hydro_render_seconds", redraw=redraw).observe(0.01)
+        server = MetricsServer(registry, port=0).start()
+        time.sleep(1.0)
+        start = time.perf_counter()
+        body = urllib.request.urlopen(f"http://127.0.0.1:{server.port}/metrics").read()
+        scrape = time.perf_counter() - start
+        renders = 200
+        start = time.perf_counter()
+        for _ in range(renders):
+            registry.render()
+        render = (time.perf_counter() - start) / renders
+        overlay = registry.overlay([
+            ("lines", "hydro_serial_lines_read_total"),
+            ("queue", "hydro_serial_queue_depth"),
+            ("frame", "hydro_render_seconds", {"redraw": "blit"}),
+        ])
+        server.stop()
+        reader.stop()
+    print(f"Scrape: {len(body)} bytes, render {render * 1e3:.2f} ms, HTTP round trip {scrape * 1e3:.1f} ms")
+    print(f"Overlay: {overlay}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Compare hydro.protocol against the split-based parsing the scripts used to do
+inline (``dict(item.split(":") for item in line.split(","))`` plus ``float``),
+and against the binary frames of hydro.frames.
+
+Usage: python benchmarks/bench_parser.py [--lines 100000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hydro.fake_arduino import stream2pi_line
+from hydro.frames import FrameDecoder, encode_frame
+from hydro.protocol import LineParser, parse_line
+
+
+def make_lines(count, seed=0):
+    rng = random.Random(seed)
+    return [
+        stream2pi_line(
+            water_level=rng.uniform(0.3, 0.7),
+            water_temp=rng.uniform(20, 28),
+            ec=rng.uniform(1.0, 2.0),
+            tds=rng.uniform(500, 1000),
+            ph=rng.uniform(5.5, 7.5),
+        ).encode() + b"\r\n"
+        for _ in range(count)
+    ]
+
+
+def split_parse(raw):
+    """The original read_from_arduino parsing."""
+    line = raw.decode("utf-8").strip()
+    data = dict(item.split(":") for item in line.split(","))
+    return {
+        "water_level": float(data.get("WATER_LEVEL", 0)),
+        "water_temp": float(data.get("WATER_TEMP", 0)),
+        "ec": float(data.get("EC", 0)),
+        "tds": float(data.get("TDS", 0)),
+        "ph": float(data.get("PH", 0)),
+    }
+
+
+def rate(func, items):
+    start = time.perf_counter()
+    func(items)
+    return len(items) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--lines", type=int, default=100000, help="Lines to parse")
+    args = parser.parse_args()
+
+    lines = make_lines(args.lines)
+    buf = b"".join(lines)
+
+    split_rate = rate(lambda items: [split_parse(line) for line in items], lines)
+    line_parser = LineParser()
+    line_rate = rate(lambda items: [line_parser.parse(line) for line in items], lines)
+    batch_rate = rate(lambda items: LineParser().parse_buffer(buf), lines)
+    frames = b"".join(encode_frame(seq, parse_line(line)) for seq, line in enumerate(lines))
+    # Serial reads hand over a few hundred bytes at a time
+    chunks = [frames[i:i + 256] for i in range(0, len(frames), 256)]
+    decoder = FrameDecoder()
+    frame_rate = rate(lambda items: [decoder.feed(chunk) for chunk in chunks], lines)
+
+    print(f"split + float (original): {split_rate:12,.0f} lines/s")
+    print(f"LineParser.parse:         {line_rate:12,.0f} lines/s ({line_rate / split_rate:.1f}x)")
+    print(f"LineParser.parse_buffer:  {batch_rate:12,.0f} lines/s ({batch_rate / split_rate:.1f}x)")
+    print(f"FrameDecoder.feed:        {frame_rate:12,.0f} frames/s ({frame_rate / split_rate:.1f}x)")
+    print(f"bytes per sample: {len(buf) / len(lines):.0f} ASCII, {len(frames) / len(lines):.0f} binary")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Replay a synthetic capture (10 Hz ASCII lines, then the same as binary frames)
+straight into the decoder and through a pseudo-terminal into SerialReader, at
+full speed and at fixed speed-ups, and check nothing is lost on the way.
+
+Usage: python benchmarks/bench_replay.py [--seconds 3600] [--capture tank1.hcap]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hydro.capture import CaptureReader, CaptureWriter, ReplayArduino, replay_samples
+from hydro.fake_arduino import stream2pi_line
+from hydro.frames import MODE_BINARY_ACK, encode_frame
+from hydro.protocol import parse_line
+from hydro.serial_reader import SerialReader
+
+
+def make_capture(path, seconds, rate=10, binary=False, seed=0):
+    """Lines as a 9600 baud port delivers them: sometimes split across reads."""
+    rng = random.Random(seed)
+    start = time.time() - seconds
+    with CaptureWriter(path, start=start, port="synthetic", baud_rate=9600) as capture:
+        if binary:
+            capture.write(start, MODE_BINARY_ACK + b"\r\n")  # As recorded after negotiation
+        for i in range(int(seconds * rate)):
+            line = stream2pi_line(
+                water_level=rng.uniform(0.3, 0.7),
+                water_temp=rng.uniform(20, 28),
+                ec=rng.uniform(1.0, 2.0),
+                tds=rng.uniform(500, 1000),
+                ph=rng.uniform(5.5, 7.5),
+            )
+            data = encode_frame(i, parse_line(line)) if binary else line.encode() + b"\r\n"
+            timestamp = start + i / rate
+            if rng.random() < 0.1:
+                split = rng.randrange(1, len(data))
+                capture.write(timestamp, data[:split])
+                capture.write(timestamp + 0.002, data[split:])
+            else:
+                capture.write(timestamp, data)
+    return int(seconds * rate)
+
+
+def bench_decoder(path, speed=None):
+    start = time.perf_counter()
+    count = sum(1 for _ in replay_samples(path, speed))
+    elapsed = time.perf_counter() - start
+    return count, elapsed
+
+
+def bench_pty(path, expected, speed=None, binary=False):
+    replay = ReplayArduino(path, speed)
+    # Queue sized for the whole capture: this measures the port path, not a slow consumer
+    reader = SerialReader(replay.port, timeout=0.05, maxlen=expected, binary=binary, negotiate_timeout=0.0)
+    reader.start()
+    while not reader.connected:
+        time.sleep(0.01)
+    start = time.perf_counter()
+    with replay:
+        count = 0
+        deadline = time.monotonic() + 600
+        while count < expected and time.monotonic() < deadline:
+            count += len(reader.drain())
+            if replay.done.is_set() and reader.sample_age() > 1.0:
+                break
+            time.sleep(0.01)
+        reader.stop()
+    return count, time.perf_counter() - start
+
+
+def report(label, count, expected, elapsed, target=None):
+    timing = f"{elapsed:.2f} s for {target:.2f} s target" if target else f"{count / elapsed:>9.0f} samples/s"
+    lost = "" if count == expected else f"  LOST {expected - count}"
+    print(f"  {label:<22}{count:>8} samples  {timing}{lost}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=3600, help="Length of the synthetic capture")
+    parser.add_argument("--capture", default=None, help="Also replay this recorded capture")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for binary in (False, True):
+            path = os.path.join(tmp, "binary.hcap" if binary else "ascii.hcap")
+            expected = make_capture(path, args.seconds, binary=binary)
+            kind = "binary frames" if binary else "ASCII lines"
+            print(f"{kind}: {expected} samples over {args.seconds:.0f} s, {os.path.getsize(path) / 1e3:.0f} kB")
+
+            count, elapsed = bench_decoder(path)
+            report("decoder, full speed", count, expected, elapsed)
+            count, elapsed = bench_pty(path, expected, binary=binary)
+            report("pty + SerialReader", count, expected, elapsed)
+            short = os.path.join(tmp, "short.hcap")
+            for speed in (100, 1000):
+                seconds = min(args.seconds, 3.0 * speed / 10)  # About 3 s of wall time
+                short_expected = make_capture(short, seconds, binary=binary)
+                count, elapsed = bench_decoder(short, speed)
+                report(f"decoder at {speed}x", count, short_expected, elapsed, seconds / speed)
+
+        if args.capture:
+            print(f"{args.capture}: {CaptureReader(args.capture).info()}")
+            count, elapsed = bench_decoder(args.capture)
+            report("decoder, full speed", count, count, elapsed)
+
+
+if __name__ == "__main__":
+    main()
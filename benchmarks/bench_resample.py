@@ -0,0 +1,72 @@
+"""
+Time hydro.resample against the datetime-based resample_data that
+gui_display.py used to run on every redraw.
+
+Usage: python benchmarks/bench_resample.py [--hours 24] [--rate 1] [--interval 300]
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hydro.resample import lttb, resample
+
+
+def legacy_resample_data(times, data, interval_seconds):
+    """The original gui_display.resample_data (datetime lists, valid-mode convolution)."""
+    start_time, end_time = times[0], times[-1]
+    resampled_times = [
+        start_time + timedelta(seconds=i)
+        for i in range(0, int((end_time - start_time).total_seconds()), interval_seconds)
+    ]
+    smoothed_data = np.convolve(data, np.ones(4) / 4, mode="valid")
+    resampled_data = np.interp(
+        [t.timestamp() for t in resampled_times],
+        [t.timestamp() for t in times[:len(smoothed_data)]],
+        smoothed_data,
+    )
+    return resampled_times, resampled_data
+
+
+def best_of(func, repeat=20):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--hours", type=float, default=24, help="Window length in hours")
+    parser.add_argument("--rate", type=float, default=1, help="Sample rate in Hz")
+    parser.add_argument("--interval", type=int, default=300, help="Resample interval in seconds")
+    parser.add_argument("--points", type=int, default=700, help="LTTB output points (~plot width)")
+    args = parser.parse_args()
+
+    count = int(args.hours * 3600 * args.rate)
+    rng = np.random.default_rng(0)
+    epochs = time.time() - args.hours * 3600 + np.arange(count) / args.rate
+    values = 6.5 + np.cumsum(rng.standard_normal(count)) * 0.001
+    datetimes = [datetime.fromtimestamp(t) for t in epochs]
+    print(f"{count:,} samples ({args.hours} h at {args.rate} Hz)")
+
+    legacy = best_of(lambda: legacy_resample_data(datetimes, values, args.interval), repeat=3)
+    binned = best_of(lambda: resample(epochs, values, args.interval, mode="bin", smooth=4))
+    interp = best_of(lambda: resample(epochs, values, args.interval, mode="interp", smooth=4))
+    lttb_time = best_of(lambda: lttb(epochs, values, args.points))
+
+    print(f"legacy resample_data: {legacy * 1000:8.2f} ms")
+    print(f"resample mode=bin:    {binned * 1000:8.2f} ms")
+    print(f"resample mode=interp: {interp * 1000:8.2f} ms")
+    print(f"lttb to {args.points} points: {lttb_time * 1000:6.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
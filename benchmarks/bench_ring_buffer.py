@@ -0,0 +1,84 @@
+"""
+Compare the list-backed rolling buffer formerly used in gui_display.py with
+hydro.ring_buffer.TimeSeriesRing.
+
+Both buffers are filled to a full window first, then timed on steady-state
+appends where every new sample evicts the oldest one.
+
+Usage: python benchmarks/bench_ring_buffer.py [--rate 10] [--hours 24] [--samples 2000]
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hydro.ring_buffer import TimeSeriesRing
+
+CHANNELS = ["pH", "Temperature", "EC", "TDS", "Water Level"]
+SAMPLE = {"pH": 6.5, "Temperature": 25.0, "EC": 1.5, "TDS": 750.0, "Water Level": 0.52}
+
+
+def list_append(buffer, timestamps, timestamp, duration):
+    """The original gui_display.read_arduino_data buffer maintenance."""
+    timestamps.append(timestamp)
+    for key in buffer:
+        buffer[key].append(SAMPLE[key])
+    cutoff = timestamp - timedelta(seconds=duration)
+    while timestamps and timestamps[0] < cutoff:
+        timestamps.pop(0)
+        for key in buffer:
+            buffer[key].pop(0)
+
+
+def bench_lists(window, rate, samples):
+    duration = window / rate
+    start = datetime(2024, 1, 1)
+    step = timedelta(seconds=1 / rate)
+    timestamps = [start + i * step for i in range(window)]
+    buffer = {key: [SAMPLE[key]] * window for key in CHANNELS}
+
+    t0 = time.perf_counter()
+    for i in range(window, window + samples):
+        list_append(buffer, timestamps, start + i * step, duration)
+    return (time.perf_counter() - t0) / samples
+
+
+def bench_ring(window, rate, samples):
+    ring = TimeSeriesRing(CHANNELS, capacity=window, max_age=window / rate)
+    for i in range(window):
+        ring.append(i / rate, SAMPLE)
+
+    t0 = time.perf_counter()
+    for i in range(window, window + samples):
+        ring.append(i / rate, SAMPLE)
+    per_append = (time.perf_counter() - t0) / samples
+
+    t0 = time.perf_counter()
+    for _ in range(1000):
+        ring.column("pH", start=(window + samples) / rate - 3600)
+    per_view = (time.perf_counter() - t0) / 1000
+    return per_append, per_view
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rate", type=float, default=10, help="Sample rate in Hz")
+    parser.add_argument("--hours", type=float, default=24, help="Window length in hours")
+    parser.add_argument("--samples", type=int, default=2000, help="Timed appends")
+    args = parser.parse_args()
+
+    window = int(args.rate * args.hours * 3600)
+    print(f"Window: {window} samples ({args.hours} h at {args.rate} Hz)")
+
+    list_time = bench_lists(window, args.rate, args.samples)
+    ring_time, view_time = bench_ring(window, args.rate, args.samples)
+    print(f"list append+evict: {list_time * 1e6:10.1f} us/sample")
+    print(f"ring append+evict: {ring_time * 1e6:10.1f} us/sample ({list_time / ring_time:.0f}x faster)")
+    print(f"ring 1 h window view: {view_time * 1e6:7.1f} us")
+
+
+if __name__ == "__main__":
+    main()
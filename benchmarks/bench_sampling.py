@@ -0,0 +1,172 @@
+"""
+Compare fixed-interval summaries with hydro.sampling's adaptive upload.
+
+A synthetic day at --rate Hz (diurnal temperature, slow pH drift, a pH
+crash after each dosing that recovers over twenty minutes, sensor noise,
+dropouts and spikes, values rounded as stream2pi.ino prints them) is run
+through default_pipeline, as the writers do. Each strategy then picks the
+documents to upload:
+
+    interval N     one mean per N seconds, as main(sampling_interval=N) did
+    deadband       AdaptiveSampler(mode="deadband")
+    swinging_door  AdaptiveSampler(mode="swinging_door")
+
+For each strategy the table shows documents per day, the compression
+ratio, the reconstruction error (linear between documents, held for
+deadband) against the filtered stream, and how the dosing crashes look
+in the cloud: the deepest pH reconstructed relative to the real
+one, and how late the first document inside the crash arrives.
+
+Usage: python benchmarks/bench_sampling.py [--rate 1] [--days 1] [--heartbeat 900] [--scale 1]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hydro.aggregate import IntervalAggregator
+from hydro.filters import default_pipeline
+from hydro.protocol import Reading
+from hydro.sampling import DEFAULT_TOLERANCES, AdaptiveSampler, reconstruct
+
+DAY = 86400
+DOSING_HOURS = (2, 10, 18)
+CRASH_DEPTH = 0.6  # pH units
+CRASH_SECONDS = 60  # Time to the bottom of the crash
+RECOVERY_SECONDS = 1200
+
+
+def synthetic(days, rate, seed=0):
+    """Raw (times, values) as a tank would send them."""
+    rng = np.random.default_rng(seed)
+    count = int(days * DAY * rate)
+    times = 1.7e9 + np.arange(count) / rate
+    hours = (times - times[0]) / 3600
+    ph = 6.2 + 0.4 * (hours % 8) / 8  # Drifts up between dosings...
+    for day in range(int(np.ceil(days))):
+        for hour in DOSING_HOURS:
+            since = (hours - 24 * day - hour) * 3600
+            falling = (since >= 0) & (since < CRASH_SECONDS)
+            recovering = since >= CRASH_SECONDS
+            ph[falling] -= CRASH_DEPTH * since[falling] / CRASH_SECONDS
+            ph[recovering] -= CRASH_DEPTH * np.exp(-(since[recovering] - CRASH_SECONDS) / (RECOVERY_SECONDS / 4))
+    values = np.column_stack([
+        0.55 - 0.03 * (hours % 24) / 24 + rng.normal(0, 0.002, count),
+        24 + 1.5 * np.sin(2 * np.pi * (hours - 9) / 24) + rng.normal(0, 0.03, count),
+        1.5 + 0.1 * (hours % 8) / 8 + rng.normal(0, 0.005, count),
+        750 + 50 * (hours % 8) / 8 + rng.normal(0, 3, count),
+        ph + rng.normal(0, 0.02, count),
+    ])
+    # Rounded like stream2pi_line, then the odd spike and dropped value
+    values = np.column_stack([np.round(values[:, i], d) for i, d in enumerate((2, 1, 2, 1, 1))])
+    spikes = rng.random(count) < 0.0005
+    values[spikes, 4] += rng.choice([-3, 3], spikes.sum())
+    values[rng.random((count, 5)) < 0.001] = np.nan
+    return times, values
+
+
+def crash_windows(times):
+    start = times[0]
+    for day in range(int(np.ceil((times[-1] - start) / DAY))):
+        for hour in DOSING_HOURS:
+            onset = start + day * DAY + hour * 3600
+            if onset + RECOVERY_SECONDS <= times[-1]:
+                yield onset, onset + RECOVERY_SECONDS
+
+
+def interval_points(times, values, interval):
+    """Documents of the fixed-interval writer: the mean of each interval, stamped at its end."""
+    aggregator = IntervalAggregator()
+    point_times, point_values = [], []
+    next_upload = times[0] + interval
+    for timestamp, row in zip(times.tolist(), values.tolist()):
+        if timestamp >= next_upload:
+            summary = aggregator.result()
+            point_times.append(next_upload)
+            point_values.append([summary.get(name, np.nan) for name in Reading._fields])
+            aggregator.reset()
+            next_upload += interval
+        aggregator.add(row)
+    return np.array(point_times), np.array(point_values).reshape(-1, len(Reading._fields))
+
+
+def sampler_points(times, values, sampler):
+    point_times, point_values = [], []
+    t0 = time.perf_counter()
+    for timestamp, row in zip(times.tolist(), values.tolist()):
+        for point in sampler.add(timestamp, row):
+            point_times.append(point.timestamp)
+            point_values.append(point.values)
+    for point in sampler.flush():
+        point_times.append(point.timestamp)
+        point_values.append(point.values)
+    cost = (time.perf_counter() - t0) / len(times)
+    return np.array(point_times), np.array(point_values).reshape(-1, len(Reading._fields)), cost
+
+
+def report(name, times, values, point_times, point_values, mode, days, cost=None):
+    errors = []
+    for i in range(len(Reading._fields)):
+        rebuilt = reconstruct(point_times, point_values[:, i], times, mode)
+        error = np.abs(rebuilt - values[:, i])
+        errors.append((np.nanmax(error), np.sqrt(np.nanmean(error ** 2))))
+    ph = Reading._fields.index("ph")
+    shortfall, delays = [], []
+    for onset, end in crash_windows(times):
+        inside = (times >= onset) & (times < end)
+        rebuilt = reconstruct(point_times, point_values[:, ph], times[inside], mode)
+        true_low = np.nanmin(values[inside, ph])
+        shortfall.append(np.nanmin(rebuilt) - true_low)
+        # First document whose pH shows the crash (below the pre-dose level by a third of its depth)
+        before = np.nanmedian(values[(times >= onset - 60) & (times < onset), ph])
+        hits = point_times[(point_times >= onset) & (point_values[:, ph] < before - CRASH_DEPTH / 3)]
+        delays.append(hits[0] - onset if len(hits) else np.inf)
+    documents = len(point_times) / days
+    print(
+        f"{name:<22} {documents:8.0f} {len(times) / max(len(point_times), 1):8.0f}x "
+        + " ".join(f"{m:7.3f}/{r:6.3f}" for m, r in errors)
+        + f"   {np.mean(shortfall):6.2f}  {np.median(delays):6.0f} s"
+        + (f"  {cost * 1e6:5.1f} us" if cost is not None else "")
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rate", type=float, default=1, help="Samples per second")
+    parser.add_argument("--days", type=float, default=1)
+    parser.add_argument("--heartbeat", type=float, default=900, help="max_silence of the adaptive samplers")
+    parser.add_argument("--scale", type=float, nargs="+", default=[1], help="Multiples of DEFAULT_TOLERANCES to try")
+    parser.add_argument("--intervals", type=float, nargs="+", default=[60, 900], help="Fixed intervals to compare")
+    args = parser.parse_args()
+
+    times, raw = synthetic(args.days, args.rate)
+    values = default_pipeline().apply_batch(raw)
+    print(f"{len(times)} samples over {args.days:g} days; tolerances {DEFAULT_TOLERANCES}")
+    print(f"{'strategy':<22} {'docs/day':>8} {'ratio':>9} "
+          + " ".join(f"{name[:14]:>14}" for name in Reading._fields)
+          + "   crash shortfall/delay  cost/sample")
+    print(f"{'':<42}" + " ".join(f"{'max/rms':>14}" for _ in Reading._fields))
+    for interval in args.intervals:
+        point_times, point_values = interval_points(times, values, interval)
+        report(f"interval {interval:g} s", times, values, point_times, point_values, "swinging_door", args.days)
+    for mode in ("deadband", "swinging_door"):
+        for scale in args.scale:
+            tolerances = {name: value * scale for name, value in DEFAULT_TOLERANCES.items()}
+            sampler = AdaptiveSampler(tolerances, max_silence=args.heartbeat, mode=mode)
+            point_times, point_values, cost = sampler_points(times, values, sampler)
+            label = mode if scale == 1 else f"{mode} x{scale:g}"
+            report(label, times, values, point_times, point_values, mode, args.days, cost)
+            stats = sampler.stats()
+            over = {name: stats[f"{name}_error_max"] / tolerances[name] for name in Reading._fields
+                    if stats[f"{name}_error_max"] > tolerances[name] * (1 + 1e-9)}
+            if over:
+                # Only where a sensor had no value in a kept sample (see hydro.sampling)
+                print(f"{'':<22} beyond tolerance: " + ", ".join(f"{k} {v:.2f}x" for k, v in over.items()))
+
+
+if __name__ == "__main__":
+    main()
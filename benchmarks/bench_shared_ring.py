@@ -0,0 +1,135 @@
+"""
+Benchmark hydro.shared_ring: one writer, N reader processes on the same ring.
+
+The writer appends samples whose channels all hold the sample's index, so
+readers can check every sample they see for tearing (channels from
+different writes) and gaps. Each reader polls ``read_new`` like a GUI's
+ingest timer and reads a chart window with ``column`` like a redraw, and
+reports how long both take and how much CPU it used. The writer's append
+cost is measured with and without readers attached.
+
+Usage: python benchmarks/bench_shared_ring.py [--readers 1 4 8] [--rate 1000] [--seconds 5]
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hydro.protocol import Reading
+from hydro.shared_ring import SharedRing, SharedRingReader
+
+NAME = f"hydro_bench_{os.getpid()}"
+
+
+def _reader(name, seconds, poll, chart_seconds, fps, queue):
+    ring = SharedRingReader(name)
+    stop_at = time.monotonic() + seconds
+    next_frame = time.monotonic()
+    new_times, chart_times = [], []
+    seen = torn = gaps = invalid = 0
+    last = None
+    cpu_start = time.process_time()
+    while time.monotonic() < stop_at:
+        t0 = time.perf_counter()
+        times, values = ring.read_new()
+        if len(times):
+            # Channels equal the timestamp's sample index; anything else is a torn read
+            torn += int(np.count_nonzero(values != times))
+            if last is not None and times[0] != last + 1:
+                gaps += 1
+            last = times[-1]
+            seen += len(times)
+        new_times.append(time.perf_counter() - t0)
+        if time.monotonic() >= next_frame:
+            t0 = time.perf_counter()
+            times, ph = ring.column("ph", start=ring.latest()[0] - chart_seconds)
+            np.nanmean(ph)
+            chart_times.append(time.perf_counter() - t0)
+            invalid += not ring.valid()
+            next_frame += 1.0 / fps
+        time.sleep(poll)
+    cpu = time.process_time() - cpu_start
+    queue.put({
+        "seen": seen, "missed": ring.missed, "torn": torn, "gaps": gaps, "invalid": invalid, "cpu": cpu,
+        "new": np.array(new_times), "chart": np.array(chart_times),
+    })
+    del times, values, ph
+    ring.close()
+
+
+def _write(ring, start, rate, seconds):
+    """Append at ``rate`` samples/s; return per-append seconds."""
+    costs = []
+    index = start
+    wall_start = time.monotonic()
+    next_time = wall_start
+    while time.monotonic() - wall_start < seconds:
+        t0 = time.perf_counter()
+        ring.append(float(index), (float(index),) * len(Reading._fields))
+        costs.append(time.perf_counter() - t0)
+        index += 1
+        next_time += 1.0 / rate
+        time.sleep(max(0.0, next_time - time.monotonic()))
+    return np.array(costs), index
+
+
+def _us(values, q):
+    return np.quantile(values, q) * 1e6 if len(values) else float("nan")
+
+
+def run(readers, rate, seconds, capacity, poll, fps):
+    ring = SharedRing(NAME, Reading._fields, capacity=capacity)
+    try:
+        costs, index = _write(ring, 0, rate, 1.0)  # Warm up and put something in the chart window
+        idle = _us(costs, 0.5)
+        queue = multiprocessing.Queue()
+        workers = [
+            multiprocessing.Process(target=_reader, args=(NAME, seconds, poll, capacity / rate / 2, fps, queue))
+            for _ in range(readers)
+        ]
+        for worker in workers:
+            worker.start()
+        costs, index = _write(ring, index, rate, seconds + 0.5)
+        results = [queue.get() for _ in workers]
+        for worker in workers:
+            worker.join()
+    finally:
+        ring.close()
+
+    new = np.concatenate([r["new"] for r in results])
+    chart = np.concatenate([r["chart"] for r in results])
+    print(
+        f"{readers:3d} readers: append p50 {_us(costs, 0.5):5.1f} us (alone {idle:4.1f}), "
+        f"read_new p50/p99 {_us(new, 0.5):5.1f}/{_us(new, 0.99):6.1f} us, "
+        f"chart p50/p99 {_us(chart, 0.5):6.1f}/{_us(chart, 0.99):6.1f} us, "
+        f"reader cpu {np.mean([r['cpu'] for r in results]) / seconds:5.1%}"
+    )
+    print(
+        f"             seen {sum(r['seen'] for r in results)} samples, missed {sum(r['missed'] for r in results)}, "
+        f"gaps {sum(r['gaps'] for r in results)}, torn values {sum(r['torn'] for r in results)}, "
+        f"lapped views {sum(r['invalid'] for r in results)}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--readers", type=int, nargs="+", default=[1, 4, 8], help="Reader processes per run")
+    parser.add_argument("--rate", type=float, default=1000, help="Samples written per second")
+    parser.add_argument("--seconds", type=float, default=5, help="Length of each run")
+    parser.add_argument("--capacity", type=int, default=36000, help="Ring size (the collector's hour at 10 Hz)")
+    parser.add_argument("--poll", type=float, default=0.01, help="Seconds between a reader's read_new calls")
+    parser.add_argument("--fps", type=float, default=5, help="Chart windows read per second per reader")
+    args = parser.parse_args()
+
+    print(f"writing {args.rate:g} samples/s into a {args.capacity}-sample ring for {args.seconds:g} s per run")
+    for readers in args.readers:
+        run(readers, args.rate, args.seconds, args.capacity, args.poll, args.fps)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Startup cost of gui_display.py, split the way FAST_START splits it.
+
+"window" is what the GUI imports before its window appears, "chart" what
+load_in_background adds afterwards; "eager" is the pre-FAST_START import
+set (everything, via pyplot) for comparison. Each set is imported in a
+fresh interpreter under ``python -X importtime`` and the log is summed per
+top-level package, so a new heavy import shows up by name. The non-import
+steps (opening the store, backfilling the buffer, the first chart render)
+are timed in-process.
+
+Usage: python benchmarks/bench_startup.py [--runs 5] [--top 8] [--db hydroponics_data.db] [--output startup.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import Counter
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from hydro.protocol import Reading
+
+# Imports of gui_display.py before the window is shown
+WINDOW_MODULES = [
+    "tkinter", "numpy", "hydro.alerts", "hydro.client", "hydro.config", "hydro.filters", "hydro.log",
+    "hydro.metrics", "hydro.protocol", "hydro.resample", "hydro.ring_buffer", "hydro.serial_reader",
+    "hydro.shared_ring", "hydro.storage",
+]
+# Added by load_in_background
+CHART_MODULES = [
+    "matplotlib.backends.backend_agg", "matplotlib.backends.backend_tkagg", "matplotlib.figure", "hydro.live_plot",
+]
+# What the window waited for before FAST_START
+EAGER_MODULES = WINDOW_MODULES + ["matplotlib.pyplot", "matplotlib.backends.backend_tkagg", "hydro.live_plot"]
+
+PHASE_MARK = "--- phase "
+
+
+def import_profile(phases):
+    """
+    Import each ``(name, modules)`` phase in order in one fresh interpreter.
+    Returns ``{phase: {"seconds": wall, "packages": {package: self seconds}, "modules": {module: cumulative}}}``.
+    """
+    lines = [f"import sys, time"]
+    for name, modules in phases:
+        lines.append(f"sys.stderr.write({PHASE_MARK + name!r} + chr(10)); t0 = time.perf_counter()")
+        lines.extend(f"import {module}" for module in modules)
+        lines.append(f"sys.stderr.write('--- wall %f' % (time.perf_counter() - t0) + chr(10))")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "\n".join(lines)],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    profile = {}
+    current = None
+    for line in result.stderr.splitlines():
+        if line.startswith(PHASE_MARK):
+            current = profile[line[len(PHASE_MARK):]] = {"seconds": 0.0, "packages": Counter(), "modules": {}}
+        elif line.startswith("--- wall "):
+            current["seconds"] = float(line.split()[-1])
+        elif line.startswith("import time:") and current is not None and "|" in line:
+            own, cumulative, name = line[len("import time:"):].split("|")
+            if not own.strip().isdigit():
+                continue  # Column header
+            module = name.strip()
+            current["packages"][module.split(".")[0]] += int(own) / 1e6
+            if name.startswith(" ") and not name.startswith("  "):  # Top level of this phase
+                current["modules"][module] = int(cumulative) / 1e6
+    return profile
+
+
+def time_steps(db_path):
+    """The non-import work between process start and a drawn chart."""
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    from hydro.filters import default_pipeline
+    from hydro.live_plot import LiveChart
+    from hydro.ring_buffer import TimeSeriesRing
+    from hydro.storage import SensorStore
+
+    steps = {}
+    t0 = time.perf_counter()
+    store = SensorStore(db_path)
+    steps["store.open"] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    smoothing = default_pipeline()
+    history = TimeSeriesRing(Reading._fields, capacity=36000, max_age=3600)
+    times, values = store.query(start=time.time() - 3600)
+    values = values.view(np.float64).reshape(-1, len(Reading._fields))
+    history.extend(times, smoothing.apply_batch(values))
+    steps["backfill"] = time.perf_counter() - t0
+    store.close()
+
+    # The first draw in a process loads fonts and fills text caches; later ones don't
+    for name in ("render.first", "render.second"):
+        t0 = time.perf_counter()
+        figure = Figure(figsize=(8, 5))
+        ax = figure.add_subplot()
+        canvas = FigureCanvasAgg(figure)
+        canvas.blit = lambda bbox=None: None
+        chart = LiveChart(ax, canvas, history.column, window=3600)
+        chart.show("ph", "pH", (5, 8))
+        chart.frame()
+        steps[name] = time.perf_counter() - t0
+    return steps
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per import set (median reported)")
+    parser.add_argument("--top", type=int, default=8, help="Packages listed per phase")
+    parser.add_argument("--db", default=None, help="Database for the store/backfill steps (default: a temporary one)")
+    parser.add_argument("--output", default=None, help="Write the results as JSON")
+    args = parser.parse_args()
+
+    profiles = [import_profile([("window", WINDOW_MODULES), ("chart", CHART_MODULES)]) for _ in range(args.runs)]
+    eager = [import_profile([("eager", EAGER_MODULES)])["eager"] for _ in range(args.runs)]
+    results = {}
+    for phase, runs in (("window", [p["window"] for p in profiles]), ("chart", [p["chart"] for p in profiles]),
+                        ("eager", eager)):
+        seconds = statistics.median(run["seconds"] for run in runs)
+        packages = {name: statistics.median(run["packages"].get(name, 0.0) for run in runs)
+                    for name in set().union(*(run["packages"] for run in runs))}
+        results[phase] = {"seconds": seconds, "packages": packages}
+        print(f"{phase} imports: {seconds * 1000:.0f} ms")
+        for name, own in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+            print(f"    {name:<24} {own * 1000:7.1f} ms")
+
+    if args.db is None:
+        import tempfile
+
+        from hydro.storage import SensorStore
+
+        tmp = tempfile.TemporaryDirectory()
+        db_path = os.path.join(tmp.name, "sensor.db")
+        store = SensorStore(db_path)
+        times = time.time() - 3600 + np.arange(36000) / 10
+        store.insert_many(times, np.tile([0.52, 25.0, 1.5, 750.0, 6.5], (len(times), 1)))
+        store.close()
+    else:
+        db_path = args.db
+    steps = time_steps(db_path)
+    results["steps"] = steps
+    for name, seconds in steps.items():
+        print(f"{name:<16} {seconds * 1000:7.1f} ms")
+
+    window = results["window"]["seconds"]
+    chart = window + results["chart"]["seconds"] + sum(steps.values())
+    before = results["eager"]["seconds"] + sum(steps.values())
+    print(f"first pixel after ~{window * 1000:.0f} ms of imports (was ~{before * 1000:.0f} ms), "
+          f"chart after ~{chart * 1000:.0f} ms")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
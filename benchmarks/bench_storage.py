@@ -0,0 +1,74 @@
+"""
+Measure hydro.storage.SensorStore insert throughput and range-query latency.
+
+A temporary database is filled with ``--days`` of synthetic samples at
+``--rate`` Hz, then queried for the last day, week and 30 days.
+
+Usage: python benchmarks/bench_storage.py [--days 30] [--rate 1]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hydro.protocol import Reading
+from hydro.storage import SensorStore
+
+
+def synthetic(count, start, rate, seed=0):
+    rng = np.random.default_rng(seed)
+    times = start + np.arange(count) / rate
+    values = np.column_stack([
+        0.5 + 0.01 * rng.standard_normal(count),
+        25 + 0.3 * rng.standard_normal(count),
+        1.5 + 0.05 * rng.standard_normal(count),
+        750 + 20 * rng.standard_normal(count),
+        6.5 + 0.1 * rng.standard_normal(count),
+    ])
+    return times, values
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--days", type=float, default=30, help="Days of history to insert")
+    parser.add_argument("--rate", type=float, default=1, help="Sample rate in Hz")
+    args = parser.parse_args()
+
+    count = int(args.days * 86400 * args.rate)
+    end = time.time()
+    times, values = synthetic(count, end - args.days * 86400, args.rate)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SensorStore(os.path.join(tmp, "bench.db"))
+
+        t0 = time.perf_counter()
+        store.insert_many(times, values)
+        bulk = time.perf_counter() - t0
+        print(f"insert_many: {count:,} rows in {bulk:.2f}s ({count / bulk:,.0f} rows/s)")
+
+        sample_count = 10000
+        t0 = time.perf_counter()
+        for i in range(sample_count):
+            store.add(end + i, Reading._make(values[i]))
+        store.flush()
+        batched = time.perf_counter() - t0
+        print(f"add (batches of {store.batch_size}): {sample_count / batched:,.0f} rows/s")
+
+        for label, days in (("1 day", 1), ("7 days", 7), ("30 days", 30)):
+            t0 = time.perf_counter()
+            result_times, _ = store.query(start=end - days * 86400, end=end)
+            elapsed = time.perf_counter() - t0
+            print(f"query {label:>7}: {len(result_times):>9,} rows in {elapsed * 1000:8.1f} ms")
+
+        size = os.path.getsize(store.path)
+        store.close()
+        print(f"database size: {size / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,473 @@
+"""
+End-to-end benchmark suite for the ingest -> store -> render pipeline.
+
+Every case times one hot path of the dashboards on synthetic data, swept over
+sample rates and window lengths: line parsing, the GUI's per-sample ingest
+(filters, ring buffer, SQLite, alerts), buffer reads, resampling, smoothing,
+chart rendering (full redraw and blitted frame), the GUI's startup imports,
+the Firestore write path against FakeFirestore and the DataFrame that
+webGUI.py builds from the cache.
+
+Results are written as JSON. With --baseline each case is compared with a
+saved run, and the exit status is 1 if any is slower by more than
+--threshold, so a regression is caught before it is deployed to the Pis:
+
+    python benchmarks/suite.py --output baseline.json        # On the old commit
+    python benchmarks/suite.py --baseline baseline.json      # On the new one
+
+Usage: python benchmarks/suite.py [--output results.json] [--baseline baseline.json] [--filter resample] [--quick]
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hydro.alerts import DEFAULT_RULES, AlertEngine, rules_from_config
+from hydro.fake_arduino import stream2pi_line
+from hydro.fake_firestore import FakeFirestore
+from hydro.filters import default_pipeline
+from hydro.firestore_cache import FirestoreCache
+from hydro.frames import MODE_BINARY_ACK, StreamDecoder, encode_frame
+from hydro.protocol import LineParser, Reading, parse_line
+from hydro.resample import moving_average, resample
+from hydro.ring_buffer import TimeSeriesRing
+from hydro.storage import SensorStore
+from hydro.uploader import BatchUploader
+
+RATES = (1, 10)  # Samples per second
+WINDOWS = (3600, 86400)  # Seconds of history: the GUI's hour and a day
+INTERVAL = 300  # gui_display.plot_data's resampling interval
+BATCH = 1000  # Samples per timed call for per-sample paths
+
+# What one case hands back after its (untimed) setup
+Workload = namedtuple("Workload", ["run", "items", "close"], defaults=[None])
+
+CASES = []
+
+
+def case(name, **grid):
+    """Register a benchmark; ``grid`` maps parameter names to the values swept."""
+
+    def register(setup):
+        CASES.append((name, grid, setup))
+        return setup
+
+    return register
+
+
+# -- Synthetic workloads ------------------------------------------------------
+
+def synthetic(seconds, rate, seed=0):
+    """(times, values) for ``seconds`` at ``rate`` Hz ending now, with noise and dropouts."""
+    rng = np.random.default_rng(seed)
+    count = int(seconds * rate)
+    times = time.time() - seconds + np.arange(count) / rate
+    base = np.array([0.52, 25.0, 1.5, 750.0, 6.5])
+    noise = np.array([0.01, 0.05, 0.01, 5.0, 0.02])
+    values = base + np.cumsum(rng.standard_normal((count, 5)), axis=0) * noise * 0.05
+    values += rng.standard_normal((count, 5)) * noise
+    values[rng.random((count, 5)) < 0.01] = np.nan
+    return times, values
+
+
+def stream2pi_lines(count, units=False, seed=0):
+    rng = random.Random(seed)
+    lines = []
+    for _ in range(count):
+        line = stream2pi_line(
+            water_level=rng.uniform(0.3, 0.7),
+            water_temp=rng.uniform(20, 28),
+            ec=rng.uniform(1.0, 2.0),
+            tds=rng.uniform(500, 1000),
+            ph=rng.uniform(5.5, 7.5),
+        )
+        if units:  # As stream2pi.ino prints it
+            line = line.replace(",WATER_TEMP", " m, WATER_TEMP").replace(",EC", " °C, EC")
+        lines.append(line.encode() + b"\r\n")
+    return lines
+
+
+def history_ring(window, rate):
+    """A full TimeSeriesRing sized like gui_display.history."""
+    times, values = synthetic(window, rate)
+    ring = TimeSeriesRing(Reading._fields, capacity=int(window * rate), max_age=window)
+    ring.extend(times, values)
+    return ring, times, values
+
+
+def temporary_store():
+    directory = tempfile.mkdtemp(prefix="hydro_bench_")
+    store = SensorStore(os.path.join(directory, "bench.db"))
+
+    def close():
+        store.close()
+        shutil.rmtree(directory, ignore_errors=True)
+
+    return store, close
+
+
+def sensor_documents(count, interval=900):
+    """Documents as the Firebase writer uploads them (interval summaries)."""
+    start = time.time() - count * interval
+    documents = []
+    for i, line in enumerate(stream2pi_lines(count)):
+        reading = parse_line(line)
+        document = {name: value for name, value in zip(Reading._fields, reading)}
+        document.update(
+            {f"{name}_{stat}": value for name, value in zip(Reading._fields, reading) for stat in ("min", "max", "last")}
+        )
+        document["samples"] = 900
+        document["tank"] = "tank1"
+        document["timestamp"] = datetime.fromtimestamp(int(start + i * interval), timezone.utc).replace(tzinfo=None)
+        documents.append(document)
+    return documents
+
+
+# -- Cases --------------------------------------------------------------------
+
+@case("parse.line", format=("canonical", "units"))
+def parse_line_case(format):
+    parser = LineParser()
+    lines = stream2pi_lines(BATCH, units=format == "units")
+
+    def run():
+        parse = parser.parse
+        for line in lines:
+            parse(line)
+
+    return Workload(run, len(lines))
+
+
+@case("parse.stream", mode=("ascii", "binary"))
+def parse_stream_case(mode):
+    if mode == "binary":
+        data = MODE_BINARY_ACK + b"\r\n" + b"".join(
+            encode_frame(i, parse_line(line)) for i, line in enumerate(stream2pi_lines(BATCH))
+        )
+    else:
+        data = b"".join(stream2pi_lines(BATCH))
+    chunks = [data[i:i + 64] for i in range(0, len(data), 64)]  # Roughly what one port read returns
+
+    def run():
+        decoder = StreamDecoder()
+        for chunk in chunks:
+            decoder.feed(chunk)
+
+    return Workload(run, BATCH)
+
+
+@case("ingest.sample", rate=RATES)
+def ingest_case(rate):
+    """gui_display.read_arduino_data for each drained sample."""
+    history = TimeSeriesRing(Reading._fields, capacity=3600 * rate, max_age=3600)
+    smoothing = default_pipeline()
+    alerts = AlertEngine(rules_from_config(DEFAULT_RULES))
+    store, close = temporary_store()
+    readings = [parse_line(line) for line in stream2pi_lines(BATCH)]
+    clock = [time.time()]
+
+    def run():
+        timestamp = clock[0]
+        for data in readings:
+            timestamp += 1.0 / rate
+            filtered = smoothing(data)
+            history.append(timestamp, filtered)
+            store.add(timestamp, data)
+            alerts.process(timestamp, filtered)
+        clock[0] = timestamp
+
+    return Workload(run, len(readings), close)
+
+
+@case("buffer.append", window=WINDOWS, rate=RATES)
+def buffer_append_case(window, rate):
+    ring, times, values = history_ring(window, rate)
+    rows = [tuple(row) for row in values[:BATCH]]
+    clock = [times[-1]]
+
+    def run():
+        timestamp = clock[0]
+        for row in rows:
+            timestamp += 1.0 / rate
+            ring.append(timestamp, row)
+        clock[0] = timestamp
+
+    return Workload(run, len(rows))
+
+
+@case("buffer.column", window=WINDOWS, rate=RATES)
+def buffer_column_case(window, rate):
+    ring, _, _ = history_ring(window, rate)
+    return Workload(lambda: ring.column("ph"), 1)
+
+
+@case("resample.bin", window=WINDOWS, rate=RATES)
+def resample_case(window, rate):
+    """gui_display.resample_data on a full buffer."""
+    times, values = synthetic(window, rate)
+    column = values[:, 4]
+    return Workload(lambda: resample(times, column, INTERVAL, mode="bin"), len(times))
+
+
+@case("smooth.moving_average", window=WINDOWS, rate=RATES)
+def moving_average_case(window, rate):
+    _, values = synthetic(window, rate)
+    column = values[:, 4]
+    return Workload(lambda: moving_average(column, 4), len(column))
+
+
+@case("smooth.filters_batch", window=WINDOWS, rate=RATES)
+def filters_batch_case(window, rate):
+    """The GUI's startup backfill: every field through the default pipeline."""
+    _, values = synthetic(window, rate)
+    pipeline = default_pipeline()
+    return Workload(lambda: pipeline.apply_batch(values), len(values))
+
+
+@case("render.full", rate=RATES)
+def render_full_case(rate):
+    """Sensor switch in gui_display: axes, ticks and line redrawn from scratch."""
+    chart, _, _ = live_chart(rate)
+
+    def run():
+        chart.show("ph", "pH", (5, 8))
+        chart.frame()
+
+    return Workload(run, 1)
+
+
+@case("render.frame", rate=RATES)
+def render_frame_case(rate):
+    """One blitted LiveChart frame after a new sample arrives."""
+    chart, ring, rows = live_chart(rate)
+    chart.show("ph", "pH", (5, 8))
+    chart.frame()
+    index = [0]
+
+    def run():
+        ring.append(time.time(), rows[index[0] % len(rows)])
+        index[0] += 1
+        chart.frame()
+
+    return Workload(run, 1)
+
+
+def live_chart(rate):
+    """LiveChart on an off-screen canvas the size of the Pi's 800x480 display."""
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    from hydro.live_plot import LiveChart
+
+    ring, _, values = history_ring(3600, rate)
+    figure = Figure(figsize=(8, 5))
+    figure.patch.set_facecolor("black")
+    ax = figure.add_subplot()
+    ax.set_facecolor("black")
+    canvas = FigureCanvasAgg(figure)
+    chart = LiveChart(ax, canvas, ring.column, window=3600)
+    return chart, ring, [tuple(row) for row in values[:BATCH]]
+
+
+@case("store.query", window=WINDOWS, rate=RATES)
+def store_query_case(window, rate):
+    """GUI backfill: read the last window back from SQLite."""
+    store, close = temporary_store()
+    times, values = synthetic(window, rate)
+    store.insert_many(times, values)
+    start = times[0]
+    return Workload(lambda: store.query(start=start), len(times), close)
+
+
+@case("startup.imports", stage=("window", "chart"))
+def startup_imports_case(stage):
+    """gui_display's imports in a fresh interpreter: before its window appears, and for the chart."""
+    from bench_startup import CHART_MODULES, WINDOW_MODULES
+
+    modules = WINDOW_MODULES if stage == "window" else WINDOW_MODULES + CHART_MODULES
+    command = [sys.executable, "-c", "; ".join(f"import {module}" for module in modules)]
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return Workload(lambda: subprocess.run(command, cwd=root, check=True), 1)
+
+
+@case("firestore.write", documents=(100, 1000))
+def firestore_write_case(documents):
+    """Firebase writer: queue interval summaries and commit them in batches."""
+    docs = sensor_documents(documents)
+
+    def run():
+        uploader = BatchUploader(FakeFirestore(), max_age=0)
+        for document in docs:
+            uploader.add(document)
+        uploader.flush()
+
+    return Workload(run, len(docs))
+
+
+@case("firestore.dataframe", documents=(1000, 10000))
+def firestore_dataframe_case(documents):
+    """webGUI.fetch_data_from_firestore with a warm cache: sync, load, DataFrame."""
+    import pandas as pd
+
+    db = FakeFirestore()
+    collection = db.collection("sensor_readings")
+    for document in sensor_documents(documents):
+        collection.add(document)
+    directory = tempfile.mkdtemp(prefix="hydro_bench_")
+    FirestoreCache(db, directory).sync()
+
+    def run():
+        cache = FirestoreCache(db, directory)
+        cache.sync()
+        df = pd.DataFrame(cache.load())
+        df["timestamp"] = pd.to_datetime(df["timestamp"], unit="s")
+        return df
+
+    return Workload(run, documents, lambda: shutil.rmtree(directory, ignore_errors=True))
+
+
+# -- Runner -------------------------------------------------------------------
+
+def expand(filters):
+    """Yield (key, name, params, setup) for every case and grid point selected."""
+    for name, grid, setup in CASES:
+        for combination in itertools.product(*grid.values()):
+            params = dict(zip(grid, combination))
+            key = name + "[" + ",".join(f"{k}={v}" for k, v in params.items()) + "]"
+            if not filters or any(f in key for f in filters):
+                yield key, name, params, setup
+
+
+def measure(run, budget, min_repeats=3, max_repeats=200):
+    """Time ``run`` after one warm-up call, until ``budget`` seconds or ``max_repeats`` calls."""
+    run()
+    samples = []
+    deadline = time.perf_counter() + budget
+    while len(samples) < min_repeats or (len(samples) < max_repeats and time.perf_counter() < deadline):
+        start = time.perf_counter()
+        run()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def run_suite(filters=(), budget=1.0):
+    results = {}
+    for key, name, params, setup in expand(filters):
+        try:
+            workload = setup(**params)
+        except ImportError as e:
+            print(f"{key:<52} skipped ({e})")
+            continue
+        try:
+            samples = measure(workload.run, budget)
+        finally:
+            if workload.close is not None:
+                workload.close()
+        median = statistics.median(samples)
+        results[key] = {
+            "case": name,
+            "params": params,
+            "items": workload.items,
+            "repeats": len(samples),
+            "median": median,
+            "min": min(samples),
+            "per_item_us": median / workload.items * 1e6,
+        }
+        print(f"{key:<52} {median * 1000:>10.3f} ms  {median / workload.items * 1e6:>10.3f} us/item")
+    return results
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    versions = {"python": platform.python_version(), "numpy": np.__version__}
+    for module in ("matplotlib", "pandas"):
+        try:
+            versions[module] = __import__(module).__version__
+        except ImportError:
+            pass
+    return {
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "machine": platform.machine(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "versions": versions,
+    }
+
+
+def compare(results, baseline, threshold):
+    """Print new vs baseline medians; returns the keys that got slower than ``threshold`` allows."""
+    regressions = []
+    print(f"\n{'case':<52} {'baseline':>10} {'now':>10}  ratio")
+    for key, result in results.items():
+        old = baseline.get(key)
+        if old is None:
+            print(f"{key:<52} {'-':>10} {result['median'] * 1000:>8.3f}ms  new")
+            continue
+        ratio = result["median"] / old["median"]
+        flag = ""
+        if ratio > 1.0 + threshold:
+            flag = "  REGRESSION"
+            regressions.append(key)
+        elif ratio < 1.0 / (1.0 + threshold):
+            flag = "  faster"
+        print(f"{key:<52} {old['median'] * 1000:>8.3f}ms {result['median'] * 1000:>8.3f}ms  {ratio:5.2f}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--output", default=None, help="Write results as JSON here")
+    parser.add_argument("--baseline", default=None, help="Compare with the JSON of an earlier run")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed slowdown, 0.25 = 25%%")
+    parser.add_argument("--filter", nargs="*", default=[], help="Only cases whose key contains one of these")
+    parser.add_argument("--budget", type=float, default=1.0, help="Seconds of timing per case")
+    parser.add_argument("--quick", action="store_true", help="Short budget, for a smoke run")
+    parser.add_argument("--list", action="store_true", help="List the case keys and exit")
+    args = parser.parse_args()
+
+    if args.list:
+        for key, *_ in expand(args.filter):
+            print(key)
+        return 0
+
+    results = run_suite(args.filter, 0.1 if args.quick else args.budget)
+    report = {"environment": environment(), "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print(f"Baseline: commit {baseline['environment'].get('commit')} from {baseline['environment'].get('date')}")
+        regressions = compare(results, baseline["results"], args.threshold)
+        if regressions:
+            print(f"{len(regressions)} case(s) slower than the baseline by more than {args.threshold:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,161 +1,307 @@
-import tkinter as tk
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import matplotlib.pyplot as plt
-from matplotlib.dates import MinuteLocator, DateFormatter
-from datetime import datetime, timedelta
-import numpy as np
-import serial
 import time
 
-# Arduino Serial Connection Settings
-ARDUINO_PORT = "/dev/ttyACM0"  # Adjust to your port
-BAUD_RATE = 9600
+STARTED = time.perf_counter()  # Startup milestones are logged relative to this
+
+import math
+import threading
+import tkinter as tk
+
+import numpy as np  # Loaded by hydro.protocol anyway; matplotlib is what startup defers
+from hydro.alerts import AlertEngine, BannerSink, print_sink, rules_from_config
+from hydro.client import CollectorClient
+from hydro.config import load_config
+from hydro.filters import default_pipeline
+from hydro.log import configure as configure_logging, get_logger
+from hydro.metrics import REGISTRY, MetricsServer
+from hydro.protocol import Reading
+from hydro.resample import resample
+from hydro.ring_buffer import TimeSeriesRing
+from hydro.serial_reader import SerialReader
+from hydro.shared_ring import SharedRingReader
+from hydro.storage import SensorStore
+
+# Settings shared with the collector daemon (collector.toml; see hydro.config).
+# With the collector running the GUI attaches to it; otherwise it opens the
+# first configured port itself.
+config = load_config()
+TANK, ARDUINO_PORT = next(iter(config["serial"]["ports"].items()), (None, "/dev/ttyACM0"))
+BAUD_RATE = config["serial"]["baud_rate"]
 TIMEOUT = 1  # Seconds
+COLLECTOR_SOCKET = config["socket"]["path"]
+use_collector = CollectorClient.available(COLLECTOR_SOCKET)
+
+# Logging and metrics (Prometheus text at http://localhost:METRICS_PORT/metrics)
+LOG_LEVEL = "INFO"
+LOG_RATE_LIMIT = 5  # Identical messages per minute; None logs everything
+METRICS_PORT = 9108  # None disables the endpoint
+SHOW_METRICS = True  # Metrics overlay in the status bar instead of the frame time only
+log_limiter = configure_logging(LOG_LEVEL, rate=LOG_RATE_LIMIT)
+log = get_logger("gui_display")
 
 # Initialize data buffers
 BUFFER_DURATION = 3600  # Store 1 hour of data (in seconds)
-buffer = {
-    "pH": [],
-    "Temperature": [],
-    "EC": [],
-    "TDS": [],
-    "Water Level": [],
-}
-timestamps = []
-arduino_connected = False
+MAX_SAMPLE_RATE = 10  # Samples per second the buffer is sized for
+TANK_TIMEOUT = 3  # Seconds to wait for the collector to name the tank it follows (with no tank configured)
+ring_name = None  # The collector's shared ring for that tank, once known
+
+# The buffer holds filtered samples (spikes removed, lightly smoothed) so plots
+# don't re-smooth on every redraw; the store keeps the raw values
+smoothing = default_pipeline()
+
+# Created by load_in_background; samples wait in ``pending`` until finish_startup sets ``started``
+store = None
+history = None
+own_history = True
+pending = []
+startup_done = threading.Event()
+startup_error = None
+started = False
+chart = None
+requested_view = None  # Sensor picked before the chart existed
 last_flash = None
 last_interaction = time.time()
+READ_INTERVAL_MS = 100  # How often the Tk loop drains the serial queue
+LIVE_CHART = True  # Continuously blit the chart; False redraws only on button presses
+CHART_FPS = 5  # Target frame rate of the live chart
+# Show the window and latest values first, then import matplotlib, open the
+# store and backfill the buffer on a background thread; False does all of it
+# before the window appears
+FAST_START = True
+
+# Alerts are checked on every sample and shown in a banner above the chart
+# (the collector already logs and forwards them when it is running)
+alert_banner = BannerSink()
+alerts = AlertEngine(
+    rules_from_config(config["alerts"]["rules"]),
+    sinks=[alert_banner] if use_collector else [print_sink, alert_banner],
+)
+
+# Samples arrive on a background thread so the UI never blocks on the port or socket
+if use_collector:
+    log.info("Attached to the collector at %s", COLLECTOR_SOCKET)
+    reader = CollectorClient(COLLECTOR_SOCKET, tank=TANK)
+    REGISTRY.register_stats("hydro_client", reader.stats, counters=("samples", "dropped", "reconnects"))
+else:
+    reader = SerialReader(ARDUINO_PORT, BAUD_RATE, timeout=TIMEOUT)
+    # Counters the reader already keeps are read at scrape time, not per sample
+    REGISTRY.register_stats("hydro_serial", reader.stats, counters=(
+        "lines_read", "parse_errors", "dropped", "reconnects",
+        "frames", "crc_errors", "dropped_frames", "rejected_frames", "rejected_values",
+    ))
+reader.start()
+if log_limiter is not None:
+    REGISTRY.gauge("hydro_log_suppressed", "Log lines dropped by the rate limit", source=lambda: log_limiter.suppressed)
+ingest_time = REGISTRY.histogram("hydro_ingest_seconds", "Time to move one drained batch into buffer, store and alerts")
+metrics_server = None  # Started by load_in_background
+METRICS_OVERLAY = [  # Metrics that don't exist in the current mode are left out
+    ("lines", "hydro_serial_lines_read_total"),
+    ("err", "hydro_serial_parse_errors_total"),
+    ("reconn", "hydro_serial_reconnects_total"),
+    ("queue", "hydro_serial_queue_depth"),
+    ("samples", "hydro_client_samples_total"),
+    ("reconn", "hydro_client_reconnects_total"),
+    ("queue", "hydro_client_queue_depth"),
+    ("ingest", "hydro_ingest_seconds"),
+    ("frame", "hydro_render_seconds", {"redraw": "blit"}),
+]
 
-# Attempt to connect to Arduino
-try:
-    arduino = serial.Serial(ARDUINO_PORT, BAUD_RATE, timeout=TIMEOUT)
-    arduino_connected = True
-except serial.SerialException:
-    arduino_connected = False
 
+# Latest-value strip above the chart, shown from the first sample on
+LABEL_FORMATS = {
+    "ph": "pH {:.2f}",
+    "water_temp": "{:.1f} °C",
+    "ec": "EC {:.2f}",
+    "tds": "TDS {:.0f}",
+    "water_level": "Level {:.2f} m",
+}
 
-def read_arduino_data():
-    """Read and parse data from Arduino."""
-    global arduino_connected
-
-    if not arduino_connected:
-        try:
-            # Try to reconnect
-            arduino.open()
-            arduino_connected = True
-        except Exception as e:
-            print(f"Error reconnecting to Arduino: {e}")
-            return  # Skip if unable to reconnect
 
+def open_history(store):
+    """The chart buffer: the collector's shared ring, or a local ring backfilled from the store."""
+    global ring_name
+    tank = None
+    if use_collector:
+        # With no tank configured, follow the one the collector names (as the client does)
+        tank = reader.wait_for_tank(TANK_TIMEOUT)
+        if tank is not None:
+            ring_name = reader.rings.get(tank, f"{config['shared_memory']['prefix']}{tank}")
+            if SharedRingReader.exists(ring_name):
+                # The collector's filtered buffer for this tank, mapped read-only: nothing to fill or backfill
+                return SharedRingReader(ring_name)
+    history = TimeSeriesRing(
+        Reading._fields,
+        capacity=BUFFER_DURATION * MAX_SAMPLE_RATE,
+        max_age=BUFFER_DURATION,
+    )
+    if use_collector and tank is None:
+        # Every tank's rows would be interleaved in one chart; start empty instead
+        log.warning("The collector has not named a tank yet; the chart starts without history")
+        return history
+    # Local history; backfill the buffer so a restart doesn't blank the chart.
+    # The collector tags rows with the tank; a standalone GUI stores them untagged.
+    stored_times, stored_values = store.query(start=time.time() - BUFFER_DURATION, tank=tank)
+    stored_values = stored_values.view(np.float64).reshape(-1, len(Reading._fields))
+    history.extend(stored_times, smoothing.apply_batch(stored_values))
+    smoothing.prime(stored_values[-32:])  # Continue the filters where the backfill ends
+    return history
+
+
+def load_in_background():
+    """
+    The slow part of startup, none of which the window needs: start the
+    metrics endpoint, import matplotlib and warm its font and text caches,
+    open the store and fill the buffer. Runs on a thread with FAST_START; only finish_startup, on
+    the Tk thread, touches widgets.
+    """
+    global store, history, own_history, startup_error, metrics_server
     try:
-        line = arduino.readline().decode("utf-8").strip()
-        print(f"Raw Arduino data: {line}")  # Debugging output
+        if METRICS_PORT:
+            metrics_server = MetricsServer(REGISTRY, port=METRICS_PORT).start()
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg  # noqa: F401 - imported for finish_startup
+        from matplotlib.figure import Figure
+        from hydro.live_plot import LiveChart  # noqa: F401
+
+        # A throwaway render loads the fonts and lays out tick labels once, off the Tk thread
+        scratch = Figure(figsize=(8, 5))
+        scratch.add_subplot().plot([0, 1], [0, 1])
+        FigureCanvasAgg(scratch).draw()
+
+        store = SensorStore(config["storage"]["path"])
+        buffer = open_history(store)
+        own_history = isinstance(buffer, TimeSeriesRing)
+        history = buffer
+    except Exception as e:
+        startup_error = e
+    finally:
+        startup_done.set()
+
+
+def finish_startup():
+    """Build the chart once load_in_background is done (polled from the Tk loop)."""
+    global fig, ax, canvas, chart, started
+    if not startup_done.is_set():
+        root.after(50, finish_startup)
+        return
+    if startup_error is not None:
+        log.warning("Chart unavailable: %s", startup_error)
+        loading_label.config(text="Chart unavailable")
+        return
+    from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+    from matplotlib.figure import Figure
+    from hydro.live_plot import LiveChart
+
+    loading_label.destroy()
+
+    fig = Figure(figsize=(8, 5))
+    ax = fig.add_subplot()
+    fig.patch.set_facecolor("black")
+    ax.set_facecolor("black")
+    canvas = FigureCanvasTkAgg(fig, master=plot_frame)
+    canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+    chart = LiveChart(ax, canvas, history_column, window=BUFFER_DURATION, fps=CHART_FPS) if LIVE_CHART else None
+    backfilled = history.latest() if own_history and use_collector else None
+    if backfilled is not None:
+        # The collector kept storing while the buffer was backfilled; those samples are in it already
+        pending[:] = [sample for sample in pending if sample[0] > backfilled[0]]
+    ingest(pending)
+    pending.clear()
+    started = True
+
+    # Default plot, unless a sensor was picked while loading
+    plot_data(*(requested_view or ("ph", "pH", (5, 8))))
+
+    # Start the live chart frame loop
+    if LIVE_CHART:
+        chart.start(root)
+    log.info("Chart ready after %.2f s", time.perf_counter() - STARTED)
 
-        # Ensure the line has valid data
-        if not line or ":" not in line or "," not in line:
-            print(f"Skipping malformed line: {line}")
-            return
 
-        # Parse the line into a dictionary
-        try:
-            data = dict(item.split(":") for item in line.split(","))
-        except ValueError as ve:
-            print(f"Error parsing line: {line}, Error: {ve}")
-            return
+def read_arduino_data():
+    """Move samples parsed by the reader thread into the buffer."""
+    try:
+        samples = reader.drain()
+        if samples:
+            show_latest(samples[-1][1])
+            if started:
+                ingest(samples)
+            elif startup_error is None:
+                pending.extend(samples)  # Until the buffer is backfilled
+    except Exception as e:
+        log.warning("Error reading samples: %s", e)
+
+    root.after(READ_INTERVAL_MS, read_arduino_data)
 
-        # Update the buffer
-        timestamp = datetime.now()
-        timestamps.append(timestamp)
-        for key in buffer.keys():
-            if key in data:
+
+def ingest(samples):
+    with ingest_time.time():
+        for timestamp, data in samples:
+            filtered = smoothing(data)
+            if own_history:
                 try:
-                    buffer[key].append(float(data[key]))
+                    history.append(timestamp, filtered)
                 except ValueError:
-                    print(f"Invalid value for {key}: {data[key]}")
-            else:
-                print(f"No data for {key} in line: {line}")
+                    # Older than the chart's newest sample (e.g. the clock stepped back); still stored
+                    log.warning("Out-of-order sample at %.3f left off the chart", timestamp)
+            if not use_collector:
+                store.add(timestamp, data)
+            alerts.process(timestamp, data)  # Raw values, as in the collector: the spike and flatline rules need them
 
-        # Maintain buffer size
-        cutoff = timestamp - timedelta(seconds=BUFFER_DURATION)
-        while timestamps and timestamps[0] < cutoff:
-            timestamps.pop(0)
-            for key in buffer:
-                buffer[key].pop(0)
 
-        print(f"Buffer for pH: {buffer['pH']}")  # Debugging output
+def show_latest(data):
+    for name, value in data._asdict().items():
+        if not math.isnan(value):  # Keep the last good value on screen
+            value_labels[name].config(text=LABEL_FORMATS[name].format(value))
 
-    except Exception as e:
-        print(f"Error reading from Arduino: {e}")
-        arduino_connected = False
 
-
-def moving_average(data, window_size=4):
-    """Calculate the moving average with a given window size."""
-    return np.convolve(data, np.ones(window_size) / window_size, mode="valid")
+def history_column(name, start=None, end=None):
+    return history.column(name, start, end)
 
 
 def resample_data(times, data, interval_seconds):
-    """Resample data to a specific interval for consistent plotting."""
-    if not times or not data or len(times) != len(data):
-        print("Error: Times and data length mismatch or insufficient data.")
-        return [], []
-
-    start_time = times[0]
-    end_time = times[-1]
+    """Bin epoch-second data (already filtered at ingest) for consistent plotting."""
+    return resample(times, data, interval_seconds, mode="bin")
 
-    # Resample timestamps
-    resampled_times = [
-        start_time + timedelta(seconds=i)
-        for i in range(0, int((end_time - start_time).total_seconds()), interval_seconds)
-    ]
-
-    # Apply moving average and downsample data
-    try:
-        smoothed_data = moving_average(data, window_size=4)  # Smoothing
-        if len(smoothed_data) < len(resampled_times):
-            print("Error: Smoothed data shorter than resampled times.")
-            return [], []
-
-        resampled_data = np.interp(
-            [t.timestamp() for t in resampled_times],
-            [t.timestamp() for t in times[:len(smoothed_data)]],
-            smoothed_data,
-        )
-    except Exception as e:
-        print(f"Error during resampling: {e}")
-        return [], []
-
-    return resampled_times, resampled_data
 
 def plot_data(sensor_name, ylabel, y_range, interval_seconds=300):
     """Fetch, resample, and plot data for a specific sensor."""
+    global requested_view
+    if not started:
+        requested_view = (sensor_name, ylabel, y_range)  # Shown by finish_startup
+        return
+    if LIVE_CHART:
+        chart.show(sensor_name, ylabel, y_range)
+        return
+
+    from matplotlib.dates import DateFormatter, MinuteLocator
+    from hydro.live_plot import to_plot_dates
+
     try:
         ax.clear()
 
-        times = timestamps
-        data = buffer.get(sensor_name, [])
+        times, data = history_column(sensor_name)
 
-        if not times or not data:
-            print(f"No data available for {sensor_name}.")
+        if np.all(np.isnan(data)):
+            log.info("No data available for %s.", sensor_name)
             ax.text(0.5, 0.5, "No Data Available", fontsize=16, color="white", ha="center", transform=ax.transAxes)
             canvas.draw()
             return
 
         # Resample data
         resampled_times, resampled_data = resample_data(times, data, interval_seconds)
-        if not resampled_times or not resampled_data:
-            print(f"Resampling failed for {sensor_name}.")
+        if len(resampled_times) == 0 or len(resampled_data) == 0:
+            log.warning("Resampling failed for %s.", sensor_name)
             ax.text(0.5, 0.5, "Error Resampling Data", fontsize=16, color="white", ha="center", transform=ax.transAxes)
             canvas.draw()
             return
 
         # Plot data
-        ax.plot(resampled_times, resampled_data, 'o-', color="white")
+        ax.plot(to_plot_dates(resampled_times), resampled_data, 'o-', color="white")
 
         # Configure grid and ticks
         ax.grid(which="major", color="white", linestyle="-", linewidth=0.8)
         ax.grid(which="minor", color="lightgray", linestyle="--", linewidth=0.5)
-        ax.set_xlim(times[0], times[-1])
+        ax.set_xlim(*to_plot_dates([times[0], times[-1]]))
         ax.xaxis.set_major_locator(MinuteLocator(interval=15))  # Major ticks every 15 minutes
         ax.xaxis.set_minor_locator(MinuteLocator(interval=5))  # Minor ticks every 5 minutes
         ax.xaxis.set_major_formatter(DateFormatter("%H:%M"))
@@ -169,38 +315,46 @@ def plot_data(sensor_name, ylabel, y_range, interval_seconds=300):
         ax.set_ylim(y_range)
         canvas.draw()
     except Exception as e:
-        print(f"Error updating plot: {e}")
+        log.warning("Error updating plot: %s", e)
 
 def show_ph():
-    plot_data("pH", "pH", (5, 8))
+    plot_data("ph", "pH", (5, 8))
 
 
 def show_temp():
-    plot_data("Temperature", "Temperature (°C)", (15, 35))
+    plot_data("water_temp", "Temperature (°C)", (15, 35))
 
 
 def show_ec():
-    plot_data("EC", "EC (mS/cm)", (0, 3))
+    plot_data("ec", "EC (mS/cm)", (0, 3))
 
 
 def show_tds():
-    plot_data("TDS", "TDS (ppm)", (0, 600))
+    plot_data("tds", "TDS (ppm)", (0, 600))
 
 
 def show_water_level():
-    plot_data("Water Level", "Water Level (m)", (0, 1))
+    plot_data("water_level", "Water Level (m)", (0, 1))
 
 
 def close_program():
+    reader.stop()
+    if store is not None:
+        store.close()
+    if metrics_server is not None:
+        metrics_server.stop()
     root.destroy()
 
 
 def update_arduino_status():
     """Update the Arduino connection status indicator."""
-    global last_flash
+    global last_flash, history
 
     try:
-        if arduino_connected:
+        if not own_history and history is not None and not history.writer_alive() and SharedRingReader.exists(ring_name):
+            history.close()  # The collector restarted and published a new ring
+            history = SharedRingReader(ring_name)
+        if reader.connected:
             current_time = time.time()
             if last_flash is None or current_time - last_flash > 0.5:
                 light_color = "green" if status_light.cget("bg") == "black" else "black"
@@ -210,8 +364,15 @@ def update_arduino_status():
         else:
             status_light.config(bg="red")
             status_label.config(text="Arduino Disconnected", fg="white")
+        if SHOW_METRICS:
+            frame_label.config(text=REGISTRY.overlay(METRICS_OVERLAY))
+        elif chart is not None:
+            frame_label.config(text=chart.frame_report())
+
+        alerts.tick(time.time())
+        alert_label.config(text=alert_banner.text())
     except Exception as e:
-        print(f"Error updating Arduino status: {e}")
+        log.warning("Error updating Arduino status: %s", e)
 
     root.after(500, update_arduino_status)  # Update every 500ms
 
@@ -229,6 +390,21 @@ status_label = tk.Label(status_frame, text="Arduino Status", font=("Arial", 12),
 status_label.pack(side=tk.LEFT)
 status_light = tk.Label(status_frame, text="  ", bg="red", width=2, height=1)
 status_light.pack(side=tk.LEFT, padx=5)
+frame_label = tk.Label(status_frame, text="", font=("Arial", 9), fg="gray", bg="black")
+frame_label.pack(side=tk.LEFT, padx=10)
+
+# Active alerts (empty when everything is within limits)
+alert_label = tk.Label(root, text="", font=("Arial", 11, "bold"), fg="red", bg="black")
+alert_label.pack()
+
+# Latest values, available long before the chart
+values_frame = tk.Frame(root, bg="black")
+values_frame.pack()
+value_labels = {}
+for name, text in (("ph", "pH --"), ("water_temp", "-- °C"), ("ec", "EC --"), ("tds", "TDS --"),
+                   ("water_level", "Level -- m")):
+    value_labels[name] = tk.Label(values_frame, text=text, font=("Arial", 12), fg="white", bg="black")
+    value_labels[name].pack(side=tk.LEFT, padx=8)
 
 # Left frame for buttons
 button_frame = tk.Frame(root, bg="black")
@@ -256,21 +432,23 @@ close_button = tk.Button(button_frame, text="Close", font=("Arial", 12), command
                          **button_size, bg="#FF3333", fg="black")
 close_button.pack(pady=5)
 
-# Initialize matplotlib figure
-fig, ax = plt.subplots(figsize=(8, 5))
-fig.patch.set_facecolor("black")
-ax.set_facecolor("black")
-canvas = FigureCanvasTkAgg(fig, master=plot_frame)
-canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+# Placeholder until finish_startup swaps in the matplotlib canvas
+loading_label = tk.Label(plot_frame, text="Loading chart...", font=("Arial", 12), fg="gray", bg="black")
+loading_label.pack(expand=True)
 
-# Default plot
-show_ph()
+if FAST_START:
+    root.update()  # Paint the window before the background work competes for the CPU
+    log.info("Window shown after %.2f s", time.perf_counter() - STARTED)
+    threading.Thread(target=load_in_background, name="StartupLoader", daemon=True).start()
+else:
+    load_in_background()
+root.after(0, finish_startup)
 
 # Start Arduino status updates
 root.after(500, update_arduino_status)
 
-# Periodically fetch Arduino data
-root.after(1000, read_arduino_data)
+# Periodically move Arduino data into the buffer
+root.after(READ_INTERVAL_MS, read_arduino_data)
 
 # Run the main loop
 root.mainloop()
\ No newline at end of file
@@ -0,0 +1,57 @@
+import math
+
+from hydro.protocol import Reading
+
+
+class IntervalAggregator:
+    """
+    Accumulate readings over a sampling interval.
+
+    Keeps count, sum, min, max and last value per field in O(1) per sample;
+    NaN values (missing or rejected) are skipped.
+    """
+
+    def __init__(self, fields=Reading._fields):
+        self.fields = tuple(fields)
+        self.reset()
+
+    def reset(self):
+        n = len(self.fields)
+        self.samples = 0
+        self._count = [0] * n
+        self._sum = [0.0] * n
+        self._min = [math.inf] * n
+        self._max = [-math.inf] * n
+        self._last = [math.nan] * n
+
+    def add(self, reading):
+        """Add one reading (a sequence in ``fields`` order)."""
+        self.samples += 1
+        for i, value in enumerate(reading):
+            if value != value:  # NaN
+                continue
+            self._count[i] += 1
+            self._sum[i] += value
+            if value < self._min[i]:
+                self._min[i] = value
+            if value > self._max[i]:
+                self._max[i] = value
+            self._last[i] = value
+
+    def result(self):
+        """
+        Return the interval summary as a flat document.
+
+        Each field's mean is stored under its own name, so existing readers
+        of the collection keep working, plus ``<field>_min``, ``_max`` and
+        ``_last``. Fields with no valid value in the interval are omitted.
+        """
+        document = {"samples": self.samples}
+        for i, name in enumerate(self.fields):
+            if not self._count[i]:
+                continue
+            document[name] = self._sum[i] / self._count[i]
+            document[f"{name}_min"] = self._min[i]
+            document[f"{name}_max"] = self._max[i]
+            document[f"{name}_last"] = self._last[i]
+        return document
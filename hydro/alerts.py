@@ -0,0 +1,596 @@
+"""
+Rule engine that raises and clears alerts as samples arrive.
+
+Rules are evaluated once per sample in O(1): thresholds compare the new
+value, rate-of-change rules keep running least-squares sums over a sliding
+window (evicted samples are subtracted, nothing is rescanned), and stale
+rules only record a timestamp. Drift, spike, stuck and flatline rules
+run the incremental detectors of ``hydro.drift``; ``AlertEngine.prime``
+catches them up on stored history after a restart, and their ``batch``
+method flags a whole history at once (``python -m hydro.drift``). Every
+rule supports ``min_duration`` (the condition must hold that long before
+the alert is raised); thresholds and rates also take a hysteresis band so
+a value hovering at the limit does not flap.
+
+Alerts are passed to sinks: any callable taking an ``Alert``.
+"""
+import copy
+import json
+import math
+import queue
+import threading
+from collections import deque, namedtuple
+
+import numpy as np
+
+from hydro.drift import (
+    DAY, DriftDetector, FlatlineDetector, SpikeDetector, StuckDetector, drift_batch, flatline_batch, spike_batch,
+    stuck_batch,
+)
+from hydro.log import get_logger
+from hydro.protocol import Reading
+from hydro.sampling import DEFAULT_TOLERANCES as RESOLUTION
+
+log = get_logger(__name__)
+
+Alert = namedtuple("Alert", ["timestamp", "rule", "tank", "field", "severity", "state", "value", "message"])
+
+RAISED = "raised"
+CLEARED = "cleared"
+
+
+class Rule:
+    """
+    Base class: tracks whether the rule's condition holds and emits an
+    ``Alert`` when the rule becomes active (after ``min_duration`` seconds)
+    and when it clears. Subclasses implement ``holds(timestamp, value)``.
+    """
+
+    kind = "rule"
+
+    def __init__(self, field, min_duration=0.0, severity="warning", name=None):
+        if field is not None and field not in Reading._fields:
+            raise ValueError(f"unknown field: {field}")
+        self.field = field
+        self.min_duration = min_duration
+        self.severity = severity
+        self.name = name or f"{field or 'any'}_{self.kind}"
+        self.reset()
+
+    def reset(self):
+        """Forget all state."""
+        self.active = False
+        self._since = None
+
+    def fresh(self):
+        """Return an unused copy with the same settings (one per tank)."""
+        rule = copy.copy(self)
+        rule.reset()
+        return rule
+
+    def update(self, timestamp, value, tank=None):
+        """Feed one value; returns an Alert on a state change, else None."""
+        if self.holds(timestamp, value):
+            if self.active:
+                return None
+            if self._since is None:
+                self._since = timestamp
+            if timestamp - self._since >= self.min_duration:
+                self.active = True
+                return self._alert(timestamp, value, tank, RAISED)
+            return None
+        self._since = None
+        if self.active:
+            self.active = False
+            return self._alert(timestamp, value, tank, CLEARED)
+        return None
+
+    def holds(self, timestamp, value):
+        raise NotImplementedError
+
+    def prime(self, times, values):
+        """Catch up on the field's stored history without raising alerts; most rules need none."""
+
+    def describe(self, value):
+        return f"{self.field} = {value:g}"
+
+    def _alert(self, timestamp, value, tank, state):
+        return Alert(timestamp, self.name, tank, self.field, self.severity, state, value, self.describe(value))
+
+
+class Threshold(Rule):
+    """
+    Value below ``low`` or above ``high``. Once raised, the value must come
+    back inside the limits by ``hysteresis`` before the alert clears.
+    """
+
+    kind = "threshold"
+
+    def __init__(self, field, low=None, high=None, hysteresis=0.0, **options):
+        self.low = -math.inf if low is None else low
+        self.high = math.inf if high is None else high
+        self.hysteresis = hysteresis
+        super().__init__(field, **options)
+
+    def holds(self, timestamp, value):
+        margin = self.hysteresis if self.active else 0.0
+        return value < self.low + margin or value > self.high - margin
+
+    def describe(self, value):
+        if value < self.low:
+            return f"{self.field} = {value:g} (below {self.low:g})"
+        if value > self.high:
+            return f"{self.field} = {value:g} (above {self.high:g})"
+        return f"{self.field} = {value:g} (back within limits)"
+
+
+class SlidingSlope:
+    """
+    Least-squares slope over the last ``window`` seconds, in units per hour.
+
+    Sums of t, v, t*t and t*v are updated as samples enter and leave the
+    window, with t relative to an origin that is moved forward now and then
+    to keep the sums well conditioned.
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self.slope = 0.0
+        self.count = 0
+        self.span = 0.0
+        self._samples = deque()
+        self._origin = None
+        self._st = self._sv = self._stt = self._stv = 0.0
+
+    def add(self, timestamp, value):
+        if self._origin is None or timestamp - self._origin > 16 * self.window:
+            self._rebase(timestamp)
+        samples = self._samples
+        t = timestamp - self._origin
+        samples.append((t, value))
+        st = self._st + t
+        sv = self._sv + value
+        stt = self._stt + t * t
+        stv = self._stv + t * value
+        cutoff = t - self.window
+        while samples[0][0] < cutoff:
+            old_t, old_v = samples.popleft()
+            st -= old_t
+            sv -= old_v
+            stt -= old_t * old_t
+            stv -= old_t * old_v
+        self._st, self._sv, self._stt, self._stv = st, sv, stt, stv
+
+        n = self.count = len(samples)
+        self.span = t - samples[0][0]
+        denominator = n * stt - st * st
+        if denominator > 0:
+            self.slope = (n * stv - st * sv) / denominator * 3600.0
+
+    def _rebase(self, timestamp):
+        """Recompute the sums around a new time origin."""
+        old = [(t + self._origin, v) for t, v in self._samples] if self._origin is not None else []
+        self._origin = timestamp
+        self._samples = deque()
+        self._st = self._sv = self._stt = self._stv = 0.0
+        for t, v in old:
+            t -= timestamp
+            self._samples.append((t, v))
+            self._st += t
+            self._sv += v
+            self._stt += t * t
+            self._stv += t * v
+
+
+class RateOfChange(Rule):
+    """
+    Least-squares slope over the last ``window`` seconds steeper than
+    ``max_rate`` (units per hour). Clears below ``clear_fraction`` of the
+    limit. Needs ``min_points`` samples spanning half the window first.
+
+    Inside an ``AlertEngine``, rules on the same field and window share one
+    ``SlidingSlope``, which the engine updates once per sample.
+    """
+
+    kind = "rate"
+
+    def __init__(self, field, max_rate, window=600.0, clear_fraction=0.8, min_points=3, **options):
+        self.max_rate = max_rate
+        self.window = window
+        self.clear_fraction = clear_fraction
+        self.min_points = min_points
+        super().__init__(field, **options)
+
+    def reset(self):
+        super().reset()
+        self.stats = SlidingSlope(self.window)
+        self.shared = False  # True when the engine updates ``stats``
+
+    def holds(self, timestamp, value):
+        stats = self.stats
+        if not self.shared:
+            stats.add(timestamp, value)
+        if stats.count < self.min_points or stats.span < self.window / 2:
+            return self.active
+        limit = self.max_rate * (self.clear_fraction if self.active else 1.0)
+        return abs(stats.slope) > limit
+
+    def describe(self, value):
+        return f"{self.field} changing {self.stats.slope:+.3g}/h (limit {self.max_rate:g}/h)"
+
+
+class Stale(Rule):
+    """
+    No valid value for ``timeout`` seconds (``field=None``: no sample at
+    all). Evaluated on every sample and on ``AlertEngine.tick``.
+    """
+
+    kind = "stale"
+
+    def __init__(self, field=None, timeout=60.0, **options):
+        self.timeout = timeout
+        super().__init__(field, **options)
+
+    def reset(self):
+        super().reset()
+        self.last_seen = None
+
+    def holds(self, timestamp, value):
+        if value is not None:
+            self.last_seen = timestamp
+        elif self.last_seen is None:
+            self.last_seen = timestamp  # Start counting from the first check
+        return timestamp - self.last_seen > self.timeout
+
+    def describe(self, value):
+        return f"no {self.field or 'sensor'} data for {self.timeout:g}s"
+
+
+class Drift(Rule):
+    """
+    The field's daily means moved away from a learnt baseline (EWMA chart
+    and CUSUM, see ``hydro.drift.DriftDetector``): a probe ageing, or the
+    tank really changing. Clears once a baseline at the new level has been
+    learnt. ``min_sigma`` defaults to the field's printed resolution.
+    """
+
+    kind = "drift"
+
+    def __init__(self, field, block=DAY, baseline=7, k=0.5, h=5.0, lam=0.2, limit=3.0, min_sigma=None, min_count=1,
+                 **options):
+        self.detector_options = {
+            "block": block, "baseline": baseline, "k": k, "h": h, "lam": lam, "limit": limit,
+            "min_sigma": RESOLUTION.get(field, 1e-9) if min_sigma is None else min_sigma, "min_count": min_count,
+        }
+        super().__init__(field, **options)
+
+    def reset(self):
+        super().reset()
+        self.detector = DriftDetector(**self.detector_options)
+
+    def holds(self, timestamp, value):
+        return self.detector.update(timestamp, value)
+
+    def prime(self, times, values):
+        self.detector.prime(times, values)
+
+    def batch(self, times, values):
+        """Per-sample ``holds`` over a whole history, vectorised."""
+        return drift_batch(times, values, **self.detector_options)
+
+    def describe(self, value):
+        detector = self.detector
+        if detector.drifting:
+            return f"{self.field} drifting {detector.shift:+.3g} from its baseline of {detector.last_reference:.3g}"
+        return f"{self.field} settled at a new baseline of {detector.reference[0]:.3g}"
+
+
+class Spike(Rule):
+    """
+    At least ``count`` spikes (``hydro.drift.SpikeDetector`` over ``window``
+    samples) within ``period`` seconds: a loose connector or failing probe
+    rather than the odd glitch the display filters hide anyway.
+    ``min_deviation`` defaults to five times the printed resolution.
+    """
+
+    kind = "spike"
+
+    def __init__(self, field, count=3, period=600.0, window=9, n_sigmas=3.0, min_deviation=None, **options):
+        self.count = count
+        self.period = period
+        self.detector_options = {
+            "window": window, "n_sigmas": n_sigmas,
+            "min_deviation": 5 * RESOLUTION.get(field, 0.0) if min_deviation is None else min_deviation,
+        }
+        super().__init__(field, **options)
+
+    def reset(self):
+        super().reset()
+        self.detector = SpikeDetector(**self.detector_options)
+        self.spikes = deque()  # Times of the spikes in the last ``period``
+
+    def holds(self, timestamp, value):
+        if value != value:
+            return False
+        spikes = self.spikes
+        if self.detector.update(timestamp, value):
+            spikes.append(timestamp)
+        while spikes and spikes[0] <= timestamp - self.period:
+            spikes.popleft()
+        return len(spikes) >= self.count
+
+    def prime(self, times, values):
+        times = np.asarray(times, dtype=float)
+        recent = times > times[-1] - self.period if len(times) else times.astype(bool)
+        flags = spike_batch(values[recent], **self.detector_options)
+        self.spikes.extend(times[recent][flags].tolist())
+        self.detector.prime(times, values)
+
+    def batch(self, times, values):
+        times = np.asarray(times, dtype=float)
+        spike_times = times[spike_batch(values, **self.detector_options)]
+        recent = np.searchsorted(spike_times, times, "right") - np.searchsorted(spike_times, times - self.period, "right")
+        return (recent >= self.count) & ~np.isnan(values)
+
+    def describe(self, value):
+        return f"{self.field}: {len(self.spikes)} spikes in {self.period:g}s (latest {value:g})"
+
+
+class Stuck(Rule):
+    """The field reported exactly the same value for ``duration`` seconds (``hydro.drift.StuckDetector``)."""
+
+    kind = "stuck"
+
+    def __init__(self, field, duration=3600.0, **options):
+        self.duration = duration
+        super().__init__(field, **options)
+
+    def reset(self):
+        super().reset()
+        self.detector = StuckDetector(self.duration)
+
+    def holds(self, timestamp, value):
+        return self.detector.update(timestamp, value)
+
+    def prime(self, times, values):
+        self.detector.prime(times, values)
+
+    def batch(self, times, values):
+        return stuck_batch(times, values, self.duration)
+
+    def describe(self, value):
+        return f"{self.field} stuck at {value:g} for {self.duration:g}s or more"
+
+
+class Flatline(Rule):
+    """
+    The field's sample-to-sample noise fell below ``ratio`` of its usual
+    level for ``duration`` seconds (``hydro.drift.FlatlineDetector``).
+    """
+
+    kind = "flatline"
+
+    def __init__(self, field, ratio=0.1, duration=1800.0, span=300, baseline_span=86400, warmup=None, **options):
+        self.detector_options = {
+            "ratio": ratio, "duration": duration, "span": span, "baseline_span": baseline_span, "warmup": warmup,
+        }
+        super().__init__(field, **options)
+
+    def reset(self):
+        super().reset()
+        self.detector = FlatlineDetector(**self.detector_options)
+
+    def holds(self, timestamp, value):
+        return self.detector.update(timestamp, value)
+
+    def prime(self, times, values):
+        self.detector.prime(times, values)
+
+    def batch(self, times, values):
+        return flatline_batch(times, values, **self.detector_options)
+
+    def describe(self, value):
+        return f"{self.field} flatlined at {value:g} (noise under {self.detector.ratio:g} of normal)"
+
+
+RULE_TYPES = {cls.kind: cls for cls in (Threshold, RateOfChange, Stale, Drift, Spike, Stuck, Flatline)}
+
+# The ranges the dashboard draws, plus the checks growers asked for
+DEFAULT_RULES = [
+    {"type": "threshold", "field": "ph", "low": 5.0, "high": 8.0, "hysteresis": 0.1, "min_duration": 60},
+    {"type": "threshold", "field": "water_temp", "low": 15.0, "high": 30.0, "hysteresis": 0.5, "min_duration": 60},
+    {"type": "threshold", "field": "water_level", "low": 0.2, "hysteresis": 0.02, "min_duration": 30,
+     "severity": "critical"},
+    {"type": "rate", "field": "ph", "max_rate": 0.5, "window": 1800},
+    {"type": "stale", "timeout": 60, "severity": "critical"},
+    {"type": "drift", "field": "ph"},
+    {"type": "drift", "field": "ec"},
+    {"type": "spike", "field": "ph"},
+    {"type": "stuck", "field": "ph"},
+    {"type": "stuck", "field": "ec"},
+    {"type": "flatline", "field": "ph"},
+]
+
+
+def rules_from_config(config):
+    """Build rules from dicts such as ``{"type": "threshold", "field": "ph", "low": 5.5}``."""
+    rules = []
+    for entry in config:
+        options = dict(entry)
+        kind = options.pop("type")
+        if kind not in RULE_TYPES:
+            raise ValueError(f"unknown rule type: {kind}")
+        rules.append(RULE_TYPES[kind](**options))
+    return rules
+
+
+class AlertEngine:
+    """
+    Evaluates rules on every sample and dispatches state changes to sinks.
+
+    Rules are indexed by field, so a sample only touches the rules for the
+    fields it carries, and rate rules share one sliding window per field and
+    window length. Each tank gets its own copy of every rule.
+
+    Usage:
+        banner = BannerSink()
+        engine = AlertEngine(rules_from_config(DEFAULT_RULES), sinks=[print_sink, banner])
+        engine.process(timestamp, reading)  # From the sample loop
+        engine.tick(time.time())  # Periodically, for stale-sensor rules
+    """
+
+    def __init__(self, rules, sinks=()):
+        self.rules = list(rules)
+        self.sinks = list(sinks)
+        self.evaluations = 0
+        self._tanks = {}
+
+    def process(self, timestamp, reading, tank=None):
+        """Evaluate one sample; returns the alerts it raised or cleared."""
+        by_field, any_field, windows = self._rules_for(tank)
+        alerts = []
+        for field, value in zip(Reading._fields, reading):
+            if value != value:  # NaN: the sensor gave nothing usable
+                continue
+            for window in windows[field]:
+                window.add(timestamp, value)
+            for rule in by_field[field]:
+                alert = rule.update(timestamp, value, tank)
+                if alert is not None:
+                    alerts.append(alert)
+            self.evaluations += len(by_field[field])
+        for rule in any_field:
+            alert = rule.update(timestamp, 0.0, tank)
+            if alert is not None:
+                alerts.append(alert)
+        self.evaluations += len(any_field)
+        self._dispatch(alerts)
+        return alerts
+
+    def prime(self, times, values, tank=None):
+        """
+        Catch ``tank``'s rules up on stored samples (``values`` an (n, 5)
+        array in ``Reading`` order), e.g. after a restart, so drift
+        baselines and fault timers carry on; no alerts are raised.
+        """
+        by_field, _, _ = self._rules_for(tank)
+        values = np.asarray(values, dtype=float).reshape(-1, len(Reading._fields))
+        for column, field in enumerate(Reading._fields):
+            for rule in by_field[field]:
+                rule.prime(times, values[:, column])
+
+    def tick(self, now):
+        """Check stale-sensor rules of every tank without a new sample."""
+        alerts = []
+        for tank, (by_field, any_field, _) in self._tanks.items():
+            for rules in (*by_field.values(), any_field):
+                for rule in rules:
+                    if isinstance(rule, Stale):
+                        alert = rule.update(now, None, tank)
+                        if alert is not None:
+                            alerts.append(alert)
+        self._dispatch(alerts)
+        return alerts
+
+    def active(self):
+        """Currently active ``(tank, rule)`` pairs."""
+        return [
+            (tank, rule)
+            for tank, (by_field, any_field, _) in self._tanks.items()
+            for rules in (*by_field.values(), any_field)
+            for rule in rules if rule.active
+        ]
+
+    def _rules_for(self, tank):
+        rules = self._tanks.get(tank)
+        if rules is None:
+            by_field = {field: [] for field in Reading._fields}
+            any_field = []
+            shared = {}  # (field, window) -> SlidingSlope
+            for template in self.rules:
+                rule = template.fresh()
+                (any_field if rule.field is None else by_field[rule.field]).append(rule)
+                if isinstance(rule, RateOfChange):
+                    key = (rule.field, rule.window)
+                    rule.stats = shared.setdefault(key, rule.stats)
+                    rule.shared = True
+            windows = {field: [stats for (f, _), stats in shared.items() if f == field] for field in Reading._fields}
+            rules = self._tanks[tank] = (by_field, any_field, windows)
+        return rules
+
+    def _dispatch(self, alerts):
+        for alert in alerts:
+            for sink in self.sinks:
+                try:
+                    sink(alert)
+                except Exception as e:
+                    log.warning("Error in alert sink %r: %s", sink, e)
+
+
+def print_sink(alert):
+    """Print alerts to the console/journal."""
+    tank = f"[{alert.tank}] " if alert.tank is not None else ""
+    print(f"ALERT {alert.state.upper()} {tank}{alert.severity}: {alert.rule}: {alert.message}")
+
+
+class BannerSink:
+    """Keeps the active alerts for a GUI banner; call ``text()`` from the UI loop."""
+
+    def __init__(self):
+        self.alerts = {}
+
+    def __call__(self, alert):
+        key = (alert.tank, alert.rule)
+        if alert.state == RAISED:
+            self.alerts[key] = alert
+        else:
+            self.alerts.pop(key, None)
+
+    def text(self):
+        return " | ".join(alert.message for alert in self.alerts.values())
+
+
+class WebhookSink:
+    """
+    POSTs each alert as JSON to ``url`` (e.g. a local relay) from a
+    background thread, so a slow or dead endpoint never stalls sampling.
+    At most ``maxsize`` alerts wait; further ones are dropped and counted.
+    """
+
+    def __init__(self, url, timeout=5.0, maxsize=100):
+        self.url = url
+        self.timeout = timeout
+        self.dropped = 0
+        self.failed = 0
+        self._queue = queue.Queue(maxsize)
+        self._thread = threading.Thread(target=self._run, name="WebhookSink", daemon=True)
+        self._thread.start()
+
+    def __call__(self, alert):
+        try:
+            self._queue.put_nowait(alert)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self, timeout=None):
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _run(self):
+        import urllib.request  # Here rather than at the top: it is slow to import and only webhooks need it
+
+        while True:
+            alert = self._queue.get()
+            if alert is None:
+                return
+            request = urllib.request.Request(
+                self.url,
+                data=json.dumps(alert._asdict()).encode("utf-8"),
+                headers={"Content-Type": "application/json"},
+                method="POST",
+            )
+            try:
+                urllib.request.urlopen(request, timeout=self.timeout).close()
+            except OSError as e:
+                self.failed += 1
+                log.warning("Error posting alert to %s: %s", self.url, e)
@@ -0,0 +1,343 @@
+"""
+Columnar archive of sensor history: one file per tank per UTC day.
+
+    archive_dir/
+        manifest.json               per-file row groups: time range, rows, column min/max
+        tank1/2024-05-01.parquet    (.npz when pyarrow is not installed)
+        untagged/2024-05-01.parquet rows without a tank ID
+
+Each day is split into hourly row groups. With pyarrow (optional) files are
+Parquet, zstd-compressed with dictionary encoding and footer statistics, so
+other tools (pandas, DuckDB, Spark) read them directly. Without it they are
+compressed ``.npz`` files with one member per column per row group.
+
+Either way ``load`` prunes on the manifest before opening anything: whole
+files by tank and day, row groups by time and by the min/max of any column
+in ``where``; then only the requested columns of the surviving groups are
+read. A month of one tank at 1 Hz loads in well under a second.
+
+Export is incremental and idempotent: each run rewrites the newest archived
+day (which may have been partial) and adds the days after it. A day file is
+never replaced by one with fewer rows, so re-exporting after
+``SensorStore.compact`` has downsampled old data cannot lose resolution.
+
+Usage:
+    python -m hydro.archive export [--db hydroponics_data.db] [--archive archive/] [--start 2024-05-01]
+    python -m hydro.archive info [--archive archive/]
+"""
+import argparse
+import json
+import os
+from datetime import datetime, timezone
+
+import numpy as np
+
+from hydro.protocol import Reading
+from hydro.storage import DEFAULT_DB_PATH, SensorStore
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+DEFAULT_ARCHIVE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "archive")
+DAY = 86400
+ROW_GROUP_SECONDS = 3600
+UNTAGGED = "untagged"  # Directory for rows stored without a tank ID
+COLUMNS = ("timestamp",) + Reading._fields
+
+
+class SensorArchive:
+    """
+    Usage:
+        archive = SensorArchive("archive")
+        archive.export(SensorStore())  # Nightly, e.g. from cron
+        columns = archive.load(start, end, columns=["ph"], tank="tank1", where={"ph": (None, 5.5)})
+        columns["timestamp"], columns["ph"]
+
+    ``format`` is "parquet" or "npz"; by default Parquet if pyarrow is
+    installed. Files of both formats can coexist in one archive.
+    """
+
+    def __init__(self, path=DEFAULT_ARCHIVE_DIR, format=None):
+        if format is None:
+            format = "parquet" if pq is not None else "npz"
+        if format == "parquet" and pq is None:
+            raise ValueError("the parquet format needs pyarrow (pip install pyarrow)")
+        if format not in ("parquet", "npz"):
+            raise ValueError(f"unknown archive format {format!r}")
+        self.path = os.path.expanduser(path)
+        self.format = format
+        os.makedirs(self.path, exist_ok=True)
+        self.manifest = self._read_manifest()
+
+    # -- Writing ---------------------------------------------------------
+
+    def export(self, store, start=None, end=None):
+        """
+        Archive the store's rows in [start, end] (epoch seconds), one UTC day
+        at a time so memory stays bounded. Returns the number of rows written.
+        """
+        span = store.time_range()
+        if span is None:
+            return 0
+        if start is None:
+            days = [entry["day"] for entry in self.manifest["files"].values()]
+            start = max(days) * DAY if days else span[0]
+        end = span[1] if end is None else end
+        written = 0
+        for day in range(int(start // DAY), int(end // DAY) + 1):
+            for tank, (times, values) in store.query_by_tank(day * DAY, (day + 1) * DAY).items():
+                keep = times < (day + 1) * DAY  # Midnight belongs to the next day
+                written += self.write_day(tank, times[keep], values[keep])
+        return written
+
+    def write_day(self, tank, times, values):
+        """
+        Write one tank's samples for one UTC day, replacing the day's file
+        unless it already holds more rows. ``values`` is a READING_DTYPE
+        array or shape (n, 5). Returns the number of rows written.
+        """
+        if len(times) == 0:
+            return 0
+        day = int(times[0] // DAY)
+        if int(times[-1] // DAY) != day:
+            raise ValueError("samples span more than one UTC day")
+        key = f"{_tank_dir(tank)}/{_day_name(day)}"
+        existing = self.manifest["files"].get(key)
+        if existing is not None and existing["rows"] > len(times):
+            return 0
+
+        columns = {"timestamp": np.asarray(times, dtype=float)}
+        table = _as_columns(values)
+        columns.update((name, table[:, i]) for i, name in enumerate(Reading._fields))
+        bounds = _group_bounds(columns["timestamp"])
+        groups = [_group_stats(columns, lo, hi) for lo, hi in bounds]
+
+        extension = ".parquet" if self.format == "parquet" else ".npz"
+        relative = key + extension
+        path = os.path.join(self.path, relative)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp"
+        if self.format == "parquet":
+            _write_parquet(tmp, columns, bounds)
+        else:
+            _write_npz(tmp, columns, bounds)
+        os.replace(tmp, path)
+        if existing is not None and existing["file"] != relative:
+            os.remove(os.path.join(self.path, existing["file"]))  # Format changed
+
+        self.manifest["files"][key] = {
+            "tank": tank, "day": day, "file": relative, "rows": len(times), "groups": groups,
+        }
+        self._write_manifest()
+        return len(times)
+
+    # -- Reading ---------------------------------------------------------
+
+    def load(self, start=None, end=None, columns=None, tank=None, where=None):
+        """
+        Return archived samples as ``{column: array}`` sorted by timestamp,
+        like ``FirestoreCache.load``. Loading every tank adds a "tank"
+        object array.
+
+        Args:
+            start, end (float): Epoch-second bounds, inclusive.
+            columns (iterable): Reading fields to return (default all);
+                "timestamp" always comes back.
+            tank: One tank ID (None: every tank; ``UNTAGGED``: untagged rows).
+            where (dict): ``{field: (low, high)}`` inclusive value ranges,
+                either end None for open; rows with NaN in a field fail it.
+        """
+        columns = list(Reading._fields if columns is None else columns)
+        where = where or {}
+        wanted = list(dict.fromkeys(["timestamp"] + columns + list(where)))
+        parts = []
+        for entry in self._select_files(start, end, tank):
+            indices = [
+                i for i, group in enumerate(entry["groups"])
+                if _group_matches(group, start, end, where)
+            ]
+            if not indices:
+                continue
+            data = self._read_groups(entry, indices, wanted)
+            parts.append((entry["tank"], data))
+
+        result = {name: np.concatenate([data[name] for _, data in parts]) if parts else np.empty(0)
+                  for name in wanted}
+        if tank is None:
+            result["tank"] = np.repeat(
+                np.array([tank_id for tank_id, _ in parts], dtype=object),
+                [len(data["timestamp"]) for _, data in parts],
+            )
+        keep = np.ones(len(result["timestamp"]), dtype=bool)
+        if start is not None:
+            keep &= result["timestamp"] >= start
+        if end is not None:
+            keep &= result["timestamp"] <= end
+        for name, (low, high) in where.items():
+            values = result[name]
+            if low is not None:
+                keep &= values >= low
+            if high is not None:
+                keep &= values <= high
+            if low is None and high is None:
+                keep &= ~np.isnan(values)
+        result = {
+            name: values if keep.all() else values[keep]
+            for name, values in result.items()
+            if name in ("timestamp", "tank") or name in columns
+        }
+        times = result["timestamp"]
+        if np.any(times[1:] < times[:-1]):  # Several tanks interleave; one tank's days are already in order
+            order = np.argsort(times, kind="stable")
+            result = {name: values[order] for name, values in result.items()}
+        return result
+
+    def tanks(self):
+        return sorted({entry["tank"] for entry in self.manifest["files"].values()}, key=lambda tank: (tank is not None, tank))
+
+    def info(self):
+        """Summary per tank: files, rows, first and last day, bytes on disk."""
+        summary = {}
+        for entry in self.manifest["files"].values():
+            item = summary.setdefault(entry["tank"], {"files": 0, "rows": 0, "first": None, "last": None, "bytes": 0})
+            item["files"] += 1
+            item["rows"] += entry["rows"]
+            item["bytes"] += os.path.getsize(os.path.join(self.path, entry["file"]))
+            name = _day_name(entry["day"])
+            item["first"] = name if item["first"] is None else min(item["first"], name)
+            item["last"] = name if item["last"] is None else max(item["last"], name)
+        return summary
+
+    def _select_files(self, start, end, tank):
+        first = None if start is None else int(start // DAY)
+        last = None if end is None else int(end // DAY)
+        for entry in sorted(self.manifest["files"].values(), key=lambda entry: entry["day"]):
+            if tank is not None and _tank_dir(entry["tank"]) != _tank_dir(tank):
+                continue
+            if (first is not None and entry["day"] < first) or (last is not None and entry["day"] > last):
+                continue
+            yield entry
+
+    def _read_groups(self, entry, indices, names):
+        path = os.path.join(self.path, entry["file"])
+        if entry["file"].endswith(".parquet"):
+            if pq is None:
+                raise RuntimeError(f"{path} is Parquet; install pyarrow to read it")
+            table = pq.ParquetFile(path).read_row_groups(indices, columns=names)
+            return {name: table.column(name).to_numpy() for name in names}
+        with np.load(path) as data:
+            return {name: np.concatenate([data[f"{name}.{i}"] for i in indices]) for name in names}
+
+    def _read_manifest(self):
+        path = os.path.join(self.path, "manifest.json")
+        if not os.path.exists(path):
+            return {"version": 1, "files": {}}
+        with open(path) as f:
+            return json.load(f)
+
+    def _write_manifest(self):
+        path = os.path.join(self.path, "manifest.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump(self.manifest, f)
+        os.replace(path + ".tmp", path)
+
+
+def _as_columns(values):
+    values = np.asarray(values)
+    if values.dtype.names:
+        return np.column_stack([values[name] for name in Reading._fields]).astype(float)
+    return values.astype(float).reshape(-1, len(Reading._fields))
+
+
+def _group_bounds(times):
+    """Row ranges of the hourly row groups of one (sorted) day."""
+    hours = (times // ROW_GROUP_SECONDS).astype(np.int64)
+    edges = np.flatnonzero(np.diff(hours)) + 1
+    starts = np.concatenate([[0], edges])
+    ends = np.concatenate([edges, [len(times)]])
+    return list(zip(starts.tolist(), ends.tolist()))
+
+
+def _group_stats(columns, lo, hi):
+    stats = {"start": float(columns["timestamp"][lo]), "end": float(columns["timestamp"][hi - 1]),
+             "rows": hi - lo, "min": {}, "max": {}}
+    for name in Reading._fields:
+        values = columns[name][lo:hi]
+        valid = values[~np.isnan(values)]
+        # JSON has no NaN; an all-missing column has no range and matches no value filter
+        stats["min"][name] = float(valid.min()) if len(valid) else None
+        stats["max"][name] = float(valid.max()) if len(valid) else None
+    return stats
+
+
+def _group_matches(group, start, end, where):
+    if (start is not None and group["end"] < start) or (end is not None and group["start"] > end):
+        return False
+    for name, (low, high) in where.items():
+        if group["min"][name] is None:
+            return False
+        if (low is not None and group["max"][name] < low) or (high is not None and group["min"][name] > high):
+            return False
+    return True
+
+
+def _write_parquet(path, columns, bounds):
+    schema = pa.schema([(name, pa.float64()) for name in COLUMNS])
+    with pq.ParquetWriter(path, schema, compression="zstd", write_statistics=True) as writer:
+        for lo, hi in bounds:
+            writer.write_table(pa.table({name: columns[name][lo:hi] for name in COLUMNS}, schema=schema))
+
+
+def _write_npz(path, columns, bounds):
+    arrays = {f"{name}.{i}": columns[name][lo:hi] for i, (lo, hi) in enumerate(bounds) for name in COLUMNS}
+    with open(path, "wb") as f:  # A file object, so savez doesn't append ".npz" to the temporary name
+        np.savez_compressed(f, **arrays)
+
+
+def _tank_dir(tank):
+    return UNTAGGED if tank is None else str(tank).replace(os.sep, "_")
+
+
+def _day_name(day):
+    return datetime.fromtimestamp(day * DAY, timezone.utc).strftime("%Y-%m-%d")
+
+
+def _parse_day(text):
+    return datetime.strptime(text, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export sensor history to a columnar archive")
+    parser.add_argument("--archive", default=DEFAULT_ARCHIVE_DIR, help="Archive directory")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export", help="Archive new rows from the database")
+    export_parser.add_argument("--db", default=DEFAULT_DB_PATH)
+    export_parser.add_argument("--start", default=None, help="First UTC day (YYYY-MM-DD); default: resume")
+    export_parser.add_argument("--end", default=None, help="Last UTC day (YYYY-MM-DD); default: today")
+    export_parser.add_argument("--format", choices=("parquet", "npz"), default=None)
+
+    commands.add_parser("info", help="Summarise the archive")
+
+    args = parser.parse_args()
+    if args.command == "export":
+        archive = SensorArchive(args.archive, args.format)
+        store = SensorStore(args.db)
+        try:
+            start = _parse_day(args.start) if args.start else None
+            end = _parse_day(args.end) + DAY - 1e-6 if args.end else None
+            rows = archive.export(store, start, end)
+        finally:
+            store.close()
+        print(f"{rows} rows archived as {archive.format} in {archive.path}")
+    else:
+        for tank, item in SensorArchive(args.archive).info().items():
+            print(f"{_tank_dir(tank)}: {item['files']} days ({item['first']} to {item['last']}), "
+                  f"{item['rows']} rows, {item['bytes'] / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
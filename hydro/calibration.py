@@ -0,0 +1,469 @@
+"""
+Host-side calibration of the analogue probes.
+
+In raw mode (``MODE RAW``) stream2pi.ino sends probe voltages rather than
+pH/EC/TDS, so the board skips the float maths and coefficients change
+without reflashing. This module turns those ``RawReading``s into
+``Reading``s with NumPy over whole batches, whether it is a few live samples
+or years of stored history:
+
+    ph   PHProbe          pH = 7 + slope * (V - v7), as calibratePH.ino,
+                          optionally with Nernst temperature compensation
+    ec   ECProbe          DFRobot_EC.readEC: two-range K value, 25 °C referred
+    tds  ECFactorProbe    EC * factor, as stream2pi.ino (no TDS probe)
+         PolynomialProbe  polynomial in the compensated voltage, as
+                          TDS_sample.ino for a DFRobot TDS probe
+
+Coefficients are versioned per tank in a JSON ``CalibrationBook``
+(calibration.json by default). A version applies from its ``valid_from``
+time until the next one, so a probe recalibrated today can be backdated
+to when it was last known good, and ``reprocess`` rewrites the stored
+history from the raw voltages kept beside it (``SensorStore`` stores them
+for every raw sample):
+
+    book = CalibrationBook()
+    book.add("tank1", {"ph": PHProbe.from_points([(1.916, 7.0), (1.670, 4.0)])}, note="buffers 4/7")
+    book.reprocess(store, "tank1")
+
+Until its first version of its own, a tank uses those under ``"*"``, and
+before any version the constants the sketches have hardcoded apply, so a
+board switched to raw mode reads the same as before.
+
+The collector reads the book when it starts: after adding a version,
+restart it (``systemctl restart hydro-collector``) or live samples keep
+the old coefficients. ``reprocess`` rewrites one day of history per
+transaction, so it can run while the collector is writing.
+
+Usage: python -m hydro.calibration show | add TANK [--ph-points V:PH ...] [--ec-k LOW HIGH] ... | reprocess [TANK]
+"""
+import argparse
+import itertools
+import json
+import os
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from hydro.log import get_logger
+from hydro.protocol import RawReading, Reading
+
+log = get_logger(__name__)
+
+DEFAULT_CALIBRATION_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "calibration.json")
+ANY_TANK = "*"
+REFERENCE_TEMP = 25.0  # °C that EC and TDS are referred to
+PROBE_FIELDS = ("ec", "tds", "ph")  # In the order they are computed: TDS may derive from EC
+REPROCESS_CHUNK = 86400  # Seconds of history rewritten per transaction by ``reprocess``
+
+_WATER_TEMP = Reading._fields.index("water_temp")
+_COLUMNS = {field: Reading._fields.index(field) for field in PROBE_FIELDS}
+_VOLTAGES = {"ec": RawReading._fields.index("ec_voltage"), "tds": RawReading._fields.index("tds_voltage"),
+             "ph": RawReading._fields.index("ph_voltage")}
+
+
+def _temperature(temperature):
+    """Water temperature with missing readings at the reference, as the sketches assume."""
+    temperature = np.asarray(temperature, dtype=float)
+    return np.where(np.isnan(temperature), REFERENCE_TEMP, temperature)
+
+
+class PHProbe:
+    """
+    Linear pH electrode: ``pH = 7 + slope * (V - v7)``, ``slope`` in pH
+    per volt at ``reference_temp``. With ``nernst=True`` the slope is
+    scaled by the absolute temperature ratio, as an electrode's output per
+    pH unit grows with temperature (calibratePH.ino does not do this).
+    """
+
+    type = "ph_linear"
+
+    def __init__(self, v7=1.916, slope=12.2, nernst=False, reference_temp=REFERENCE_TEMP):
+        self.v7 = float(v7)
+        self.slope = float(slope)
+        self.nernst = bool(nernst)
+        self.reference_temp = float(reference_temp)
+
+    @classmethod
+    def from_points(cls, points, **kwargs):
+        """Least-squares fit to ``[(voltage, pH), ...]`` buffer readings (two or more)."""
+        voltages, ph = np.array(points, dtype=float).T
+        if len(voltages) < 2 or np.ptp(voltages) == 0:
+            raise ValueError("need buffer readings at two or more different voltages")
+        slope, intercept = np.polyfit(voltages, ph, 1)
+        return cls(v7=(7.0 - intercept) / slope, slope=slope, **kwargs)
+
+    def __call__(self, voltage, temperature, ec=None):
+        slope = self.slope
+        if self.nernst:
+            slope = slope * (self.reference_temp + 273.15) / (_temperature(temperature) + 273.15)
+        return 7.0 + slope * (np.asarray(voltage, dtype=float) - self.v7)
+
+    def voltage(self, ph, temperature):
+        """The probe voltage that reads ``ph`` (for simulators and tests)."""
+        slope = self.slope
+        if self.nernst:
+            slope = slope * (self.reference_temp + 273.15) / (_temperature(temperature) + 273.15)
+        return self.v7 + (np.asarray(ph, dtype=float) - 7.0) / slope
+
+    def to_dict(self):
+        return {"type": self.type, "v7": self.v7, "slope": self.slope, "nernst": self.nernst,
+                "reference_temp": self.reference_temp}
+
+
+class ECProbe:
+    """
+    DFRobot_EC.readEC on the host: ``EC = 1000 * mV / 820 / 200 * K``,
+    referred to 25 °C with ``coefficient`` per °C. K is ``k_low`` below
+    about 2.25 mS/cm and ``k_high`` above (the library's two calibration
+    ranges). The library switches with hysteresis between 2.0 and 2.5;
+    a fixed threshold in the middle makes a sample convert the same live
+    and when reprocessed.
+    """
+
+    type = "ec_dfrobot"
+    RES2 = 820.0
+    ECREF = 200.0
+    THRESHOLD = 2.25  # mS/cm
+
+    def __init__(self, k_low=1.0, k_high=1.0, coefficient=0.0185):
+        self.k_low = float(k_low)
+        self.k_high = float(k_high)
+        self.coefficient = float(coefficient)
+
+    def __call__(self, voltage, temperature, ec=None):
+        raw = 1000.0 * np.asarray(voltage, dtype=float) * 1000.0 / self.RES2 / self.ECREF
+        k = np.where(raw * self.k_low > self.THRESHOLD, self.k_high, self.k_low)
+        return raw * k / (1.0 + self.coefficient * (_temperature(temperature) - REFERENCE_TEMP))
+
+    def voltage(self, ec, temperature):
+        compensated = np.asarray(ec, dtype=float) * (1.0 + self.coefficient * (_temperature(temperature) - REFERENCE_TEMP))
+        k = np.where(compensated > self.THRESHOLD, self.k_high, self.k_low)
+        return compensated / k * self.RES2 * self.ECREF / 1e6
+
+    def to_dict(self):
+        return {"type": self.type, "k_low": self.k_low, "k_high": self.k_high, "coefficient": self.coefficient}
+
+
+class ECFactorProbe:
+    """TDS (ppm) as ``factor`` times EC (mS/cm), as stream2pi.ino computes it; needs no probe."""
+
+    type = "ec_factor"
+
+    def __init__(self, factor=500.0):
+        self.factor = float(factor)
+
+    def __call__(self, voltage, temperature, ec=None):
+        return self.factor * ec
+
+    def to_dict(self):
+        return {"type": self.type, "factor": self.factor}
+
+
+class PolynomialProbe:
+    """
+    ``scale * polyval(coefficients, V / (1 + coefficient * (T - 25)))``;
+    the defaults are TDS_sample.ino's curve for the DFRobot TDS probe.
+    """
+
+    type = "polynomial"
+
+    def __init__(self, coefficients=(133.42, -255.86, 857.39, 0.0), scale=0.5, coefficient=0.02):
+        self.coefficients = [float(c) for c in coefficients]
+        self.scale = float(scale)
+        self.coefficient = float(coefficient)
+
+    def __call__(self, voltage, temperature, ec=None):
+        compensated = np.asarray(voltage, dtype=float) / (
+            1.0 + self.coefficient * (_temperature(temperature) - REFERENCE_TEMP)
+        )
+        return self.scale * np.polyval(self.coefficients, compensated)
+
+    def to_dict(self):
+        return {"type": self.type, "coefficients": self.coefficients, "scale": self.scale,
+                "coefficient": self.coefficient}
+
+
+PROBE_TYPES = {cls.type: cls for cls in (PHProbe, ECProbe, ECFactorProbe, PolynomialProbe)}
+
+# What stream2pi.ino computes on the board today
+DEFAULT_PROBES = {"ec": ECProbe(), "tds": ECFactorProbe(), "ph": PHProbe()}
+
+
+def probe_from_dict(settings):
+    settings = dict(settings)
+    try:
+        cls = PROBE_TYPES[settings.pop("type")]
+    except KeyError:
+        raise ValueError(f"probe type must be one of {sorted(PROBE_TYPES)}") from None
+    return cls(**settings)
+
+
+def convert(probes, raw):
+    """
+    Calibrate an (n, 5) array in ``RawReading`` order with one set of
+    ``probes``; returns an (n, 5) array in ``Reading`` order.
+    """
+    raw = np.asarray(raw, dtype=float).reshape(-1, len(RawReading._fields))
+    out = raw.copy()  # Water level and temperature pass through
+    temperature = raw[:, _WATER_TEMP]
+    for field in PROBE_FIELDS:
+        out[:, _COLUMNS[field]] = probes[field](raw[:, _VOLTAGES[field]], temperature, ec=out[:, _COLUMNS["ec"]])
+    return out
+
+
+class CalibrationBook:
+    """
+    Versioned probe coefficients per tank, kept in a JSON file.
+
+    Versions are only ever appended; ``add`` starts a new one that carries
+    over the probes it does not replace. ``apply`` converts raw samples
+    with whichever version was in effect at each sample's time.
+    """
+
+    def __init__(self, path=DEFAULT_CALIBRATION_PATH):
+        self.path = path
+        self.tanks = {}  # tank -> [version dict], oldest first
+        self._probes = {}  # Version's probe settings as JSON -> {field: probe}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.tanks = json.load(f)["tanks"]
+
+    def versions(self, tank):
+        """
+        The versions that apply to ``tank`` over time, oldest first: those
+        for any tank until the first of its own. The sketch defaults apply
+        before all of them.
+        """
+        key = _key(tank)
+        own = self.tanks.get(key, [])
+        shared = self.tanks.get(ANY_TANK, []) if key != ANY_TANK else []
+        if own:
+            shared = [version for version in shared if version["valid_from"] < own[0]["valid_from"]]
+        return shared + own
+
+    def probes(self, tank, timestamp=None):
+        """``{field: probe}`` in effect for ``tank`` at ``timestamp`` (default: now)."""
+        versions = self.versions(tank)
+        timestamp = time.time() if timestamp is None else timestamp
+        index = np.searchsorted([v["valid_from"] for v in versions], timestamp, side="right") - 1
+        return self._version_probes(versions[index] if index >= 0 else None)
+
+    def add(self, tank, probes, valid_from=None, note=""):
+        """
+        Start a new version for ``tank`` (``"*"`` for every tank without
+        its own) with ``probes`` (``{field: probe}``) replacing those of the
+        latest version, effective from ``valid_from`` (default: now).
+        Returns the version number.
+        """
+        unknown = set(probes) - set(PROBE_FIELDS)
+        if unknown:
+            raise ValueError(f"unknown probe fields: {sorted(unknown)}")
+        versions = self.versions(tank)
+        merged = dict(self._version_probes(versions[-1] if versions else None))
+        merged.update(probes)
+        own = self.tanks.setdefault(_key(tank), [])
+        version = {
+            "version": own[-1]["version"] + 1 if own else 1,
+            "valid_from": time.time() if valid_from is None else float(valid_from),
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "note": note,
+            "probes": {field: merged[field].to_dict() for field in PROBE_FIELDS},
+        }
+        own.append(version)
+        own.sort(key=lambda v: v["valid_from"])
+        self.save()
+        return version["version"]
+
+    def apply(self, tank, times, raw):
+        """
+        Calibrate ``raw`` ((n, 5) in ``RawReading`` order) sampled at
+        ``times``; returns an (n, 5) array in ``Reading`` order.
+        """
+        times = np.asarray(times, dtype=float)
+        raw = np.asarray(raw, dtype=float).reshape(-1, len(RawReading._fields))
+        versions = self.versions(tank)
+        starts = [v["valid_from"] for v in versions]
+        if not versions or (len(times) and times.min() >= starts[-1]):
+            # Live samples: all under the latest version
+            return convert(self._version_probes(versions[-1] if versions else None), raw)
+        # Split by version (-1: the defaults); history usually falls in one or two of them
+        index = np.searchsorted(starts, times, side="right") - 1
+        out = np.empty_like(raw)
+        for i in np.unique(index):
+            rows = index == i
+            out[rows] = convert(self._version_probes(versions[i] if i >= 0 else None), raw[rows])
+        return out
+
+    def reprocess(self, store, tank=None, start=None, end=None, chunk=REPROCESS_CHUNK):
+        """
+        Recompute EC, TDS and pH of stored raw samples in [start, end] with
+        the current versions, for one ``tank`` or all of them (None).
+        Returns the number of rows rewritten.
+
+        History is read and rewritten ``chunk`` seconds at a time, each in
+        its own transaction, so other writers (the collector) only wait for
+        one chunk rather than the whole history.
+        """
+        stored = store.time_range()
+        if stored is None:
+            return 0
+        first = stored[0] if start is None else max(start, stored[0])
+        last = stored[1] if end is None else min(end, stored[1])
+        counts = {}
+        window = first - first % chunk  # Aligned, so chunks rebuild whole rollup buckets
+        while window <= last:
+            window_end = min(np.nextafter(window + chunk, -np.inf), last)  # [window, window + chunk)
+            for sample_tank, (ids, times, raw) in store.query_raw(max(window, first), window_end, tank).items():
+                values = self.apply(sample_tank, times, raw)
+                store.update_values(ids, values[:, [_COLUMNS[field] for field in PROBE_FIELDS]], PROBE_FIELDS)
+                counts[sample_tank] = counts.get(sample_tank, 0) + len(ids)
+            window += chunk
+        for sample_tank, count in counts.items():
+            log.info("Recalibrated %d samples of tank %s", count, sample_tank)
+        return sum(counts.values())
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"tanks": self.tanks}, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def _version_probes(self, version):
+        if version is None:
+            return DEFAULT_PROBES
+        key = json.dumps(version["probes"], sort_keys=True)
+        probes = self._probes.get(key)
+        if probes is None:
+            probes = self._probes[key] = {
+                field: probe_from_dict(settings) for field, settings in version["probes"].items()
+            }
+        return probes
+
+
+class Calibrator:
+    """
+    Converts the ``RawReading``s in drained batches of ``(timestamp, tank,
+    reading)`` samples, one vectorised call per tank and batch; calibrated
+    ``Reading``s pass through untouched.
+
+    Usage:
+        calibrator = Calibrator(CalibrationBook())
+        for timestamp, tank, reading, raw in calibrator.calibrate(samples.drain()):
+            store.add(timestamp, reading, tank, raw)  # raw is None for calibrated boards
+    """
+
+    def __init__(self, book):
+        self.book = book
+        self.samples = 0
+
+    def calibrate(self, batch):
+        """Return ``(timestamp, tank, Reading, RawReading or None)`` for each sample, in order."""
+        out = [(timestamp, tank, reading, None) for timestamp, tank, reading in batch]
+        by_tank = {}
+        for i, (_, tank, reading, _) in enumerate(out):
+            if type(reading) is RawReading:
+                by_tank.setdefault(tank, []).append(i)
+        width = len(RawReading._fields)
+        for tank, rows in by_tank.items():
+            raws = [out[i][2] for i in rows]
+            # fromiter over the flattened tuples is several times faster than asarray on namedtuples
+            times = np.fromiter((out[i][0] for i in rows), float, len(rows))
+            raw = np.fromiter(itertools.chain.from_iterable(raws), float, len(rows) * width).reshape(-1, width)
+            values = self.book.apply(tank, times, raw)
+            for i, raw_reading, row in zip(rows, raws, values.tolist()):
+                out[i] = (out[i][0], tank, Reading._make(row), raw_reading)
+            self.samples += len(rows)
+        return out
+
+
+def _key(tank):
+    return ANY_TANK if tank is None else str(tank)
+
+
+def main():
+    from hydro.config import load_config
+    from hydro.storage import SensorStore
+
+    parser = argparse.ArgumentParser(description="Show, add or apply probe calibrations")
+    parser.add_argument("--config", default=None, help="TOML file with [calibration] and [storage] paths")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("show", help="List every tank's calibration versions")
+    add = commands.add_parser("add", help="Start a new calibration version")
+    add.add_argument("tank", help='Tank ID, or "*" for every tank without its own')
+    add.add_argument("--ph-points", nargs="+", metavar="V:PH", help="Buffer readings, e.g. 1.916:7 1.670:4")
+    add.add_argument("--ph-slope", type=float, help="pH per volt (with --ph-v7)")
+    add.add_argument("--ph-v7", type=float, help="Probe voltage at pH 7")
+    add.add_argument("--ph-nernst", action="store_true", help="Compensate the pH slope for temperature")
+    add.add_argument("--ec-k", nargs=2, type=float, metavar=("LOW", "HIGH"), help="DFRobot K values")
+    add.add_argument("--tds-factor", type=float, help="TDS = factor * EC")
+    add.add_argument("--valid-from", default=None, help="ISO time (UTC) the calibration applies from; default now")
+    add.add_argument("--note", default="")
+    add.add_argument("--reprocess", action="store_true", help="Recompute the stored history afterwards")
+    reprocess = commands.add_parser("reprocess", help="Recompute stored samples from their raw voltages")
+    reprocess.add_argument("tank", nargs="?", default=None, help="Default: every tank")
+    reprocess.add_argument("--since", default=None, help="ISO time (UTC); default: all history")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    book = CalibrationBook(config["calibration"]["path"])
+    if args.command == "show":
+        for tank, versions in sorted(book.tanks.items()):
+            for version in versions:
+                valid_from = datetime.fromtimestamp(version["valid_from"], timezone.utc).isoformat(timespec="seconds")
+                print(f"{tank} v{version['version']} from {valid_from}  {version['note']}")
+                for field, settings in version["probes"].items():
+                    print(f"    {field}: {settings}")
+        if not book.tanks:
+            print(f"No calibrations in {book.path}; the sketch defaults apply:")
+            for field, probe in DEFAULT_PROBES.items():
+                print(f"    {field}: {probe.to_dict()}")
+        return
+
+    if args.command == "add":
+        probes = {}
+        nernst = {"nernst": args.ph_nernst}
+        if args.ph_points:
+            probes["ph"] = PHProbe.from_points([point.split(":") for point in args.ph_points], **nernst)
+        elif args.ph_slope is not None or args.ph_v7 is not None:
+            current = book.probes(args.tank)["ph"]
+            probes["ph"] = PHProbe(
+                args.ph_v7 if args.ph_v7 is not None else current.v7,
+                args.ph_slope if args.ph_slope is not None else current.slope,
+                **nernst,
+            )
+        if args.ec_k:
+            probes["ec"] = ECProbe(*args.ec_k)
+        if args.tds_factor is not None:
+            probes["tds"] = ECFactorProbe(args.tds_factor)
+        if not probes:
+            parser.error("nothing to calibrate")
+        valid_from = _parse_time(args.valid_from)
+        version = book.add(args.tank, probes, valid_from, args.note)
+        print(f"{args.tank}: version {version} (restart the collector to apply it to live samples)")
+        if not args.reprocess:
+            return
+        tank, since = (None if args.tank == ANY_TANK else args.tank), valid_from
+    else:
+        tank, since = args.tank, _parse_time(args.since)
+
+    store = SensorStore(config["storage"]["path"])
+    try:
+        t0 = time.perf_counter()
+        rows = book.reprocess(store, tank, start=since)
+        print(f"Recalibrated {rows} samples in {time.perf_counter() - t0:.1f} s")
+    finally:
+        store.close()
+
+
+def _parse_time(text):
+    if text is None:
+        return None
+    moment = datetime.fromisoformat(text)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+if __name__ == "__main__":
+    main()
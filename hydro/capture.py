@@ -0,0 +1,343 @@
+"""
+Record raw serial traffic with timestamps and play it back.
+
+A capture file holds exactly the bytes the port returned (ASCII lines or
+binary frames, partial reads included) so replays exercise the same parser
+paths as the hardware:
+
+    b"HCAP1\\n"                   magic
+    one JSON line                  {"start": epoch, "port": ..., "baud_rate": ..., "tank": ...}
+    records                        <uint32 microseconds since previous record>
+                                   <uint16 length> <bytes>
+
+An hour of one board at 1 Hz is about 240 kB. Playback goes either through
+a pseudo-terminal (``ReplayArduino``, a drop-in for ``FakeArduino``) or
+straight into ``hydro.frames.StreamDecoder`` (``replay_samples``), in real
+time or at any speed-up.
+
+Usage:
+    python -m hydro.capture record /dev/ttyACM0 tank1.hcap [--seconds 3600]
+    python -m hydro.capture replay tank1.hcap [--speed 100] [--pty]
+    python -m hydro.capture info tank1.hcap
+    python -m hydro.capture convert lines.txt lines.hcap [--rate 1]
+"""
+import argparse
+import json
+import os
+import select
+import struct
+import threading
+import time
+import tty
+
+from hydro.frames import StreamDecoder
+
+MAGIC = b"HCAP1\n"
+RECORD = struct.Struct("<IH")  # Microseconds since the previous record, payload length
+MAX_DELTA = 0xFFFFFFFF  # About 71 minutes; longer gaps are bridged with empty records
+MAX_PAYLOAD = 0xFFFF
+
+
+class CaptureWriter:
+    """
+    Append timestamped chunks to a capture file.
+
+    Usage:
+        with CaptureWriter("tank1.hcap", port="/dev/ttyACM0") as capture:
+            capture.write(time.time(), port.read(port.in_waiting))
+    """
+
+    def __init__(self, path, start=None, **header):
+        self.path = path
+        self.start = time.time() if start is None else start
+        self.records = 0
+        self.bytes = 0
+        self._file = open(path, "wb")
+        self._file.write(MAGIC)
+        self._file.write(json.dumps(dict(header, start=self.start)).encode() + b"\n")
+        self._elapsed_us = 0  # Integer microseconds since ``start``, so timestamps never drift
+        self._lock = threading.Lock()
+
+    def write(self, timestamp, data):
+        """Record ``data`` (bytes) as read at ``timestamp`` (epoch seconds); safe from any thread."""
+        with self._lock:
+            elapsed_us = max(self._elapsed_us, round((timestamp - self.start) * 1e6))
+            delta = elapsed_us - self._elapsed_us
+            while delta > MAX_DELTA:
+                self._file.write(RECORD.pack(MAX_DELTA, 0))
+                delta -= MAX_DELTA
+            for offset in range(0, max(len(data), 1), MAX_PAYLOAD):
+                payload = data[offset:offset + MAX_PAYLOAD]
+                self._file.write(RECORD.pack(delta, len(payload)))
+                self._file.write(payload)
+                delta = 0
+            self._elapsed_us = elapsed_us
+            self.records += 1
+            self.bytes += len(data)
+
+    def flush(self):
+        with self._lock:
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CaptureReader:
+    """
+    Iterate ``(timestamp, data)`` over a capture file; ``header`` holds its
+    JSON header (``start``, ``port``, ``baud_rate``, ...).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a capture file")
+            self.header = json.loads(f.readline())
+            self._offset = f.tell()
+
+    def __iter__(self):
+        start = self.header["start"]
+        elapsed_us = 0
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            data = f.read()
+        offset = 0
+        end = len(data)
+        unpack = RECORD.unpack_from
+        size = RECORD.size
+        while offset + size <= end:
+            delta, length = unpack(data, offset)
+            offset += size
+            elapsed_us += delta
+            if length:
+                yield start + elapsed_us / 1e6, data[offset:offset + length]
+                offset += length
+
+    def info(self):
+        records = 0
+        total = 0
+        first = last = None
+        for timestamp, data in self:
+            records += 1
+            total += len(data)
+            if first is None:
+                first = timestamp
+            last = timestamp
+        return {
+            **self.header,
+            "records": records,
+            "bytes": total,
+            "duration": (last - first) if records else 0.0,
+        }
+
+
+def paced(chunks, speed=1.0, rebase=False):
+    """
+    Yield ``(timestamp, data)`` from ``chunks`` no faster than ``speed``
+    times real time (``speed=None``: as fast as possible). With ``rebase``
+    the timestamps are shifted so the first one is now.
+    """
+    origin = None
+    clock = None
+    offset = 0.0
+    for timestamp, data in chunks:
+        if origin is None:
+            origin = timestamp
+            clock = time.monotonic()
+            if rebase:
+                offset = time.time() - origin
+        if speed:
+            delay = clock + (timestamp - origin) / speed - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        yield timestamp + offset, data
+
+
+def replay_samples(path, speed=None, rebase=False, decoder=None):
+    """
+    Feed a capture straight into a ``StreamDecoder`` and yield
+    ``(timestamp, reading)`` samples, like ``SerialReader.drain`` would.
+    """
+    decoder = decoder or StreamDecoder()
+    for timestamp, data in paced(CaptureReader(path), speed, rebase):
+        for reading in decoder.feed(data):
+            yield timestamp, reading
+
+
+class ReplayArduino:
+    """
+    Pseudo-terminal that plays a capture back, for anything that opens a
+    serial port (``SerialReader``, ``IngestHub``, the original scripts).
+
+    ``speed`` scales the recorded timing (``None``: as fast as the reader
+    keeps up). With ``loop=True`` the capture repeats until stopped.
+    ``done`` is set once the last chunk has been written.
+
+    pyserial flushes the input when it opens a port, so call ``start`` once
+    the reader is connected or the first chunks are lost.
+
+    Usage:
+        replay = ReplayArduino("tank1.hcap", speed=100)
+        reader = SerialReader(replay.port)
+        reader.start()
+        ...  # Wait for reader.connected
+        with replay:
+            ...
+    """
+
+    def __init__(self, path, speed=1.0, loop=False):
+        self.capture = CaptureReader(path)
+        self.speed = speed
+        self.loop = loop
+        self.chunks_written = 0
+        self.bytes_written = 0
+        self.done = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)
+        self.port = os.ttyname(self._slave)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="ReplayArduino", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+        for fd in (self._master, self._slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _run(self):
+        try:
+            while not self._stop_event.is_set():
+                for _, data in paced(self.capture, self.speed):
+                    if not self._write(data):
+                        return
+                if not self.loop:
+                    break
+        except OSError:
+            pass
+        finally:
+            self.done.set()
+
+    def _write(self, data):
+        """Write all of ``data``, waiting while the reader drains the pty; False once stopped."""
+        view = memoryview(data)
+        while view:
+            if self._stop_event.is_set():
+                return False
+            if not select.select([], [self._master], [], 0.1)[1]:
+                continue
+            written = os.write(self._master, view)
+            view = view[written:]
+        self.chunks_written += 1
+        self.bytes_written += len(data)
+        return True
+
+
+def record(port, path, baud_rate=9600, seconds=None, tank=None, serial_factory=None):
+    """Copy everything read from ``port`` into a capture file until ``seconds`` pass or Ctrl+C."""
+    if serial_factory is None:
+        import serial
+
+        serial_factory = serial.Serial
+    connection = serial_factory(port, baud_rate, timeout=0.1)
+    deadline = None if seconds is None else time.monotonic() + seconds
+    with CaptureWriter(path, port=port, baud_rate=baud_rate, tank=tank) as capture:
+        try:
+            while deadline is None or time.monotonic() < deadline:
+                data = connection.read(max(1, connection.in_waiting))
+                if data:
+                    capture.write(time.time(), data)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            connection.close()
+    return capture
+
+
+def convert_lines(source, path, rate=1.0, start=None):
+    """Turn a plain text capture (one stream2pi line per row) into a capture file at ``rate`` lines/s."""
+    with open(source, "rb") as f, CaptureWriter(path, start=start, source=os.path.basename(source)) as capture:
+        for i, line in enumerate(f):
+            capture.write(capture.start + i / rate, line.rstrip(b"\r\n") + b"\r\n")
+    return capture
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record and replay raw serial captures")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    record_parser = commands.add_parser("record", help="Record a serial port")
+    record_parser.add_argument("port")
+    record_parser.add_argument("path")
+    record_parser.add_argument("--baud", type=int, default=9600)
+    record_parser.add_argument("--seconds", type=float, default=None)
+    record_parser.add_argument("--tank", default=None)
+
+    replay_parser = commands.add_parser("replay", help="Play a capture back")
+    replay_parser.add_argument("path")
+    replay_parser.add_argument("--speed", type=float, default=1.0, help="Speed-up; 0 for as fast as possible")
+    replay_parser.add_argument("--pty", action="store_true", help="Serve it on a pseudo-terminal instead of printing")
+    replay_parser.add_argument("--loop", action="store_true", help="Repeat until Ctrl+C (with --pty)")
+
+    info_parser = commands.add_parser("info", help="Summarise a capture")
+    info_parser.add_argument("path")
+
+    convert_parser = commands.add_parser("convert", help="Convert a text file of lines")
+    convert_parser.add_argument("source")
+    convert_parser.add_argument("path")
+    convert_parser.add_argument("--rate", type=float, default=1.0, help="Lines per second")
+
+    args = parser.parse_args()
+    speed = getattr(args, "speed", None) or None
+
+    if args.command == "record":
+        print(f"Recording {args.port} to {args.path}, Ctrl+C to stop")
+        capture = record(args.port, args.path, args.baud, args.seconds, args.tank)
+        print(f"{capture.records} chunks, {capture.bytes} bytes")
+    elif args.command == "info":
+        for key, value in CaptureReader(args.path).info().items():
+            print(f"{key}: {value}")
+    elif args.command == "convert":
+        capture = convert_lines(args.source, args.path, args.rate)
+        print(f"{capture.records} lines written to {args.path}")
+    elif args.pty:
+        with ReplayArduino(args.path, speed, args.loop) as replay:
+            print(f"Replaying on {replay.port}, Ctrl+C to stop")
+            try:
+                while not replay.done.wait(0.5):
+                    pass
+            except KeyboardInterrupt:
+                pass
+    else:
+        try:
+            for timestamp, reading in replay_samples(args.path, speed):
+                print(timestamp, tuple(reading))
+        except (KeyboardInterrupt, BrokenPipeError):
+            pass
+
+
+if __name__ == "__main__":
+    main()
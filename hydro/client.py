@@ -0,0 +1,199 @@
+"""
+Thin-client side of the collector socket (see hydro.collector).
+
+``CollectorClient`` has the same ``start``/``drain``/``connected``/``stats``/
+``stop`` surface as ``SerialReader``, so a GUI switches from owning the port
+to attaching to the collector by swapping one object.
+"""
+import json
+import socket
+import threading
+import time
+from collections import deque
+
+from hydro.log import get_logger
+from hydro.protocol import Reading
+
+log = get_logger(__name__)
+
+_NAN = float("nan")
+
+
+class CollectorClient(threading.Thread):
+    """
+    Background thread that follows one tank on the collector socket
+    (``tank=None``: the first one the collector reports), or every tank
+    with ``all_tanks=True``, e.g. for a multi-tank overview.
+
+    ``drain`` returns ``(timestamp, Reading)`` samples, or
+    ``(timestamp, tank, Reading)`` with ``all_tanks``. ``connected`` is
+    True while the collector is reachable and the tank's board is
+    connected. Lost connections are retried every ``reconnect_delay``
+    seconds; samples from the gap are in the collector's database.
+
+    With ``tank=None``, ``wait_for_tank`` blocks until the hello message
+    (or the first sample) names the tank being followed.
+    """
+
+    def __init__(self, path, tank=None, all_tanks=False, maxlen=1024, reconnect_delay=2.0):
+        super().__init__(name=f"CollectorClient({path})", daemon=True)
+        self.path = path
+        self.tank = tank
+        self.all_tanks = all_tanks
+        self.reconnect_delay = reconnect_delay
+        self.store_path = None
+        self.rings = {}  # tank -> shared ring name (hydro.shared_ring), as of the hello message
+        self.latest = {}  # tank -> (timestamp, Reading), from the hello message onwards
+        self.devices = {}  # tank -> status dict from the collector
+        self.attached = False
+        self._tank_known = threading.Event()
+        if tank is not None:
+            self._tank_known.set()
+
+        self._queue = deque(maxlen=maxlen)
+        self._stop_event = threading.Event()
+        self._socket = None
+
+        self.samples = 0
+        self.dropped = 0
+        self.reconnects = 0
+        self._last_sample = time.monotonic()
+
+    @staticmethod
+    def available(path):
+        """True if a collector is accepting connections at ``path``."""
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(path)
+            return True
+        except OSError:
+            return False
+        finally:
+            probe.close()
+
+    @property
+    def connected(self):
+        if not self.attached:
+            return False
+        if self.all_tanks or self.tank is None:
+            return any(status.get("state") == "connected" for status in self.devices.values())
+        return self.devices.get(self.tank, {}).get("state") == "connected"
+
+    def run(self):
+        has_attached = False
+        while not self._stop_event.is_set():
+            try:
+                self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                self._socket.connect(self.path)
+            except OSError as e:
+                log.warning("Cannot reach the collector at %s: %s", self.path, e)
+                self._close()
+                self._stop_event.wait(self.reconnect_delay)
+                continue
+            if has_attached:
+                self.reconnects += 1
+            has_attached = True
+            self.attached = True
+            try:
+                self._read()
+            except (OSError, ValueError) as e:
+                if not self._stop_event.is_set():
+                    log.warning("Lost the collector connection: %s", e)
+            finally:
+                self.attached = False
+                self._close()
+            self._stop_event.wait(self.reconnect_delay)
+
+    def stop(self, timeout=None):
+        self._stop_event.set()
+        if self._socket is not None:
+            try:
+                self._socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        if self.is_alive():
+            self.join(timeout)
+
+    def wait_for_tank(self, timeout=None):
+        """The tank being followed, after up to ``timeout`` seconds for the collector to name it (else None)."""
+        self._tank_known.wait(timeout)
+        return self.tank
+
+    def drain(self, max_items=None):
+        """Return queued samples, oldest first, without blocking."""
+        items = []
+        while self._queue and (max_items is None or len(items) < max_items):
+            try:
+                items.append(self._queue.popleft())
+            except IndexError:
+                break
+        return items
+
+    def sample_age(self):
+        return time.monotonic() - self._last_sample
+
+    def healthy(self):
+        return self.connected
+
+    def stats(self):
+        return {
+            "connected": self.connected,
+            "attached": self.attached,
+            "queue_depth": len(self._queue),
+            "samples": self.samples,
+            "dropped": self.dropped,
+            "reconnects": self.reconnects,
+            "sample_age": self.sample_age(),
+        }
+
+    def _read(self):
+        pending = b""
+        while not self._stop_event.is_set():
+            chunk = self._socket.recv(65536)
+            if not chunk:
+                raise ConnectionError("collector closed the connection")
+            *lines, pending = (pending + chunk).split(b"\n")
+            for line in lines:
+                self._handle(json.loads(line))
+
+    def _handle(self, message):
+        kind = message.get("type")
+        if kind == "sample":
+            tank = message["tank"]
+            reading = Reading._make(_NAN if value is None else value for value in message["v"])
+            self.latest[tank] = (message["t"], reading)
+            if self.all_tanks:
+                self._publish((message["t"], tank, reading))
+                return
+            if self.tank is None:
+                self.tank = tank
+                self._tank_known.set()
+            if tank == self.tank:
+                self._publish((message["t"], reading))
+        elif kind == "status":
+            self.devices = message["devices"]
+        elif kind == "hello":
+            self.store_path = message.get("store")
+            self.rings = message.get("rings", {})
+            self.latest = {
+                tank: (sample["t"], Reading._make(_NAN if value is None else value for value in sample["v"]))
+                for tank, sample in message.get("latest", {}).items()
+            }
+            if self.tank is None and not self.all_tanks and self.latest:
+                self.tank = next(iter(self.latest))
+                self._tank_known.set()
+
+    def _publish(self, item):
+        self.samples += 1
+        self._last_sample = time.monotonic()
+        if len(self._queue) == self._queue.maxlen:
+            self.dropped += 1
+        self._queue.append(item)
+
+    def _close(self):
+        if self._socket is not None:
+            try:
+                self._socket.close()
+            except OSError:
+                pass
+            self._socket = None
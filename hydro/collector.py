@@ -0,0 +1,436 @@
+"""
+Headless collector: owns the serial devices, storage, alerts and uploads.
+
+Runs as a service, independent of any window (see hydro-collector.service).
+GUIs attach as thin clients over a Unix socket (``hydro.client``), so any
+number of displays share one data stream and collection carries on when a
+GUI is closed or crashes. Each tank's recent filtered samples are also
+published in shared memory (``hydro.shared_ring``) so local viewers can
+chart them without keeping their own buffers. Everything runs on one event loop; only the
+Firestore uploader, which can block on the network, has its own thread.
+
+Socket protocol, one JSON object per line from collector to client:
+    {"type": "hello", "store": "/path/to/db", "rings": {tank: ring name},
+     "latest": {tank: {"t": epoch, "v": [5 values]}}}
+    {"type": "sample", "tank": "tank1", "t": epoch, "v": [water_level, water_temp, ec, tds, ph]}
+    {"type": "status", "devices": {tank: {"state": "connected", "sample_age": 0.4, ...}}}
+Missing values are null.
+
+Usage: python -m hydro.collector [--config collector.toml] [--simulate 2]
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+
+from hydro.aggregate import IntervalAggregator
+from hydro.alerts import AlertEngine, WebhookSink, print_sink, rules_from_config
+from hydro.calibration import CalibrationBook, Calibrator
+from hydro.config import load_config
+from hydro.filters import default_pipeline
+from hydro.hub import IngestHub
+from hydro.log import configure as configure_logging, get_logger
+from hydro.metrics import REGISTRY, MetricsServer
+from hydro.protocol import Reading
+from hydro.sampling import MODES as SAMPLING_MODES, AdaptiveSampler, point_document
+from hydro.shared_ring import SharedRing
+from hydro.storage import SensorStore
+
+log = get_logger("hydro.collector")  # Also when run as __main__
+
+STATUS_INTERVAL = 1.0  # Seconds between status messages and housekeeping
+MAX_CLIENT_BACKLOG = 1 << 20  # Bytes unsent to one client before it is dropped
+
+
+class Collector:
+    """
+    Usage:
+        collector = Collector(load_config())
+        asyncio.run(collector.run())  # Until SIGTERM/SIGINT or ``stop()``
+
+    ``db`` replaces the Firestore client (e.g. ``FakeFirestore``) when
+    uploads are enabled.
+    """
+
+    def __init__(self, config, db=None):
+        self.config = config
+        serial_config = config["serial"]
+        self.hub = IngestHub(
+            serial_config["ports"],
+            discover=not serial_config["ports"],
+            rescan_interval=serial_config["rescan_interval"],
+            baud_rate=serial_config["baud_rate"],
+            binary=serial_config["binary"],
+            raw=serial_config["raw"],
+            stale_timeout=serial_config["stale_timeout"] or None,
+        )
+        self.samples = self.hub.subscribe(maxlen=4096)
+        # Written on the flush tick only, where a database locked by another process is retried
+        self.store = SensorStore(config["storage"]["path"], batch_size=None)
+        self.calibrator = Calibrator(CalibrationBook(config["calibration"]["path"]))
+        sinks = [print_sink]
+        if config["alerts"]["webhook"]:
+            sinks.append(WebhookSink(config["alerts"]["webhook"]))
+        self.alerts = AlertEngine(rules_from_config(config["alerts"]["rules"]), sinks=sinks)
+        self.latest = {}  # tank -> (timestamp, Reading)
+        self.clients = set()  # StreamWriter
+        self.clients_dropped = 0
+        self.rings = {}  # tank -> SharedRing of filtered samples
+        self.filters = {}  # tank -> FilterPipeline feeding its ring and sampler
+
+        self.uploader = None
+        self.aggregators = {}  # tank -> IntervalAggregator, in "interval" upload mode
+        self.samplers = {}  # tank -> AdaptiveSampler, in the other modes
+        self._sampled = {}  # tank -> sampler.samples at the last interval check
+        self._db = db
+        self._upload_executor = None
+        self._upload_future = None
+
+        self.live_server = None
+        if config["live_server"]["enabled"]:
+            from hydro.live_server import LiveServer
+
+            # Its own connection: /api/range queries run on the server's worker thread
+            self.live_server = LiveServer(
+                SensorStore(config["storage"]["path"]), config["live_server"]["host"], config["live_server"]["port"]
+            )
+
+        self._stopping = None
+        self._ingest_time = REGISTRY.histogram("hydro_ingest_seconds", "Time to ingest one drained batch")
+        REGISTRY.register_stats("hydro_device", lambda: self.hub.stats()["devices"], label="tank", counters=(
+            "reconnects", "lines_read", "parse_errors",
+            "frames", "crc_errors", "dropped_frames", "rejected_frames", "rejected_values",
+        ))
+        REGISTRY.register_stats(
+            "hydro_collector", self.stats, counters=("samples", "calibrated", "clients_dropped")
+        )
+
+    def _prime_alerts(self):
+        """Catch the drift and sensor-fault rules up on stored history, so a restart does not relearn baselines."""
+        days = self.config["alerts"]["history_days"]
+        if not days:
+            return
+        t0 = time.perf_counter()
+        samples = 0
+        for tank, (times, values) in self.store.query_by_tank(start=time.time() - days * 86400).items():
+            self.alerts.prime(times, values.view(np.float64).reshape(-1, len(Reading._fields)), tank)
+            samples += len(times)
+        log.info("Primed alert rules with %d stored samples in %.1f s", samples, time.perf_counter() - t0)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        self._stopping = asyncio.Event()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            try:
+                loop.add_signal_handler(sig, self._stopping.set)
+            except (NotImplementedError, RuntimeError):
+                pass  # Not the main thread
+        self._prime_alerts()
+        if self.config["upload"]["enabled"]:
+            self._start_uploads()
+        socket_path = self.config["socket"]["path"]
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)  # Left over from a crash
+        server = await asyncio.start_unix_server(self._serve_client, socket_path)
+        os.chmod(socket_path, 0o666)  # GUIs may run as another user
+        tasks = [loop.create_task(self.hub.run())]
+        if self.live_server is not None:
+            tasks.append(loop.create_task(self.live_server.serve()))
+        await asyncio.sleep(0)  # Let the hub set up its subscriptions before they are awaited
+        log.info("Collector running; clients attach at %s", socket_path)
+        try:
+            await self._loop()
+        finally:
+            server.close()
+            for writer in list(self.clients):
+                writer.close()
+            self.hub.stop()
+            if self.live_server is not None:
+                self.live_server.stop()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if os.path.exists(socket_path):
+                os.unlink(socket_path)
+            try:
+                self.store.close()
+            except sqlite3.OperationalError as e:
+                log.error("Samples not yet written to %s are lost: %s", self.store.path, e)
+            for ring in self.rings.values():
+                ring.close()
+            if self.live_server is not None:
+                self.live_server.store.close()
+            if self._upload_executor is not None:
+                self._flush_aggregates()
+                for tank, sampler in self.samplers.items():
+                    self._queue_points(tank, sampler.flush())
+                self._upload_executor.submit(self.uploader.close)
+                self._upload_executor.shutdown(wait=True)
+            log.info("Collector stopped")
+
+    def stop(self):
+        """Stop ``run``; call from the collector's loop (signal handlers do this)."""
+        if self._stopping is not None:
+            self._stopping.set()
+
+    def stats(self):
+        return {
+            "samples": self.hub.samples,
+            "calibrated": self.calibrator.samples,
+            "clients": len(self.clients),
+            "clients_dropped": self.clients_dropped,
+            "queue_depth": self.samples.depth(),
+        }
+
+    # -- Main loop -------------------------------------------------------
+
+    async def _loop(self):
+        flush_interval = self.config["storage"]["flush_interval"]
+        upload_interval = self.config["upload"]["interval"]
+        next_flush = time.monotonic() + flush_interval
+        next_status = time.monotonic()
+        next_upload = time.monotonic() + upload_interval
+        batch_wait = asyncio.ensure_future(self.samples.get_batch())
+        stopping = asyncio.ensure_future(self._stopping.wait())
+        try:
+            while not self._stopping.is_set():
+                timeout = max(0.0, min(next_flush, next_status) - time.monotonic())
+                await asyncio.wait({batch_wait, stopping}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if batch_wait.done():
+                    self._ingest(batch_wait.result())
+                    batch_wait = asyncio.ensure_future(self.samples.get_batch())
+                now = time.monotonic()
+                if now >= next_flush:
+                    self._flush_store()
+                    next_flush = now + flush_interval
+                if now >= next_status:
+                    self.alerts.tick(time.time())
+                    self._broadcast(_line({"type": "status", "devices": self._device_status()}))
+                    if self.uploader is not None:
+                        if now >= next_upload:
+                            self._flush_aggregates()
+                            next_upload += upload_interval
+                        self._submit_upload(self.uploader.poll)
+                    next_status = now + STATUS_INTERVAL
+        finally:
+            batch_wait.cancel()
+            stopping.cancel()
+            self._flush_store()
+
+    def _flush_store(self):
+        """Write buffered samples; if another process holds the database, keep them for the next tick."""
+        try:
+            self.store.flush()
+        except sqlite3.OperationalError as e:
+            log.warning("Cannot write to %s, retrying on the next flush: %s", self.store.path, e)
+
+    def _ingest(self, batch):
+        with self._ingest_time.time():
+            lines = []
+            for timestamp, tank, reading, raw in self.calibrator.calibrate(batch):
+                filtered = None
+                if self.config["shared_memory"]["enabled"]:
+                    filtered = self._publish_shared(timestamp, tank, reading)
+                self.store.add(timestamp, reading, tank, raw)
+                self.alerts.process(timestamp, reading, tank)
+                if self.uploader is not None:
+                    if self.config["upload"]["mode"] == "interval":
+                        aggregator = self.aggregators.get(tank)
+                        if aggregator is None:
+                            aggregator = self.aggregators[tank] = IntervalAggregator()
+                        aggregator.add(reading)
+                    else:
+                        if filtered is None:
+                            filtered = self._filter(tank)(reading)
+                        self._sample(timestamp, tank, filtered)
+                if self.live_server is not None:
+                    self.live_server.publish(timestamp, reading, tank)
+                self.latest[tank] = (timestamp, reading)
+                lines.append(_line({"type": "sample", "tank": tank, "t": timestamp, "v": _values(reading)}))
+            self._broadcast(b"".join(lines))
+
+    def _publish_shared(self, timestamp, tank, reading):
+        ring = self.rings.get(tank)
+        if ring is None:
+            ring = self._open_ring(tank)
+        filtered = self.filters[tank](reading)
+        try:
+            ring.append(timestamp, filtered)
+        except ValueError:
+            # The clock stepped back (e.g. NTP after a boot without RTC); start the ring afresh
+            log.warning("Clock went backwards; clearing the shared ring for tank %s", tank)
+            ring.clear()
+            ring.append(timestamp, filtered)
+        return filtered
+
+    def _filter(self, tank):
+        smoothing = self.filters.get(tank)
+        if smoothing is None:
+            smoothing = self.filters[tank] = default_pipeline()
+        return smoothing
+
+    def _open_ring(self, tank):
+        settings = self.config["shared_memory"]
+        duration = settings["hours"] * 3600
+        ring = self.rings[tank] = SharedRing(
+            f"{settings['prefix']}{tank}",
+            Reading._fields,
+            capacity=int(duration * settings["max_sample_rate"]),
+            max_age=duration,
+        )
+        # Backfill from the database, as gui_display.py does for its own buffer
+        smoothing = self.filters[tank] = default_pipeline()
+        try:
+            times, values = self.store.query(start=time.time() - duration, tank=tank)
+        except sqlite3.OperationalError as e:  # Flushing first needs the write lock
+            log.warning("Cannot backfill the shared ring for tank %s: %s", tank, e)
+            return ring
+        values = values.view(np.float64).reshape(-1, len(Reading._fields))
+        ring.extend(times, smoothing.apply_batch(values))
+        smoothing.prime(values[-32:])
+        return ring
+
+    # -- Clients ---------------------------------------------------------
+
+    async def _serve_client(self, reader, writer):
+        latest = {str(tank): {"t": t, "v": _values(reading)} for tank, (t, reading) in self.latest.items()}
+        rings = {str(tank): ring.name for tank, ring in self.rings.items()}
+        writer.write(_line({
+            "type": "hello", "store": os.path.abspath(self.store.path), "rings": rings, "latest": latest,
+        }))
+        writer.write(_line({"type": "status", "devices": self._device_status()}))
+        self.clients.add(writer)
+        try:
+            while await reader.read(1024):
+                pass  # Clients only listen; this notices them leaving
+        except ConnectionError:
+            pass
+        finally:
+            self.clients.discard(writer)
+            writer.close()
+
+    def _broadcast(self, data):
+        for writer in list(self.clients):
+            transport = writer.transport
+            if transport.is_closing():
+                self.clients.discard(writer)
+            elif transport.get_write_buffer_size() > MAX_CLIENT_BACKLOG:
+                # A frozen GUI must not grow the collector's memory; it resyncs on reconnect
+                self.clients_dropped += 1
+                self.clients.discard(writer)
+                transport.abort()
+            else:
+                transport.write(data)
+
+    def _device_status(self):
+        return {
+            str(tank): {"state": device.state, "sample_age": round(device.sample_age(), 3)}
+            for tank, device in self.hub.devices.items()
+        }
+
+    # -- Uploads ---------------------------------------------------------
+
+    def _start_uploads(self):
+        from hydro.uploader import BatchUploader
+
+        upload = self.config["upload"]
+        if upload["mode"] not in SAMPLING_MODES + ("interval",):
+            raise ValueError(f"upload.mode must be one of {SAMPLING_MODES + ('interval',)}")
+        db = self._db
+        if db is None:
+            from google.cloud import firestore
+
+            db = firestore.Client.from_service_account_json(upload["credentials"])
+        # Slow interval sampling gains nothing from buffering
+        max_age = upload["flush_interval"]
+        if upload["mode"] == "interval" and upload["interval"] >= upload["flush_interval"]:
+            max_age = 0
+        self.uploader = BatchUploader(db, upload["collection"], max_age=max_age, spool_path=upload["spool_path"])
+        REGISTRY.register_stats("hydro_uploader", self.uploader.stats,
+                                counters=("commits", "documents_written", "failures"))
+        REGISTRY.register_stats(
+            "hydro_sampler", lambda: {tank: sampler.stats() for tank, sampler in self.samplers.items()}, label="tank",
+            counters=("samples", "points", "trigger_first", "trigger_change", "trigger_heartbeat", "trigger_flush"),
+        )
+        self._upload_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="Uploader")
+
+    def _flush_aggregates(self):
+        """Queue one summary document per tank for the interval that just ended; warn about silent tanks."""
+        # Second resolution, naive UTC, like write_hydro_data_to_firebase.py
+        timestamp = datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+        for tank, aggregator in self.aggregators.items():
+            if aggregator.samples:
+                document = dict(aggregator.result(), tank=tank, timestamp=timestamp)
+                self._upload_executor.submit(self.uploader.add, document)
+                aggregator.reset()
+            else:
+                log.warning("No data from tank %s in the last %s seconds", tank, self.config["upload"]["interval"])
+        for tank, sampler in self.samplers.items():
+            if sampler.samples == self._sampled.get(tank):
+                log.warning("No data from tank %s in the last %s seconds", tank, self.config["upload"]["interval"])
+            self._sampled[tank] = sampler.samples
+
+    def _sample(self, timestamp, tank, filtered):
+        sampler = self.samplers.get(tank)
+        if sampler is None:
+            upload = self.config["upload"]
+            sampler = self.samplers[tank] = AdaptiveSampler(
+                upload["tolerances"], max_silence=upload["interval"], mode=upload["mode"]
+            )
+        points = sampler.add(timestamp, filtered)
+        if points:
+            self._queue_points(tank, points)
+
+    def _queue_points(self, tank, points):
+        for point in points:
+            self._upload_executor.submit(self.uploader.add, dict(point_document(point), tank=tank))
+
+    def _submit_upload(self, fn):
+        # Skip a poll while the previous one is still blocked on the network
+        if self._upload_future is None or self._upload_future.done():
+            self._upload_future = self._upload_executor.submit(fn)
+
+
+def _values(reading):
+    return [None if value != value else value for value in reading]
+
+
+def _line(message):
+    return json.dumps(message, separators=(",", ":")).encode() + b"\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Collect sensor data headlessly")
+    parser.add_argument("--config", default=None, help="TOML file (default: $HYDRO_CONFIG or collector.toml)")
+    parser.add_argument("--simulate", type=int, default=0, help="Read N simulated boards instead of the configured ports")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    configure_logging(config["log"]["level"], rate=config["log"]["rate_limit"] or None)
+    fakes = []
+    if args.simulate:
+        from hydro.fake_arduino import FakeArduino
+
+        serial_config = config["serial"]
+        fakes = [
+            FakeArduino(rate=1.0, seed=i, binary=serial_config["binary"], raw=serial_config["raw"]).start()
+            for i in range(args.simulate)
+        ]
+        config["serial"]["ports"] = {f"sim{i + 1}": fake.port for i, fake in enumerate(fakes)}
+    metrics_server = MetricsServer(REGISTRY, port=config["metrics"]["port"]).start() if config["metrics"]["port"] else None
+    try:
+        asyncio.run(Collector(config).run())
+    finally:
+        if metrics_server is not None:
+            metrics_server.stop()
+        for fake in fakes:
+            fake.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+TOML configuration for the collector daemon and the GUIs that attach to it.
+
+The file only needs the settings that differ from ``DEFAULTS``; see
+collector.toml in the repository root for every option. It is looked up
+in this order: an explicit path, ``$HYDRO_CONFIG``, /etc/hydro/collector.toml,
+then collector.toml next to the code. With none of them present the
+defaults are used, which match the constants the scripts had hardcoded.
+"""
+import copy
+import os
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11 (e.g. Raspberry Pi OS bullseye's 3.9)
+    import tomli as tomllib
+
+from hydro.alerts import DEFAULT_RULES
+from hydro.calibration import DEFAULT_CALIBRATION_PATH
+from hydro.storage import DEFAULT_DB_PATH
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SEARCH_PATHS = ("/etc/hydro/collector.toml", os.path.join(REPO_ROOT, "collector.toml"))
+
+DEFAULTS = {
+    "serial": {
+        "ports": {},  # Tank ID -> port; empty: discover boards and adopt new ones
+        "baud_rate": 9600,
+        "binary": False,
+        "raw": False,  # Ask boards for probe voltages and calibrate them here (hydro.calibration)
+        "stale_timeout": 30.0,
+        "rescan_interval": 5.0,
+    },
+    "storage": {
+        "path": DEFAULT_DB_PATH,
+        "flush_interval": 2.0,  # Seconds; GUIs read the database for backfill
+    },
+    "calibration": {
+        "path": DEFAULT_CALIBRATION_PATH,
+    },
+    "socket": {
+        "path": "/tmp/hydro_collector.sock",
+    },
+    "upload": {
+        "enabled": False,
+        "credentials": "",  # Firestore service account JSON
+        "collection": "sensor_readings",
+        "mode": "swinging_door",  # Or "deadband" (see hydro.sampling), or "interval" for summaries
+        "tolerances": {},  # Field -> largest error allowed in the uploaded curve; unset fields use the defaults
+        "interval": 900,  # Seconds per summary document; the heartbeat in the adaptive modes
+        "flush_interval": 60,
+        "spool_path": os.path.join(REPO_ROOT, "HydroCloud", "firestore_spool.jsonl"),
+    },
+    "alerts": {
+        "rules": DEFAULT_RULES,
+        "webhook": "",
+        "history_days": 14,  # Stored history the drift/fault rules are primed with at startup
+    },
+    "shared_memory": {
+        "enabled": True,
+        "prefix": "hydro_",  # Each tank's ring is prefix + tank ID, a file in /dev/shm
+        "hours": 1.0,  # Filtered history kept per tank
+        "max_sample_rate": 10,  # Samples per second the rings are sized for
+    },
+    "live_server": {
+        "enabled": False,
+        "host": "0.0.0.0",
+        "port": 8080,
+    },
+    "metrics": {
+        "port": 9110,  # 0 disables the endpoint
+    },
+    "log": {
+        "level": "INFO",
+        "rate_limit": 5,  # Identical messages per minute; 0 logs everything
+    },
+}
+
+
+def find_config(path=None):
+    """The config file to use, or None for the defaults."""
+    if path:
+        return path
+    if os.environ.get("HYDRO_CONFIG"):
+        return os.environ["HYDRO_CONFIG"]
+    for candidate in SEARCH_PATHS:
+        if os.path.exists(candidate):
+            return candidate
+    return None
+
+
+def load_config(path=None):
+    """
+    Return the merged configuration as nested dicts.
+
+    Raises ValueError for unknown sections or keys, so a typo does not
+    silently fall back to a default.
+    """
+    config = copy.deepcopy(DEFAULTS)
+    path = find_config(path)
+    if path is None:
+        return config
+    with open(path, "rb") as f:
+        overrides = tomllib.load(f)
+    for section, values in overrides.items():
+        if section not in config:
+            raise ValueError(f"{path}: unknown section [{section}]")
+        if not isinstance(values, dict):
+            raise ValueError(f"{path}: [{section}] must be a table")
+        for key, value in values.items():
+            if key not in config[section]:
+                raise ValueError(f"{path}: unknown setting {section}.{key}")
+            config[section][key] = value
+    # Relative paths are relative to the config file, not the working directory
+    base = os.path.dirname(os.path.abspath(path))
+    for section, key in (("storage", "path"), ("calibration", "path"), ("upload", "spool_path"), ("upload", "credentials")):
+        value = config[section][key]
+        if value:
+            config[section][key] = os.path.join(base, os.path.expanduser(value))
+    return config
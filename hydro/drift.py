@@ -0,0 +1,491 @@
+"""
+Drift and sensor-fault detection from incremental statistics.
+
+A pH electrode ageing over weeks is invisible in an hour of chart. These
+detectors watch one sensor's stream each, with O(1) state per sample, so
+nothing is rescanned as history grows:
+
+    DriftDetector     Each ``block`` (a day by default) is reduced to its
+                      mean. The first ``baseline`` block means are learnt
+                      with Welford's algorithm. Later ones go through an
+                      EWMA control chart and a two-sided CUSUM against that
+                      baseline. A signal starts a new baseline, so a drift
+                      that carries on is reported again.
+    SpikeDetector     A Hampel test with a floor: further than ``n_sigmas``
+                      scaled MADs and ``min_deviation`` from the median of
+                      the last ``window`` values.
+    StuckDetector     The same value for ``duration`` seconds.
+    FlatlineDetector  Sample-to-sample noise (an EMA of squared differences
+                      over ``span`` samples) below ``ratio`` of its
+                      long-run level (over ``baseline_span`` samples) for
+                      ``duration`` seconds: a probe that stopped responding
+                      although its value still moves a little.
+
+Daily blocks average out the day/night and dosing cycles, which would
+otherwise look like drift. Each detector has a ``*_batch`` twin that
+flags a whole history in one vectorised pass, with the same result (up to
+float rounding), and a ``prime`` that brings its state up to date from
+history the same way. hydro.alerts wraps the detectors as the rule types
+"drift", "spike", "stuck" and "flatline", so they raise alerts live and
+can be backfilled over stored history:
+
+Usage: python -m hydro.drift [--config collector.toml] [--tank tank1] [--days 365] [--firestore-cache DIR]
+"""
+import argparse
+import math
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from hydro.filters import EMA, MAD_SCALE, Hampel, ema_batch
+from hydro.protocol import Reading
+
+DAY = 86400.0
+
+
+class Welford:
+    """Running count, mean and sample variance, updated in O(1) without loss of precision."""
+
+    __slots__ = ("count", "mean", "_m2")
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+
+    def merge(self, other):
+        """Fold in another ``Welford``'s samples (Chan et al.'s pairwise update)."""
+        count = self.count + other.count
+        if not other.count:
+            return
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self._m2 += other._m2 + delta * delta * self.count * other.count / count
+        self.count = count
+
+    @property
+    def variance(self):
+        return self._m2 / (self.count - 1) if self.count > 1 else math.nan
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance) if self.count > 1 else math.nan
+
+
+class DriftDetector:
+    """
+    Sustained shift of a sensor's ``block`` means from a learnt baseline.
+
+    ``k`` and ``h`` are the CUSUM's allowance and decision interval, and
+    ``lam`` and ``limit`` the EWMA chart's weight and width. All four are
+    in baseline standard deviations, which are at least ``min_sigma``.
+    Blocks with fewer than ``min_count`` samples are skipped. ``drifting``
+    is set by a signal and stays set until a new baseline is learnt.
+    ``shift`` is the EWMA's distance from the baseline mean
+    (``reference``).
+    """
+
+    def __init__(self, block=DAY, baseline=7, k=0.5, h=5.0, lam=0.2, limit=3.0, min_sigma=1e-9, min_count=1):
+        self.block = block
+        self.baseline_blocks = baseline
+        self.k = k
+        self.h = h
+        self.lam = lam
+        self.limit = limit
+        self.min_sigma = min_sigma
+        self.min_count = min_count
+        self.reset()
+
+    def reset(self):
+        self.drifting = False
+        self.signals = 0
+        self.blocks = 0
+        self.reference = None  # (mean, sigma) of the baseline once learnt
+        self.last_reference = math.nan  # Baseline mean the last signal was raised against
+        self.shift = 0.0
+        self.baseline = Welford()
+        self.ewma = 0.0
+        self.cusum_high = self.cusum_low = 0.0
+        self._block = None
+        self._sum = 0.0
+        self._count = 0
+
+    def update(self, timestamp, value):
+        """Add one sample; returns ``drifting`` (False for NaN)."""
+        if value != value:
+            return False
+        block = math.floor(timestamp / self.block)
+        if block != self._block:
+            if self._count >= self.min_count:
+                self._close(self._sum / self._count)
+            self._block = block
+            self._sum = 0.0
+            self._count = 0
+        self._sum += value
+        self._count += 1
+        return self.drifting
+
+    def prime(self, times, values):
+        """Catch up on history (``update`` for every sample, vectorised)."""
+        blocks, sums, counts = _block_runs(times, values, self.block)
+        if not len(blocks):
+            return
+        first = 0
+        if blocks[0] == self._block:
+            # History continues the open block
+            self._sum += sums[0]
+            self._count += counts[0]
+            first = 1
+        for block, total, count in zip(blocks[first:].tolist(), sums[first:].tolist(), counts[first:].tolist()):
+            if self._count >= self.min_count:
+                self._close(self._sum / self._count)
+            self._block, self._sum, self._count = block, total, count
+
+    def _close(self, mean):
+        self.blocks += 1
+        if self.reference is None:
+            self.baseline.add(mean)
+            if self.baseline.count >= self.baseline_blocks:
+                sigma = self.baseline.std if self.baseline.count > 1 else 0.0
+                self.reference = (self.baseline.mean, max(sigma, self.min_sigma))
+                self.ewma = self.baseline.mean
+                self.shift = 0.0
+                self.drifting = False
+            return
+        reference, sigma = self.reference
+        z = (mean - reference) / sigma
+        self.ewma += self.lam * (mean - self.ewma)
+        self.shift = self.ewma - reference
+        self.cusum_high = max(0.0, self.cusum_high + z - self.k)
+        self.cusum_low = max(0.0, self.cusum_low - z - self.k)
+        ewma_limit = self.limit * sigma * math.sqrt(self.lam / (2.0 - self.lam))
+        if self.cusum_high > self.h or self.cusum_low > self.h or abs(self.shift) > ewma_limit:
+            self.drifting = True
+            self.signals += 1
+            self.last_reference = reference
+            self.baseline.reset()
+            self.reference = None
+            self.cusum_high = self.cusum_low = 0.0
+
+
+class SpikeDetector(Hampel):
+    """
+    A value further than ``n_sigmas`` scaled MADs from the median of the
+    last ``window`` values (itself included), and by more than
+    ``min_deviation``: without the floor, a steady sensor whose MAD is
+    zero at the printed resolution would spike on every last-digit flip.
+    """
+
+    def __init__(self, window=9, n_sigmas=3.0, min_deviation=0.0):
+        self.min_deviation = min_deviation
+        self.spikes = 0
+        super().__init__(window, n_sigmas)
+
+    def update(self, timestamp, value):
+        """Add one sample; True if it is a spike."""
+        if value != value:
+            return False
+        self._push(value)
+        median = self.median()
+        deviation = abs(value - median)
+        if deviation > self.min_deviation and deviation > self.n_sigmas * MAD_SCALE * self.mad(median):
+            self.spikes += 1
+            return True
+        return False
+
+    def prime(self, times, values):
+        values = np.asarray(values, dtype=float)
+        for value in values[~np.isnan(values)][-self.window:].tolist():
+            self._push(value)
+
+
+class StuckDetector:
+    """The same value, exactly, for at least ``duration`` seconds."""
+
+    def __init__(self, duration=3600.0):
+        self.duration = duration
+        self.reset()
+
+    def reset(self):
+        self._value = None
+        self._since = None
+
+    def update(self, timestamp, value):
+        """Add one sample; True while the value has not changed for ``duration``."""
+        if value != value:
+            return False
+        if value != self._value:
+            self._value = value
+            self._since = timestamp
+        return timestamp - self._since >= self.duration
+
+    def prime(self, times, values):
+        t, x = _valid(times, values)
+        if not len(x):
+            return
+        changes = np.flatnonzero(x != x[-1])
+        start = changes[-1] + 1 if len(changes) else 0
+        if start == 0 and self._value == x[-1]:
+            return  # The run began before this history
+        self._value = float(x[-1])
+        self._since = float(t[start])
+
+
+class FlatlineDetector:
+    """
+    Sample-to-sample noise collapsed: the EMA of squared differences over
+    ``span`` samples below ``ratio`` squared times the same over
+    ``baseline_span`` samples, for ``duration`` seconds. Judged after
+    ``warmup`` samples (default ``baseline_span``). A flatline much longer
+    than ``baseline_span`` becomes the new normal; ``StuckDetector`` still
+    catches a value that does not move at all.
+    """
+
+    def __init__(self, ratio=0.1, duration=1800.0, span=300, baseline_span=86400, warmup=None):
+        self.ratio = ratio
+        self.duration = duration
+        self.span = span
+        self.baseline_span = baseline_span
+        self.warmup = baseline_span if warmup is None else warmup
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.noise = EMA(span=self.span)
+        self.baseline = EMA(span=self.baseline_span)
+        self._last = None
+        self._since = None
+
+    def update(self, timestamp, value):
+        """Add one sample; True while the noise has been flat for ``duration``."""
+        if value != value:
+            return False
+        last, self._last = self._last, value
+        if last is None:
+            return False
+        squared = (value - last) * (value - last)
+        noise = self.noise(squared)
+        baseline = self.baseline(squared)
+        self.count += 1
+        if self.count < self.warmup or not noise < self.ratio * self.ratio * baseline:
+            self._since = None
+            return False
+        if self._since is None:
+            self._since = timestamp
+        return timestamp - self._since >= self.duration
+
+    def prime(self, times, values):
+        t, x = _valid(times, values)
+        if not len(x):
+            return
+        if self._last is not None:
+            t = np.concatenate([[math.nan], t])
+            x = np.concatenate([[self._last], x])
+        if len(x) >= 2:
+            squared = np.diff(x) ** 2
+            noise = _ema_from(self.noise, squared)
+            baseline = _ema_from(self.baseline, squared)
+            count = self.count + np.arange(1, len(squared) + 1)
+            flat = (count >= self.warmup) & (noise < self.ratio * self.ratio * baseline)
+            self.count = int(count[-1])
+            if flat[-1]:
+                unflat = np.flatnonzero(~flat)
+                if len(unflat):
+                    self._since = float(t[1:][unflat[-1] + 1])
+                elif self._since is None:
+                    self._since = float(t[1])
+            else:
+                self._since = None
+        self._last = float(x[-1])
+
+
+def drift_batch(times, values, **options):
+    """NumPy equivalent of ``DriftDetector.update`` over a whole history (``options`` as its arguments)."""
+    detector = DriftDetector(**options)
+    values = np.asarray(values, dtype=float)
+    out = np.zeros(len(values), dtype=bool)
+    valid = ~np.isnan(values)
+    blocks, sums, counts = _block_runs(np.asarray(times, dtype=float)[valid], values[valid], detector.block)
+    state = np.zeros(len(blocks), dtype=bool)
+    for i in range(len(blocks)):
+        # A block's samples see the state after the blocks before it closed
+        if i and counts[i - 1] >= detector.min_count:
+            detector._close(sums[i - 1] / counts[i - 1])
+        state[i] = detector.drifting
+    out[valid] = np.repeat(state, counts)
+    return out
+
+
+def spike_batch(values, window=9, n_sigmas=3.0, min_deviation=0.0, chunk=1 << 20):
+    """NumPy equivalent of ``SpikeDetector.update`` over a whole array; windows are medianed ``chunk`` at a time."""
+    values = np.asarray(values, dtype=float)
+    out = np.zeros(len(values), dtype=bool)
+    valid = ~np.isnan(values)
+    x = values[valid]
+    flags = np.zeros(len(x), dtype=bool)
+    detector = SpikeDetector(window, n_sigmas, min_deviation)
+    for i in range(min(window - 1, len(x))):
+        flags[i] = detector.update(None, x[i])  # Short windows at the start, as the stream sees them
+    if len(x) >= window:
+        windows = sliding_window_view(x, window)
+        for start in range(0, len(windows), chunk):
+            part = windows[start:start + chunk]
+            if window % 2:
+                median = np.partition(part, window // 2, axis=1)[:, window // 2]  # Same value, no averaging pass
+            else:
+                median = np.median(part, axis=1)
+            deviation = np.abs(part[:, -1] - median)
+            # The MAD is only needed where the floor is passed, which is rare
+            candidates = np.flatnonzero(deviation > min_deviation)
+            mad = np.median(np.abs(part[candidates] - median[candidates, None]), axis=1)
+            flags[window - 1 + start + candidates] = deviation[candidates] > n_sigmas * MAD_SCALE * mad
+    out[valid] = flags
+    return out
+
+
+def stuck_batch(times, values, duration=3600.0):
+    """NumPy equivalent of ``StuckDetector.update`` over a whole history."""
+    values = np.asarray(values, dtype=float)
+    out = np.zeros(len(values), dtype=bool)
+    valid = ~np.isnan(values)
+    t, x = np.asarray(times, dtype=float)[valid], values[valid]
+    if len(x):
+        out[valid] = t - t[_run_starts(np.r_[True, x[1:] != x[:-1]])] >= duration
+    return out
+
+
+def flatline_batch(times, values, ratio=0.1, duration=1800.0, span=300, baseline_span=86400, warmup=None):
+    """NumPy equivalent of ``FlatlineDetector.update`` over a whole history."""
+    warmup = baseline_span if warmup is None else warmup
+    values = np.asarray(values, dtype=float)
+    out = np.zeros(len(values), dtype=bool)
+    valid = ~np.isnan(values)
+    t, x = np.asarray(times, dtype=float)[valid], values[valid]
+    if len(x) < 2:
+        return out
+    squared = np.diff(x) ** 2
+    noise = ema_batch(squared, 2.0 / (span + 1.0))
+    baseline = ema_batch(squared, 2.0 / (baseline_span + 1.0))
+    flat = (np.arange(1, len(squared) + 1) >= warmup) & (noise < ratio * ratio * baseline)
+    since = t[1:][_run_starts(np.r_[True, flat[1:] != flat[:-1]])]
+    out[np.flatnonzero(valid)[1:]] = flat & (t[1:] - since >= duration)
+    return out
+
+
+def episodes(times, flags, min_duration=0.0):
+    """
+    ``[(start, end)]`` of the runs of ``flags`` lasting at least
+    ``min_duration`` seconds, starting once they have, as a rule with
+    ``min_duration`` raises them. Drop missing samples first: ``*_batch``
+    flags them False, but the rule engine skips them.
+    """
+    times = np.asarray(times, dtype=float)
+    flags = np.asarray(flags, dtype=bool)
+    edges = np.diff(np.r_[0, flags.view(np.int8), 0])
+    result = []
+    for first, stop in zip(np.flatnonzero(edges == 1).tolist(), np.flatnonzero(edges == -1).tolist()):
+        start = times[first] + min_duration
+        if times[stop - 1] >= start:
+            result.append((float(times[first + np.searchsorted(times[first:stop], start)]), float(times[stop - 1])))
+    return result
+
+
+def _valid(times, values):
+    values = np.asarray(values, dtype=float)
+    valid = ~np.isnan(values)
+    return np.asarray(times, dtype=float)[valid], values[valid]
+
+
+def _run_starts(starts):
+    """For each position, the index where its run began; ``starts`` marks the first of each run."""
+    return np.maximum.accumulate(np.where(starts, np.arange(len(starts)), 0))
+
+
+def _block_runs(times, values, block):
+    """(block numbers, sums, counts) of consecutive valid samples in the same block, in order."""
+    t, x = _valid(times, values)
+    if not len(x):
+        return np.empty(0, dtype=np.int64), np.empty(0), np.empty(0, dtype=np.int64)
+    blocks = np.floor(t / block).astype(np.int64)
+    starts = np.flatnonzero(np.r_[True, blocks[1:] != blocks[:-1]])
+    return blocks[starts], np.add.reduceat(x, starts), np.diff(np.r_[starts, len(x)])
+
+
+def _ema_from(ema, values):
+    """Continue ``ema`` (an ``EMA``) over ``values`` vectorised; returns every output and updates its state."""
+    if ema.value is not None:
+        out = ema_batch(np.r_[ema.value, values], ema.alpha)[1:]
+        # ema_batch starts from its first value, so the state is carried in as a first sample
+    else:
+        out = ema_batch(values, ema.alpha)
+    ema.value = float(out[-1])
+    return out
+
+
+def main():
+    from hydro.alerts import rules_from_config
+    from hydro.config import load_config
+    from hydro.storage import SensorStore
+
+    parser = argparse.ArgumentParser(description="Backfill drift and sensor-fault detection over stored history")
+    parser.add_argument("--config", default=None, help="TOML file with the [alerts] rules and [storage] path")
+    parser.add_argument("--tank", default=None, help="Default: every tank")
+    parser.add_argument("--days", type=float, default=None, help="History to scan; default: all of it")
+    parser.add_argument("--firestore-cache", default=None, metavar="DIR",
+                        help="Scan the FirestoreCache in DIR instead of SQLite (all tanks as one)")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    rules = [rule for rule in rules_from_config(config["alerts"]["rules"]) if hasattr(rule, "batch")]
+    start = time.time() - args.days * DAY if args.days else None
+    t0 = time.perf_counter()
+    if args.firestore_cache:
+        from hydro.firestore_cache import FirestoreCache
+
+        columns = FirestoreCache(None, args.firestore_cache).load(start=start)
+        nan = np.full(len(columns["timestamp"]), np.nan)
+        history = {None: (columns["timestamp"], np.column_stack([columns.get(f, nan) for f in Reading._fields]))}
+    else:
+        store = SensorStore(config["storage"]["path"])
+        try:
+            history = {
+                tank: (times, values.view(np.float64).reshape(-1, len(Reading._fields)))
+                for tank, (times, values) in store.query_by_tank(start=start).items()
+                if args.tank is None or tank == args.tank
+            }
+        finally:
+            store.close()
+    loaded = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    samples = 0
+    for tank, (times, values) in history.items():
+        samples += len(times)
+        for rule in rules:
+            column = values[:, Reading._fields.index(rule.field)]
+            valid = ~np.isnan(column)  # Rules skip missing values, so they must not split episodes
+            flags = rule.batch(times, column)[valid]
+            for start_time, end_time in episodes(times[valid], flags, rule.min_duration):
+                print(f"{tank or '-'}  {rule.name:<20} {_iso(start_time)} .. {_iso(end_time)}  "
+                      f"({(end_time - start_time) / 3600:.1f} h)")
+    print(f"Scanned {samples:,} samples with {len(rules)} rules in {time.perf_counter() - t0:.1f} s "
+          f"(loaded in {loaded:.1f} s)")
+
+
+def _iso(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime("%Y-%m-%d %H:%M")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+Fake stream2pi.ino boards on pseudo-terminals, for tests and load testing.
+
+Run as a simulator for N tanks; the tty paths are printed so collectors can
+be pointed at them:
+
+Usage: python -m hydro.fake_arduino [--devices 12] [--rate 10] [--binary] [--raw]
+"""
+import argparse
+import os
+import random
+import select
+import threading
+import time
+import tty
+
+from hydro.calibration import DEFAULT_PROBES
+from hydro.frames import MODE_BINARY_ACK, MODE_RAW_ACK, encode_frame
+from hydro.protocol import RawReading, parse_line
+
+
+def stream2pi_line(water_level=0.52, water_temp=25.0, ec=1.5, tds=750.0, ph=6.5):
+    """Format one line the way stream2pi.ino prints it."""
+    return f"WATER_LEVEL:{water_level:.2f},WATER_TEMP:{water_temp:.1f},EC:{ec:.2f},TDS:{tds:.1f},PH:{ph:.1f}"
+
+
+def stream2pi_raw_line(water_level=0.52, water_temp=25.0, ec_voltage=0.246, ph_voltage=1.916):
+    """Format one line the way stream2pi.ino prints it in raw mode."""
+    return f"WATER_LEVEL:{water_level:.2f},WATER_TEMP:{water_temp:.1f},EC_V:{ec_voltage:.4f},PH_V:{ph_voltage:.4f}"
+
+
+def raw_reading(reading):
+    """The probe voltages that read as ``reading`` with the sketch's calibration."""
+    return RawReading(
+        reading.water_level,
+        reading.water_temp,
+        float(DEFAULT_PROBES["ec"].voltage(reading.ec, reading.water_temp)),
+        float("nan"),  # stream2pi.ino has no TDS probe
+        float(DEFAULT_PROBES["ph"].voltage(reading.ph, reading.water_temp)),
+    )
+
+
+class FakeArduino:
+    """
+    Pseudo-terminal that behaves like an Arduino running stream2pi.ino.
+
+    ``port`` is a real tty path, so anything that opens ``serial.Serial``
+    can be pointed at it. Lines come from ``line_source`` (a callable
+    returning a string) or from a random walk around typical tank values.
+    With ``binary=True`` it also answers ``MODE BIN`` / ``MODE ASCII``
+    like the sketches and then sends the same values as binary frames.
+    With ``raw=True`` it answers ``MODE RAW`` and then sends the probe
+    voltages those values correspond to, in lines or frames.
+
+    Usage:
+        with FakeArduino(rate=10) as fake:
+            reader = SerialReader(fake.port)
+    """
+
+    def __init__(self, rate=1.0, line_source=None, seed=None, binary=False, raw=False):
+        self.rate = rate
+        self.line_source = line_source or self._random_walk
+        self.binary = binary
+        self.raw = raw
+        self.binary_mode = False
+        self.raw_mode = False
+        self.lines_written = 0
+        self.frames_written = 0
+        self._commands = b""
+        self._rng = random.Random(seed)
+        self._state = {"water_level": 0.52, "water_temp": 25.0, "ec": 1.5, "ph": 6.5}
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)
+        self.port = os.ttyname(self._slave)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="FakeArduino", daemon=True)
+        self._thread.start()
+        return self
+
+    def write_line(self, line):
+        """Write one raw line to the port."""
+        os.write(self._master, line.encode("utf-8") + b"\r\n")
+        self.lines_written += 1
+
+    def write_frame(self, line):
+        """Write the values of one stream2pi line as a binary frame (of voltages in raw mode)."""
+        reading = parse_line(line)
+        os.write(self._master, encode_frame(self.frames_written, raw_reading(reading) if self.raw_mode else reading))
+        self.frames_written += 1
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+        for fd in (self._master, self._slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _run(self):
+        interval = 1.0 / self.rate
+        next_time = time.monotonic()
+        while not self._stop_event.is_set():
+            try:
+                if self.binary or self.raw:
+                    self._read_commands()
+                if self.binary_mode:
+                    self.write_frame(self.line_source())
+                elif self.raw_mode:
+                    raw = raw_reading(parse_line(self.line_source()))
+                    self.write_line(stream2pi_raw_line(raw.water_level, raw.water_temp, raw.ec_voltage, raw.ph_voltage))
+                else:
+                    self.write_line(self.line_source())
+            except OSError:
+                break
+            next_time += interval
+            self._stop_event.wait(max(0.0, next_time - time.monotonic()))
+
+    def _read_commands(self):
+        while select.select([self._master], [], [], 0)[0]:
+            self._commands += os.read(self._master, 256)
+        *lines, self._commands = self._commands.split(b"\n")
+        for command in lines:
+            command = command.strip()
+            if command == b"MODE BIN" and self.binary:
+                self.write_line(MODE_BINARY_ACK.decode())
+                self.binary_mode = True
+            elif command == b"MODE RAW" and self.raw:
+                self.write_line(MODE_RAW_ACK.decode())
+                self.raw_mode = True
+            elif command == b"MODE ASCII":
+                self.binary_mode = False
+                self.write_line("MODE:ASCII")
+
+    def _random_walk(self):
+        state = self._state
+        state["water_temp"] += self._rng.uniform(-0.3, 0.3)
+        state["ec"] += self._rng.uniform(-0.05, 0.05)
+        state["ph"] += self._rng.uniform(-0.1, 0.1)
+        return stream2pi_line(tds=state["ec"] * 500, **state)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate stream2pi.ino boards on pseudo-terminals")
+    parser.add_argument("--devices", type=int, default=1, help="Number of fake boards")
+    parser.add_argument("--rate", type=float, default=1.0, help="Lines per second per board")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed (board i uses seed + i)")
+    parser.add_argument("--binary", action="store_true", help="Answer MODE BIN")
+    parser.add_argument("--raw", action="store_true", help="Answer MODE RAW")
+    args = parser.parse_args()
+
+    fakes = [
+        FakeArduino(args.rate, seed=None if args.seed is None else args.seed + i, binary=args.binary, raw=args.raw).start()
+        for i in range(args.devices)
+    ]
+    for i, fake in enumerate(fakes):
+        print(f"tank{i + 1} {fake.port}")
+    print("Press Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for fake in fakes:
+            fake.stop()
+
+
+if __name__ == "__main__":
+    main()
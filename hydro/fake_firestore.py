@@ -0,0 +1,165 @@
+import uuid
+from datetime import datetime, timezone
+
+MAX_BATCH_WRITES = 500
+
+
+class FakeFirestore:
+    """
+    In-process stand-in for ``google.cloud.firestore.Client``.
+
+    Implements the subset of the client API the monitor scripts use
+    (``collection``, ``document``, ``add``, ``set``, ``get``, ``stream``,
+    batched writes and ``order_by``/``start_at``/``start_after``/``limit``
+    queries). Set ``fail_writes`` to simulate an outage; every write
+    then raises ``ConnectionError``. Committed batches are recorded in
+    ``batch_sizes``; like the server, a batch over 500 writes is rejected.
+
+    For tests against the real client, start the Firestore emulator and set
+    ``FIRESTORE_EMULATOR_HOST``; ``firestore.Client`` picks it up on its own.
+    """
+
+    def __init__(self):
+        self.collections = {}
+        self.fail_writes = False
+        self.round_trips = 0
+        self.batch_sizes = []
+
+    def collection(self, name):
+        return FakeCollection(self, name)
+
+    def batch(self):
+        return FakeBatch(self)
+
+    def _write(self, collection, doc_id, data):
+        self.collections.setdefault(collection, {})[doc_id] = dict(data)
+
+    def _check(self):
+        self.round_trips += 1
+        if self.fail_writes:
+            raise ConnectionError("simulated Firestore outage")
+
+
+class FakeCollection:
+    def __init__(self, client, name):
+        self._client = client
+        self.id = name
+
+    def document(self, doc_id=None):
+        return FakeDocument(self._client, self.id, doc_id or uuid.uuid4().hex)
+
+    def add(self, data):
+        doc = self.document()
+        doc.set(data)
+        return None, doc
+
+    def stream(self):
+        return FakeQuery(self._client, self.id).stream()
+
+    def order_by(self, field):
+        return FakeQuery(self._client, self.id).order_by(field)
+
+
+class FakeQuery:
+    """Ordered, cursored, limited view of a collection."""
+
+    def __init__(self, client, collection):
+        self._client = client
+        self._collection = collection
+        self._order = None
+        self._cursor = None  # (key, inclusive)
+        self._limit = None
+
+    def order_by(self, field):
+        self._order = field
+        return self
+
+    def start_at(self, cursor):
+        self._cursor = (self._cursor_key(cursor), True)
+        return self
+
+    def start_after(self, cursor):
+        self._cursor = (self._cursor_key(cursor), False)
+        return self
+
+    def limit(self, count):
+        self._limit = count
+        return self
+
+    def stream(self):
+        self._client.round_trips += 1
+        docs = list(self._client.collections.get(self._collection, {}).items())
+        if self._order is not None:
+            docs.sort(key=lambda item: (_comparable(item[1].get(self._order)), item[0]))
+        if self._cursor is not None:
+            key, inclusive = self._cursor
+            docs = [
+                (doc_id, data) for doc_id, data in docs
+                if self._sort_key(doc_id, data, key) > key or (inclusive and self._sort_key(doc_id, data, key) == key)
+            ]
+        for doc_id, data in docs[:self._limit]:
+            yield FakeSnapshot(doc_id, data)
+
+    def _cursor_key(self, cursor):
+        # A snapshot cursor includes the document ID as tie-breaker; a dict does not
+        if isinstance(cursor, FakeSnapshot):
+            return (_comparable(cursor.to_dict().get(self._order)), cursor.id)
+        return (_comparable(cursor[self._order]),)
+
+    def _sort_key(self, doc_id, data, key):
+        return (_comparable(data.get(self._order)), doc_id)[:len(key)]
+
+
+def _comparable(value):
+    """Firestore stores datetimes in UTC; treat naive ones as UTC like the server does."""
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+    return value
+
+
+class FakeDocument:
+    def __init__(self, client, collection, doc_id):
+        self._client = client
+        self._collection = collection
+        self.id = doc_id
+
+    def set(self, data):
+        self._client._check()
+        self._client._write(self._collection, self.id, data)
+
+    def get(self):
+        self._client.round_trips += 1
+        return FakeSnapshot(self.id, self._client.collections.get(self._collection, {}).get(self.id))
+
+
+class FakeSnapshot:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self._data = data
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+
+class FakeBatch:
+    def __init__(self, client):
+        self._client = client
+        self._writes = []
+
+    def set(self, doc_ref, data):
+        self._writes.append((doc_ref, dict(data)))
+
+    def commit(self):
+        if len(self._writes) > MAX_BATCH_WRITES:
+            raise ValueError(f"maximum {MAX_BATCH_WRITES} writes allowed per request")
+        self._client._check()
+        self._client.batch_sizes.append(len(self._writes))
+        for doc_ref, data in self._writes:
+            self._client._write(doc_ref._collection, doc_ref.id, data)
+        self._writes = []
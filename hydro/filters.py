@@ -0,0 +1,301 @@
+"""
+Streaming filters applied once per sample at ingest.
+
+Each stage takes one float and returns one float, keeps at most ``window``
+values of state and treats NaN as "no sample" (NaN out, state unchanged):
+
+    RunningMedian(window)      median of the last ``window`` values
+    Hampel(window, n_sigmas)   replace outliers by the window median
+    EMA(alpha=, span=)         exponential moving average
+
+Stages are chained per sensor in a ``FilterPipeline``, which can also
+compensate EC/TDS to 25 °C using the (filtered) water temperature. The
+``*_batch`` functions are NumPy equivalents over a whole array, used to
+filter history loaded from disk and to check the streaming versions
+(tests/test_filters.py).
+"""
+import bisect
+import math
+from collections import deque
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from hydro.protocol import Reading
+
+# Scales the median absolute deviation to a standard deviation for normal noise
+MAD_SCALE = 1.4826
+
+_NAN = float("nan")
+
+
+class RunningMedian:
+    """
+    Median of the last ``window`` values (fewer while filling up).
+
+    The window is kept sorted: bisect finds the slot in O(log w) and the
+    insert/remove is a memmove, which beats a pair of heaps for the window
+    sizes used here.
+    """
+
+    def __init__(self, window=5):
+        self.window = window
+        self.reset()
+
+    def reset(self):
+        self._order = deque()
+        self._sorted = []
+
+    def __call__(self, value):
+        if value != value:
+            return _NAN
+        self._push(value)
+        return self.median()
+
+    def median(self):
+        s = self._sorted
+        n = len(s)
+        half = n // 2
+        return s[half] if n % 2 else 0.5 * (s[half - 1] + s[half])
+
+    def _push(self, value):
+        if len(self._order) == self.window:
+            old = self._order.popleft()
+            del self._sorted[bisect.bisect_left(self._sorted, old)]
+        self._order.append(value)
+        bisect.insort(self._sorted, value)
+
+
+class Hampel(RunningMedian):
+    """
+    Hampel identifier on a trailing window (including the new value): a
+    value further than ``n_sigmas`` scaled MADs from the window median is
+    replaced by the median. ``replaced`` counts the outliers.
+
+    The MAD is the median of |x - median|. Read from the sorted window, the
+    deviations below and above the median are two sorted runs, so their
+    median is a k-th-of-two-sorted-arrays search: O(log w).
+    """
+
+    def __init__(self, window=7, n_sigmas=3.0):
+        self.n_sigmas = n_sigmas
+        self.replaced = 0
+        super().__init__(window)
+
+    def __call__(self, value):
+        if value != value:
+            return _NAN
+        self._push(value)
+        median = self.median()
+        if abs(value - median) > self.n_sigmas * MAD_SCALE * self.mad(median):
+            self.replaced += 1
+            return median
+        return value
+
+    def mad(self, median):
+        s = self._sorted
+        n = len(s)
+        split = bisect.bisect_left(s, median)
+
+        def below(i):  # i-th smallest deviation among values < median
+            return median - s[split - 1 - i]
+
+        def above(i):  # i-th smallest deviation among values >= median
+            return s[split + i] - median
+
+        half = n // 2
+        if n % 2:
+            return _kth(below, split, above, n - split, half)
+        return 0.5 * (_kth(below, split, above, n - split, half - 1) + _kth(below, split, above, n - split, half))
+
+
+class EMA:
+    """Exponential moving average; give ``alpha`` or ``span`` (alpha = 2 / (span + 1))."""
+
+    def __init__(self, alpha=None, span=None):
+        if (alpha is None) == (span is None):
+            raise ValueError("give exactly one of alpha or span")
+        self.alpha = alpha if alpha is not None else 2.0 / (span + 1.0)
+        self.reset()
+
+    def reset(self):
+        self.value = None
+
+    def __call__(self, value):
+        if value != value:
+            return _NAN
+        if self.value is None:
+            self.value = value
+        else:
+            self.value += self.alpha * (value - self.value)
+        return self.value
+
+
+class FilterPipeline:
+    """
+    Per-sensor chains of stages applied to each ``Reading``.
+
+    ``stages`` maps field names to lists of stages. With ``compensate=True``
+    EC and TDS are referred to 25 °C using the filtered water temperature;
+    stream2pi.ino's DFRobot library already does this for EC, so it is only
+    needed for sketches that report raw values.
+
+    Usage:
+        pipeline = FilterPipeline({"ph": [Hampel(7), EMA(span=4)]})
+        smoothed = pipeline(reading)
+    """
+
+    def __init__(self, stages=None, compensate=False, coefficient=0.02):
+        self.stages = {field: list(chain) for field, chain in (stages or {}).items()}
+        unknown = set(self.stages) - set(Reading._fields)
+        if unknown:
+            raise ValueError(f"unknown fields: {sorted(unknown)}")
+        self.compensate = compensate
+        self.coefficient = coefficient
+        self._chains = [self.stages.get(field, ()) for field in Reading._fields]
+
+    def __call__(self, reading):
+        values = []
+        for value, chain in zip(reading, self._chains):
+            for stage in chain:
+                value = stage(value)
+            values.append(value)
+        if self.compensate:
+            water_temp = values[1]
+            if not math.isnan(water_temp):
+                factor = 1.0 + self.coefficient * (water_temp - 25.0)
+                values[2] /= factor
+                values[3] /= factor
+        return Reading._make(values)
+
+    def reset(self):
+        for chain in self._chains:
+            for stage in chain:
+                stage.reset()
+
+    def prime(self, values):
+        """Feed recent history (rows in ``Reading`` order) through the stages, discarding the output."""
+        for row in np.asarray(values, dtype=float).reshape(-1, len(Reading._fields)).tolist():
+            self(row)
+
+    def apply_batch(self, values):
+        """
+        Filter an (n, 5) array (``Reading`` field order) with the batch
+        equivalents of the stages; returns a new array.
+        """
+        out = np.array(values, dtype=float, copy=True).reshape(-1, len(Reading._fields))
+        for column, chain in enumerate(self._chains):
+            for stage in chain:
+                out[:, column] = batch_equivalent(stage, out[:, column])
+        if self.compensate:
+            factor = 1.0 + self.coefficient * (out[:, 1] - 25.0)
+            valid = ~np.isnan(factor)
+            out[valid, 2] /= factor[valid]
+            out[valid, 3] /= factor[valid]
+        return out
+
+
+def default_pipeline():
+    """Spike rejection plus light smoothing on every sensor, as the dashboard draws it."""
+    return FilterPipeline({field: [Hampel(9), EMA(span=4)] for field in Reading._fields})
+
+
+def running_median_batch(values, window):
+    """NumPy equivalent of ``RunningMedian`` over a whole array."""
+    return _over_valid(values, window, lambda windows: np.median(windows, axis=1), np.median)
+
+
+def hampel_batch(values, window, n_sigmas=3.0):
+    """NumPy equivalent of ``Hampel`` over a whole array."""
+
+    def full(windows):
+        median = np.median(windows, axis=1)
+        mad = np.median(np.abs(windows - median[:, None]), axis=1)
+        current = windows[:, -1]
+        return np.where(np.abs(current - median) > n_sigmas * MAD_SCALE * mad, median, current)
+
+    def partial(window_values):
+        return full(window_values[None, :])[0]
+
+    return _over_valid(values, window, full, partial)
+
+
+def ema_batch(values, alpha):
+    """
+    NumPy equivalent of ``EMA``: y[i] = y[i-1] + alpha * (x[i] - y[i-1]).
+
+    Solved in closed form per chunk with cumulative sums; chunks are short
+    enough that (1 - alpha) ** -k stays far from overflow.
+    """
+    values = np.asarray(values, dtype=float)
+    out = np.full(len(values), np.nan)
+    valid = ~np.isnan(values)
+    x = values[valid]
+    if len(x) == 0:
+        return out
+    decay = 1.0 - alpha
+    if decay <= 0.0:
+        out[valid] = x
+        return out
+    chunk = max(1, min(len(x), int(200.0 / -math.log10(decay)))) if decay < 1.0 else len(x)
+    y = np.empty(len(x))
+    previous = x[0]
+    for start in range(0, len(x), chunk):
+        part = x[start:start + chunk]
+        k = np.arange(len(part))
+        growth = decay ** -k
+        y[start:start + len(part)] = decay ** (k + 1) * previous + alpha * decay ** k * np.cumsum(part * growth)
+        previous = y[start + len(part) - 1]
+    out[valid] = y
+    return out
+
+
+def batch_equivalent(stage, values):
+    """Run the NumPy equivalent of a streaming stage over ``values``."""
+    if isinstance(stage, Hampel):
+        return hampel_batch(values, stage.window, stage.n_sigmas)
+    if isinstance(stage, RunningMedian):
+        return running_median_batch(values, stage.window)
+    if isinstance(stage, EMA):
+        return ema_batch(values, stage.alpha)
+    raise TypeError(f"no batch equivalent for {type(stage).__name__}")
+
+
+def _kth(a, len_a, b, len_b, k):
+    """k-th smallest (0-based) of two sorted sequences given as index functions."""
+    # Binary search on how many of the k + 1 smallest come from ``a``
+    lo, hi = max(0, k + 1 - len_b), min(k + 1, len_a)
+    while lo < hi:
+        take_a = (lo + hi) // 2
+        take_b = k + 1 - take_a
+        if take_b > 0 and take_a < len_a and a(take_a) < b(take_b - 1):
+            lo = take_a + 1
+        else:
+            hi = take_a
+    take_a = lo
+    take_b = k + 1 - take_a
+    candidates = []
+    if take_a > 0:
+        candidates.append(a(take_a - 1))
+    if take_b > 0:
+        candidates.append(b(take_b - 1))
+    return max(candidates)
+
+
+def _over_valid(values, window, full, partial):
+    """
+    Apply a trailing-window filter to the non-NaN samples only (NaN stays
+    NaN). ``full`` gets all complete windows as a 2-D view; ``partial`` gets
+    each of the shorter windows at the start, as the streams see them.
+    """
+    values = np.asarray(values, dtype=float)
+    out = np.full(len(values), np.nan)
+    valid = ~np.isnan(values)
+    x = values[valid]
+    y = np.empty(len(x))
+    for i in range(min(window - 1, len(x))):
+        y[i] = partial(x[:i + 1])
+    if len(x) >= window:
+        y[window - 1:] = full(sliding_window_view(x, window))
+    out[valid] = y
+    return out
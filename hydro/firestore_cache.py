@@ -0,0 +1,182 @@
+"""
+Incremental, cached reader for the ``sensor_readings`` Firestore collection.
+
+Documents are fetched with ordered, paginated queries starting at the
+timestamp high-water mark of the local cache, so each run only downloads
+documents written since the last one. The cache is a directory of ``.npz``
+column chunks plus a ``meta.json`` index:
+
+    cache_dir/
+        meta.json          high-water mark and per-chunk time ranges
+        chunk_000001.npz   "timestamp" (epoch seconds) + one array per field
+"""
+import json
+import os
+from datetime import datetime, timezone
+
+import numpy as np
+
+MAX_CHUNKS = 64  # Merge into one chunk beyond this many files
+
+
+class FirestoreCache:
+    """
+    Usage:
+        cache = FirestoreCache(db, "~/.cache/hydro/sensor_readings")
+        cache.sync()  # Fetch only new documents
+        columns = cache.load(start=time.time() - 7 * 86400)
+        columns["timestamp"], columns["ph"]
+    """
+
+    def __init__(self, db, cache_dir, collection="sensor_readings", page_size=1000, chunk_rows=50000):
+        self.db = db
+        self.cache_dir = os.path.expanduser(cache_dir)
+        self.collection = collection
+        self.page_size = page_size
+        self.chunk_rows = chunk_rows
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.meta = self._read_meta()
+
+    def sync(self):
+        """Download documents newer than the cache; returns how many were added."""
+        base = self.db.collection(self.collection).order_by("timestamp")
+        high_water = self.meta["high_water"]
+        seen_at_high_water = set(self.meta["high_water_ids"])
+        if high_water is None:
+            query = base
+        else:
+            # Inclusive, because several documents can share one timestamp
+            query = base.start_at({"timestamp": datetime.fromtimestamp(high_water, timezone.utc)})
+
+        added = 0
+        rows = []
+        while True:
+            page = list(query.limit(self.page_size).stream())
+            for snapshot in page:
+                data = snapshot.to_dict()
+                timestamp = _epoch(data.get("timestamp"))
+                if timestamp is None:
+                    continue
+                if timestamp == high_water and snapshot.id in seen_at_high_water:
+                    continue
+                rows.append((snapshot.id, timestamp, data))
+            if len(rows) >= self.chunk_rows:
+                added += self._write_chunk(rows)
+                rows = []
+            if len(page) < self.page_size:
+                break
+            query = base.start_after(page[-1])
+
+        if rows:
+            added += self._write_chunk(rows)
+        if len(self.meta["chunks"]) > MAX_CHUNKS:
+            self._merge_chunks()
+        return added
+
+    def load(self, start=None, end=None, columns=None):
+        """
+        Return cached documents in [start, end] as ``{column: array}``,
+        sorted by ``timestamp``. Chunks outside the range are not read.
+        Columns missing from a chunk are filled with NaN.
+        """
+        parts = []
+        for chunk in self.meta["chunks"]:
+            if (start is not None and chunk["end"] < start) or (end is not None and chunk["start"] > end):
+                continue
+            with np.load(os.path.join(self.cache_dir, chunk["file"])) as data:
+                parts.append({name: data[name] for name in data.files})
+
+        names = sorted({name for part in parts for name in part} - {"timestamp"})
+        if columns is not None:
+            names = [name for name in names if name in columns]
+        result = {"timestamp": np.concatenate([p["timestamp"] for p in parts]) if parts else np.empty(0)}
+        for name in names:
+            result[name] = np.concatenate(
+                [p.get(name, np.full(len(p["timestamp"]), np.nan)) for p in parts]
+            )
+
+        order = np.argsort(result["timestamp"], kind="stable")
+        keep = np.ones(len(order), dtype=bool)
+        times = result["timestamp"][order]
+        if start is not None:
+            keep &= times >= start
+        if end is not None:
+            keep &= times <= end
+        return {name: values[order][keep] for name, values in result.items()}
+
+    def _write_chunk(self, rows):
+        """Store rows as one chunk and advance the high-water mark."""
+        names = sorted({
+            key for _, _, data in rows for key, value in data.items()
+            if key != "timestamp" and isinstance(value, (int, float)) and not isinstance(value, bool)
+        })
+        arrays = {"timestamp": np.array([timestamp for _, timestamp, _ in rows])}
+        for name in names:
+            arrays[name] = np.array([_number(data.get(name)) for _, _, data in rows], dtype=float)
+
+        number = self.meta["next_chunk"]
+        filename = f"chunk_{number:06d}.npz"
+        np.savez(os.path.join(self.cache_dir, filename), **arrays)
+
+        newest = float(arrays["timestamp"].max())
+        ids = [doc_id for doc_id, timestamp, _ in rows if timestamp == newest]
+        if newest == self.meta["high_water"]:
+            ids += self.meta["high_water_ids"]
+        self.meta["high_water"] = newest
+        self.meta["high_water_ids"] = ids
+        self.meta["next_chunk"] = number + 1
+        self.meta["chunks"].append({
+            "file": filename,
+            "start": float(arrays["timestamp"].min()),
+            "end": newest,
+            "rows": len(rows),
+        })
+        self._write_meta()
+        return len(rows)
+
+    def _merge_chunks(self):
+        merged = self.load()
+        old = [chunk["file"] for chunk in self.meta["chunks"]]
+        number = self.meta["next_chunk"]
+        filename = f"chunk_{number:06d}.npz"
+        np.savez(os.path.join(self.cache_dir, filename), **merged)
+        self.meta["next_chunk"] = number + 1
+        self.meta["chunks"] = [{
+            "file": filename,
+            "start": float(merged["timestamp"].min()),
+            "end": float(merged["timestamp"].max()),
+            "rows": len(merged["timestamp"]),
+        }]
+        self._write_meta()
+        for name in old:
+            os.remove(os.path.join(self.cache_dir, name))
+
+    def _read_meta(self):
+        path = os.path.join(self.cache_dir, "meta.json")
+        if not os.path.exists(path):
+            return {"high_water": None, "high_water_ids": [], "next_chunk": 1, "chunks": []}
+        with open(path) as f:
+            return json.load(f)
+
+    def _write_meta(self):
+        path = os.path.join(self.cache_dir, "meta.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump(self.meta, f)
+        os.replace(path + ".tmp", path)
+
+
+def _epoch(value):
+    """Firestore timestamps come back as UTC datetimes; naive ones are UTC too."""
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+    if isinstance(value, (int, float)):
+        return float(value)
+    return None
+
+
+def _number(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return np.nan
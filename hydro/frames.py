@@ -0,0 +1,240 @@
+"""
+Binary framed mode of the stream2pi sketches.
+
+The sketches start in the ASCII line mode (see ``hydro.protocol``). When the
+host sends ``MODE BIN`` the sketch answers ``MODE:BIN`` and from then on
+sends fixed 25-byte frames (all little-endian):
+
+    offset  size  field
+    0       1     sync byte 0xA5
+    1       2     sequence number (uint16, wraps)
+    3       20    water_level, water_temp, ec, tds, ph (float32)
+    23      2     CRC16-CCITT (poly 0x1021, init 0xFFFF) of bytes 0..22
+
+Sketches without binary support never answer, so the host keeps parsing
+ASCII. The sequence number lets the host count frames lost on the wire.
+
+``MODE RAW`` (answered with ``MODE:RAW``) makes the sketch send probe
+voltages instead of calibrated EC/TDS/pH, in lines and frames alike; the
+frame layout is unchanged and decodes to ``RawReading``. A host that wants
+both sends ``MODE RAW`` first. Sketches without probes to read raw
+(stream2pi_noDisplay.ino) answer ``MODE:NORAW`` so the host stops asking.
+Boards return to calibrated ASCII whenever the port is reopened (which
+resets them).
+"""
+import math
+import struct
+from binascii import crc_hqx
+
+from hydro.protocol import RAW_VALID_RANGES, VALID_RANGES, LineParser, RawReading, Reading
+
+SYNC = 0xA5
+FRAME = struct.Struct("<BH5fH")
+FRAME_SIZE = FRAME.size  # 25 bytes, vs ~70 for an ASCII line
+
+MODE_BINARY_COMMAND = b"MODE BIN\n"
+MODE_ASCII_COMMAND = b"MODE ASCII\n"
+MODE_BINARY_ACK = b"MODE:BIN"
+MODE_RAW_COMMAND = b"MODE RAW\n"
+MODE_RAW_ACK = b"MODE:RAW"
+MODE_RAW_REFUSED = b"MODE:NORAW"
+
+_NAN = float("nan")
+_SYNC_BYTE = bytes([SYNC])
+
+
+def crc16(data):
+    """CRC16-CCITT as computed by the sketches."""
+    return crc_hqx(data, 0xFFFF)
+
+
+def encode_frame(seq, reading):
+    """Pack one frame (used by FakeArduino and for testing decoders)."""
+    body = FRAME.pack(SYNC, seq & 0xFFFF, *reading, 0)[:-2]
+    return body + struct.pack("<H", crc16(body))
+
+
+class FrameDecoder:
+    """
+    Incremental decoder for a stream of binary frames.
+
+    ``feed`` accepts arbitrary chunks (frames may be split across reads),
+    checks each frame's CRC in place on a memoryview and unpacks it with
+    ``struct.unpack_from``, so no per-frame bytes objects are created. On a
+    CRC mismatch it resynchronises on the next sync byte. Values outside
+    ``valid_ranges`` become NaN, as with ``LineParser``. Frames decode to
+    ``record`` (``RawReading`` in raw mode).
+    """
+
+    def __init__(self, valid_ranges=VALID_RANGES, record=Reading):
+        self.valid_ranges = valid_ranges
+        self.record = record
+        self._buffer = bytearray()
+        self._last_seq = None
+
+        self.frames = 0
+        self.crc_errors = 0
+        self.dropped_frames = 0  # Sequence gaps
+        self.rejected_frames = 0
+        self.rejected_values = 0
+
+    def feed(self, chunk):
+        """Return the ``(seq, Reading)`` pairs completed by ``chunk``."""
+        buf = self._buffer
+        buf += chunk
+        out = []
+        offset = 0
+        end = len(buf)
+        unpack_from = FRAME.unpack_from
+        record = self.record
+        (l0, h0), (l1, h1), (l2, h2), (l3, h3), (l4, h4) = self.valid_ranges
+        last_seq = self._last_seq
+        with memoryview(buf) as view:
+            while True:
+                start = buf.find(_SYNC_BYTE, offset)
+                if start < 0:
+                    offset = end
+                    break
+                if end - start < FRAME_SIZE:
+                    offset = start
+                    break
+                _, seq, a, b, c, d, e, crc = unpack_from(buf, start)
+                if crc_hqx(view[start:start + FRAME_SIZE - 2], 0xFFFF) != crc:
+                    self.crc_errors += 1
+                    offset = start + 1
+                    continue
+                offset = start + FRAME_SIZE
+                self.frames += 1
+                if last_seq is not None and seq != (last_seq + 1) & 0xFFFF:
+                    self.dropped_frames += (seq - last_seq - 1) & 0xFFFF
+                last_seq = seq
+                # Fast path: every value present and in range
+                if l0 <= a <= h0 and l1 <= b <= h1 and l2 <= c <= h2 and l3 <= d <= h3 and l4 <= e <= h4:
+                    out.append((seq, record(a, b, c, d, e)))
+                    continue
+                reading = self._validate([a, b, c, d, e])
+                if reading is not None:
+                    out.append((seq, reading))
+        self._last_seq = last_seq
+        del buf[:offset]
+        return out
+
+    def reset(self):
+        """Forget partial frames and the sequence number (the board was reset)."""
+        self._buffer.clear()
+        self._last_seq = None
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "crc_errors": self.crc_errors,
+            "dropped_frames": self.dropped_frames,
+            "rejected_frames": self.rejected_frames,
+            "rejected_values": self.rejected_values,
+        }
+
+    def _validate(self, values):
+        usable = 0
+        for slot, (lo, hi) in enumerate(self.valid_ranges):
+            value = values[slot]
+            if lo <= value <= hi:
+                usable += 1
+            else:
+                if not math.isnan(value):
+                    self.rejected_values += 1
+                values[slot] = _NAN
+        if not usable:
+            self.rejected_frames += 1
+            return None
+        return self.record._make(values)
+
+
+class StreamDecoder:
+    """
+    Raw serial bytes to Readings, in ASCII line mode until the board
+    acknowledges ``MODE BIN`` and in framed mode after that. Once it
+    acknowledges ``MODE RAW``, frames decode to ``RawReading`` (raw ASCII
+    lines are recognised by their keys); ``raw_refused`` is set if it
+    answers that it cannot.
+
+    Usage:
+        decoder = StreamDecoder()
+        port.write(MODE_BINARY_COMMAND)  # Optional; old sketches ignore it
+        for reading in decoder.feed(port.read(port.in_waiting)):
+            ...
+    """
+
+    def __init__(self, parser=None, valid_ranges=VALID_RANGES, raw_valid_ranges=RAW_VALID_RANGES):
+        self.parser = parser or LineParser(valid_ranges, raw_valid_ranges)
+        self.frames = FrameDecoder(valid_ranges)
+        self.valid_ranges = valid_ranges
+        self.raw_valid_ranges = raw_valid_ranges
+        self.binary = False
+        self.raw = False
+        self.raw_refused = False
+        self.lines = 0  # ASCII lines
+        self.line_errors = 0
+        self._pending = b""
+
+    @property
+    def lines_read(self):
+        """ASCII lines plus binary frames (including corrupt ones)."""
+        return self.lines + self.frames.frames + self.frames.crc_errors
+
+    @property
+    def parse_errors(self):
+        """Unusable ASCII lines, corrupt frames and frames with no valid value."""
+        return self.line_errors + self.frames.crc_errors + self.frames.rejected_frames
+
+    def feed(self, chunk):
+        """Return the Readings completed by ``chunk``."""
+        if self.binary:
+            return [reading for _, reading in self.frames.feed(chunk)]
+        data = self._pending + chunk
+        out = []
+        start = 0
+        while True:
+            newline = data.find(b"\n", start)
+            if newline < 0:
+                break
+            line = data[start:newline].strip()
+            start = newline + 1
+            if not line:
+                continue
+            if line == MODE_RAW_ACK:
+                self._set_raw(True)
+                continue
+            if line == MODE_RAW_REFUSED:
+                self.raw_refused = True
+                continue
+            if line == MODE_BINARY_ACK:
+                self.binary = True
+                self._pending = b""
+                return out + [reading for _, reading in self.frames.feed(data[start:])]
+            self.lines += 1
+            reading = self.parser.parse(line)
+            if reading is None:
+                self.line_errors += 1
+            else:
+                out.append(reading)
+        self._pending = data[start:]
+        return out
+
+    def reset(self):
+        """Back to ASCII mode for a new connection; counters are kept."""
+        self.binary = False
+        self._set_raw(False)
+        self.raw_refused = False
+        self._pending = b""
+        self.frames.reset()
+
+    def stats(self):
+        stats = {"mode": "binary" if self.binary else "ascii", "raw": self.raw, "lines_read": self.lines_read,
+                 "parse_errors": self.parse_errors}
+        stats.update(self.frames.stats())
+        return stats
+
+    def _set_raw(self, raw):
+        self.raw = raw
+        self.frames.record = RawReading if raw else Reading
+        self.frames.valid_ranges = self.raw_valid_ranges if raw else self.valid_ranges
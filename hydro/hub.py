@@ -0,0 +1,356 @@
+"""
+Asyncio ingestion hub for several Arduinos (one per tank) on one Pi.
+
+Every serial port is read from a single event loop: the port is opened
+non-blocking and registered with ``loop.add_reader``, so idle ports cost
+nothing and a dozen 10 Hz streams use a few percent of one core. Each
+valid line becomes a ``Sample(timestamp, tank, reading)`` that is fanned
+out to every subscriber (GUI, SensorStore, uploader).
+"""
+import asyncio
+import glob
+import heapq
+import os
+import threading
+import time
+from collections import deque, namedtuple
+
+import serial
+
+from hydro.frames import MODE_BINARY_COMMAND, MODE_RAW_COMMAND, StreamDecoder
+from hydro.log import get_logger
+
+log = get_logger(__name__)
+
+# Stable per-board names first; ttyACM*/ttyUSB* if udev has no by-id links
+DEFAULT_PATTERNS = ("/dev/serial/by-id/*", "/dev/ttyACM*", "/dev/ttyUSB*")
+
+Sample = namedtuple("Sample", ["timestamp", "tank", "reading"])
+
+# Device states
+CONNECTING = "connecting"
+CONNECTED = "connected"
+BACKOFF = "backoff"
+STOPPED = "stopped"
+
+
+def discover_ports(patterns=DEFAULT_PATTERNS):
+    """
+    Return ``{tank_id: port}`` for the serial devices present.
+
+    The first pattern that matches anything wins, so boards listed under
+    /dev/serial/by-id are not picked up a second time as /dev/ttyACM*.
+    """
+    for pattern in patterns:
+        ports = sorted(glob.glob(pattern))
+        if ports:
+            return {os.path.basename(port): port for port in ports}
+    return {}
+
+
+class Subscription:
+    """
+    Bounded per-tank queues for one consumer.
+
+    Each tank has its own ``maxlen`` deque, so a chatty or backed-up device
+    only ever drops its own oldest samples (counted in ``dropped``), never
+    another tank's. ``drain`` is safe to call from any thread.
+    """
+
+    def __init__(self, maxlen=1024, tanks=None):
+        self.maxlen = maxlen
+        self.tanks = set(tanks) if tanks is not None else None
+        self.dropped = {}
+        self._queues = {}
+        self._lock = threading.Lock()
+        self._ready = None  # asyncio.Event, created on the hub's loop
+
+    def drain(self, max_items=None):
+        """Return queued samples across all tanks, oldest first, without blocking."""
+        with self._lock:
+            merged = list(heapq.merge(*self._queues.values(), key=lambda sample: sample.timestamp))
+            if max_items is not None and len(merged) > max_items:
+                merged = merged[:max_items]
+                for sample in merged:
+                    self._queues[sample.tank].popleft()
+            else:
+                for queue in self._queues.values():
+                    queue.clear()
+            if self._ready is not None:
+                self._ready.clear()
+        return merged
+
+    async def get_batch(self):
+        """Wait until at least one sample is queued, then drain (hub loop only)."""
+        while True:
+            batch = self.drain()
+            if batch:
+                return batch
+            await self._ready.wait()
+
+    def depth(self):
+        return sum(len(queue) for queue in self._queues.values())
+
+    def _put(self, sample):
+        if self.tanks is not None and sample.tank not in self.tanks:
+            return
+        with self._lock:
+            queue = self._queues.get(sample.tank)
+            if queue is None:
+                queue = self._queues[sample.tank] = deque(maxlen=self.maxlen)
+            if len(queue) == self.maxlen:
+                self.dropped[sample.tank] = self.dropped.get(sample.tank, 0) + 1
+            queue.append(sample)
+        if self._ready is not None:
+            self._ready.set()
+
+
+class Device:
+    """
+    One serial port and its reconnect state machine.
+
+    connecting -> connected -> (read error or stale) -> backoff -> connecting
+
+    The backoff doubles from ``reconnect_delay`` up to ``max_reconnect_delay``
+    and resets once the port opens. If ``stale_timeout`` is set, a port that
+    stays open but sends no valid line for that long is reopened. With
+    ``binary=True`` the board is asked for binary frames (``hydro.frames``)
+    after each connect; boards that do not answer stay in ASCII mode. With
+    ``raw=True`` it is asked for probe voltages (``RawReading``s, converted
+    by ``hydro.calibration``); boards that do not answer, or refuse, keep
+    calibrating.
+    """
+
+    def __init__(self, tank, port, baud_rate=9600, stale_timeout=None, reconnect_delay=1.0,
+                 max_reconnect_delay=30.0, binary=False, raw=False, negotiate_timeout=5.0,
+                 serial_factory=serial.Serial):
+        self.tank = tank
+        self.port = port
+        self.baud_rate = baud_rate
+        self.stale_timeout = stale_timeout
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.binary = binary
+        self.raw = raw
+        self.negotiate_timeout = negotiate_timeout
+        self.serial_factory = serial_factory
+        self.decoder = StreamDecoder()
+        self.state = STOPPED
+
+        self.reconnects = 0
+        self._has_connected = False
+        self._last_sample = time.monotonic()
+
+    async def run(self, publish):
+        """Read until cancelled, calling ``publish(Sample)`` for each valid line."""
+        delay = self.reconnect_delay
+        try:
+            while True:
+                self.state = CONNECTING
+                try:
+                    port = self.serial_factory(self.port, self.baud_rate, timeout=0)
+                except (serial.SerialException, OSError) as e:
+                    log.warning("Error connecting to tank %s on %s: %s", self.tank, self.port, e)
+                else:
+                    if self._has_connected:
+                        self.reconnects += 1
+                    self._has_connected = True
+                    self.state = CONNECTED
+                    delay = self.reconnect_delay
+                    try:
+                        await self._read(port, publish)
+                    except (serial.SerialException, OSError) as e:
+                        log.warning("Error reading tank %s: %s", self.tank, e)
+                    finally:
+                        port.close()
+                self.state = BACKOFF
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_reconnect_delay)
+        finally:
+            self.state = STOPPED
+
+    def sample_age(self):
+        """Seconds since the last valid sample (or since the port was opened)."""
+        return time.monotonic() - self._last_sample
+
+    def stats(self):
+        stats = {
+            "port": self.port,
+            "state": self.state,
+            "reconnects": self.reconnects,
+            "sample_age": self.sample_age(),
+        }
+        stats.update(self.decoder.stats())
+        return stats
+
+    async def _read(self, port, publish):
+        loop = asyncio.get_running_loop()
+        ready = asyncio.Event()
+        fd = port.fileno()
+        loop.add_reader(fd, ready.set)
+        self._last_sample = time.monotonic()  # Grace period while the board boots
+        self.decoder.reset()
+        # The board may still be booting, so the mode request is repeated every second
+        negotiate_until = time.monotonic() + self.negotiate_timeout if self.binary or self.raw else 0.0
+        next_request = 0.0
+        try:
+            while True:
+                now = time.monotonic()
+                if now < negotiate_until and now >= next_request:
+                    # Raw first: its acknowledgement is an ASCII line
+                    request = MODE_RAW_COMMAND if self._wants_raw() else b""
+                    if self.binary and not self.decoder.binary:
+                        request += MODE_BINARY_COMMAND
+                    if request:
+                        port.write(request)
+                    next_request = now + 1.0
+                try:
+                    await asyncio.wait_for(ready.wait(), self._wait_timeout(negotiate_until))
+                except asyncio.TimeoutError:
+                    pass
+                if self.stale_timeout is not None and self.sample_age() > self.stale_timeout:
+                    raise serial.SerialException(f"no valid data for {self.stale_timeout}s")
+                if not ready.is_set():
+                    continue
+                ready.clear()
+                chunk = port.read(max(1, port.in_waiting))
+                timestamp = time.time()
+                readings = self.decoder.feed(chunk)
+                if readings:
+                    self._last_sample = time.monotonic()
+                for reading in readings:
+                    publish(Sample(timestamp, self.tank, reading))
+        finally:
+            loop.remove_reader(fd)
+
+    def _wants_raw(self):
+        return self.raw and not self.decoder.raw and not self.decoder.raw_refused
+
+    def _wait_timeout(self, negotiate_until):
+        timeouts = []
+        if self.stale_timeout is not None:
+            timeouts.append(max(0.0, self.stale_timeout - self.sample_age()) + 0.01)
+        negotiating = (self.binary and not self.decoder.binary) or self._wants_raw()
+        if negotiating and time.monotonic() < negotiate_until:
+            timeouts.append(1.0)
+        return min(timeouts, default=None)
+
+
+class IngestHub:
+    """
+    Reads every tank's Arduino on one event loop and fans samples out.
+
+    ``ports`` maps tank IDs to serial ports; with ``discover=True`` the hub
+    also scans ``patterns`` every ``rescan_interval`` seconds and adopts new
+    devices (tank ID = device file name). Extra keyword arguments go to
+    ``Device``.
+
+    Usage:
+        hub = IngestHub({"tank1": "/dev/ttyACM0", "tank2": "/dev/ttyACM1"})
+        gui_feed = hub.subscribe()
+        hub.start()  # Background thread; or ``await hub.run()`` in a loop
+        for timestamp, tank, reading in gui_feed.drain():
+            ...
+        hub.stop()
+    """
+
+    def __init__(self, ports=None, discover=False, patterns=DEFAULT_PATTERNS, rescan_interval=5.0, **device_options):
+        self.discover = discover
+        self.patterns = patterns
+        self.rescan_interval = rescan_interval
+        self.device_options = device_options
+        self.devices = {}
+        self.samples = 0
+        self._subscriptions = []
+        self._tasks = {}
+        self._loop = None
+        self._stopping = None
+        self._thread = None
+        for tank, port in (ports or {}).items():
+            self.add_device(tank, port)
+
+    def add_device(self, tank, port):
+        """Register a port; started at once if the hub is running (hub loop only)."""
+        if tank in self.devices:
+            raise ValueError(f"duplicate tank ID: {tank}")
+        device = self.devices[tank] = Device(tank, port, **self.device_options)
+        if self._loop is not None:
+            self._tasks[tank] = self._loop.create_task(device.run(self._publish))
+        return device
+
+    def subscribe(self, maxlen=1024, tanks=None):
+        """Return a new Subscription; only ``tanks`` if given."""
+        subscription = Subscription(maxlen, tanks)
+        if self._loop is not None:
+            subscription._ready = asyncio.Event()
+        self._subscriptions.append(subscription)
+        return subscription
+
+    async def run(self):
+        """Run until ``stop`` is called."""
+        self._loop = asyncio.get_running_loop()
+        self._stopping = asyncio.Event()
+        for subscription in self._subscriptions:
+            subscription._ready = asyncio.Event()
+        for tank, device in self.devices.items():
+            self._tasks[tank] = self._loop.create_task(device.run(self._publish))
+        try:
+            while not self._stopping.is_set():
+                if self.discover:
+                    self._rescan()
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), self.rescan_interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            for task in self._tasks.values():
+                task.cancel()
+            await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+            self._tasks = {}
+            self._loop = None
+
+    def start(self):
+        """Run the hub on its own thread; returns self."""
+        started = threading.Event()
+
+        async def main():
+            run = asyncio.ensure_future(self.run())
+            await asyncio.sleep(0)
+            started.set()
+            await run
+
+        self._thread = threading.Thread(target=asyncio.run, args=(main(),), name="IngestHub", daemon=True)
+        self._thread.start()
+        started.wait()
+        return self
+
+    def stop(self, timeout=None):
+        """Stop the hub; safe to call from any thread."""
+        loop = self._loop
+        if loop is not None:
+            loop.call_soon_threadsafe(self._stopping.set)
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def stats(self):
+        """Per-tank device counters plus per-subscriber queue depth and drops; safe from any thread."""
+        return {
+            "samples": self.samples,
+            "devices": {tank: device.stats() for tank, device in list(self.devices.items())},
+            "subscriptions": [
+                {"depth": sub.depth(), "dropped": dict(sub.dropped)} for sub in self._subscriptions
+            ],
+        }
+
+    def _publish(self, sample):
+        self.samples += 1
+        for subscription in self._subscriptions:
+            subscription._put(sample)
+
+    def _rescan(self):
+        known = {device.port for device in self.devices.values()}
+        for tank, port in discover_ports(self.patterns).items():
+            if port not in known and tank not in self.devices:
+                log.info("Found new device for tank %s on %s", tank, port)
+                self.add_device(tank, port)
@@ -0,0 +1,146 @@
+"""
+Live-updating Matplotlib chart for the Tk dashboard.
+
+The axes, grid, locators and labels are drawn once into a cached background;
+each frame only restores that background, updates the line data in place and
+blits the axes region. A full redraw happens only when the sensor changes,
+the window is resized, or the time axis has to scroll.
+"""
+import time
+from datetime import datetime
+
+import numpy as np
+from matplotlib.dates import DateFormatter, MinuteLocator, date2num
+
+from hydro.log import get_logger
+from hydro.metrics import REGISTRY
+from hydro.resample import lttb
+
+log = get_logger(__name__)
+
+
+def to_plot_dates(epochs):
+    """Convert epoch seconds to Matplotlib date numbers in local time."""
+    offset = datetime.now().astimezone().utcoffset().total_seconds()
+    return date2num(((np.asarray(epochs) + offset) * 1e6).astype("datetime64[us]"))
+
+
+class LiveChart:
+    """
+    Blitted time-series chart throttled to ``fps`` frames per second.
+
+    Args:
+        ax: Matplotlib axes to draw into.
+        canvas: The FigureCanvasTkAgg holding ``ax``.
+        source (callable): ``source(name)`` returns ``(epochs, values)`` arrays.
+        window (float): Seconds of history shown.
+        fps (float): Target frame rate.
+        max_points (int): Points drawn per frame (LTTB-downsampled), roughly the
+            axes width in pixels.
+    """
+
+    def __init__(self, ax, canvas, source, window=3600, fps=5, max_points=700, color="white"):
+        self.ax = ax
+        self.canvas = canvas
+        self.source = source
+        self.window = window
+        self.fps = fps
+        self.max_points = max_points
+        self.color = color
+        self.name = None
+
+        self.frame_time = 0.0  # Last frame, seconds
+        self.mean_frame_time = 0.0  # Exponential moving average
+        self.max_frame_time = 0.0
+        self.full_redraws = 0
+        self.blit_time = REGISTRY.histogram("hydro_render_seconds", "LiveChart frame time", redraw="blit")
+        self.redraw_time = REGISTRY.histogram("hydro_render_seconds", "LiveChart frame time", redraw="full")
+
+        self._background = None
+        self._x_end = None
+        self._widget = None
+        self._data_key = None
+
+        self._configure_axes(color)
+        self.line, = ax.plot([], [], "-", color=color, linewidth=1.2, animated=True)
+        canvas.mpl_connect("draw_event", self._on_draw)
+
+    def show(self, name, ylabel, y_range):
+        """Switch to another series; this needs one full redraw."""
+        self.name = name
+        self._data_key = None
+        self.ax.set_ylabel(ylabel, color=self.color)
+        self.ax.set_ylim(y_range)
+        self._scroll(time.time())
+
+    def start(self, widget):
+        """Start the frame loop on a Tk widget's ``after`` scheduler."""
+        self._widget = widget
+        self._tick()
+
+    def frame(self):
+        """Render one frame with the latest data."""
+        if self.name is None:
+            return
+        start = time.perf_counter()
+
+        now = time.time()
+        if self._x_end is None or now > self._x_end:
+            self._scroll(now)
+
+        # Only re-downsample when new samples arrived since the last frame
+        times, values = self.source(self.name)
+        key = (self.name, len(times), times[-1] if len(times) else None)
+        if key != self._data_key:
+            self._data_key = key
+            present = ~np.isnan(values)
+            times, values = lttb(times[present], values[present], self.max_points)
+            self.line.set_data(to_plot_dates(times), values)
+
+        full = self._background is None
+        if full:
+            self.canvas.draw()  # _on_draw captures the background
+        self.canvas.restore_region(self._background)
+        self.ax.draw_artist(self.line)
+        self.canvas.blit(self.ax.bbox)
+
+        self.frame_time = time.perf_counter() - start
+        (self.redraw_time if full else self.blit_time).observe(self.frame_time)
+        self.mean_frame_time += 0.1 * (self.frame_time - self.mean_frame_time)
+        self.max_frame_time = max(self.max_frame_time, self.frame_time)
+
+    def frame_report(self):
+        """One-line frame time summary for the status bar."""
+        return (
+            f"frame {self.mean_frame_time * 1000:.1f} ms (max {self.max_frame_time * 1000:.0f}) "
+            f"/ budget {1000 / self.fps:.0f} ms"
+        )
+
+    def _tick(self):
+        try:
+            self.frame()
+        except Exception as e:
+            log.warning("Error updating plot: %s", e)
+        self._widget.after(int(1000 / self.fps), self._tick)
+
+    def _scroll(self, now):
+        """Move the time axis forward; leaves 1/12 of the window as headroom."""
+        self._x_end = now + self.window / 12
+        self.ax.set_xlim(*to_plot_dates([self._x_end - self.window, self._x_end]))
+        self._background = None
+        self.full_redraws += 1
+
+    def _on_draw(self, event):
+        self._background = self.canvas.copy_from_bbox(self.ax.bbox)
+
+    def _configure_axes(self, color):
+        ax = self.ax
+        ax.grid(which="major", color=color, linestyle="-", linewidth=0.8)
+        ax.grid(which="minor", color="lightgray", linestyle="--", linewidth=0.5)
+        ax.xaxis.set_major_locator(MinuteLocator(interval=15))  # Major ticks every 15 minutes
+        ax.xaxis.set_minor_locator(MinuteLocator(interval=5))  # Minor ticks every 5 minutes
+        ax.xaxis.set_major_formatter(DateFormatter("%H:%M"))
+        ax.tick_params(axis="x", which="major", labelsize=10, colors=color)
+        ax.tick_params(axis="x", which="minor", length=5, colors=color)
+        ax.tick_params(axis="y", colors=color)
+        ax.set_xlabel(f"Time ({self.window / 3600:g}hr)", color=color)
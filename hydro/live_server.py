@@ -0,0 +1,340 @@
+"""
+Small asyncio HTTP server for live data on the LAN (no cloud round trip).
+
+Endpoints:
+    GET /                  five-panel live page (webinterface/live.html)
+    GET /api/latest        newest sample per tank, JSON
+    GET /api/range         ?start=&end=&tank=&points= history from SensorStore,
+                           binned to ``points`` buckets, JSON columns; long
+                           ranges are read from its rollup tiers
+    GET /api/stream        Server-Sent Events: one ``snapshot`` event, then
+                           one ``sample`` event per new sample carrying only
+                           the fields that changed (delta encoding)
+
+Each sample is encoded once and the same bytes are written straight to
+every client's transport (no per-client queue or task wake-up). A client
+whose unsent backlog exceeds ``max_backlog`` bytes is disconnected; the
+browser's EventSource reconnects and starts again from a fresh snapshot.
+
+Usage: python -m hydro.live_server [--port 8080] [--ports tank1=/dev/ttyACM0 ...] [--simulate 2]
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from hydro.protocol import Reading
+
+PAGE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "webinterface", "live.html")
+
+MAX_REQUEST_BYTES = 8192
+KEEPALIVE_INTERVAL = 15.0  # Seconds between SSE comments on an idle stream
+
+
+class LiveServer:
+    """
+    ``store`` is a SensorStore used only by this server for /api/range
+    (open a separate one: with WAL it reads while the collector writes).
+
+    Usage:
+        server = LiveServer(store, port=8080).start()  # Background thread
+        server.publish(timestamp, reading, tank)  # From any thread
+        server.stop()
+    """
+
+    def __init__(self, store=None, host="0.0.0.0", port=8080, max_backlog=256 * 1024, max_points=2000):
+        self.store = store
+        self.host = host
+        self.port = port
+        self.max_backlog = max_backlog
+        self.max_points = max_points
+        self.latest = {}  # tank -> (timestamp, Reading)
+        self.clients = set()  # _Client
+        self.published = 0
+        self.disconnected_slow = 0
+
+        self._loop = None
+        self._loop_thread_id = None
+        self._server = None
+        self._thread = None
+        self._stopping = None
+        # SQLite connections are not safe to share across threads; one worker serialises queries
+        self._store_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="LiveServerStore")
+
+    # -- Publishing ------------------------------------------------------
+
+    def publish(self, timestamp, reading, tank=None):
+        """Hand a new sample to the server; safe to call from any thread."""
+        loop = self._loop
+        if loop is None:
+            return
+        if threading.get_ident() == self._loop_thread_id:
+            self._broadcast(timestamp, reading, tank)
+        else:
+            loop.call_soon_threadsafe(self._broadcast, timestamp, reading, tank)
+
+    def _broadcast(self, timestamp, reading, tank):
+        previous = self.latest.get(tank)
+        self.latest[tank] = (timestamp, reading)
+        self.published += 1
+        if previous is None:
+            changed = _values(reading)
+        else:
+            changed = {
+                name: _json_number(value)
+                for name, value, old in zip(Reading._fields, reading, previous[1])
+                if not (value == old or (value != value and old != old))
+            }
+        event = _sse("sample", {"tank": tank, "t": timestamp, "v": changed})
+        for client in list(self.clients):
+            if client.tank is not None and client.tank != tank:
+                continue
+            transport = client.transport
+            if transport.get_write_buffer_size() > self.max_backlog:
+                # Too far behind; it reconnects and resyncs from a snapshot
+                self.disconnected_slow += 1
+                self.clients.discard(client)
+                transport.abort()
+            else:
+                transport.write(event)
+
+    # -- Lifecycle -------------------------------------------------------
+
+    async def serve(self):
+        """Serve until ``stop`` is called."""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._stopping = asyncio.Event()
+        self._server = await asyncio.start_server(self._handle, self.host, self.port, limit=MAX_REQUEST_BYTES)
+        self.port = self._server.sockets[0].getsockname()[1]  # If port 0 was requested
+        try:
+            await self._stopping.wait()
+        finally:
+            self._server.close()
+            for client in list(self.clients):
+                client.transport.close()
+            await self._server.wait_closed()
+            self._loop = None
+
+    def start(self):
+        """Run the server on its own thread; returns self once it is listening."""
+        started = threading.Event()
+
+        async def main():
+            task = asyncio.ensure_future(self.serve())
+            while self._server is None and not task.done():
+                await asyncio.sleep(0.01)
+            started.set()
+            await task
+
+        self._thread = threading.Thread(target=asyncio.run, args=(main(),), name="LiveServer", daemon=True)
+        self._thread.start()
+        started.wait()
+        return self
+
+    def stop(self, timeout=None):
+        loop = self._loop
+        if loop is not None:
+            loop.call_soon_threadsafe(self._stopping.set)
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self._store_executor.shutdown(wait=False)
+
+    def stats(self):
+        return {
+            "clients": len(self.clients),
+            "published": self.published,
+            "disconnected_slow": self.disconnected_slow,
+        }
+
+    # -- HTTP ------------------------------------------------------------
+
+    async def _handle(self, reader, writer):
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout=10)
+            method, target, _ = head.split(b"\r\n", 1)[0].decode("latin-1").split(" ", 2)
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError, ValueError):
+            writer.close()
+            return
+        except ConnectionError:
+            return
+        url = urlsplit(target)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        try:
+            if method != "GET":
+                await self._respond(writer, 405, b"Method not allowed", "text/plain")
+            elif url.path == "/api/stream":
+                await self._stream(reader, writer, query.get("tank"))
+            elif url.path == "/api/latest":
+                await self._respond_json(writer, self._latest_payload())
+            elif url.path == "/api/range":
+                await self._respond_json(writer, await self._range_payload(query))
+            elif url.path in ("/", "/index.html"):
+                with open(PAGE_PATH, "rb") as f:
+                    await self._respond(writer, 200, f.read(), "text/html; charset=utf-8")
+            else:
+                await self._respond(writer, 404, b"Not found", "text/plain")
+        except ValueError as e:
+            await self._respond(writer, 400, str(e).encode(), "text/plain")
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer, status, body, content_type):
+        reason = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed"}[status]
+        writer.write(
+            f"HTTP/1.1 {status} {reason}\r\nContent-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\nCache-Control: no-store\r\nConnection: close\r\n\r\n".encode()
+            + body
+        )
+        await writer.drain()
+
+    async def _respond_json(self, writer, payload):
+        await self._respond(writer, 200, json.dumps(payload).encode(), "application/json")
+
+    async def _stream(self, reader, writer, tank):
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-store\r\n"
+            b"Connection: keep-alive\r\n\r\nretry: 2000\n\n"
+        )
+        writer.write(_sse("snapshot", self._latest_payload()))
+        client = _Client(writer.transport, tank)
+        self.clients.add(client)
+        try:
+            # Samples are written by _broadcast; this only notices the client leaving
+            while not writer.transport.is_closing():
+                try:
+                    data = await asyncio.wait_for(reader.read(1024), KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    writer.write(b": keepalive\n\n")
+                    continue
+                if not data:
+                    break
+        finally:
+            self.clients.discard(client)
+
+    def _latest_payload(self):
+        return {
+            str(tank) if tank is not None else "": {"t": timestamp, "v": _values(reading)}
+            for tank, (timestamp, reading) in self.latest.items()
+        }
+
+    async def _range_payload(self, query):
+        if self.store is None:
+            raise ValueError("no local history on this server")
+        now = time.time()
+        start = float(query.get("start", now - 3600))
+        end = float(query.get("end", now))
+        points = min(int(query.get("points", 600)), self.max_points)
+        if not (math.isfinite(start) and math.isfinite(end)):
+            raise ValueError("start and end must be finite")  # float() takes "nan" and "inf"
+        if end <= start or points < 1:
+            raise ValueError("need start < end and points >= 1")
+        tank = query.get("tank")
+        interval = (end - start) / points
+        times, values, weights = await self._loop.run_in_executor(
+            self._store_executor, lambda: self._range(start, end, points, tank)
+        )
+        # Bin means on a fixed grid so every column shares one time axis
+        index = np.clip(((times - start) // interval).astype(np.int64), 0, points - 1)
+        payload = {"timestamp": (start + (np.arange(points) + 0.5) * interval).tolist()}
+        for name in Reading._fields:
+            column = values[name]
+            present = ~np.isnan(column)
+            weight = None if weights is None else weights[name][present]
+            counts = np.bincount(index[present], weights=weight, minlength=points)
+            sums = np.bincount(
+                index[present], weights=column[present] if weight is None else column[present] * weight,
+                minlength=points,
+            )
+            with np.errstate(invalid="ignore", divide="ignore"):
+                means = sums / counts
+            payload[name] = [None if math.isnan(v) else v for v in means.tolist()]
+        return payload
+
+    def _range(self, start, end, points, tank):
+        """
+        ``(times, values, weights)`` to bin for /api/range: the store's
+        rollup buckets (centres, means and counts) when a tier is fine
+        enough for ``points``, else the raw samples with ``weights`` None.
+        """
+        rollup = self.store.rollup(start, end, points, tank)
+        if rollup is not None:
+            return rollup["times"] + rollup["resolution"] / 2, rollup["mean"], rollup["count"]
+        times, values = self.store.query(start, end, tank)
+        return times, values, None
+
+
+class _Client:
+    """An open event stream (optionally one tank only)."""
+
+    __slots__ = ("transport", "tank")
+
+    def __init__(self, transport, tank):
+        self.transport = transport
+        self.tank = tank
+
+
+def _values(reading):
+    return {name: _json_number(value) for name, value in zip(Reading._fields, reading)}
+
+
+def _json_number(value):
+    return None if value != value else value
+
+
+def _sse(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n".encode()
+
+
+def main():
+    from hydro.fake_arduino import FakeArduino
+    from hydro.hub import IngestHub
+    from hydro.storage import DEFAULT_DB_PATH, SensorStore
+
+    parser = argparse.ArgumentParser(description="Serve live sensor data on the LAN")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--ports", nargs="*", default=[], help="tank=port pairs; none: discover boards")
+    parser.add_argument("--simulate", type=int, default=0, help="Serve N simulated boards instead")
+    parser.add_argument("--db", default=None, help="SQLite path (default: hydroponics_data.db)")
+    args = parser.parse_args()
+
+    fakes = [FakeArduino(rate=1.0, seed=i).start() for i in range(args.simulate)]
+    ports = dict(pair.split("=", 1) for pair in args.ports)
+    ports.update({f"sim{i + 1}": fake.port for i, fake in enumerate(fakes)})
+    db_path = args.db or DEFAULT_DB_PATH
+    store = SensorStore(db_path)
+    hub = IngestHub(ports, discover=not ports)
+    samples = hub.subscribe()
+    server = LiveServer(SensorStore(db_path), args.host, args.port).start()
+    hub.start()
+    print(f"Serving on http://{args.host}:{server.port}/")
+    try:
+        while True:
+            time.sleep(0.1)
+            for timestamp, tank, reading in samples.drain():
+                store.add(timestamp, reading, tank)
+                server.publish(timestamp, reading, tank)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        hub.stop()
+        server.stop()
+        server.store.close()
+        store.close()
+        for fake in fakes:
+            fake.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Logging for the hydro package and the scripts that use it.
+
+By default messages go to stdout exactly as the old ``print()`` calls did
+(message only, INFO and up), so nothing changes until a script opts in:
+
+    from hydro.log import configure, get_logger
+    configure(level="DEBUG", rate=5, per=60)  # Levelled format, rate-limited
+    log = get_logger(__name__)
+    log.warning("Error reading tank %s: %s", tank, e)
+
+Pass the values as arguments rather than pre-formatting the message: the
+rate limiter groups records by their unformatted message, so a port that
+fails ten times a second logs ``rate`` lines per ``per`` seconds, followed
+by a count of what was suppressed, instead of flooding the journal.
+"""
+import logging
+import sys
+import time
+
+ROOT = "hydro"
+PLAIN_FORMAT = "%(message)s"
+LEVELLED_FORMAT = "%(asctime)s %(levelname)-7s %(name)s: %(message)s"
+
+_handler = logging.StreamHandler(sys.stdout)
+_handler.setFormatter(logging.Formatter(PLAIN_FORMAT))
+_root = logging.getLogger(ROOT)
+_root.addHandler(_handler)
+_root.setLevel(logging.INFO)
+_root.propagate = False
+_limiter = None  # RateLimiter installed by configure()
+
+
+def get_logger(name):
+    """Logger under the ``hydro`` hierarchy (scripts' own names are nested under it)."""
+    if name != ROOT and not name.startswith(ROOT + "."):
+        name = f"{ROOT}.{name}"
+    return RateLimitedLogger(logging.getLogger(name), {})
+
+
+class RateLimitedLogger(logging.LoggerAdapter):
+    """
+    Checks the level and the rate limit before a LogRecord is built, so a
+    disabled or suppressed call costs a dict lookup rather than a record
+    and a stack walk.
+    """
+
+    def log(self, level, msg, *args, **kwargs):
+        if not self.logger.isEnabledFor(level):
+            return
+        limiter = _limiter
+        if limiter is not None:
+            dropped = limiter.check((self.logger.name, level, msg))
+            if dropped is None:
+                return
+            if dropped:
+                msg = f"{msg} ({dropped} similar messages suppressed)"
+        self.logger.log(level, msg, *args, **kwargs)
+
+
+class RateLimiter:
+    """
+    At most ``rate`` messages per ``per`` seconds for each (logger, level,
+    message template). ``suppressed`` counts everything held back.
+    """
+
+    def __init__(self, rate=5, per=60.0, clock=time.monotonic):
+        self.rate = rate
+        self.per = per
+        self.clock = clock
+        self.suppressed = 0
+        self._windows = {}  # key -> [window start, emitted, suppressed]
+
+    def check(self, key):
+        """None to drop the message, else how many were dropped since the last one let through."""
+        now = self.clock()
+        window = self._windows.get(key)
+        if window is None or now - window[0] >= self.per:
+            dropped = window[2] if window is not None else 0
+            self._windows[key] = [now, 1, 0]
+            if len(self._windows) > 1000:
+                self._expire(now)
+            return dropped
+        if window[1] < self.rate:
+            window[1] += 1
+            return 0
+        window[2] += 1
+        self.suppressed += 1
+        return None
+
+    def _expire(self, now):
+        for key, window in list(self._windows.items()):
+            if now - window[0] >= self.per and not window[2]:
+                del self._windows[key]
+
+
+def configure(level="INFO", rate=None, per=60.0, levelled=True, stream=None):
+    """
+    Switch the hydro loggers to ``level`` (name or number). With
+    ``levelled`` each line carries time, level and logger name; with
+    ``rate`` repeated messages are limited to ``rate`` per ``per`` seconds.
+    Returns the RateLimiter (or None) so its ``suppressed`` count can be
+    exported as a metric.
+    """
+    global _limiter
+    if stream is not None:
+        _handler.setStream(stream)
+    _handler.setFormatter(logging.Formatter(LEVELLED_FORMAT if levelled else PLAIN_FORMAT))
+    _limiter = RateLimiter(rate, per) if rate else None
+    _root.setLevel(level.upper() if isinstance(level, str) else level)
+    return _limiter
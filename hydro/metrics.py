@@ -0,0 +1,332 @@
+"""
+Low-overhead counters, gauges and fixed-bucket histograms for the daemons.
+
+Hot paths only do an increment or a bisect into a handful of bucket bounds
+(well under a microsecond); everything else is pulled at scrape time from the
+``stats()`` methods the components already have. Metrics are exposed in
+Prometheus text format by ``MetricsServer`` and summarised on one line by
+``Registry.overlay`` for the Tk status bar.
+
+Updates are not locked: each metric is written by one thread (the reader,
+the Tk loop or the uploader) and a scrape may be one update behind.
+
+Usage:
+    ingest_time = REGISTRY.histogram("hydro_ingest_seconds", "Time to ingest one drained batch")
+    with ingest_time.time():
+        ...
+    REGISTRY.register_stats("hydro_serial", reader.stats, counters=("lines_read", "parse_errors"))
+    MetricsServer(REGISTRY, port=9108).start()  # curl localhost:9108/metrics
+"""
+import bisect
+import math
+import threading
+import time
+
+from hydro.log import get_logger
+
+log = get_logger(__name__)
+
+# Seconds; from a parsed line (tens of µs) up to a Firestore commit over a bad link
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Counter:
+    """Monotonic count (``inc``)."""
+
+    kind = "counter"
+
+    def __init__(self, name, help="", labels=None):
+        self.name = name
+        self.help = help
+        self.labels = dict(labels or {})
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def samples(self):
+        yield self.name, self.labels, self.value
+
+
+class Gauge:
+    """Current value (``set``), or read from ``source()`` at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name, help="", labels=None, source=None):
+        self.name = name
+        self.help = help
+        self.labels = dict(labels or {})
+        self.source = source
+        self.value = 0.0
+
+    def set(self, value):
+        self.value = value
+
+    def samples(self):
+        yield self.name, self.labels, self.source() if self.source is not None else self.value
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram. ``counts[i]`` counts observations <= ``bounds[i]``
+    (non-cumulative; the last slot is +Inf), as Prometheus buckets need only
+    a running sum at scrape time.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, help="", labels=None, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = dict(labels or {})
+        self.bounds = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def time(self):
+        """Context manager observing the elapsed seconds of its block."""
+        return _Timer(self)
+
+    def quantile(self, q):
+        """Estimate a quantile by linear interpolation inside its bucket (NaN when empty)."""
+        if not self.count:
+            return math.nan
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for bound, count in zip(self.bounds, self.counts):
+            if count and seen + count >= rank:
+                return lower + (bound - lower) * (rank - seen) / count
+            seen += count
+            lower = bound
+        return self.bounds[-1]  # In the +Inf bucket: report the largest finite bound
+
+    def mean(self):
+        return self.sum / self.count if self.count else math.nan
+
+    def samples(self):
+        cumulative = 0
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            yield self.name + "_bucket", dict(self.labels, le=_format(bound)), cumulative
+        yield self.name + "_bucket", dict(self.labels, le="+Inf"), self.count
+        yield self.name + "_sum", self.labels, self.sum
+        yield self.name + "_count", self.labels, self.count
+
+
+class _Timer:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class Registry:
+    """
+    Named metrics plus ``stats()`` callbacks, rendered together.
+
+    ``counter``/``gauge``/``histogram`` return the existing metric when called
+    again with the same name and labels, so modules can ask for theirs
+    without coordinating.
+    """
+
+    def __init__(self):
+        self._metrics = {}  # (name, labels) -> metric
+        self._stats = []  # (prefix, fn, counters, label)
+        self._lock = threading.Lock()
+
+    def counter(self, name, help="", **labels):
+        return self._get(Counter, name, help, labels)
+
+    def gauge(self, name, help="", source=None, **labels):
+        gauge = self._get(Gauge, name, help, labels)
+        if source is not None:
+            gauge.source = source
+        return gauge
+
+    def histogram(self, name, help="", buckets=LATENCY_BUCKETS, **labels):
+        return self._get(Histogram, name, help, labels, buckets=buckets)
+
+    def register_stats(self, prefix, stats, counters=(), label=None):
+        """
+        Export the numeric entries of ``stats()`` as ``<prefix>_<key>``.
+
+        Keys in ``counters`` are typed as counters (with ``_total``), the
+        rest as gauges. With ``label`` set, ``stats()`` returns
+        ``{label_value: stats_dict}`` (e.g. one dict per tank).
+        """
+        with self._lock:
+            self._stats.append((prefix, stats, frozenset(counters), label))
+
+    def get(self, name, **labels):
+        """The metric registered as ``name`` with ``labels``, or None."""
+        return self._metrics.get((name, _label_key(labels)))
+
+    def collect(self):
+        """Yield ``(name, kind, help, samples)`` for every metric family."""
+        families = {}
+        with self._lock:
+            metrics = list(self._metrics.values())
+            stats = list(self._stats)
+        for metric in metrics:
+            family = families.setdefault(metric.name, [metric.kind, metric.help, []])
+            family[2].extend(metric.samples())
+        for prefix, fn, counters, label in stats:
+            try:
+                result = fn()
+            except Exception as e:
+                result = {}
+                log.warning("Error collecting %s metrics: %s", prefix, e)
+            groups = result.items() if label is not None else [(None, result)]
+            for value_label, values in groups:
+                labels = {label: str(value_label)} if label is not None else {}
+                for key, value in values.items():
+                    if isinstance(value, bool):
+                        value = int(value)
+                    elif not isinstance(value, (int, float)):
+                        continue
+                    is_counter = key in counters
+                    name = f"{prefix}_{key}_total" if is_counter else f"{prefix}_{key}"
+                    family = families.setdefault(name, ["counter" if is_counter else "gauge", "", []])
+                    family[2].append((name, labels, value))
+        for name, (kind, help, samples) in families.items():
+            yield name, kind, help, samples
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for name, kind, help, samples in self.collect():
+            if help:
+                lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for sample_name, labels, value in samples:
+                if labels:
+                    text = ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items())
+                    lines.append(f"{sample_name}{{{text}}} {_format(value)}")
+                else:
+                    lines.append(f"{sample_name} {_format(value)}")
+        return "\n".join(lines) + "\n"
+
+    def overlay(self, items):
+        """
+        One compact status line. ``items`` holds ``(label, name)`` or
+        ``(label, name, labels)``; histograms show p50/p95 in ms, everything
+        else its current value. Metrics with no data yet are left out.
+        """
+        parts = []
+        values = None
+        for label, name, *rest in items:
+            labels = rest[0] if rest else {}
+            metric = self.get(name, **labels)
+            if isinstance(metric, Histogram):
+                if metric.count:
+                    parts.append(f"{label} {metric.quantile(0.5) * 1000:.1f}/{metric.quantile(0.95) * 1000:.1f}ms")
+                continue
+            if values is None:
+                values = {
+                    (sample, _label_key(sample_labels)): value
+                    for _, _, _, samples in self.collect()
+                    for sample, sample_labels, value in samples
+                }
+            value = values.get((name, _label_key(labels)))
+            if value is not None:
+                parts.append(f"{label} {value:g}")
+        return "  ".join(parts)
+
+    def _get(self, cls, name, help, labels, **options):
+        key = (name, _label_key(labels))
+        metric = self._metrics.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(key)
+                if metric is None:
+                    metric = self._metrics[key] = cls(name, help, labels, **options)
+        if not isinstance(metric, cls):
+            raise ValueError(f"{name} is already registered as a {metric.kind}")
+        return metric
+
+
+# Shared by everything in one process
+REGISTRY = Registry()
+
+
+class MetricsServer:
+    """
+    Serves ``registry.render()`` at ``/metrics`` from a daemon thread.
+
+    Binds to localhost by default; pass ``host="0.0.0.0"`` to let a
+    Prometheus on another machine scrape it.
+    """
+
+    def __init__(self, registry=REGISTRY, host="127.0.0.1", port=9108):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer  # Only needed once serving
+
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # One line per scrape would drown the journal
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]  # If port 0 was requested
+        self._thread = threading.Thread(target=self._server.serve_forever, name="MetricsServer", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format(value):
+    if isinstance(value, float):
+        if math.isnan(value):
+            return "NaN"
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        return repr(value)
+    return str(value)
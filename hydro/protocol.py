@@ -0,0 +1,199 @@
+"""
+Parser for the ``KEY:VALUE`` line protocol sent by the stream2pi sketches.
+
+Example line:
+    WATER_LEVEL:0.52,WATER_TEMP:25.0,EC:1.50,TDS:750.0,PH:6.5
+
+stream2pi.ino also prints units after each value ("0.52 m, WATER_TEMP:25.0
+°C, ..."); those are skipped. Lines are decoded straight from bytes into a
+fixed-slot ``Reading`` without building intermediate dicts.
+
+In raw mode (``MODE RAW``, see ``hydro.frames``) the sketch sends probe
+voltages instead of calibrated values and the line becomes a ``RawReading``:
+    WATER_LEVEL:0.52,WATER_TEMP:25.0,EC_V:0.246,PH_V:1.916
+The host converts those with ``hydro.calibration``.
+"""
+import math
+import re
+from collections import namedtuple
+
+import numpy as np
+
+# Arduino keys, in the order the sketches send them
+FIELDS = ("WATER_LEVEL", "WATER_TEMP", "EC", "TDS", "PH")
+
+# Record with one slot per field; missing or rejected values are NaN
+Reading = namedtuple("Reading", ["water_level", "water_temp", "ec", "tds", "ph"])
+
+# Raw mode: the same slots, with probe voltages (V) for the three analogue probes
+RAW_FIELDS = ("WATER_LEVEL", "WATER_TEMP", "EC_V", "TDS_V", "PH_V")
+RawReading = namedtuple("RawReading", ["water_level", "water_temp", "ec_voltage", "tds_voltage", "ph_voltage"])
+
+READING_DTYPE = np.dtype([(name, "f8") for name in Reading._fields])
+
+# Physically plausible ranges; anything outside is treated as a sensor fault
+# (e.g. the DS18B20 reports -127 °C when disconnected)
+VALID_RANGES = Reading(
+    water_level=(0.0, 5.0),
+    water_temp=(-10.0, 60.0),
+    ec=(0.0, 20.0),
+    tds=(0.0, 10000.0),
+    ph=(0.0, 14.0),
+)
+# The boards' ADCs read 0-5 V
+RAW_VALID_RANGES = RawReading(
+    water_level=VALID_RANGES.water_level,
+    water_temp=VALID_RANGES.water_temp,
+    ec_voltage=(0.0, 5.0),
+    tds_voltage=(0.0, 5.0),
+    ph_voltage=(0.0, 5.0),
+)
+
+_NAN = float("nan")
+_SLOTS = {key.encode(): i for i, key in enumerate(FIELDS)}
+_RAW_SLOTS = {key.encode(): i for i, key in enumerate(RAW_FIELDS) if key not in FIELDS}
+
+# Fast path for lines in the canonical field order
+_LINE = re.compile(rb",".join(key.encode() + rb":([^,]+)" for key in FIELDS))
+# Fallback for any other field order or subset
+_FIELD = re.compile(rb"([A-Z_]+):\s*([^\s,]+)")
+
+
+class LineParser:
+    """
+    Stateful parser that validates values and counts rejects.
+
+    Attributes:
+        lines (int): Lines seen.
+        rejected_lines (int): Lines with no usable value.
+        rejected_values (int): Individual values that were unparseable or
+            outside ``valid_ranges``.
+    """
+
+    def __init__(self, valid_ranges=VALID_RANGES, raw_valid_ranges=RAW_VALID_RANGES):
+        self.valid_ranges = Reading(*valid_ranges)
+        self.raw_valid_ranges = RawReading(*raw_valid_ranges)
+        self._lo = np.array([lo for lo, _ in self.valid_ranges])
+        self._hi = np.array([hi for _, hi in self.valid_ranges])
+        self.lines = 0
+        self.rejected_lines = 0
+        self.rejected_values = 0
+
+    def parse(self, raw):
+        """
+        Parse one line (bytes or str) into a ``Reading``, or a
+        ``RawReading`` if it carries probe voltages.
+
+        Returns None if the line has no usable value.
+        """
+        if isinstance(raw, str):
+            raw = raw.encode("utf-8", errors="replace")
+        self.lines += 1
+
+        match = _LINE.match(raw)
+        record, valid_ranges = Reading, self.valid_ranges
+        try:
+            values = list(map(float, match.groups()))
+        except (AttributeError, ValueError):
+            # Not the canonical layout, or values carry units, or raw mode
+            values = [None] * len(FIELDS)
+            for key, text in _FIELD.findall(raw):
+                slot = _SLOTS.get(key)
+                if slot is None:
+                    slot = _RAW_SLOTS.get(key)
+                    if slot is None:
+                        continue
+                    record, valid_ranges = RawReading, self.raw_valid_ranges
+                values[slot] = _to_float(text)
+
+        usable = 0
+        for slot, (lo, hi) in enumerate(valid_ranges):
+            value = values[slot]
+            if value is None:
+                values[slot] = _NAN
+            elif lo <= value <= hi:
+                usable += 1
+            else:
+                values[slot] = _NAN
+                self.rejected_values += 1
+        if not usable:
+            self.rejected_lines += 1
+            return None
+        return record._make(values)
+
+    def parse_buffer(self, buf):
+        """
+        Parse a buffer of newline-separated lines, e.g. a replayed log.
+
+        Returns a structured array of ``READING_DTYPE``, one row per line
+        that had at least one usable value. Raw-mode lines (probe voltages)
+        are skipped rather than rejected; replay those through ``parse``.
+        """
+        if isinstance(buf, str):
+            buf = buf.encode("utf-8", errors="replace")
+        lines = buf.splitlines()
+        lines = [line for line in lines if line.strip()]
+        self.lines += len(lines)
+
+        table = np.full((len(lines), len(FIELDS)), np.nan)
+        missing = np.zeros(table.shape, dtype=bool)
+        raw_lines = np.zeros(len(lines), dtype=bool)
+        for row, raw in enumerate(lines):
+            match = _LINE.match(raw)
+            if match is not None:
+                try:
+                    table[row] = match.groups()
+                    continue
+                except ValueError:
+                    pass
+            texts = [None] * len(FIELDS)
+            for key, text in _FIELD.findall(raw):
+                slot = _SLOTS.get(key)
+                if slot is not None:
+                    texts[slot] = text
+                elif key in _RAW_SLOTS:
+                    raw_lines[row] = True
+            if raw_lines[row]:
+                missing[row] = True
+                continue
+            for slot, text in enumerate(texts):
+                if text is None:
+                    missing[row, slot] = True
+                else:
+                    table[row, slot] = _to_float(text)
+
+        # Validate all values in one pass; NaN fails both comparisons
+        bad = ~((table >= self._lo) & (table <= self._hi))
+        self.rejected_values += int(np.count_nonzero(bad & ~missing))
+        table[bad] = np.nan
+
+        keep = ~np.all(np.isnan(table), axis=1)
+        self.rejected_lines += int(np.count_nonzero(~keep & ~raw_lines))
+        return np.ascontiguousarray(table[keep]).view(READING_DTYPE).reshape(-1)
+
+    def stats(self):
+        return {
+            "lines": self.lines,
+            "rejected_lines": self.rejected_lines,
+            "rejected_values": self.rejected_values,
+        }
+
+
+def _to_float(text):
+    try:
+        return float(text)
+    except ValueError:
+        return _NAN
+
+
+def reading_to_dict(reading):
+    """Return the usable (non-NaN) fields of a ``Reading`` keyed by field name."""
+    return {name: value for name, value in zip(Reading._fields, reading) if not math.isnan(value)}
+
+
+def parse_line(raw):
+    """Parse one line with a module-level parser; see ``LineParser.parse``."""
+    return _default_parser.parse(raw)
+
+
+_default_parser = LineParser()
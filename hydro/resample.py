@@ -0,0 +1,119 @@
+"""
+Resampling and smoothing for plotting, on epoch-second float arrays.
+
+All functions take ``times`` (sorted epoch seconds) and ``values`` as NumPy
+arrays, treat NaN as missing and never loop over samples in Python.
+"""
+import numpy as np
+
+
+def moving_average(values, window=4):
+    """
+    Centre-aligned moving average that skips NaN.
+
+    The output has the same length as the input; near the edges the window
+    shrinks instead of dropping samples, so it stays aligned with ``times``.
+    """
+    values = np.asarray(values, dtype=float)
+    if window <= 1 or len(values) == 0:
+        return values.copy()
+    index = np.arange(len(values))
+    lo = np.clip(index - window // 2, 0, len(values))
+    hi = np.clip(index + (window - window // 2), 0, len(values))
+    present = ~np.isnan(values)
+    if present.all():
+        sums = np.concatenate([[0.0], np.cumsum(values)])
+        return (sums[hi] - sums[lo]) / (hi - lo)
+    sums = np.concatenate([[0.0], np.cumsum(np.where(present, values, 0.0))])
+    counts = np.concatenate([[0], np.cumsum(present)])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (sums[hi] - sums[lo]) / (counts[hi] - counts[lo])
+
+
+def bin_aggregate(times, values, interval, start=None, end=None):
+    """
+    Average samples into fixed bins of ``interval`` seconds.
+
+    Returns ``(centres, means)``; bins without samples are NaN so gaps stay
+    visible on the chart.
+    """
+    times, values = _clean(times, values)
+    if len(times) == 0:
+        return np.empty(0), np.empty(0)
+    start = times[0] if start is None else start
+    end = times[-1] if end is None else end
+    n_bins = max(1, int(np.ceil((end - start) / interval)))
+    index = np.clip(((times - start) // interval).astype(np.int64), 0, n_bins - 1)
+    keep = (times >= start) & (times <= end)
+    counts = np.bincount(index[keep], minlength=n_bins)
+    sums = np.bincount(index[keep], weights=values[keep], minlength=n_bins)
+    centres = start + (np.arange(n_bins) + 0.5) * interval
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return centres, sums / counts
+
+
+def interpolate(times, values, interval, start=None, end=None):
+    """Linearly interpolate onto a regular grid of ``interval`` seconds."""
+    times, values = _clean(times, values)
+    if len(times) == 0:
+        return np.empty(0), np.empty(0)
+    start = times[0] if start is None else start
+    end = times[-1] if end is None else end
+    grid = start + np.arange(int((end - start) // interval) + 1) * interval
+    return grid, np.interp(grid, times, values)
+
+
+def lttb(times, values, threshold):
+    """
+    Largest-Triangle-Three-Buckets downsampling to ``threshold`` points.
+
+    Keeps the points that best preserve the visual shape of the series
+    (peaks and dips survive, unlike with averaging).
+    """
+    times, values = _clean(times, values)
+    n = len(times)
+    if threshold >= n or threshold < 3:
+        return times, values
+
+    # Bucket boundaries for the n - 2 interior points, and each bucket's mean
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    sizes = np.diff(edges)
+    avg_t = np.add.reduceat(times[:edges[-1]], edges[:-1]) / sizes
+    avg_v = np.add.reduceat(values[:edges[-1]], edges[:-1]) / sizes
+    # The third triangle vertex is the next bucket's mean (the last point for the final bucket)
+    avg_t = np.append(avg_t[1:], times[-1])
+    avg_v = np.append(avg_v[1:], values[-1])
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        t0, v0 = times[previous], values[previous]
+        areas = np.abs((t0 - avg_t[i]) * (values[lo:hi] - v0) - (t0 - times[lo:hi]) * (avg_v[i] - v0))
+        previous = lo + int(areas.argmax())
+        selected[i + 1] = previous
+    return times[selected], values[selected]
+
+
+def resample(times, values, interval, mode="bin", smooth=1, start=None, end=None):
+    """
+    Smooth with a centre-aligned moving average of ``smooth`` samples, then
+    resample with ``mode`` = "bin" (bin means) or "interp" (linear).
+    """
+    values = moving_average(values, smooth)
+    if mode == "bin":
+        return bin_aggregate(times, values, interval, start, end)
+    if mode == "interp":
+        return interpolate(times, values, interval, start, end)
+    raise ValueError(f"unknown resample mode: {mode}")
+
+
+def _clean(times, values):
+    """Drop NaN samples."""
+    times = np.asarray(times, dtype=float)
+    values = np.asarray(values, dtype=float)
+    present = ~np.isnan(values)
+    if present.all():
+        return times, values
+    return times[present], values[present]
@@ -0,0 +1,155 @@
+import numpy as np
+
+
+class TimeSeriesRing:
+    """
+    Fixed-capacity time-series store backed by preallocated NumPy arrays.
+
+    Every sample shares one monotonic timestamp column (epoch seconds) and
+    has one float64 slot per channel; channels missing from a sample are
+    stored as NaN so all columns stay aligned. Appends and evictions are
+    O(1). Each sample is written twice, at ``i`` and ``i + capacity``, so the
+    retained samples are always one contiguous slice and every read is a
+    zero-copy view.
+    """
+
+    def __init__(self, channels, capacity, max_age=None):
+        """
+        Args:
+            channels (iterable): Channel names, in column order.
+            capacity (int): Maximum number of samples kept.
+            max_age (float): Optional age limit in seconds; older samples are
+                evicted on append.
+        """
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.channels = tuple(channels)
+        self.capacity = int(capacity)
+        self.max_age = max_age
+        self._index = {name: i for i, name in enumerate(self.channels)}
+        self._times, self._values = self._allocate()
+        self._start = 0  # Logical index of the oldest retained sample
+        self._end = 0  # Logical index one past the newest sample
+
+    def _allocate(self):
+        """Return the ``(times, values)`` arrays, NaN-filled; subclasses may place them elsewhere."""
+        return np.full(2 * self.capacity, np.nan), np.full((len(self.channels), 2 * self.capacity), np.nan)
+
+    def __len__(self):
+        return self._end - self._start
+
+    def append(self, timestamp, values):
+        """
+        Add one sample.
+
+        Args:
+            timestamp (float): Epoch seconds, not older than the last sample.
+            values (dict or sequence): Channel values by name, or in channel
+                order. Missing or None values are stored as NaN.
+        """
+        if self._end > self._start and timestamp < self._times[self._slot(self._end - 1)]:
+            raise ValueError("timestamps must be monotonic")
+
+        row = np.full(len(self.channels), np.nan)
+        if isinstance(values, dict):
+            for name, value in values.items():
+                i = self._index.get(name)
+                if i is not None and value is not None:
+                    row[i] = value
+        else:
+            for i, value in enumerate(values):
+                if value is not None:
+                    row[i] = value
+
+        slot = self._slot(self._end)
+        for pos in (slot, slot + self.capacity):
+            self._times[pos] = timestamp
+            self._values[:, pos] = row
+        self._end += 1
+
+        # Evict by capacity, then by age
+        if self._end - self._start > self.capacity:
+            self._start = self._end - self.capacity
+        if self.max_age is not None:
+            cutoff = timestamp - self.max_age
+            while self._times[self._slot(self._start)] < cutoff:
+                self._start += 1
+
+    def extend(self, timestamps, values):
+        """
+        Add many samples at once; ``values`` has shape (len(timestamps), n_channels).
+        """
+        timestamps = np.asarray(timestamps, dtype=float)
+        count = len(timestamps)
+        if count == 0:
+            return
+        values = np.asarray(values, dtype=float).reshape(count, len(self.channels))
+        if np.any(np.diff(timestamps) < 0) or (
+            self._end > self._start and timestamps[0] < self._times[self._slot(self._end - 1)]
+        ):
+            raise ValueError("timestamps must be monotonic")
+
+        # Only the newest ``capacity`` samples can survive
+        skipped = max(0, count - self.capacity)
+        self._end += skipped
+        timestamps, values = timestamps[skipped:], values[skipped:]
+
+        slots = (self._end + np.arange(len(timestamps))) % self.capacity
+        for offset in (0, self.capacity):
+            self._times[slots + offset] = timestamps
+            self._values[:, slots + offset] = values.T
+        self._end += len(timestamps)
+
+        self._start = max(self._start, self._end - self.capacity)
+        if self.max_age is not None:
+            cutoff = timestamps[-1] - self.max_age
+            self._start += int(np.searchsorted(self.times(), cutoff, side="left"))
+
+    def clear(self):
+        self._start = self._end = 0
+
+    def times(self):
+        """Return a read-only view of all retained timestamps."""
+        return self._view(self._times, self._start, self._end)
+
+    def column(self, name, start=None, end=None):
+        """Return ``(times, values)`` views for one channel, optionally limited to [start, end]."""
+        lo, hi = self._bounds(start, end)
+        row = self._values[self._index[name]]
+        return self._view(self._times, lo, hi), self._view(row, lo, hi)
+
+    def window(self, start=None, end=None):
+        """
+        Return ``(times, values)`` views over [start, end] where ``values`` has
+        shape (n_channels, n_samples).
+        """
+        lo, hi = self._bounds(start, end)
+        return self._view(self._times, lo, hi), self._view(self._values, lo, hi)
+
+    def latest(self):
+        """Return ``(timestamp, {channel: value})`` for the newest sample, or None."""
+        if self._end == self._start:
+            return None
+        slot = self._slot(self._end - 1)
+        return float(self._times[slot]), dict(zip(self.channels, self._values[:, slot].tolist()))
+
+    def _slot(self, index):
+        return index % self.capacity
+
+    def _bounds(self, start, end):
+        """Convert a time range to logical sample indices."""
+        lo, hi = self._start, self._end
+        if start is None and end is None:
+            return lo, hi
+        times = self.times()
+        if start is not None:
+            lo = self._start + int(np.searchsorted(times, start, side="left"))
+        if end is not None:
+            hi = self._start + int(np.searchsorted(times, end, side="right"))
+        return lo, max(lo, hi)
+
+    def _view(self, array, lo, hi):
+        first = self._slot(lo) if hi > lo else 0
+        view = array[..., first:first + (hi - lo)]
+        view.flags.writeable = False
+        return view
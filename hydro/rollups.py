@@ -0,0 +1,197 @@
+"""
+Multi-resolution rollups (min/max/mean/count per sensor) maintained as
+samples arrive, so long charts read a few hundred pre-aggregated buckets
+instead of every raw point.
+
+``SensorStore`` keeps the tiers in its database, updated with every
+write, so every process reading the store (the live server, webGUI --db)
+shares them (``SensorStore.rollup``). ``RollupEngine`` keeps them in
+memory for a single process.
+"""
+import numpy as np
+
+from hydro.protocol import Reading
+from hydro.ring_buffer import TimeSeriesRing
+
+# Bucket width in seconds -> number of buckets kept
+DEFAULT_TIERS = {
+    60: 60 * 24 * 31,  # 1 min for a month
+    900: 4 * 24 * 400,  # 15 min for ~13 months
+    3600: 24 * 366 * 5,  # 1 h for 5 years
+}
+
+STATS = ("mean", "min", "max", "count")
+
+
+def bucket_stats(times, values, resolution):
+    """
+    Aggregate samples sorted by time into ``resolution``-second buckets in
+    one vectorized pass: ``(starts, count, total, low, high)``, the last four
+    (buckets, fields) arrays. Empty buckets are not returned; a field with
+    no values in a bucket has count 0 and NaN limits.
+    """
+    times = np.asarray(times, dtype=float)
+    values = np.asarray(values, dtype=float).reshape(len(times), -1)
+    starts = np.floor(times / resolution) * resolution
+    edges = np.flatnonzero(np.r_[True, starts[1:] != starts[:-1]])
+    present = ~np.isnan(values)
+    count = np.add.reduceat(present, edges, axis=0).astype(float)
+    total = np.add.reduceat(np.where(present, values, 0.0), edges, axis=0)
+    low = np.fmin.reduceat(values, edges, axis=0)
+    high = np.fmax.reduceat(values, edges, axis=0)
+    return starts[edges], count, total, low, high
+
+
+class RollupTier:
+    """Closed buckets of one resolution plus the bucket currently filling."""
+
+    def __init__(self, resolution, capacity, fields):
+        self.resolution = resolution
+        self.fields = fields
+        self.buckets = TimeSeriesRing(
+            [f"{field}_{stat}" for stat in STATS for field in fields], capacity
+        )
+        self._start = None
+        self._reset()
+
+    def add(self, timestamp, values):
+        start = timestamp - timestamp % self.resolution
+        if start != self._start:
+            self.close()
+            self._start = start
+        present = ~np.isnan(values)
+        self._count += present
+        self._sum += np.where(present, values, 0.0)
+        np.fmin(self._min, values, out=self._min)
+        np.fmax(self._max, values, out=self._max)
+
+    def close(self):
+        """Move the filling bucket into the closed buckets."""
+        if self._start is not None and self._count.any():
+            self.buckets.append(self._start, self._row())
+        self._start = None
+        self._reset()
+
+    def extend_closed(self, starts, count, total, low, high):
+        """Append pre-aggregated buckets (used by backfill)."""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = total / count
+        rows = np.hstack([mean, low, high, count])
+        rows[np.hstack([count == 0] * len(STATS))] = np.nan
+        self.buckets.extend(starts, rows)
+
+    def reopen(self, start, count, total, low, high):
+        """Make a partially aggregated bucket the one currently filling."""
+        self._start = start
+        self._count, self._sum, self._min, self._max = count, total, low, high
+
+    def _row(self):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = self._sum / self._count
+        row = np.concatenate([mean, self._min, self._max, self._count.astype(float)])
+        row[np.tile(self._count == 0, len(STATS))] = np.nan
+        return row
+
+    def _reset(self):
+        n = len(self.fields)
+        self._count = np.zeros(n)
+        self._sum = np.zeros(n)
+        self._min = np.full(n, np.nan)
+        self._max = np.full(n, np.nan)
+
+
+class RollupEngine:
+    """
+    Keep rollup tiers for every sensor field.
+
+    Usage:
+        engine = RollupEngine()
+        engine.add(timestamp, reading)  # For each incoming sample
+        result = engine.query("ph", start, end, pixels=600)
+        if result is None:
+            ...  # Window is short enough to plot raw samples
+    """
+
+    def __init__(self, tiers=None, fields=Reading._fields):
+        self.fields = tuple(fields)
+        tiers = DEFAULT_TIERS if tiers is None else tiers
+        self.tiers = [RollupTier(res, cap, self.fields) for res, cap in sorted(tiers.items())]
+        self._first = None
+        self._last = None
+
+    def add(self, timestamp, reading):
+        """Fold one sample into every tier; O(tiers * fields)."""
+        if self._last is not None and timestamp < self._last:
+            return  # Out-of-order sample; the closed buckets can't take it
+        if self._first is None:
+            self._first = timestamp
+        self._last = timestamp
+        values = np.asarray(reading, dtype=float)
+        for tier in self.tiers:
+            tier.add(timestamp, values)
+
+    def backfill(self, times, values):
+        """
+        Build all tiers from stored history in one vectorized pass.
+
+        ``values`` is a READING_DTYPE structured array (as returned by
+        ``SensorStore.query``) or an (n, fields) float array. Should be
+        called before any ``add``; the last bucket of each tier stays open
+        so live samples continue it.
+        """
+        times = np.asarray(times, dtype=float)
+        if len(times) == 0:
+            return
+        if values.dtype.names:
+            values = np.column_stack([values[name] for name in self.fields])
+        values = np.asarray(values, dtype=float)
+        order = np.argsort(times, kind="stable")
+        times, values = times[order], values[order]
+
+        for tier in self.tiers:
+            starts, count, total, low, high = bucket_stats(times, values, tier.resolution)
+            tier.extend_closed(starts[:-1], count[:-1], total[:-1], low[:-1], high[:-1])
+            # Reopen the newest bucket so incoming samples keep filling it
+            tier.reopen(starts[-1], count[-1], total[-1], low[-1], high[-1])
+        self._first, self._last = times[0], times[-1]
+
+    def pick_tier(self, start, end, pixels):
+        """
+        Return the coarsest tier with at least one bucket per pixel over
+        [start, end] that still reaches back to ``start`` (or to the first
+        sample, if that is later), or None if raw samples are needed.
+        """
+        if self._first is None:
+            return None
+        wanted = (end - start) / max(pixels, 1)
+        reach = max(start, self._first)
+        for tier in reversed(self.tiers):
+            if tier.resolution > wanted:
+                continue
+            times = tier.buckets.times()
+            if len(times) and times[0] <= reach + tier.resolution:
+                return tier
+        return None
+
+    def query(self, field, start, end, pixels):
+        """
+        Return ``{"resolution", "times", "mean", "min", "max", "count"}`` for
+        one field over [start, end], or None if no tier fits.
+
+        Arrays are views into the tier and include the bucket still filling.
+        """
+        tier = self.pick_tier(start, end, pixels)
+        if tier is None:
+            return None
+        result = {"resolution": tier.resolution}
+        for stat in STATS:
+            times, values = tier.buckets.column(f"{field}_{stat}", start - tier.resolution, end)
+            result[stat] = values
+        result["times"] = times
+        if tier._start is not None and tier._start <= end and tier._count.any():
+            # Append the open bucket so the chart reaches the latest sample
+            row = dict(zip(tier.buckets.channels, tier._row()))
+            result["times"] = np.append(result["times"], tier._start)
+            for stat in STATS:
+                result[stat] = np.append(result[stat], row[f"{field}_{stat}"])
+        return result
@@ -0,0 +1,260 @@
+"""
+Event-driven choice of the samples worth uploading.
+
+Instead of one summary per fixed interval, ``AdaptiveSampler`` watches the
+continuous stream and keeps only the samples the cloud copy needs to
+follow it within a per-sensor tolerance:
+
+    swinging_door  Swinging-door compression. A sample is kept once no
+                   straight line from the previous kept sample passes
+                   within the tolerance of every sample since, so linear
+                   interpolation between kept samples stays within the
+                   tolerance. A steady tank costs one heartbeat per
+                   ``max_silence``; a pH crash after dosing is kept as the
+                   handful of vertices that outline it.
+    deadband       A sample is kept when a sensor moved more than its
+                   tolerance from its last kept value; holding the last
+                   kept value stays within the tolerance.
+
+Either way a sample is kept at least every ``max_silence`` seconds (the
+heartbeat), so a gap in the cloud means no data rather than no change.
+Kept samples carry all five values, and each sensor restarts from every
+kept sample in which it has a value. The tolerance is guaranteed between
+two kept samples that both have the sensor's value; across a kept sample
+where the sensor reported nothing its line can stray a little further.
+
+``stats()`` reports the compression ratio and the reconstruction error of
+everything kept so far; ``reconstruct`` rebuilds a stream from kept
+samples for offline comparison (benchmarks/bench_sampling.py).
+"""
+import math
+from collections import namedtuple
+from datetime import datetime, timezone
+
+import numpy as np
+
+from hydro.protocol import Reading
+
+MODES = ("swinging_door", "deadband")
+TRIGGERS = ("first", "change", "heartbeat", "flush")
+
+# The resolution stream2pi.ino prints (a few counts for TDS); anything finer follows rounding noise
+DEFAULT_TOLERANCES = {
+    "water_level": 0.01,  # m
+    "water_temp": 0.1,  # °C
+    "ec": 0.02,  # mS/cm
+    "tds": 10.0,  # ppm
+    "ph": 0.1,
+}
+
+# A kept sample; ``samples`` counts the raw samples since the previous one, this one included
+Point = namedtuple("Point", ["timestamp", "values", "trigger", "samples"])
+
+
+class AdaptiveSampler:
+    """
+    Pick the samples of one tank's stream to upload.
+
+    ``tolerances`` maps field names to the largest reconstruction error
+    allowed (missing fields use ``DEFAULT_TOLERANCES``). Feed it filtered
+    readings; raw spikes would each be kept.
+
+    Usage:
+        sampler = AdaptiveSampler({"ph": 0.02}, max_silence=900)
+        for point in sampler.add(timestamp, reading):
+            uploader.add(point_document(point))
+        ...
+        for point in sampler.flush():  # On shutdown: keep the newest sample
+            uploader.add(point_document(point))
+    """
+
+    def __init__(self, tolerances=None, max_silence=900, mode="swinging_door", fields=Reading._fields):
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {MODES}")
+        tolerances = dict(DEFAULT_TOLERANCES, **(tolerances or {}))
+        unknown = set(tolerances) - set(fields) - set(DEFAULT_TOLERANCES)
+        if unknown:
+            raise ValueError(f"unknown fields: {sorted(unknown)}")
+        self.fields = tuple(fields)
+        self.tolerances = [float(tolerances.get(field, 0.0)) for field in self.fields]
+        self.max_silence = max_silence
+        self.mode = mode
+        self.reset()
+
+    def reset(self):
+        n = len(self.fields)
+        self.samples = 0
+        self.points = 0
+        self.triggers = dict.fromkeys(TRIGGERS, 0)
+        self._error_max = [0.0] * n
+        self._error_sum_sq = [0.0] * n
+        self._error_count = [0] * n
+        self._restart()
+
+    def add(self, timestamp, values):
+        """Add one sample; return the list of ``Point``s it causes to be kept (usually empty)."""
+        self.samples += 1
+        kept = []
+        if self._last_kept is not None and timestamp <= (self._held or self._last_kept)[0]:
+            # The clock stepped back: close off what came before and start again
+            kept.extend(self.flush())
+            self._restart()
+        if self._last_kept is None:
+            kept.append(self._keep(timestamp, values, "first"))
+            return kept
+        change = self._changed(timestamp, values)
+        if change and self._held is not None and self.mode == "swinging_door":
+            # The door closed on this sample: the previous one is a vertex
+            held_time, held_values = self._held
+            kept.append(self._keep(held_time, held_values, "change", held=True))
+            change = self._changed(timestamp, values)
+        if change:
+            kept.append(self._keep(timestamp, values, "change"))
+        elif timestamp - self._last_kept[0] >= self.max_silence:
+            kept.append(self._keep(timestamp, values, "heartbeat"))
+        else:
+            self._hold(timestamp, values)
+        return kept
+
+    def flush(self):
+        """Keep the newest sample if it was not kept yet; returns a list of at most one ``Point``."""
+        if self._held is None:
+            return []
+        held_time, held_values = self._held
+        return [self._keep(held_time, held_values, "flush", held=True)]
+
+    def compression_ratio(self):
+        return self.samples / self.points if self.points else math.nan
+
+    def stats(self):
+        """
+        Counters plus, per field, the largest and RMS difference between
+        the samples already accounted for by a later kept sample and
+        their reconstruction.
+        """
+        result = {"samples": self.samples, "points": self.points, "compression_ratio": self.compression_ratio()}
+        result.update({f"trigger_{name}": count for name, count in self.triggers.items()})
+        for i, field in enumerate(self.fields):
+            count = self._error_count[i]
+            result[f"{field}_error_max"] = self._error_max[i]
+            result[f"{field}_error_rms"] = math.sqrt(self._error_sum_sq[i] / count) if count else 0.0
+        return result
+
+    def _restart(self):
+        n = len(self.fields)
+        self._last_kept = None  # (timestamp, values)
+        self._held = None  # Newest sample, while it is not kept
+        self._since = 0  # Samples added since the last kept one
+        self._anchors = [(math.nan, math.nan)] * n  # Per field: its last kept (timestamp, value)
+        self._upper = [math.inf] * n  # Swinging door: smallest upper slope so far
+        self._lower = [-math.inf] * n  # ... and largest lower slope
+        self._pending = [([], []) for _ in range(n)]  # Per field: samples since its anchor, not kept
+
+    def _changed(self, timestamp, values):
+        """Fold the sample into each field's door (or deadband); True if any field needs a new point."""
+        change = False
+        door = self.mode == "swinging_door"
+        for i, value in enumerate(values):
+            if value != value:  # NaN
+                continue
+            anchor_time, anchor = self._anchors[i]
+            if anchor != anchor:
+                change = True  # First value of this field since the start
+                continue
+            tolerance = self.tolerances[i]
+            if not door:
+                if abs(value - anchor) > tolerance:
+                    change = True
+                continue
+            elapsed = timestamp - anchor_time
+            slope = (value - anchor) / elapsed
+            if slope > self._upper[i] or slope < self._lower[i]:
+                # A line ending at this sample would miss an earlier one by more than the tolerance
+                change = True
+            upper = slope + tolerance / elapsed
+            lower = slope - tolerance / elapsed
+            if upper < self._upper[i]:
+                self._upper[i] = upper
+            if lower > self._lower[i]:
+                self._lower[i] = lower
+        return change
+
+    def _hold(self, timestamp, values):
+        self._held = (timestamp, values)
+        self._since += 1
+        for i, value in enumerate(values):
+            if value == value:
+                times, pending = self._pending[i]
+                times.append(timestamp)
+                pending.append(value)
+
+    def _keep(self, timestamp, values, trigger, held=False):
+        """Make a sample a point; ``held`` if it is ``self._held`` rather than the sample being added."""
+        samples = self._since if held else self._since + 1
+        for i, value in enumerate(values):
+            if value != value:
+                continue  # The field keeps its anchor; its pending samples wait for a point with a value
+            times, pending = self._pending[i]
+            if held:
+                times.pop()  # Added by _hold, and exact now
+                pending.pop()
+            anchor_time, anchor = self._anchors[i]
+            if pending and anchor == anchor:
+                self._account(i, times, pending, (anchor_time, anchor), (timestamp, value))
+            times.clear()
+            pending.clear()
+            self._anchors[i] = (timestamp, value)
+            self._upper[i] = math.inf
+            self._lower[i] = -math.inf
+        self._last_kept = (timestamp, values)
+        self._held = None
+        self._since = 0
+        self.points += 1
+        self.triggers[trigger] += 1
+        return Point(timestamp, tuple(values), trigger, samples)
+
+    def _account(self, i, times, values, start, end):
+        """Add the reconstruction error of one field's samples between two of its points."""
+        values = np.asarray(values)
+        if self.mode == "swinging_door":
+            rebuilt = np.interp(times, (start[0], end[0]), (start[1], end[1]))
+        else:
+            rebuilt = start[1]
+        error = np.abs(values - rebuilt)
+        self._error_max[i] = max(self._error_max[i], float(error.max()))
+        self._error_sum_sq[i] += float(np.dot(error, error))
+        self._error_count[i] += len(error)
+
+
+def point_document(point, fields=Reading._fields):
+    """
+    The Firestore document for a kept sample: its values (missing ones
+    omitted), ``samples``, ``trigger`` and the sample's own time as a
+    naive UTC datetime.
+    """
+    document = {name: value for name, value in zip(fields, point.values) if value == value}
+    document["samples"] = point.samples
+    document["trigger"] = point.trigger
+    document["timestamp"] = datetime.fromtimestamp(point.timestamp, timezone.utc).replace(tzinfo=None)
+    return document
+
+
+def reconstruct(point_times, point_values, times, mode="swinging_door"):
+    """
+    Rebuild one field at ``times`` from its kept ``(point_times,
+    point_values)``: linear between points for swinging_door, the last
+    point's value for deadband. NaN before the first point.
+    """
+    point_times = np.asarray(point_times, dtype=float)
+    point_values = np.asarray(point_values, dtype=float)
+    valid = ~np.isnan(point_values)
+    point_times, point_values = point_times[valid], point_values[valid]
+    times = np.asarray(times, dtype=float)
+    if not len(point_times):
+        return np.full(len(times), np.nan)
+    if mode == "swinging_door":
+        rebuilt = np.interp(times, point_times, point_values)
+    else:
+        rebuilt = point_values[np.maximum(np.searchsorted(point_times, times, side="right") - 1, 0)]
+    rebuilt[times < point_times[0]] = np.nan
+    return rebuilt
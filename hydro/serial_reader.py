@@ -0,0 +1,205 @@
+import threading
+import time
+from collections import deque
+
+import serial
+
+from hydro.frames import MODE_BINARY_COMMAND, StreamDecoder
+from hydro.log import get_logger
+from hydro.protocol import LineParser
+
+log = get_logger(__name__)
+
+
+class SerialReader(threading.Thread):
+    """
+    Background thread that owns the Arduino serial port.
+
+    The thread reads lines continuously, parses them into
+    ``hydro.protocol.Reading`` records and publishes ``(timestamp, reading)``
+    samples on a bounded deque. ``deque.append`` and ``popleft`` are atomic,
+    so the Tk loop can drain samples without taking a lock or ever blocking
+    on the port. When the queue is full the oldest sample is dropped and
+    counted.
+
+    The port stays open for the life of the thread, so the board is only
+    reset once. If ``stale_timeout`` is set and no valid sample arrives for
+    that many seconds, the port is closed and reopened.
+
+    With ``binary=True`` the board is asked for binary frames
+    (``hydro.frames``) after each connect; boards that do not answer within
+    ``negotiate_timeout`` seconds keep being read as ASCII lines.
+
+    ``capture`` (a ``hydro.capture.CaptureWriter``) records every raw read
+    for later replay.
+    """
+
+    def __init__(self, port, baud_rate=9600, timeout=1, maxlen=1024, parse=None,
+                 reconnect_delay=2.0, stale_timeout=None, binary=False, negotiate_timeout=5.0,
+                 capture=None, serial_factory=serial.Serial):
+        super().__init__(name=f"SerialReader({port})", daemon=True)
+        self.port = port
+        self.baud_rate = baud_rate
+        self.timeout = timeout
+        self.parse = parse or LineParser().parse
+        self.reconnect_delay = reconnect_delay
+        self.stale_timeout = stale_timeout
+        self.binary = binary
+        self.negotiate_timeout = negotiate_timeout
+        self.capture = capture
+        self.serial_factory = serial_factory
+        self.connected = False
+        self.decoder = StreamDecoder() if binary else None
+
+        self._queue = deque(maxlen=maxlen)
+        self._stop_event = threading.Event()
+        self._serial = None
+        self._has_connected = False
+        self._last_sample = time.monotonic()
+        self._negotiate_until = 0.0
+        self._next_request = 0.0
+
+        # Counters, only written by the reader thread
+        self.lines_read = 0
+        self.parse_errors = 0
+        self.dropped = 0
+        self.reconnects = 0
+        self.last_parse_latency = 0.0
+        self._total_parse_latency = 0.0
+
+    def run(self):
+        while not self._stop_event.is_set():
+            if not self.connected and not self._connect():
+                self._stop_event.wait(self.reconnect_delay)
+                continue
+            try:
+                if self.decoder is None:
+                    raw = self._serial.readline()
+                else:
+                    self._negotiate()
+                    raw = self._serial.read(max(1, self._serial.in_waiting))
+            except (serial.SerialException, OSError) as e:
+                log.warning("Error reading from Arduino: %s", e)
+                self._disconnect()
+                continue
+            if raw:
+                timestamp = time.time()
+                if self.capture is not None:
+                    self.capture.write(timestamp, raw)
+                if self.decoder is None:
+                    self._handle_line(raw, timestamp)
+                else:
+                    self._handle_chunk(raw, timestamp)
+            if self.stale_timeout is not None and self.sample_age() > self.stale_timeout:
+                log.warning("No valid data from Arduino for %ss, reconnecting", self.stale_timeout)
+                self._disconnect()
+        self._disconnect()
+
+    def stop(self, timeout=None):
+        """Stop the thread and close the port."""
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
+
+    def sample_age(self):
+        """Seconds since the last valid sample (or since the port was opened)."""
+        return time.monotonic() - self._last_sample
+
+    def healthy(self):
+        """Return True if connected and samples are arriving."""
+        if not self.connected:
+            return False
+        return self.stale_timeout is None or self.sample_age() <= self.stale_timeout
+
+    def drain(self, max_items=None):
+        """Return queued samples, oldest first, without blocking."""
+        items = []
+        while self._queue and (max_items is None or len(items) < max_items):
+            try:
+                items.append(self._queue.popleft())
+            except IndexError:
+                break
+        return items
+
+    def stats(self):
+        """Return a snapshot of the reader's counters."""
+        parsed = self.lines_read - self.parse_errors
+        stats = {
+            "connected": self.connected,
+            "queue_depth": len(self._queue),
+            "lines_read": self.lines_read,
+            "parse_errors": self.parse_errors,
+            "dropped": self.dropped,
+            "reconnects": self.reconnects,
+            "sample_age": self.sample_age(),
+            "last_parse_latency": self.last_parse_latency,
+            "mean_parse_latency": self._total_parse_latency / parsed if parsed else 0.0,
+        }
+        if self.decoder is not None:
+            stats["mode"] = "binary" if self.decoder.binary else "ascii"
+            stats.update(self.decoder.frames.stats())
+        return stats
+
+    def _handle_line(self, raw, timestamp):
+        self.lines_read += 1
+        start = time.perf_counter()
+        data = self.parse(raw)
+        latency = time.perf_counter() - start
+        if not data:
+            self.parse_errors += 1
+            return
+        self.last_parse_latency = latency
+        self._total_parse_latency += latency
+        self._publish(timestamp, data)
+
+    def _handle_chunk(self, raw, timestamp):
+        """Decode raw bytes (ASCII lines or binary frames) in binary-capable mode."""
+        start = time.perf_counter()
+        readings = self.decoder.feed(raw)
+        latency = time.perf_counter() - start
+        self.lines_read = self.decoder.lines_read
+        self.parse_errors = self.decoder.parse_errors
+        if readings:
+            self.last_parse_latency = latency / len(readings)
+            self._total_parse_latency += latency
+        for data in readings:
+            self._publish(timestamp, data)
+
+    def _publish(self, timestamp, data):
+        self._last_sample = time.monotonic()
+        if len(self._queue) == self._queue.maxlen:
+            self.dropped += 1
+        self._queue.append((timestamp, data))
+
+    def _negotiate(self):
+        """Repeat the binary-mode request until the board acknowledges or time runs out."""
+        now = time.monotonic()
+        if not self.decoder.binary and now < self._negotiate_until and now >= self._next_request:
+            self._serial.write(MODE_BINARY_COMMAND)
+            self._next_request = now + 1.0  # The board may still be booting
+
+    def _connect(self):
+        try:
+            self._serial = self.serial_factory(self.port, self.baud_rate, timeout=self.timeout)
+        except (serial.SerialException, OSError) as e:
+            log.warning("Error connecting to Arduino on %s: %s", self.port, e)
+            return False
+        if self._has_connected:
+            self.reconnects += 1
+        self._has_connected = True
+        self._last_sample = time.monotonic()  # Grace period while the board boots
+        if self.decoder is not None:
+            self.decoder.reset()
+            self._negotiate_until = self._last_sample + self.negotiate_timeout
+            self._next_request = 0.0
+        self.connected = True
+        return True
+
+    def _disconnect(self):
+        self.connected = False
+        if self._serial is not None:
+            try:
+                self._serial.close()
+            except Exception:
+                pass
+            self._serial = None
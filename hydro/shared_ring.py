@@ -0,0 +1,293 @@
+"""
+Live sample buffer in shared memory, written by one process and mapped
+read-only by any number of local viewers.
+
+``SharedRing`` is a ``TimeSeriesRing`` whose arrays live in a file under
+/dev/shm instead of the process heap; the collector publishes each tank's
+filtered samples there. ``SharedRingReader`` maps the same file read-only
+and offers the ring's read API (``times``, ``column``, ``window``,
+``latest``), returning NumPy views straight into the mapping: no copies,
+no socket and no system call per sample.
+
+Consistency uses a seqlock-style header. The writer makes ``seq`` odd and
+announces how far it is about to write (``reserve``) before touching the
+arrays, then publishes the new ``start``/``end`` and makes ``seq`` even.
+Readers take ``start``/``end`` under ``seq`` and, because every sample is
+stored twice (see TimeSeriesRing), slice one contiguous view. A view stays
+intact until the writer laps it; ``valid()`` says whether the last one
+still is, and ``snapshot()`` returns copies that are guaranteed intact::
+
+    ring = SharedRingReader("hydro_tank1")
+    times, ph = ring.column("ph", start=time.time() - 600)
+    mean = np.nanmean(ph)
+    if not ring.valid():  # Only possible if reading took longer than the ring holds
+        ...
+
+Plain files are mapped rather than ``multiprocessing.shared_memory``
+segments: those cannot be opened read-only, and on Python < 3.13 every
+process that attaches one unlinks it when it exits.
+
+CPython issues no memory barriers, so on weakly ordered CPUs (the Pi's ARM
+cores) a reader could in principle see the header before the samples it
+covers. Values are aligned 8-byte stores, so the worst case is one sample
+showing its previous contents, which the next read corrects; fine for
+viewers, not for accounting (use the database for that).
+"""
+import json
+import mmap
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from hydro.ring_buffer import TimeSeriesRing
+
+SHM_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+MAGIC = int.from_bytes(b"HYDRING1", "little")
+HEADER_SIZE = 4096  # Eight uint64 fields, then the JSON metadata; keeps the arrays page-aligned
+_MAGIC, _CAPACITY, _CHANNELS, _SEQ, _START, _END, _RESERVE, _PID = range(8)
+
+
+def ring_path(name):
+    return os.path.join(SHM_DIR, name)
+
+
+class SharedRing(TimeSeriesRing):
+    """
+    The writing side: a TimeSeriesRing published as ``name`` (a file in
+    ``SHM_DIR``). Only one process may write a ring. Creating a ring
+    replaces any previous one of the same name; readers of the old one
+    notice through ``writer_alive()`` and reattach.
+    """
+
+    def __init__(self, name, channels, capacity, max_age=None):
+        self.name = name
+        self.path = ring_path(name)
+        self._mmap = None
+        super().__init__(channels, capacity, max_age)
+        self._inode = os.stat(self._tmp_path).st_ino
+        os.replace(self._tmp_path, self.path)  # Readers only ever see a complete header
+
+    def _allocate(self):
+        n_channels = len(self.channels)
+        size = HEADER_SIZE + 8 * 2 * self.capacity * (1 + n_channels)
+        self._tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(self._tmp_path, "w+b") as f:
+            f.truncate(size)
+            self._mmap = mmap.mmap(f.fileno(), size)
+        self._header = np.frombuffer(self._mmap, np.uint64, 8)
+        metadata = json.dumps({"channels": self.channels, "max_age": self.max_age}).encode()
+        if 64 + len(metadata) > HEADER_SIZE:
+            raise ValueError("too many channels for the ring header")
+        self._mmap[64:64 + len(metadata)] = metadata
+        self._header[:] = (MAGIC, self.capacity, n_channels, 0, 0, 0, 0, os.getpid())
+        times = np.frombuffer(self._mmap, np.float64, 2 * self.capacity, offset=HEADER_SIZE)
+        values = np.frombuffer(
+            self._mmap, np.float64, 2 * self.capacity * n_channels, offset=HEADER_SIZE + 16 * self.capacity
+        ).reshape(n_channels, 2 * self.capacity)
+        times[:] = np.nan
+        values[:] = np.nan
+        return times, values
+
+    def append(self, timestamp, values):
+        self._begin(1)
+        try:
+            super().append(timestamp, values)
+        finally:
+            self._commit()
+
+    def extend(self, timestamps, values):
+        self._begin(len(timestamps))
+        try:
+            super().extend(timestamps, values)
+        finally:
+            self._commit()
+
+    def clear(self):
+        self._begin(0)
+        super().clear()
+        self._commit()
+
+    def close(self, unlink=True):
+        """Mark the ring closed for readers and, by default, remove it."""
+        if self._mmap is None:
+            return
+        self._header[_PID] = 0
+        if unlink:
+            try:
+                if os.stat(self.path).st_ino == self._inode:  # Not yet replaced by a newer writer
+                    os.unlink(self.path)
+            except OSError:
+                pass
+        _release(self)
+
+    def _begin(self, count):
+        self._header[_SEQ] += 1
+        self._header[_RESERVE] = self._end + count
+
+    def _commit(self):
+        header = self._header
+        header[_START] = self._start
+        header[_END] = self._end
+        header[_RESERVE] = self._end
+        header[_SEQ] += 1
+
+
+class SharedRingReader:
+    """
+    Read-only view of a ring published by ``SharedRing``. Raises
+    FileNotFoundError if no ring of that name exists (see ``exists``).
+
+    ``times``, ``column`` and ``window`` behave like TimeSeriesRing's and
+    return views into shared memory; ``read_new`` returns what was appended
+    since its previous call, for consumers that process every sample.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.path = ring_path(name)
+        with open(self.path, "rb") as f:
+            self._inode = os.fstat(f.fileno()).st_ino
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._header = np.frombuffer(self._mmap, np.uint64, 8)
+        if self._header[_MAGIC] != MAGIC:
+            _release(self)
+            raise ValueError(f"{self.path} is not a hydro shared ring")
+        metadata = json.loads(self._mmap[64:HEADER_SIZE].rstrip(b"\0"))
+        self.channels = tuple(metadata["channels"])
+        self.max_age = metadata["max_age"]
+        self.capacity = int(self._header[_CAPACITY])
+        self._index = {name: i for i, name in enumerate(self.channels)}
+        self._times = np.frombuffer(self._mmap, np.float64, 2 * self.capacity, offset=HEADER_SIZE)
+        self._values = np.frombuffer(
+            self._mmap, np.float64, 2 * self.capacity * len(self.channels), offset=HEADER_SIZE + 16 * self.capacity
+        ).reshape(len(self.channels), 2 * self.capacity)
+        self._lo = 0  # Logical index of the oldest sample in the last views handed out
+        self._cursor = self._indices()[1]  # read_new starts with samples written after attaching
+        self.missed = 0  # Samples read_new could not return because the writer lapped them
+
+    @staticmethod
+    def exists(name):
+        return os.path.exists(ring_path(name))
+
+    def __len__(self):
+        start, end = self._indices()
+        return end - start
+
+    def writer_alive(self):
+        """False once the writer closed the ring, exited, or a new ring replaced this one."""
+        pid = int(self._header[_PID])
+        if pid == 0:
+            return False
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass  # Alive, owned by another user
+        try:
+            return os.stat(self.path).st_ino == self._inode
+        except OSError:
+            return False
+
+    def times(self):
+        start, end = self._indices()
+        return self._view(self._times, start, end)
+
+    def column(self, name, start=None, end=None):
+        """Return ``(times, values)`` views for one channel, optionally limited to [start, end]."""
+        lo, hi = self._bounds(start, end)
+        row = self._values[self._index[name]]
+        return self._view(self._times, lo, hi), self._view(row, lo, hi)
+
+    def window(self, start=None, end=None):
+        """Return ``(times, values)`` views over [start, end]; ``values`` is (n_channels, n_samples)."""
+        lo, hi = self._bounds(start, end)
+        return self._view(self._times, lo, hi), self._view(self._values, lo, hi)
+
+    def latest(self):
+        """Return ``(timestamp, {channel: value})`` for the newest sample, or None."""
+        for _ in range(100):
+            start, end = self._indices()
+            if end == start:
+                return None
+            slot = (end - 1) % self.capacity
+            timestamp, values = float(self._times[slot]), self._values[:, slot].tolist()
+            if self._intact(end - 1):
+                return timestamp, dict(zip(self.channels, values))
+        return timestamp, dict(zip(self.channels, values))
+
+    def read_new(self):
+        """
+        Return ``(times, values)`` views of the samples appended since the
+        previous call. Samples overwritten before they were read are counted
+        in ``missed``.
+        """
+        start, end = self._indices()
+        if end < self._cursor:  # The writer cleared the ring
+            self._cursor = start
+        lo = max(self._cursor, start)
+        self.missed += lo - self._cursor
+        self._cursor = end
+        return self._view(self._times, lo, end), self._view(self._values, lo, end)
+
+    def valid(self):
+        """True if the views returned by the last read have not been overwritten since."""
+        return self._intact(self._lo)
+
+    def snapshot(self, start=None, end=None):
+        """Like ``window`` but returns copies, re-reading until they are intact."""
+        while True:
+            times, values = self.window(start, end)
+            times, values = times.copy(), values.copy()
+            if self.valid():
+                return times, values
+
+    def close(self):
+        _release(self)
+
+    def _indices(self):
+        """``(start, end)`` as of the last completed write (the seqlock read)."""
+        header = self._header
+        for attempt in range(10000):
+            seq = header[_SEQ]
+            if not seq % 2:
+                start, end = int(header[_START]), int(header[_END])
+                if header[_SEQ] == seq:
+                    return start, end
+            if attempt > 100:
+                time.sleep(0)  # Let the writer finish its batch
+        # A writer that died mid-write leaves seq odd; its last published indices still hold
+        return int(header[_START]), int(header[_END])
+
+    def _intact(self, lo):
+        # Writing sample k overwrites sample k - capacity
+        return int(self._header[_RESERVE]) <= lo + self.capacity
+
+    def _bounds(self, start, end):
+        lo, hi = self._indices()
+        if start is None and end is None:
+            return lo, hi
+        times = self._view(self._times, lo, hi)
+        first = lo
+        if start is not None:
+            lo = first + int(np.searchsorted(times, start, side="left"))
+        if end is not None:
+            hi = first + int(np.searchsorted(times, end, side="right"))
+        return lo, max(lo, hi)
+
+    def _view(self, array, lo, hi):
+        self._lo = lo
+        first = lo % self.capacity if hi > lo else 0
+        return array[..., first:first + (hi - lo)]
+
+
+def _release(ring):
+    """Unmap ``ring``'s memory; views still held elsewhere keep it mapped until they go."""
+    mapping, ring._mmap = ring._mmap, None
+    ring._header = ring._times = ring._values = None
+    try:
+        mapping.close()
+    except BufferError:
+        pass  # Exported views remain; the mapping is freed with the last of them
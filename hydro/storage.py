@@ -0,0 +1,520 @@
+"""
+Local time-series store backed by hydroponics_data.db.
+
+Samples live in the existing ``sensor_data`` table. Timestamps are stored as
+UTC epoch seconds (REAL) so range queries can use the timestamp index and
+go straight into NumPy; rows written by older code as text datetimes are
+converted when the store is opened. With several tanks, each row carries
+the tank ID in ``tank`` (NULL for single-tank setups). Boards in raw mode
+also leave their probe voltages in ``ec_voltage``, ``tds_voltage`` and
+``ph_voltage`` (NULL otherwise), so hydro.calibration can recompute the
+history after a probe is recalibrated.
+
+Every write is also folded into ``sensor_rollup``: count, sum, min and max
+per field and tank in 1 min, 15 min and 1 h buckets (hydro.rollups tiers),
+so long charts read pre-aggregated buckets (``rollup``) instead of every
+row. The table is backfilled from ``sensor_data`` once, when it is created.
+"""
+import itertools
+import os
+import sqlite3
+import time
+
+import numpy as np
+
+from hydro.log import get_logger
+from hydro.protocol import READING_DTYPE, Reading
+from hydro.rollups import DEFAULT_TIERS, bucket_stats
+
+log = get_logger(__name__)
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "hydroponics_data.db")
+# How long a write waits for another process's lock (every script here opens the same file) before
+# raising sqlite3.OperationalError
+BUSY_TIMEOUT = 5.0  # Seconds
+
+# Reading field -> sensor_data column
+COLUMNS = {
+    "water_level": "water_level",
+    "water_temp": "temperature",
+    "ec": "ec",
+    "tds": "tds",
+    "ph": "ph",
+}
+# RawReading voltage field -> sensor_data column; level and temperature share the columns above
+RAW_COLUMNS = {
+    "ec_voltage": "ec_voltage",
+    "tds_voltage": "tds_voltage",
+    "ph_voltage": "ph_voltage",
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sensor_data (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp DATETIME NOT NULL,
+    ph REAL,
+    temperature REAL,
+    ec REAL,
+    tds REAL,
+    water_level REAL,
+    tank TEXT,
+    ec_voltage REAL,
+    tds_voltage REAL,
+    ph_voltage REAL
+);
+CREATE INDEX IF NOT EXISTS idx_sensor_data_timestamp ON sensor_data (timestamp);
+"""
+
+_COLUMN_LIST = ", ".join(COLUMNS[name] for name in Reading._fields)
+_RAW_COLUMN_LIST = ", ".join(RAW_COLUMNS.values())
+_INSERT = (
+    f"INSERT INTO sensor_data (timestamp, {_COLUMN_LIST}, tank, {_RAW_COLUMN_LIST}) "
+    f"VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+_NO_VOLTAGES = (None,) * len(RAW_COLUMNS)
+
+# Per field and bucket; the mean is sum / count. ``tank`` is '' for untagged rows
+_ROLLUP_STATS = ("count", "sum", "min", "max")
+_ROLLUP_COLUMNS = [f"{COLUMNS[name]}_{stat}" for name in Reading._fields for stat in _ROLLUP_STATS]
+_ROLLUP_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS sensor_rollup (
+    resolution INTEGER NOT NULL,
+    tank TEXT NOT NULL,
+    start REAL NOT NULL,
+    {", ".join(f"{column} REAL" for column in _ROLLUP_COLUMNS)},
+    PRIMARY KEY (resolution, tank, start)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_sensor_rollup_start ON sensor_rollup (resolution, start);
+"""
+_ROLLUP_COLUMN_LIST = ", ".join(_ROLLUP_COLUMNS)
+_ROLLUP_MERGE = {
+    "count": "{0} = {0} + excluded.{0}",
+    "sum": "{0} = {0} + excluded.{0}",
+    # min()/max() with a NULL argument are NULL in SQLite
+    "min": "{0} = coalesce(min({0}, excluded.{0}), {0}, excluded.{0})",
+    "max": "{0} = coalesce(max({0}, excluded.{0}), {0}, excluded.{0})",
+}
+_ROLLUP_UPSERT = (
+    f"INSERT INTO sensor_rollup (resolution, tank, start, {_ROLLUP_COLUMN_LIST}) "
+    f"VALUES (?, ?, ?, {', '.join('?' * len(_ROLLUP_COLUMNS))}) "
+    f"ON CONFLICT (resolution, tank, start) DO UPDATE SET "
+    + ", ".join(_ROLLUP_MERGE[stat].format(f"{COLUMNS[name]}_{stat}")
+                for name in Reading._fields for stat in _ROLLUP_STATS)
+)
+_ROLLUP_AGGREGATES = {"count": "count({})", "sum": "total({})", "min": "min({})", "max": "max({})"}
+_ROLLUP_FROM_ROWS = ", ".join(
+    _ROLLUP_AGGREGATES[stat].format(COLUMNS[name]) for name in Reading._fields for stat in _ROLLUP_STATS
+)
+# Buckets of several tanks (tank=None) are merged
+_ROLLUP_MERGED = ", ".join(
+    f"{'sum' if stat == 'count' else 'total' if stat == 'sum' else stat}({COLUMNS[name]}_{stat})"
+    for name in Reading._fields for stat in _ROLLUP_STATS
+)
+
+
+class SensorStore:
+    """
+    Owner of the ``sensor_data`` table.
+
+    ``add`` buffers samples and writes them in one transaction every
+    ``batch_size`` samples (None: only when ``flush`` is called); if that write
+    fails (e.g. another process holds the lock for longer than
+    ``busy_timeout``) the samples stay buffered for the next flush. The
+    database runs in WAL mode, so readers in other processes never block
+    the writer. SQLite stores NaN as NULL, so missing values round-trip as
+    NaN.
+
+    Usage:
+        store = SensorStore()
+        store.add(time.time(), reading)
+        times, values = store.query(start=time.time() - 3600)
+        values["ph"]  # float64 array
+    """
+
+    def __init__(self, path=DEFAULT_DB_PATH, batch_size=100, busy_timeout=BUSY_TIMEOUT):
+        self.path = path
+        self.batch_size = batch_size
+        self._pending = []
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(f"PRAGMA busy_timeout = {int(busy_timeout * 1000)}")
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")  # Durable at checkpoints; safe with WAL
+        self._add_columns()
+        self.conn.executescript(_SCHEMA)
+        self._migrate_text_timestamps()
+        self._create_rollups()
+
+    def add(self, timestamp, reading, tank=None, raw=None):
+        """
+        Buffer one sample; ``reading`` is a sequence in ``Reading`` field
+        order and ``raw`` the ``RawReading`` it was calibrated from, if any.
+        """
+        self._pending.append((timestamp, *reading, tank, *(_NO_VOLTAGES if raw is None else raw[2:])))
+        if self.batch_size is not None and len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Write buffered samples in a single transaction. They are only
+        dropped from the buffer once it commits, so after an error (e.g.
+        ``sqlite3.OperationalError: database is locked``) the next flush
+        writes them again.
+        """
+        if not self._pending:
+            return
+        pending = self._pending[:]
+        width = 1 + len(Reading._fields)
+        with self.conn:
+            self.conn.executemany(_INSERT, pending)
+            self._roll_up(
+                np.array([row[:width] for row in pending], dtype=float),
+                [row[width] for row in pending],
+            )
+        del self._pending[:len(pending)]
+
+    def insert_many(self, timestamps, values, tank=None, raw=None):
+        """
+        Bulk insert arrays: ``values`` is a READING_DTYPE structured array or
+        an (n, 5) float array in ``Reading`` field order, ``raw`` an optional
+        (n, 5) array in ``RawReading`` order. NaN is stored as NULL.
+        """
+        rows = np.column_stack([np.asarray(timestamps, dtype=float), _as_table(values)])
+        if raw is None:
+            params = [(*row, tank, *_NO_VOLTAGES) for row in rows.tolist()]
+        else:
+            voltages = np.asarray(raw, dtype=float).reshape(len(rows), -1)[:, 2:]
+            params = [(*row, tank, *volts) for row, volts in zip(rows.tolist(), voltages.tolist())]
+        with self.conn:
+            self.conn.executemany(_INSERT, params)
+            self._roll_up(rows, [tank] * len(rows))
+
+    def query(self, start=None, end=None, tank=None):
+        """
+        Return ``(times, values)`` for samples in [start, end] (epoch seconds),
+        from one ``tank`` if given.
+
+        ``times`` is a float64 array and ``values`` a READING_DTYPE structured
+        array; NULLs come back as NaN.
+        """
+        self.flush()
+        sql = f"SELECT timestamp, {_COLUMN_LIST} FROM sensor_data"
+        clauses, params = [], []
+        if start is not None:
+            clauses.append("timestamp >= ?")
+            params.append(start)
+        if end is not None:
+            clauses.append("timestamp <= ?")
+            params.append(end)
+        if tank is not None:
+            clauses.append("tank = ?")
+            params.append(tank)
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY timestamp"
+        rows = self.conn.execute(sql, params).fetchall()
+        table = np.array(rows, dtype=float).reshape(-1, len(Reading._fields) + 1)
+        return table[:, 0].copy(), np.ascontiguousarray(table[:, 1:]).view(READING_DTYPE).reshape(-1)
+
+    def query_by_tank(self, start=None, end=None):
+        """Like ``query`` over every tank, split into ``{tank: (times, values)}``; untagged rows are under None."""
+        self.flush()
+        sql = f"SELECT timestamp, {_COLUMN_LIST}, tank FROM sensor_data"
+        clauses, params = [], []
+        if start is not None:
+            clauses.append("timestamp >= ?")
+            params.append(start)
+        if end is not None:
+            clauses.append("timestamp <= ?")
+            params.append(end)
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY tank, timestamp"
+        result = {}
+        for tank, rows in itertools.groupby(self.conn.execute(sql, params), key=lambda row: row[-1]):
+            table = np.array([row[:-1] for row in rows], dtype=float).reshape(-1, len(Reading._fields) + 1)
+            result[tank] = table[:, 0].copy(), np.ascontiguousarray(table[:, 1:]).view(READING_DTYPE).reshape(-1)
+        return result
+
+    def query_raw(self, start=None, end=None, tank=None):
+        """
+        Samples in [start, end] stored with probe voltages, as ``{tank: (ids,
+        times, raw)}`` with ``raw`` an (n, 5) float array in ``RawReading``
+        order; from one ``tank`` if given.
+        """
+        self.flush()
+        raw_columns = " OR ".join(f"{column} IS NOT NULL" for column in RAW_COLUMNS.values())
+        sql = (
+            f"SELECT id, timestamp, {COLUMNS['water_level']}, {COLUMNS['water_temp']}, {_RAW_COLUMN_LIST}, tank "
+            f"FROM sensor_data"
+        )
+        clauses, params = [f"({raw_columns})"], []
+        if start is not None:
+            clauses.append("timestamp >= ?")
+            params.append(start)
+        if end is not None:
+            clauses.append("timestamp <= ?")
+            params.append(end)
+        if tank is not None:
+            clauses.append("tank = ?")
+            params.append(tank)
+        sql += " WHERE " + " AND ".join(clauses) + " ORDER BY tank, timestamp"
+        result = {}
+        for sample_tank, rows in itertools.groupby(self.conn.execute(sql, params), key=lambda row: row[-1]):
+            table = np.array([row[:-1] for row in rows], dtype=float).reshape(-1, 7)
+            result[sample_tank] = table[:, 0].astype(np.int64), table[:, 1].copy(), table[:, 2:].copy()
+        return result
+
+    def update_values(self, ids, values, fields=Reading._fields):
+        """
+        Overwrite ``fields`` of the rows ``ids`` with an (n, len(fields))
+        array, in one transaction; the rollup buckets they fall in are rebuilt.
+        Other writers wait for it, so rewrite long histories in slices (as
+        ``CalibrationBook.reprocess`` does).
+        """
+        assignments = ", ".join(f"{COLUMNS[name]} = ?" for name in fields)
+        rows = np.asarray(values, dtype=float).reshape(len(ids), len(fields)).tolist()
+        ids = np.asarray(ids).tolist()
+        with self.conn:
+            self.conn.executemany(
+                f"UPDATE sensor_data SET {assignments} WHERE id = ?",
+                [(*row, row_id) for row, row_id in zip(rows, ids)],
+            )
+            self.conn.execute("CREATE TEMP TABLE updated_ids (id INTEGER PRIMARY KEY)")
+            self.conn.executemany("INSERT OR IGNORE INTO updated_ids VALUES (?)", [(row_id,) for row_id in ids])
+            spans = self.conn.execute(
+                "SELECT coalesce(tank, ''), min(timestamp), max(timestamp) FROM sensor_data "
+                "WHERE id IN (SELECT id FROM updated_ids) GROUP BY coalesce(tank, '')"
+            ).fetchall()
+            self.conn.execute("DROP TABLE updated_ids")
+            for tank, start, end in spans:
+                self._rebuild_rollups(start, end, tank)
+
+    def rollup(self, start, end, pixels, tank=None):
+        """
+        Bucket statistics over [start, end] from the coarsest rollup tier
+        with at least one bucket per pixel, or None when even the finest is
+        too coarse and raw samples should be drawn.
+
+        Returns ``{"resolution", "times", "mean", "min", "max", "count"}``:
+        ``times`` holds the bucket starts and the rest are READING_DTYPE
+        structured arrays (NaN where a bucket has no value). Without
+        ``tank``, the buckets of every tank are merged.
+        """
+        self.flush()
+        wanted = (end - start) / max(pixels, 1)
+        candidates = [resolution for resolution in sorted(DEFAULT_TIERS, reverse=True) if resolution <= wanted]
+        if not candidates:
+            return None
+        where, params = ("AND tank = ?", [tank]) if tank is not None else ("", [])
+        earliest = {
+            resolution: self.conn.execute(
+                f"SELECT min(start) FROM sensor_rollup WHERE resolution = ? {where}", [resolution, *params]
+            ).fetchone()[0]
+            for resolution in DEFAULT_TIERS
+        }
+        present = [first for first in earliest.values() if first is not None]
+        if not present:
+            return None
+        reach = max(start, max(present))  # The finest tier starts at (about) the first sample
+        for resolution in candidates:
+            first = earliest[resolution]
+            # Pruned tiers no longer reach old windows; a coarser one still does
+            if first is not None and first <= reach + resolution:
+                break
+        else:
+            return None
+        rows = self.conn.execute(
+            f"SELECT start, {_ROLLUP_MERGED} FROM sensor_rollup "
+            f"WHERE resolution = ? AND start >= ? AND start <= ? {where} GROUP BY start ORDER BY start",
+            [resolution, start - start % resolution, end, *params],
+        ).fetchall()
+        table = np.array(rows, dtype=float).reshape(-1, 1 + len(_ROLLUP_COLUMNS))
+        stats = table[:, 1:].reshape(len(table), len(Reading._fields), len(_ROLLUP_STATS))
+        count, total, low, high = (stats[:, :, i] for i in range(len(_ROLLUP_STATS)))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(count > 0, total / count, np.nan)
+
+        def structured(columns):
+            return np.ascontiguousarray(columns).view(READING_DTYPE).reshape(-1)
+
+        return {
+            "resolution": resolution,
+            "times": table[:, 0].copy(),
+            "mean": structured(mean),
+            "min": structured(low),
+            "max": structured(high),
+            "count": structured(count),
+        }
+
+    def time_range(self):
+        """``(oldest, newest)`` timestamp in the table, or None if it is empty."""
+        self.flush()
+        oldest, newest = self.conn.execute("SELECT min(timestamp), max(timestamp) FROM sensor_data").fetchone()
+        return None if oldest is None else (oldest, newest)
+
+    def latest(self, tank=None):
+        """Return ``(timestamp, Reading)`` for the newest sample (of ``tank``), or None."""
+        self.flush()
+        where, params = ("WHERE tank = ?", (tank,)) if tank is not None else ("", ())
+        row = self.conn.execute(
+            f"SELECT timestamp, {_COLUMN_LIST} FROM sensor_data {where} ORDER BY timestamp DESC LIMIT 1",
+            params,
+        ).fetchone()
+        if row is None:
+            return None
+        return row[0], Reading._make(float("nan") if v is None else v for v in row[1:])
+
+    def compact(self, retention_days=365, downsample_after_days=7, bucket_seconds=300, now=None):
+        """
+        Keep the database small on an SD card.
+
+        Deletes samples older than ``retention_days``, replaces samples older
+        than ``downsample_after_days`` with per-tank ``bucket_seconds`` averages, then
+        checkpoints the WAL and returns free pages to the filesystem. Rollup
+        buckets are kept as long as their tier's capacity (years for the
+        hourly tier), so long charts outlive the samples.
+        """
+        self.flush()
+        now = time.time() if now is None else now
+        retention_cutoff = now - retention_days * 86400
+        downsample_cutoff = now - downsample_after_days * 86400
+        averages = ", ".join(f"avg({COLUMNS[name]})" for name in Reading._fields)
+        raw_averages = ", ".join(f"avg({column})" for column in RAW_COLUMNS.values())
+        with self.conn:
+            self.conn.execute("DELETE FROM sensor_data WHERE timestamp < ?", (retention_cutoff,))
+            # Only touch buckets that hold more than one row, so reruns are no-ops
+            self.conn.execute(
+                f"""
+                CREATE TEMP TABLE compacted AS
+                SELECT CAST(timestamp / :bucket AS INTEGER) * :bucket AS timestamp, {averages}, tank, {raw_averages}
+                FROM sensor_data WHERE timestamp < :cutoff
+                GROUP BY CAST(timestamp / :bucket AS INTEGER), tank HAVING count(*) > 1
+                """,
+                {"bucket": bucket_seconds, "cutoff": downsample_cutoff},
+            )
+            self.conn.execute(
+                """
+                DELETE FROM sensor_data WHERE timestamp < :cutoff
+                AND (CAST(timestamp / :bucket AS INTEGER) * :bucket, coalesce(tank, ''))
+                    IN (SELECT timestamp, coalesce(tank, '') FROM compacted)
+                """,
+                {"bucket": bucket_seconds, "cutoff": downsample_cutoff},
+            )
+            self.conn.execute(
+                f"INSERT INTO sensor_data (timestamp, {_COLUMN_LIST}, tank, {_RAW_COLUMN_LIST}) SELECT * FROM compacted"
+            )
+            self.conn.execute("DROP TABLE compacted")
+            for resolution, capacity in DEFAULT_TIERS.items():
+                self.conn.execute(
+                    "DELETE FROM sensor_rollup WHERE resolution = ? AND start < ?",
+                    (resolution, now - capacity * resolution),
+                )
+        self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self.conn.execute("VACUUM")
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self.conn.close()
+
+    def _add_columns(self):
+        """Databases created before multi-tank support lack ``tank``, and before raw mode the voltage columns."""
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(sensor_data)")]
+        if not columns:
+            return
+        missing = [name for name in ("tank", *RAW_COLUMNS.values()) if name not in columns]
+        with self.conn:
+            for name in missing:
+                self.conn.execute(f"ALTER TABLE sensor_data ADD COLUMN {name} {'TEXT' if name == 'tank' else 'REAL'}")
+
+    def _create_rollups(self):
+        """
+        Create ``sensor_rollup``, backfilled from the samples already stored,
+        unless it exists; tables from before multi-tank support are rebuilt.
+        """
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(sensor_rollup)")]
+        if "tank" in columns:
+            return
+        started = time.perf_counter()
+        with self.conn:
+            self.conn.execute("DROP TABLE IF EXISTS sensor_rollup")
+            for statement in _ROLLUP_SCHEMA.split(";"):
+                if statement.strip():
+                    self.conn.execute(statement)
+            self._rebuild_rollups()
+        log.info("Built sensor_rollup from stored samples in %.1f s", time.perf_counter() - started)
+
+    def _roll_up(self, table, tanks):
+        """Fold new rows (timestamp and ``Reading`` columns) into every tier; inside the caller's transaction."""
+        if not len(table):
+            return
+        tanks = np.array(["" if tank is None else tank for tank in tanks], dtype=object)
+        params = []
+        for tank in set(tanks.tolist()):
+            rows = table[tanks == tank]
+            rows = rows[np.argsort(rows[:, 0], kind="stable")]
+            for resolution in DEFAULT_TIERS:
+                starts, count, total, low, high = bucket_stats(rows[:, 0], rows[:, 1:], resolution)
+                stats = np.stack([count, total, low, high], axis=2).reshape(len(starts), -1)
+                params.extend((resolution, tank, *row) for row in np.column_stack([starts, stats]).tolist())
+        self.conn.executemany(_ROLLUP_UPSERT, params)
+
+    def _rebuild_rollups(self, start=None, end=None, tank=None):
+        """
+        Recompute the buckets covering [start, end] (of ``tank``, '' for
+        untagged rows) from ``sensor_data``: the finest tier from the rows,
+        the coarser ones from its buckets, so the rows are read once.
+        """
+        finest, coarsest = min(DEFAULT_TIERS), max(DEFAULT_TIERS)
+        # Whole buckets of every tier; the finest may have been pruned around the range
+        params = {"finest": finest, "tank": tank}
+        if start is not None:
+            params["start"] = start - start % coarsest
+        if end is not None:
+            params["end"] = end - end % coarsest + coarsest
+
+        def where(column, tank_column):
+            clauses = [f"{column} >= :start"] if start is not None else []
+            clauses += [f"{column} < :end"] if end is not None else []
+            clauses += [f"{tank_column} = :tank"] if tank is not None else []
+            return " AND ".join(clauses) or "1"
+
+        for resolution in sorted(DEFAULT_TIERS):
+            params["resolution"] = resolution
+            self.conn.execute(
+                f"DELETE FROM sensor_rollup WHERE resolution = :resolution AND {where('start', 'tank')}", params
+            )
+            if resolution == finest:
+                source = f"""
+                    SELECT :resolution, coalesce(tank, ''), CAST(timestamp / :resolution AS INTEGER) * :resolution,
+                           {_ROLLUP_FROM_ROWS}
+                    FROM sensor_data WHERE {where('timestamp', "coalesce(tank, '')")}
+                    GROUP BY coalesce(tank, ''), CAST(timestamp / :resolution AS INTEGER)
+                """
+            else:
+                source = f"""
+                    SELECT :resolution, tank, CAST(start / :resolution AS INTEGER) * :resolution, {_ROLLUP_MERGED}
+                    FROM sensor_rollup WHERE resolution = :finest AND {where('start', 'tank')}
+                    GROUP BY tank, CAST(start / :resolution AS INTEGER)
+                """
+            self.conn.execute(
+                f"INSERT INTO sensor_rollup (resolution, tank, start, {_ROLLUP_COLUMN_LIST}) {source}", params
+            )
+
+    def _migrate_text_timestamps(self):
+        """Convert rows stored as 'YYYY-MM-DD HH:MM:SS' (UTC) to epoch seconds."""
+        # SQLite sorts every number before any text, so ">= ''" is a range on the
+        # timestamp index; checking typeof() alone scanned the whole table on every open
+        with self.conn:
+            self.conn.execute(
+                "UPDATE sensor_data SET timestamp = (julianday(timestamp) - 2440587.5) * 86400.0 "
+                "WHERE timestamp >= '' AND typeof(timestamp) = 'text'"
+            )
+
+
+def _as_table(values):
+    values = np.asarray(values)
+    if values.dtype.names:
+        return np.column_stack([values[name] for name in Reading._fields]).astype(float)
+    return values.astype(float).reshape(-1, len(Reading._fields))
@@ -0,0 +1,189 @@
+import json
+import os
+import time
+import uuid
+from datetime import datetime
+
+from hydro.log import get_logger
+from hydro.metrics import REGISTRY
+
+log = get_logger(__name__)
+
+# Firestore rejects batches with more than 500 writes
+MAX_BATCH_SIZE = 500
+
+
+class BatchUploader:
+    """
+    Buffer sensor documents and commit them to Firestore in batched writes.
+
+    Documents are flushed when the buffer holds ``max_batch`` documents or the
+    oldest one is ``max_age`` seconds old. Each document gets a client-side ID
+    when it is added, so retrying a batch overwrites rather than duplicates.
+
+    A failed commit appends the batch to an append-only JSON-lines spool file,
+    so readings survive outages and restarts. The spool is drained, oldest
+    first, with exponential backoff between failed attempts.
+
+    Usage:
+        uploader = BatchUploader(db, spool_path="spool.jsonl")
+        uploader.add({"ph": 6.5, "timestamp": datetime.utcnow()})
+        uploader.poll()  # Call regularly from the main loop
+    """
+
+    def __init__(self, db, collection="sensor_readings", max_batch=MAX_BATCH_SIZE, max_age=60,
+                 spool_path=None, min_backoff=1.0, max_backoff=300.0, clock=time.monotonic):
+        if not 0 < max_batch <= MAX_BATCH_SIZE:
+            raise ValueError(f"max_batch must be between 1 and {MAX_BATCH_SIZE}")
+        self.db = db
+        self.collection = collection
+        self.max_batch = max_batch
+        self.max_age = max_age
+        self.spool_path = spool_path
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.clock = clock
+
+        self._pending = []  # (doc_id, document)
+        self._oldest = None
+        self._backoff = 0.0
+        self._retry_at = 0.0
+
+        self.commits = 0
+        self.documents_written = 0
+        self.failures = 0
+        self.commit_time = REGISTRY.histogram(
+            "hydro_upload_seconds", "Firestore batch commit latency, failures included", collection=collection
+        )
+
+    def add(self, document):
+        """Queue one document; flushes if the buffer is full."""
+        if not self._pending:
+            self._oldest = self.clock()
+        self._pending.append((uuid.uuid4().hex, dict(document)))
+        if len(self._pending) >= self.max_batch:
+            self.flush()
+
+    def poll(self):
+        """Flush by age and retry the spool if its backoff has expired."""
+        now = self.clock()
+        if self._pending and now - self._oldest >= self.max_age:
+            self.flush()
+        elif self.spooled() and now >= self._retry_at:
+            self.drain_spool()
+
+    def flush(self):
+        """Commit everything buffered; on failure the documents are spooled."""
+        pending, self._pending = self._pending, []
+        if not pending:
+            return True
+
+        # Keep ordering: anything already spooled has to go first
+        if self.spooled() and not self.drain_spool():
+            self._spool(pending)
+            return False
+
+        for start in range(0, len(pending), self.max_batch):
+            chunk = pending[start:start + self.max_batch]
+            if not self._commit(chunk):
+                self._spool(pending[start:])
+                return False
+        return True
+
+    def drain_spool(self):
+        """Upload spooled documents. Returns True once the spool is empty."""
+        if self.clock() < self._retry_at:
+            return False
+        backlog = self._read_spool()
+        for start in range(0, len(backlog), self.max_batch):
+            if not self._commit(backlog[start:start + self.max_batch]):
+                self._rewrite_spool(backlog[start:])
+                return False
+        self._rewrite_spool([])
+        return True
+
+    def spooled(self):
+        """Return True if the spool file holds unsent documents."""
+        return bool(self.spool_path) and os.path.exists(self.spool_path) and os.path.getsize(self.spool_path) > 0
+
+    def close(self):
+        """Flush the buffer; anything that cannot be sent stays in the spool."""
+        self.flush()
+
+    def stats(self):
+        return {
+            "pending": len(self._pending),
+            "commits": self.commits,
+            "documents_written": self.documents_written,
+            "failures": self.failures,
+            "backoff": self._backoff,
+        }
+
+    def _commit(self, chunk):
+        start = time.perf_counter()
+        try:
+            batch = self.db.batch()
+            collection_ref = self.db.collection(self.collection)
+            for doc_id, document in chunk:
+                batch.set(collection_ref.document(doc_id), document)
+            batch.commit()
+        except Exception as e:
+            self.commit_time.observe(time.perf_counter() - start)
+            self.failures += 1
+            self._backoff = min(self.max_backoff, max(self.min_backoff, self._backoff * 2))
+            self._retry_at = self.clock() + self._backoff
+            log.warning("Error writing batch to Firestore, retrying in %.0fs: %s", self._backoff, e)
+            return False
+        self.commit_time.observe(time.perf_counter() - start)
+        self.commits += 1
+        self.documents_written += len(chunk)
+        self._backoff = 0.0
+        return True
+
+    def _spool(self, chunk):
+        if not self.spool_path:
+            log.error("Dropping %d documents: no spool file configured", len(chunk))
+            return
+        with open(self.spool_path, "a") as f:
+            for doc_id, document in chunk:
+                f.write(_encode(doc_id, document) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _read_spool(self):
+        if not self.spooled():
+            return []
+        backlog = []
+        with open(self.spool_path) as f:
+            for line in f:
+                try:
+                    backlog.append(_decode(line))
+                except ValueError:
+                    # Half-written line from a crash mid-append
+                    log.warning("Skipping corrupt spool entry: %s", line.strip())
+        return backlog
+
+    def _rewrite_spool(self, backlog):
+        """Atomically replace the spool with ``backlog``."""
+        tmp_path = self.spool_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            for doc_id, document in backlog:
+                f.write(_encode(doc_id, document) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.spool_path)
+
+
+def _encode(doc_id, document):
+    document = dict(document)
+    if isinstance(document.get("timestamp"), datetime):
+        document["timestamp"] = document["timestamp"].isoformat()
+    return json.dumps({"id": doc_id, "document": document})
+
+
+def _decode(line):
+    entry = json.loads(line)
+    document = entry["document"]
+    if isinstance(document.get("timestamp"), str):
+        document["timestamp"] = datetime.fromisoformat(document["timestamp"])
+    return entry["id"], document
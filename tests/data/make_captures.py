@@ -0,0 +1,116 @@
+"""
+Regenerate the small ``.hcap`` captures the replay tests feed to the decoder.
+
+Each capture is a handful of records laid out the way a 9600 baud port
+delivers them (lines split across reads, noise on connect, corrupt frames),
+with the expected outcome asserted in tests/test_replay.py. The files are
+checked in; rerun this only when a capture has to change.
+
+Usage: python tests/data/make_captures.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from hydro.capture import CaptureWriter
+from hydro.fake_arduino import stream2pi_line, stream2pi_raw_line
+from hydro.frames import MODE_BINARY_ACK, MODE_RAW_ACK, encode_frame
+from hydro.protocol import RawReading, Reading
+
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+START = 1700000000.0
+
+
+def line(**values):
+    return stream2pi_line(**values).encode() + b"\r\n"
+
+
+def write(name, chunks, **header):
+    """``chunks`` is a list of payloads, one record each, 0.1 s apart."""
+    with CaptureWriter(os.path.join(DATA_DIR, name), start=START, port="synthetic", baud_rate=9600,
+                       **header) as capture:
+        for i, data in enumerate(chunks):
+            capture.write(START + i / 10, data)
+
+
+def split_lines():
+    """Four lines: split mid-value, split between CR and LF, two in one read, one byte at a time."""
+    first, second, third, fourth = (line(ph=6.0 + i / 10) for i in range(4))
+    return [first[:20], first[20:], second[:-1], second[-1:] + third, *(fourth[i:i + 1] for i in range(len(fourth)))]
+
+
+def garbage():
+    """Connected mid-line, noise, a line without values, blank lines and an unterminated tail."""
+    return [
+        b"TDS:750.0,PH:6.5\r\n",  # Tail of a line sent before the port opened; still usable
+        b"\x00\xff\xfe\r\n",
+        b"Booting stream2pi...\r\n",
+        line(ph=6.1),
+        b"\r\n\r\n",
+        b"WATER_LEVEL:abc,WATER_TEMP:,EC:1.50\r\n",  # One usable value out of three
+        line(ph=6.2),
+        b"WATER_LEVEL:0.5",  # Never finished
+    ]
+
+
+def binary_crc():
+    """An ASCII line, the MODE:BIN ack, then frames with corruption, noise and a split."""
+    reading = Reading(0.5, 25.0, 1.5, 750.0, 6.5)
+    frames = [encode_frame(seq, reading._replace(ph=6.0 + seq / 10)) for seq in range(6)]
+    corrupt = bytearray(frames[1])
+    corrupt[10] ^= 0xFF
+    return [
+        line(ph=6.5),
+        MODE_BINARY_ACK + b"\r\n" + frames[0],
+        bytes(corrupt),  # CRC mismatch: dropped, decoder resyncs on frames[2]
+        frames[2] + b"\xa5\x01\x02",  # Noise that starts with a sync byte
+        frames[3][:7],
+        frames[3][7:] + frames[5],  # frames[4] lost on the wire
+    ]
+
+
+def raw_handshake():
+    """MODE RAW acknowledged (voltages as lines), then MODE BIN (voltages as frames)."""
+    raw = RawReading(0.5, 25.0, 0.246, float("nan"), 1.916)
+    return [
+        line(ph=6.5),
+        MODE_RAW_ACK + b"\r\n",
+        stream2pi_raw_line().encode() + b"\r\n",
+        MODE_BINARY_ACK + b"\r\n",
+        encode_frame(0, raw) + encode_frame(1, raw._replace(ph_voltage=2.0)),
+    ]
+
+
+def out_of_range():
+    """A disconnected DS18B20 (-127 °C), a pH of 15 and an all-bad line, then the same as frames."""
+    reading = Reading(0.5, 25.0, 1.5, 750.0, 6.5)
+    return [
+        line(water_temp=-127.0),
+        line(ph=15.0),
+        b"WATER_LEVEL:9.00,WATER_TEMP:-127.0,EC:-1.00,TDS:-5.0,PH:20.0\r\n",
+        line(),
+        MODE_BINARY_ACK + b"\r\n",
+        encode_frame(0, reading._replace(water_temp=-127.0)),
+        encode_frame(1, Reading(9.0, -127.0, -1.0, -5.0, 20.0)),
+        encode_frame(2, reading),
+    ]
+
+
+CAPTURES = {
+    "split_lines.hcap": split_lines,
+    "garbage.hcap": garbage,
+    "binary_crc.hcap": binary_crc,
+    "raw_handshake.hcap": raw_handshake,
+    "out_of_range.hcap": out_of_range,
+}
+
+
+def main():
+    for name, chunks in CAPTURES.items():
+        write(name, chunks())
+        print(f"wrote {name}")
+
+
+if __name__ == "__main__":
+    main()
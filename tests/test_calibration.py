@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from hydro.calibration import DEFAULT_PROBES, CalibrationBook, PHProbe, convert
+from hydro.storage import SensorStore
+
+START = 1.7e9 - 1.7e9 % 86400
+DAY = 86400.0
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SensorStore(str(tmp_path / "sensor.db"))
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def book(tmp_path):
+    return CalibrationBook(str(tmp_path / "calibration.json"))
+
+
+def raw_history(store, days=3, step=600.0, tank="tank1"):
+    """Raw samples every ``step`` seconds, stored with the default calibration as the collector would."""
+    times = START + np.arange(0, days * DAY, step)
+    rng = np.random.default_rng(0)
+    raw = np.column_stack([
+        np.full(len(times), 0.5), rng.uniform(20, 26, len(times)), rng.uniform(0.2, 0.3, len(times)),
+        np.full(len(times), np.nan), rng.uniform(1.6, 2.2, len(times)),
+    ])
+    store.insert_many(times, convert(DEFAULT_PROBES, raw), tank, raw)
+    return times, raw
+
+
+def test_reprocess_rewrites_history_one_chunk_at_a_time(store, book, monkeypatch):
+    times, raw = raw_history(store)
+    book.add("tank1", {"ph": PHProbe.from_points([(2.0, 7.0), (1.7, 4.0)])}, valid_from=START)
+    calls = []
+    update_values = store.update_values
+
+    def counted(ids, *args):
+        calls.append(len(ids))
+        update_values(ids, *args)
+
+    monkeypatch.setattr(store, "update_values", counted)
+
+    assert book.reprocess(store, "tank1") == len(times)
+    assert len(calls) == 3  # One transaction per day
+    _, values = store.query(tank="tank1")
+    expected = book.apply("tank1", times, raw)
+    np.testing.assert_allclose(values["ph"], expected[:, 4])
+    np.testing.assert_allclose(values["ec"], expected[:, 2])
+    assert values["water_temp"].tolist() == raw[:, 1].tolist()  # Not a probe field
+
+
+def test_reprocess_from_a_start_time_leaves_older_rows(store, book):
+    times, raw = raw_history(store)
+    before = store.query(tank="tank1")[1]["ph"].copy()
+    book.add("tank1", {"ph": PHProbe(v7=2.0, slope=10.0)}, valid_from=START + 1.5 * DAY)
+
+    assert book.reprocess(store, "tank1", start=START + 1.5 * DAY) == np.count_nonzero(times >= START + 1.5 * DAY)
+    after = store.query(tank="tank1")[1]["ph"]
+    old = times < START + 1.5 * DAY
+    assert after[old].tolist() == before[old].tolist()
+    assert not np.allclose(after[~old], before[~old])
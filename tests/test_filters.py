@@ -0,0 +1,95 @@
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+from hydro.filters import EMA, FilterPipeline, Hampel, RunningMedian, batch_equivalent, default_pipeline
+from hydro.protocol import Reading
+from hydro.storage import DEFAULT_DB_PATH, SensorStore
+
+TOLERANCE = 1e-9  # Relative; the batch EMA sums in a different order
+
+
+def synthetic_trace(count=3000, seed=0):
+    """Random walks with noise, spikes (ultrasonic echoes, EMI on the probes) and dropped values."""
+    rng = np.random.default_rng(seed)
+    base = np.array([0.52, 25.0, 1.5, 750.0, 6.5])
+    noise = np.array([0.01, 0.05, 0.01, 5.0, 0.02])
+    values = base + np.cumsum(rng.standard_normal((count, 5)), axis=0) * noise * 0.1
+    values += rng.standard_normal((count, 5)) * noise
+    spikes = rng.random((count, 5)) < 0.005
+    values[spikes] += rng.choice([-1, 1], spikes.sum()) * noise[np.nonzero(spikes)[1]] * 50
+    values[rng.random((count, 5)) < 0.01] = np.nan
+    return values
+
+
+def recorded_trace(tmp_path):
+    """The repo's sample database, opened on a copy so it is left untouched."""
+    path = str(tmp_path / "trace.db")
+    shutil.copy(DEFAULT_DB_PATH, path)
+    store = SensorStore(path)
+    _, values = store.query()
+    store.close()
+    return values.view(np.float64).reshape(len(values), -1)
+
+
+PIPELINES = {
+    "default": default_pipeline,
+    "median 30": lambda: FilterPipeline({f: [RunningMedian(30)] for f in Reading._fields}),
+    "median 4 + EMA 0.1, compensated": lambda: FilterPipeline(
+        {f: [RunningMedian(4), EMA(alpha=0.1)] for f in Reading._fields}, compensate=True),
+    "Hampel 31, 2 sigma": lambda: FilterPipeline({f: [Hampel(31, n_sigmas=2.0)] for f in Reading._fields}),
+}
+
+
+def assert_equivalent(streamed, batch):
+    streamed = np.asarray(streamed, dtype=float)
+    np.testing.assert_array_equal(np.isnan(streamed), np.isnan(batch))
+    scale = np.maximum(np.abs(batch), 1.0)
+    error = np.nanmax(np.abs(streamed - batch) / scale) if len(batch) else 0.0
+    assert error <= TOLERANCE
+
+
+STAGES = {
+    "median 1": lambda: RunningMedian(1),
+    "median 4": lambda: RunningMedian(4),
+    "median 5": lambda: RunningMedian(5),
+    "median 30": lambda: RunningMedian(30),
+    "Hampel 7": lambda: Hampel(7),
+    "Hampel 9, 2 sigma": lambda: Hampel(9, n_sigmas=2.0),
+    "EMA 0.3": lambda: EMA(alpha=0.3),
+    "EMA span 4": lambda: EMA(span=4),
+}
+
+
+@pytest.mark.parametrize("name", STAGES)
+def test_stage_matches_its_batch_equivalent(name):
+    stage = STAGES[name]()
+    for column in synthetic_trace(1000).T:
+        stage.reset()
+        assert_equivalent([stage(value) for value in column.tolist()], batch_equivalent(stage, column))
+
+
+@pytest.mark.parametrize("name", PIPELINES)
+def test_pipeline_matches_apply_batch(name):
+    trace = synthetic_trace()
+    pipeline = PIPELINES[name]()
+    streamed = [pipeline(row) for row in trace.tolist()]
+    assert_equivalent(streamed, PIPELINES[name]().apply_batch(trace))
+
+
+@pytest.mark.skipif(not os.path.exists(DEFAULT_DB_PATH), reason="no recorded hydroponics_data.db")
+@pytest.mark.parametrize("name", PIPELINES)
+def test_pipeline_matches_apply_batch_on_the_recorded_db(name, tmp_path):
+    trace = recorded_trace(tmp_path)
+    pipeline = PIPELINES[name]()
+    streamed = [pipeline(row) for row in trace.tolist()]
+    assert_equivalent(streamed, PIPELINES[name]().apply_batch(trace))
+
+
+def test_nan_passes_through_without_touching_state():
+    median = RunningMedian(3)
+    assert [median(v) for v in [1.0, 5.0]] == [1.0, 3.0]
+    assert np.isnan(median(float("nan")))
+    assert median(3.0) == 3.0  # Window is 1, 5, 3
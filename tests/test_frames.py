@@ -0,0 +1,115 @@
+import math
+
+from hydro.frames import (
+    FRAME_SIZE, MODE_BINARY_ACK, MODE_RAW_ACK, MODE_RAW_REFUSED, FrameDecoder, StreamDecoder, encode_frame,
+)
+from hydro.protocol import RawReading, Reading
+
+LINE = b"WATER_LEVEL:0.52,WATER_TEMP:25.0,EC:1.50,TDS:750.0,PH:6.5\r\n"
+
+
+def reading(ph):
+    return Reading(0.52, 25.0, 1.5, 750.0, ph)
+
+
+def frames(*phs, first_seq=0):
+    return b"".join(encode_frame(first_seq + i, reading(ph)) for i, ph in enumerate(phs))
+
+
+def phs(pairs):
+    return [round(reading.ph, 3) for _, reading in pairs]
+
+
+def test_frames_round_trip_in_any_chunking():
+    stream = frames(6.0, 6.1, 6.2, 6.3)
+    for size in (1, 7, FRAME_SIZE, FRAME_SIZE + 3, len(stream)):
+        decoder = FrameDecoder()
+        out = []
+        for i in range(0, len(stream), size):
+            out += decoder.feed(stream[i:i + size])
+        assert [seq for seq, _ in out] == [0, 1, 2, 3]
+        assert phs(out) == [6.0, 6.1, 6.2, 6.3]
+        assert decoder.crc_errors == 0
+
+
+def test_corrupted_crc_is_skipped():
+    bad = bytearray(frames(6.1, first_seq=1))
+    bad[10] ^= 0x40
+    decoder = FrameDecoder()
+    assert phs(decoder.feed(frames(6.0) + bytes(bad) + frames(6.2, first_seq=2))) == [6.0, 6.2]
+    assert decoder.crc_errors == 1
+    assert decoder.dropped_frames == 1  # Sequence number 1 never arrived intact
+
+
+def test_truncated_frame_waits_for_the_rest():
+    stream = frames(6.0, 6.1)
+    decoder = FrameDecoder()
+    assert phs(decoder.feed(stream[:FRAME_SIZE + 10])) == [6.0]
+    assert phs(decoder.feed(stream[FRAME_SIZE + 10:])) == [6.1]
+    # A frame cut off by a board reset is dropped with the partial buffer
+    decoder.feed(stream[:FRAME_SIZE - 1])
+    decoder.reset()
+    assert phs(decoder.feed(frames(6.2))) == [6.2]
+    assert decoder.crc_errors == 0
+
+
+def test_resync_after_garbage_bytes():
+    garbage = b"\x00\xa5\xa5\x13\x37" + bytes(range(0xA0, 0xB0)) + b"\xa5"
+    decoder = FrameDecoder()
+    assert phs(decoder.feed(garbage + frames(6.0, 6.1) + garbage + frames(6.2, first_seq=2))) == [6.0, 6.1, 6.2]
+    assert decoder.frames == 3
+    assert decoder.crc_errors > 0
+    assert decoder.dropped_frames == 0
+
+
+def test_out_of_range_values_are_nan():
+    decoder = FrameDecoder()
+    (_, value), = decoder.feed(encode_frame(0, Reading(0.52, -127.0, 1.5, 750.0, 6.5)))
+    assert math.isnan(value.water_temp) and value.ph == 6.5
+    assert decoder.feed(encode_frame(1, Reading(-1.0, -127.0, -1.0, -1.0, 20.0))) == []
+    assert decoder.stats()["rejected_frames"] == 1
+    assert decoder.rejected_values == 6
+
+
+def test_ascii_then_binary_in_one_stream():
+    stream = LINE + b"garbage\r\n" + MODE_BINARY_ACK + b"\r\n" + frames(6.0, 6.1)
+    decoder = StreamDecoder()
+    out = decoder.feed(stream[:40]) + decoder.feed(stream[40:])
+    assert [round(reading.ph, 3) for reading in out] == [6.5, 6.0, 6.1]
+    assert decoder.binary
+    assert decoder.lines == 2 and decoder.line_errors == 1
+    # Lines arriving after the switch are not frames: skipped, then back in sync
+    assert [round(r.ph, 3) for r in decoder.feed(LINE + frames(6.2, first_seq=2))] == [6.2]
+    stats = decoder.stats()
+    assert stats["mode"] == "binary"
+    assert stats["frames"] == 3
+    assert decoder.lines_read == 3 + 2 + stats["crc_errors"]
+
+
+def test_reset_returns_to_ascii():
+    decoder = StreamDecoder()
+    decoder.feed(MODE_BINARY_ACK + b"\n" + frames(6.0)[:10])
+    decoder.reset()
+    assert not decoder.binary
+    assert [r.ph for r in decoder.feed(LINE)] == [6.5]
+
+
+def test_raw_mode_frames_decode_to_raw_readings():
+    decoder = StreamDecoder()
+    raw = RawReading(0.52, 25.0, 0.246, float("nan"), 1.916)
+    out = decoder.feed(LINE + MODE_RAW_ACK + b"\r\n" + MODE_BINARY_ACK + b"\r\n" + encode_frame(0, raw))
+    assert [type(reading) for reading in out] == [Reading, RawReading]
+    assert round(out[1].ph_voltage, 3) == 1.916 and math.isnan(out[1].tds_voltage)
+    assert decoder.stats()["raw"]
+    decoder.reset()
+    assert not decoder.raw
+    assert type(decoder.feed(LINE)[0]) is Reading
+
+
+def test_boards_without_raw_mode_refuse_it():
+    decoder = StreamDecoder()
+    assert [r.ph for r in decoder.feed(MODE_RAW_REFUSED + b"\r\n" + LINE)] == [6.5]
+    assert decoder.raw_refused and not decoder.raw
+    assert decoder.line_errors == 0
+    decoder.reset()  # A different board may be plugged in
+    assert not decoder.raw_refused
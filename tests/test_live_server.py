@@ -0,0 +1,49 @@
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+
+from hydro.live_server import LiveServer
+from hydro.protocol import Reading
+from hydro.storage import SensorStore
+
+START = 1.7e9
+
+
+def reject_constant(name):
+    raise ValueError(f"not JSON: {name}")
+
+
+@pytest.fixture
+def server(tmp_path):
+    store = SensorStore(str(tmp_path / "sensor.db"))
+    for i in range(600):
+        store.add(START + i, Reading(0.5, 25.0, 1.5, 750.0, 6.5 if i % 2 else float("nan")))
+    store.flush()
+    server = LiveServer(store, host="127.0.0.1", port=0).start()
+    yield server
+    server.stop()
+    store.close()
+
+
+def get(server, query):
+    url = f"http://127.0.0.1:{server.port}/api/range?{query}"
+    with urllib.request.urlopen(url, timeout=5) as response:
+        return response.status, json.loads(response.read(), parse_constant=reject_constant)
+
+
+def test_range_is_binned_json(server):
+    status, payload = get(server, f"start={START}&end={START + 600}&points=10")
+    assert status == 200
+    assert len(payload["timestamp"]) == len(payload["ph"]) == 10
+    assert payload["ph"] == pytest.approx([6.5] * 10)
+
+
+@pytest.mark.parametrize("query", [
+    "start=nan", f"start={START}&end=inf", "start=-inf", f"start={START}&end=nan", f"start={START}&end={START}",
+])
+def test_range_rejects_bad_bounds(server, query):
+    with pytest.raises(urllib.error.HTTPError) as error:
+        get(server, query)
+    assert error.value.code == 400
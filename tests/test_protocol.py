@@ -0,0 +1,90 @@
+import math
+
+import numpy as np
+
+from hydro.protocol import LineParser, RawReading, Reading, parse_line, reading_to_dict
+
+LINE = b"WATER_LEVEL:0.52,WATER_TEMP:25.0,EC:1.50,TDS:750.0,PH:6.5"
+RAW_LINE = b"WATER_LEVEL:0.52,WATER_TEMP:25.0,EC_V:0.2460,PH_V:1.9160"
+WITH_UNITS = b"WATER_LEVEL:0.52 m, WATER_TEMP:25.0 \xc2\xb0C, EC:1.50 ms/cm, TDS:750.0 ppm, PH:6.50"
+
+
+def values(reading):
+    return [None if math.isnan(value) else value for value in reading]
+
+
+def test_canonical_line():
+    assert parse_line(LINE) == Reading(0.52, 25.0, 1.5, 750.0, 6.5)
+    assert parse_line(LINE.decode()) == Reading(0.52, 25.0, 1.5, 750.0, 6.5)
+
+
+def test_unit_suffixes_are_skipped():
+    parser = LineParser()
+    assert parser.parse(WITH_UNITS) == Reading(0.52, 25.0, 1.5, 750.0, 6.5)
+    assert parser.rejected_values == 0
+
+
+def test_other_field_orders_and_subsets():
+    assert values(parse_line(b"PH:6.1,EC:1.2")) == [None, None, 1.2, None, 6.1]
+    assert values(parse_line(b"TDS:700,UNKNOWN:3,WATER_LEVEL:0.4")) == [0.4, None, None, 700.0, None]
+
+
+def test_nan_fields_are_missing_not_fatal():
+    parser = LineParser()
+    reading = parser.parse(b"WATER_LEVEL:0.52,WATER_TEMP:nan,EC:1.50,TDS:750.0,PH:nan")
+    assert values(reading) == [0.52, None, 1.5, 750.0, None]
+    assert reading_to_dict(reading) == {"water_level": 0.52, "ec": 1.5, "tds": 750.0}
+
+
+def test_malformed_and_partial_lines():
+    parser = LineParser()
+    assert parser.parse(b"") is None
+    assert parser.parse(b"\x00\xff\xfe") is None
+    assert parser.parse(b"Integrated Sensor Array with TDS Ready") is None
+    assert parser.parse(b"WATER_LEVEL:abc,WATER_TEMP:") is None
+    assert parser.rejected_lines == 4
+    # A line cut off by a reconnect keeps the values it still has
+    assert values(parser.parse(b"TDS:750.0,PH:6.5")) == [None, None, None, 750.0, 6.5]
+    assert values(parser.parse(b"WATER_LEVEL:0.52,WATER_TEMP:2")) == [0.52, 2.0, None, None, None]
+    assert parser.lines == 6
+
+
+def test_out_of_range_values_are_rejected():
+    parser = LineParser()
+    reading = parser.parse(b"WATER_LEVEL:0.52,WATER_TEMP:-127.0,EC:1.50,TDS:750.0,PH:15")
+    assert values(reading) == [0.52, None, 1.5, 750.0, None]
+    assert parser.rejected_values == 2
+    assert parser.parse(b"WATER_LEVEL:9,WATER_TEMP:-127.0,EC:-1,TDS:-5,PH:20") is None
+    assert parser.rejected_values == 7
+    assert parser.rejected_lines == 1
+
+
+def test_parse_buffer_matches_parse():
+    buffer = b"\r\n".join([
+        LINE, WITH_UNITS, b"", b"garbage", b"PH:6.1,EC:1.2", b"WATER_LEVEL:0.52,WATER_TEMP:nan,EC:1.50,TDS:750.0,PH:99",
+    ]) + b"\r\n"
+    one, batch = LineParser(), LineParser()
+    expected = [reading for reading in map(one.parse, buffer.splitlines()) if reading is not None]
+    table = batch.parse_buffer(buffer)
+    np.testing.assert_array_equal(table.view(np.float64).reshape(len(table), -1), np.array(expected, dtype=float))
+    assert batch.stats() == {"lines": 5, "rejected_lines": 1, "rejected_values": 2}
+    assert one.stats() == {"lines": 6, "rejected_lines": 2, "rejected_values": 2}  # parse also sees the blank line
+
+
+def test_raw_lines_parse_to_raw_readings():
+    parser = LineParser()
+    reading = parser.parse(RAW_LINE)
+    assert type(reading) is RawReading
+    assert values(reading) == [0.52, 25.0, 0.246, None, 1.916]
+    over = parser.parse(b"WATER_LEVEL:0.52,WATER_TEMP:25.0,EC_V:7.5,PH_V:1.9")  # The ADC reads at most 5 V
+    assert values(over) == [0.52, 25.0, None, None, 1.9]
+    assert parser.rejected_values == 1
+
+
+def test_parse_buffer_skips_raw_lines():
+    parser = LineParser()
+    table = parser.parse_buffer(b"\r\n".join([LINE, RAW_LINE, b"garbage", RAW_LINE, LINE]))
+    assert len(table) == 2
+    assert table["ph"].tolist() == [6.5, 6.5]
+    # Skipped, not rejected: they are fine, only not calibrated here
+    assert parser.stats() == {"lines": 5, "rejected_lines": 1, "rejected_values": 0}
@@ -0,0 +1,104 @@
+import math
+import os
+
+import pytest
+
+from hydro.capture import CaptureReader, replay_samples
+from hydro.frames import StreamDecoder
+from hydro.protocol import RawReading, Reading
+
+# Small captures written by tests/data/make_captures.py
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+START = 1700000000.0
+
+
+def replay(name):
+    decoder = StreamDecoder()
+    samples = list(replay_samples(os.path.join(DATA_DIR, name), decoder=decoder))
+    return decoder, [timestamp for timestamp, _ in samples], [reading for _, reading in samples]
+
+
+def missing(reading):
+    return [field for field, value in zip(reading._fields, reading) if math.isnan(value)]
+
+
+def test_captures_hold_the_reads_as_recorded():
+    chunks = list(CaptureReader(os.path.join(DATA_DIR, "split_lines.hcap")))
+    assert len(chunks) > 40  # The last line arrives one byte per read
+    assert chunks[0] == (START, b"WATER_LEVEL:0.52,WAT")
+    assert CaptureReader(os.path.join(DATA_DIR, "split_lines.hcap")).header["port"] == "synthetic"
+
+
+def test_lines_split_across_reads():
+    decoder, times, readings = replay("split_lines.hcap")
+    assert [reading.ph for reading in readings] == [6.0, 6.1, 6.2, 6.3]
+    assert all(type(reading) is Reading and not missing(reading) for reading in readings)
+    # Each reading is stamped with the read that completed its line
+    assert times[:3] == pytest.approx([START + 0.1, START + 0.3, START + 0.3])
+    assert decoder.lines_read == 4
+    assert decoder.parse_errors == 0
+
+
+def test_garbage_and_partial_lines():
+    decoder, times, readings = replay("garbage.hcap")
+    assert len(readings) == 4
+    # The tail of a line sent before the port opened still has usable values
+    assert missing(readings[0]) == ["water_level", "water_temp", "ec"]
+    assert readings[0].ph == 6.5
+    assert [readings[1].ph, readings[3].ph] == [6.1, 6.2]
+    assert missing(readings[2]) == ["water_level", "water_temp", "tds", "ph"]
+    # Noise and the boot banner are rejected; blank lines are not counted at all
+    assert decoder.lines == 6
+    assert decoder.line_errors == 2
+    assert decoder.parser.rejected_lines == 2
+    # The unterminated tail waits for the rest of its line
+    assert decoder._pending == b"WATER_LEVEL:0.5"
+    assert decoder.feed(b"2,WATER_TEMP:25.0\r\n")[0].water_level == 0.52
+
+
+def test_crc_failures_resync_in_binary_mode():
+    decoder, times, readings = replay("binary_crc.hcap")
+    assert decoder.binary
+    assert type(readings[0]) is Reading and readings[0].ph == 6.5  # ASCII before the ack
+    assert [round(reading.ph, 3) for reading in readings[1:]] == [6.0, 6.2, 6.3, 6.5]
+    stats = decoder.stats()
+    assert stats["mode"] == "binary"
+    assert stats["frames"] == 4
+    assert stats["crc_errors"] == 2  # The corrupted frame and the stray sync byte
+    assert stats["dropped_frames"] == 2  # Sequence numbers 1 (corrupted) and 4 (lost)
+    assert stats["parse_errors"] == 2
+    # The frame split across two reads comes out with the second one
+    assert times[3] == pytest.approx(START + 0.5)
+
+
+def test_mode_raw_then_binary_handshake():
+    decoder, times, readings = replay("raw_handshake.hcap")
+    assert type(readings[0]) is Reading  # Calibrated until the board acknowledges MODE RAW
+    assert all(type(reading) is RawReading for reading in readings[1:])
+    assert readings[1].ec_voltage == 0.246
+    assert [round(reading.ph_voltage, 3) for reading in readings[2:]] == [1.916, 2.0]
+    assert missing(readings[3]) == ["tds_voltage"]
+    assert decoder.raw and decoder.binary
+    assert decoder.stats()["frames"] == 2
+    assert decoder.parse_errors == 0
+
+    decoder.reset()  # Reopening the port resets the board to calibrated ASCII
+    assert not decoder.raw and not decoder.binary
+    assert type(decoder.feed(b"WATER_LEVEL:0.52,WATER_TEMP:25.0,EC:1.50,TDS:750.0,PH:6.5\r\n")[0]) is Reading
+
+
+def test_out_of_range_values_are_counted_as_rejects():
+    decoder, times, readings = replay("out_of_range.hcap")
+    assert len(readings) == 5
+    assert missing(readings[0]) == ["water_temp"]
+    assert missing(readings[1]) == ["ph"]
+    assert not missing(readings[2])
+    assert missing(readings[3]) == ["water_temp"]
+    assert not missing(readings[4])
+    # Lines: 1 + 1 + 5 bad values, the all-bad line dropped
+    assert decoder.parser.rejected_values == 7
+    assert decoder.parser.rejected_lines == 1
+    # Frames: the same, after the MODE:BIN ack
+    assert decoder.frames.rejected_values == 6
+    assert decoder.frames.rejected_frames == 1
+    assert decoder.parse_errors == 2
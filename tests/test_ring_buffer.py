@@ -0,0 +1,113 @@
+import numpy as np
+import pytest
+
+from hydro.ring_buffer import TimeSeriesRing
+
+CHANNELS = ("a", "b", "c")
+
+
+class ListReference:
+    """The buffer as plain lists, evicting by capacity then by age like TimeSeriesRing."""
+
+    def __init__(self, capacity, max_age=None):
+        self.capacity = capacity
+        self.max_age = max_age
+        self.samples = []
+
+    def append(self, timestamp, row):
+        self.samples.append((timestamp, list(row)))
+        del self.samples[:-self.capacity]
+        if self.max_age is not None:
+            self.samples = [s for s in self.samples if s[0] >= timestamp - self.max_age]
+
+    def window(self, start=None, end=None):
+        kept = [s for s in self.samples if (start is None or s[0] >= start) and (end is None or s[0] <= end)]
+        return [t for t, _ in kept], [row for _, row in kept]
+
+
+def samples(count, seed=0):
+    rng = np.random.default_rng(seed)
+    times = np.cumsum(rng.uniform(0.1, 2.0, count)) + 1.7e9
+    values = rng.normal(size=(count, len(CHANNELS)))
+    values[rng.random(values.shape) < 0.1] = np.nan
+    return times, values
+
+
+def assert_same(ring, reference, start=None, end=None):
+    times, rows = reference.window(start, end)
+    ring_times, ring_values = ring.window(start, end)
+    assert ring_times.tolist() == times
+    np.testing.assert_array_equal(ring_values.T, np.array(rows).reshape(-1, len(CHANNELS)))
+    for i, name in enumerate(CHANNELS):
+        column_times, column = ring.column(name, start, end)
+        assert column_times.tolist() == times
+        np.testing.assert_array_equal(column, np.array([row[i] for row in rows]))
+
+
+def test_wraps_around_many_times():
+    ring, reference = TimeSeriesRing(CHANNELS, capacity=7), ListReference(7)
+    times, values = samples(100)
+    for timestamp, row in zip(times, values):
+        ring.append(timestamp, row)
+        reference.append(timestamp, row)
+        assert_same(ring, reference)
+    assert len(ring) == 7
+    assert ring.latest()[0] == times[-1]
+    assert ring.window()[0].flags.c_contiguous  # Still one zero-copy slice after wrapping
+
+
+def test_extend_larger_than_capacity_keeps_the_newest():
+    ring, reference = TimeSeriesRing(CHANNELS, capacity=10), ListReference(10)
+    times, values = samples(35)
+    ring.extend(times, values)
+    for timestamp, row in zip(times, values):
+        reference.append(timestamp, row)
+    assert len(ring) == 10
+    assert ring.times().tolist() == times[-10:].tolist()
+    assert_same(ring, reference)
+
+
+def test_max_age_trims_old_samples():
+    ring, reference = TimeSeriesRing(CHANNELS, capacity=1000, max_age=30.0), ListReference(1000, max_age=30.0)
+    times, values = samples(200)
+    for timestamp, row in zip(times, values):
+        ring.append(timestamp, row)
+        reference.append(timestamp, row)
+    assert_same(ring, reference)
+    assert ring.times()[0] >= times[-1] - 30.0
+    assert len(ring) < 200
+
+
+def test_window_and_column_bounds_match_the_reference():
+    ring, reference = TimeSeriesRing(CHANNELS, capacity=50), ListReference(50)
+    times, values = samples(120)
+    for timestamp, row in zip(times, values):
+        ring.append(timestamp, row)
+        reference.append(timestamp, row)
+    kept = reference.window()[0]
+    bounds = [
+        (None, None), (kept[10], None), (None, kept[20]), (kept[5], kept[5]), (kept[5] + 1e-6, kept[6]),
+        (kept[0] - 100, kept[-1] + 100), (kept[-1] + 1, None), (None, kept[0] - 1), (kept[30], kept[10]),
+    ]
+    for start, end in bounds:
+        assert_same(ring, reference, start, end)
+
+
+def test_missing_channels_are_nan():
+    ring = TimeSeriesRing(CHANNELS, capacity=4)
+    ring.append(1.0, {"b": 2.0, "unknown": 9.0})
+    ring.append(2.0, [1.0, None, 3.0])
+    _, values = ring.window()
+    np.testing.assert_array_equal(values, [[np.nan, 1.0], [2.0, np.nan], [np.nan, 3.0]])
+
+
+def test_rejects_older_timestamps_and_read_only_views():
+    ring = TimeSeriesRing(CHANNELS, capacity=4)
+    ring.append(2.0, [1.0, 2.0, 3.0])
+    ring.append(2.0, [1.0, 2.0, 3.0])  # Equal is fine
+    with pytest.raises(ValueError):
+        ring.append(1.0, [1.0, 2.0, 3.0])
+    with pytest.raises(ValueError):
+        ring.times()[0] = 0.0
+    with pytest.raises(ValueError):
+        TimeSeriesRing(CHANNELS, capacity=0)
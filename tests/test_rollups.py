@@ -0,0 +1,106 @@
+import numpy as np
+import pytest
+
+from hydro.storage import SensorStore
+
+START = 1.7e9 - 1.7e9 % 3600
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SensorStore(str(tmp_path / "sensor.db"), batch_size=50)
+    yield store
+    store.close()
+
+
+def samples(count, step=1.7, seed=0):
+    rng = np.random.default_rng(seed)
+    times = START + np.arange(count) * step
+    values = rng.normal([0.5, 25.0, 1.5, 750.0, 6.5], [0.01, 0.3, 0.05, 20.0, 0.1], (count, 5))
+    values[rng.random((count, 5)) < 0.05] = np.nan
+    return times, values
+
+
+def buckets(store):
+    rows = store.conn.execute("SELECT * FROM sensor_rollup ORDER BY resolution, tank, start").fetchall()
+    return [row[:3] for row in rows], np.array([row[3:] for row in rows], dtype=float)
+
+
+def assert_matches_rebuild(store):
+    keys, stats = buckets(store)
+    with store.conn:
+        store._rebuild_rollups()
+    rebuilt_keys, rebuilt = buckets(store)
+    assert keys == rebuilt_keys
+    np.testing.assert_allclose(stats, rebuilt, rtol=1e-9, equal_nan=True)
+
+
+def test_writes_update_the_tiers_incrementally(store):
+    times, values = samples(6000)
+    for i in range(3000):
+        store.add(times[i], values[i], tank="tank1" if i % 3 else None)
+    store.insert_many(times[3000:], values[3000:], "tank2")
+    store.flush()
+    assert_matches_rebuild(store)
+
+
+def test_rollup_means_match_the_samples(store):
+    times, values = samples(20000)
+    store.insert_many(times, values, "tank1")
+    result = store.rollup(times[0], times[-1], pixels=300, tank="tank1")
+    assert result["resolution"] == 60
+    stored_times, stored = store.query(times[0], times[-1], tank="tank1")
+    for i in (0, 10, len(result["times"]) - 1):
+        inside = (stored_times >= result["times"][i]) & (stored_times < result["times"][i] + 60)
+        assert result["mean"]["ph"][i] == pytest.approx(np.nanmean(stored["ph"][inside]))
+        assert result["max"]["ph"][i] == np.nanmax(stored["ph"][inside])
+        assert result["count"]["ph"][i] == np.count_nonzero(~np.isnan(stored["ph"][inside]))
+
+    # Too short a window for 1 min buckets: draw the samples
+    assert store.rollup(times[0], times[0] + 3600, pixels=600) is None
+    # Coarser tiers for longer windows; without a tank, tanks are merged
+    store.insert_many(times, values, "tank2")
+    merged = store.rollup(times[0], times[-1], pixels=20)
+    assert merged["resolution"] == 900
+    assert merged["count"]["ph"].sum() == 2 * np.count_nonzero(~np.isnan(values[:, 4]))
+
+
+def test_updated_values_rebuild_their_buckets(store):
+    times, values = samples(5000)
+    store.insert_many(times, values, "tank1")
+    ids = [row[0] for row in store.conn.execute("SELECT id FROM sensor_data ORDER BY timestamp LIMIT 700")]
+    store.update_values(ids, np.full((len(ids), 1), 9.0), ["ph"])
+    assert_matches_rebuild(store)
+
+
+def test_existing_history_is_backfilled_once(tmp_path):
+    path = str(tmp_path / "sensor.db")
+    store = SensorStore(path)
+    times, values = samples(3000)
+    store.insert_many(times, values, "tank1")
+    _, expected = buckets(store)
+    store.conn.execute("DROP TABLE sensor_rollup")  # As written before rollups existed
+    store.close()
+
+    store = SensorStore(path)
+    _, backfilled = buckets(store)
+    np.testing.assert_allclose(backfilled, expected, rtol=1e-9, equal_nan=True)
+    store.close()
+
+
+def test_rollups_from_before_tanks_are_rebuilt(tmp_path):
+    path = str(tmp_path / "sensor.db")
+    store = SensorStore(path)
+    times, values = samples(3000)
+    store.insert_many(times, values, "tank1")
+    _, expected = buckets(store)
+    with store.conn:  # As written by a store without the tank column
+        store.conn.execute("DROP TABLE sensor_rollup")
+        store.conn.execute("CREATE TABLE sensor_rollup (resolution INTEGER, start REAL)")
+    store.close()
+
+    store = SensorStore(path)
+    keys, rebuilt = buckets(store)
+    assert {tank for _, tank, _ in keys} == {"tank1"}
+    np.testing.assert_allclose(rebuilt, expected, rtol=1e-9, equal_nan=True)
+    store.close()
@@ -0,0 +1,47 @@
+import math
+import sqlite3
+
+import pytest
+
+from hydro.protocol import Reading
+from hydro.storage import SensorStore
+
+START = 1.7e9
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SensorStore(str(tmp_path / "sensor.db"), batch_size=1000, busy_timeout=0.05)
+    yield store
+    store.close()
+
+
+def stored_count(store):
+    return store.conn.execute("SELECT count(*) FROM sensor_data").fetchone()[0]
+
+
+def test_samples_round_trip_with_missing_values(store):
+    store.add(START, Reading(0.5, 25.0, 1.5, 750.0, 6.5))
+    store.add(START + 1, Reading(0.5, float("nan"), 1.5, 750.0, 6.4))
+    times, values = store.query()
+    assert times.tolist() == [START, START + 1]
+    assert values["ph"].tolist() == [6.5, 6.4]
+    assert math.isnan(values["water_temp"][1])
+
+
+def test_a_locked_database_keeps_the_batch(store):
+    for i in range(10):
+        store.add(START + i, Reading(0.5, 25.0, 1.5, 750.0, 6.5))
+    other = sqlite3.connect(store.path)
+    other.execute("BEGIN IMMEDIATE")  # Another process writing
+    with pytest.raises(sqlite3.OperationalError):
+        store.flush()
+    assert len(store._pending) == 10
+    store.add(START + 10, Reading(0.5, 25.0, 1.5, 750.0, 6.5))
+    other.rollback()
+    other.close()
+
+    store.flush()
+    assert store._pending == []
+    assert stored_count(store) == 11
+    assert store.query()[0].tolist() == [START + i for i in range(11)]
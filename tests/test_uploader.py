@@ -0,0 +1,139 @@
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+from hydro.fake_firestore import FakeFirestore
+from hydro.uploader import MAX_BATCH_SIZE, BatchUploader
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def document(n):
+    return {"n": n, "ph": 6.0 + n / 100, "timestamp": datetime(2024, 1, 1, 0, 0, n % 60, tzinfo=timezone.utc)}
+
+
+def written(db):
+    """Documents in the order Firestore received them."""
+    return list(db.collections.get("sensor_readings", {}).values())
+
+
+def spool_lines(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_failed_commit_spools_the_batch(tmp_path):
+    db = FakeFirestore()
+    db.fail_writes = True
+    spool = tmp_path / "spool.jsonl"
+    uploader = BatchUploader(db, spool_path=str(spool), clock=Clock())
+    for n in range(3):
+        uploader.add(document(n))
+
+    assert not uploader.flush()
+    assert written(db) == []
+    assert uploader.failures == 1
+    assert [entry["document"]["n"] for entry in spool_lines(spool)] == [0, 1, 2]
+    assert uploader.stats()["pending"] == 0
+
+
+def test_retries_wait_for_the_backoff(tmp_path):
+    db = FakeFirestore()
+    db.fail_writes = True
+    clock = Clock()
+    uploader = BatchUploader(db, spool_path=str(tmp_path / "spool.jsonl"), min_backoff=1.0, max_backoff=4.0,
+                             clock=clock)
+    uploader.add(document(0))
+    uploader.flush()
+    assert uploader.stats()["backoff"] == 1.0
+
+    round_trips = db.round_trips
+    clock.now = 0.5
+    uploader.poll()
+    assert db.round_trips == round_trips  # Still backing off
+
+    backoffs = []
+    for _ in range(4):
+        clock.now += uploader.stats()["backoff"]
+        uploader.poll()
+        backoffs.append(uploader.stats()["backoff"])
+    assert backoffs == [2.0, 4.0, 4.0, 4.0]
+
+    db.fail_writes = False
+    clock.now += 4.0
+    uploader.poll()
+    assert not uploader.spooled()
+    assert [doc["n"] for doc in written(db)] == [0]
+    assert uploader.stats()["backoff"] == 0.0
+
+
+def test_backlog_drains_in_order_after_restart(tmp_path):
+    db = FakeFirestore()
+    db.fail_writes = True
+    spool = str(tmp_path / "spool.jsonl")
+    uploader = BatchUploader(db, spool_path=spool, clock=Clock())
+    for n in range(10):
+        uploader.add(document(n))
+        if n % 4 == 3:
+            uploader.flush()  # Fails and spools
+    uploader.close()
+    assert len(spool_lines(spool)) == 10
+
+    # A new process picks up the spool; what is buffered now goes after it
+    db.fail_writes = False
+    restarted = BatchUploader(db, spool_path=spool, clock=Clock())
+    for n in range(10, 13):
+        restarted.add(document(n))
+    assert restarted.flush()
+
+    assert [doc["n"] for doc in written(db)] == list(range(13))
+    assert written(db)[0]["timestamp"] == document(0)["timestamp"]  # Datetimes survive the spool
+    assert not restarted.spooled()
+
+
+def test_truncated_last_spool_line_is_skipped(tmp_path):
+    spool = tmp_path / "spool.jsonl"
+    db = FakeFirestore()
+    db.fail_writes = True
+    uploader = BatchUploader(db, spool_path=str(spool), clock=Clock())
+    for n in range(2):
+        uploader.add(document(n))
+    uploader.flush()
+    with open(spool, "a") as f:
+        f.write('{"id": "3f2a", "document": {"n": 2, "ph"')  # Crash mid-append
+
+    db.fail_writes = False
+    assert BatchUploader(db, spool_path=str(spool), clock=Clock()).drain_spool()
+    assert [doc["n"] for doc in written(db)] == [0, 1]
+    assert spool.read_text() == ""
+
+
+def test_batches_are_capped_at_500(tmp_path):
+    with pytest.raises(ValueError):
+        BatchUploader(FakeFirestore(), max_batch=MAX_BATCH_SIZE + 1)
+
+    db = FakeFirestore()
+    clock = Clock()
+    uploader = BatchUploader(db, spool_path=str(tmp_path / "spool.jsonl"), clock=clock)
+    for n in range(1200):
+        uploader.add(document(n))
+    uploader.flush()
+    assert db.batch_sizes == [500, 500, 200]
+
+    # A large spool is drained in capped batches too
+    db.fail_writes = True
+    for n in range(1200, 2400):
+        uploader.add(document(n))
+    uploader.flush()
+    db.fail_writes = False
+    clock.now += uploader.max_backoff
+    assert uploader.drain_spool()
+    assert db.batch_sizes[3:] == [500, 500, 200]
+    assert [doc["n"] for doc in written(db)] == list(range(2400))
@@ -1,64 +1,141 @@
-from google.cloud import firestore
+import argparse
+import os
+import sys
+import time
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hydro.archive import DEFAULT_ARCHIVE_DIR, SensorArchive
+from hydro.firestore_cache import FirestoreCache
+from hydro.rollups import bucket_stats
+from hydro.storage import DEFAULT_DB_PATH, SensorStore
+
+# Approximate width of one subplot in pixels (12 in figure, 2 columns, 100 dpi)
+PLOT_WIDTH_PX = 600
+
+# Local copy of the sensor_readings collection
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "firestore_cache")
+
 # Firestore setup
 def initialize_firestore():
     """
     Initialize Firestore using the service account key.
     """
+    from google.cloud import firestore  # Not needed when plotting from the archive or the database
+
     return firestore.Client.from_service_account_json("/Users/tcar5787/APIKeys/hydro_web_interface/serviceAccountKey.json")
 
 # Fetch data from Firestore
-def fetch_data_from_firestore(db):
+def fetch_data_from_firestore(db, start=None, end=None):
     """
     Fetch sensor data from Firestore and return as a Pandas DataFrame.
+
+    Only documents newer than the local cache are downloaded (in ordered
+    pages); the rest is read from CACHE_DIR. ``start``/``end`` (epoch
+    seconds) limit the returned range.
     """
     try:
-        # Reference Firestore collection
-        collection_ref = db.collection("sensor_readings")
-        docs = collection_ref.stream()
-
-        # Extract data into a list of dictionaries
-        data = []
-        for doc in docs:
-            doc_data = doc.to_dict()
-            # Convert Firestore timestamp to Python datetime
-            if 'timestamp' in doc_data and doc_data['timestamp']:
-                doc_data['timestamp'] = doc_data['timestamp'].timestamp()  # Convert to a POSIX timestamp
-            data.append(doc_data)
-
-        # Create a Pandas DataFrame
-        df = pd.DataFrame(data)
-        # Convert the POSIX timestamp back to datetime
+        cache = FirestoreCache(db, CACHE_DIR)
+        added = cache.sync()
+        print(f"Fetched {added} new documents from Firestore")
+
+        df = pd.DataFrame(cache.load(start, end))
+        if df.empty:
+            return df
+        # Convert the POSIX timestamp back to datetime (already sorted)
         df['timestamp'] = pd.to_datetime(df['timestamp'], unit='s')
-
-        # Sort the DataFrame by timestamp
-        df.sort_values(by='timestamp', inplace=True)
-
         return df
     except Exception as e:
         print(f"Error fetching data from Firestore: {e}")
         return None
 
-# Plot the data
-def plot_data(df):
+# Read from the local columnar archive instead
+def fetch_data_from_archive(path=DEFAULT_ARCHIVE_DIR, start=None, end=None, tank=None):
+    """
+    Load archived sensor data (see hydro.archive) as a DataFrame shaped like
+    fetch_data_from_firestore's, so it works offline and at full resolution.
+    """
+    try:
+        df = pd.DataFrame(SensorArchive(path).load(start, end, tank=tank))
+        if df.empty:
+            return df
+        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='s')
+        return df
+    except Exception as e:
+        print(f"Error reading the archive: {e}")
+        return None
+
+# Read the local SQLite store through its rollup tiers
+def database_series(path=DEFAULT_DB_PATH, start=None, end=None, tank=None):
     """
-    Plot sensor data using Matplotlib.
+    Return ``series(column) -> (datetimes, values)`` over the store at
+    ``path``. Long ranges come from the rollup buckets the store keeps up
+    to date as samples are written (about one per pixel), so the cost does
+    not grow with the raw history; short ones from the samples themselves.
+    """
+    store = SensorStore(path)
+    try:
+        stored = store.time_range()
+        if stored is None:
+            return None
+        start = stored[0] if start is None else start
+        end = stored[1] if end is None else end
+        result = store.rollup(start, end, PLOT_WIDTH_PX, tank)
+        if result is None:
+            times, values = store.query(start, end, tank)
+        else:
+            times, values = result["times"] + result["resolution"] / 2, result["mean"]
+    finally:
+        store.close()
+    if not len(times):
+        return None
+    index = pd.to_datetime(times, unit="s")
+    return lambda column: (index, values[column])
+
+
+def dataframe_series(df):
+    """
+    ``series`` for a DataFrame from Firestore or the archive, which have
+    no rollups: columns longer than the plot are averaged to ~one point per
+    pixel when drawn.
     """
     if df is None or df.empty:
+        return None
+    epochs = df['timestamp'].to_numpy().astype("datetime64[ns]").astype("int64") / 1e9
+
+    def series(column):
+        if column not in df:
+            return [], []
+        values = df[column].to_numpy(dtype=float)
+        if len(epochs) <= PLOT_WIDTH_PX:
+            return df['timestamp'], values
+        starts, count, total, _, _ = bucket_stats(epochs, values, (epochs[-1] - epochs[0]) / PLOT_WIDTH_PX)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = total[:, 0] / count[:, 0]
+        return pd.to_datetime(starts, unit="s"), means
+
+    return series
+
+
+# Plot the data
+def plot_data(series):
+    """
+    Plot sensor data using Matplotlib; ``series(column)`` returns the
+    ``(datetimes, values)`` to draw (see database_series, dataframe_series).
+    """
+    if series is None:
         print("No data available to plot.")
         return
 
-    # Set timestamp as the DataFrame index
-    df.set_index('timestamp', inplace=True)
-
     # Create plots for each sensor type
     plt.figure(figsize=(12, 8))
 
     # Water Level
     plt.subplot(3, 2, 1)
-    plt.plot(df.index, df['water_level'], label='Water Level')
+    plt.plot(*series('water_level'), label='Water Level')
     plt.title('Water Level')
     plt.xlabel('Time')
     plt.ylabel('Level')
@@ -66,7 +143,7 @@ def plot_data(df):
 
     # Water Temperature
     plt.subplot(3, 2, 2)
-    plt.plot(df.index, df['water_temp'], label='Water Temp', color='orange')
+    plt.plot(*series('water_temp'), label='Water Temp', color='orange')
     plt.title('Water Temperature')
     plt.xlabel('Time')
     plt.ylabel('Temperature (°C)')
@@ -74,7 +151,7 @@ def plot_data(df):
 
     # EC
     plt.subplot(3, 2, 3)
-    plt.plot(df.index, df['ec'], label='EC', color='green')
+    plt.plot(*series('ec'), label='EC', color='green')
     plt.title('Electrical Conductivity (EC)')
     plt.xlabel('Time')
     plt.ylabel('EC')
@@ -82,7 +159,7 @@ def plot_data(df):
 
     # TDS
     plt.subplot(3, 2, 4)
-    plt.plot(df.index, df['tds'], label='TDS', color='purple')
+    plt.plot(*series('tds'), label='TDS', color='purple')
     plt.title('Total Dissolved Solids (TDS)')
     plt.xlabel('Time')
     plt.ylabel('TDS')
@@ -90,7 +167,7 @@ def plot_data(df):
 
     # pH
     plt.subplot(3, 2, 5)
-    plt.plot(df.index, df['ph'], label='pH', color='red')
+    plt.plot(*series('ph'), label='pH', color='red')
     plt.title('pH Levels')
     plt.xlabel('Time')
     plt.ylabel('pH')
@@ -101,17 +178,31 @@ def plot_data(df):
     plt.show()
 
 def main():
-    # Initialize Firestore
-    db = initialize_firestore()
+    parser = argparse.ArgumentParser(description="Plot hydroponics sensor history")
+    parser.add_argument("--archive", nargs="?", const=DEFAULT_ARCHIVE_DIR, default=None,
+                        help="Read the local columnar archive instead of Firestore")
+    parser.add_argument("--db", nargs="?", const=DEFAULT_DB_PATH, default=None,
+                        help="Read the local SQLite store (through its rollups) instead of Firestore")
+    parser.add_argument("--tank", default=None, help="Only this tank (archive and database only)")
+    parser.add_argument("--days", type=float, default=None, help="Only the last N days")
+    args = parser.parse_args()
+    start = time.time() - args.days * 86400 if args.days else None
+
+    if args.db:
+        plot_data(database_series(args.db, start, tank=args.tank))
+        return
 
     # Fetch data
-    df = fetch_data_from_firestore(db)
+    if args.archive:
+        df = fetch_data_from_archive(args.archive, start, tank=args.tank)
+    else:
+        df = fetch_data_from_firestore(initialize_firestore(), start)
     if df is not None:
         print("Fetched data:")
         print(df.head())
 
         # Plot the data
-        plot_data(df)
+        plot_data(dataframe_series(df))
     else:
         print("No data fetched.")
 